@@ -0,0 +1,47 @@
+"""Add question_student_sketches table
+
+Revision ID: 4d40e461d082
+Revises: 6cd499e91ad1
+Create Date: 2026-10-18 12:21:09.550127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4d40e461d082'
+down_revision: Union[str, Sequence[str], None] = '6cd499e91ad1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('question_student_sketches',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('granularity', sa.String(), nullable=False),
+    sa.Column('bucket_start', sa.Date(), nullable=False),
+    sa.Column('class_name', sa.String(), nullable=True),
+    sa.Column('subject', sa.String(), nullable=True),
+    sa.Column('sketch', sa.LargeBinary(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('granularity', 'bucket_start', 'class_name', 'subject', name='uix_question_student_sketch')
+    )
+    with op.batch_alter_table('question_student_sketches', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_question_student_sketches_class_name'), ['class_name'], unique=False)
+        batch_op.create_index(batch_op.f('ix_question_student_sketches_subject'), ['subject'], unique=False)
+        batch_op.create_index('ix_question_student_sketches_granularity_bucket', ['granularity', 'bucket_start'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('question_student_sketches', schema=None) as batch_op:
+        batch_op.drop_index('ix_question_student_sketches_granularity_bucket')
+        batch_op.drop_index(batch_op.f('ix_question_student_sketches_subject'))
+        batch_op.drop_index(batch_op.f('ix_question_student_sketches_class_name'))
+
+    op.drop_table('question_student_sketches')
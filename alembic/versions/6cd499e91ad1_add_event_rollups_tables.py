@@ -0,0 +1,59 @@
+"""Add event_rollups tables
+
+Revision ID: 6cd499e91ad1
+Revises: d1bbc6f964a4
+Create Date: 2026-10-18 11:05:52.613920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6cd499e91ad1'
+down_revision: Union[str, Sequence[str], None] = 'd1bbc6f964a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('event_rollups',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('metric', sa.String(), nullable=False),
+    sa.Column('granularity', sa.String(), nullable=False),
+    sa.Column('bucket_start', sa.Date(), nullable=False),
+    sa.Column('class_name', sa.String(), nullable=True),
+    sa.Column('subject', sa.String(), nullable=True),
+    sa.Column('count', sa.Integer(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('metric', 'granularity', 'bucket_start', 'class_name', 'subject', name='uix_event_rollup')
+    )
+    with op.batch_alter_table('event_rollups', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_event_rollups_class_name'), ['class_name'], unique=False)
+        batch_op.create_index(batch_op.f('ix_event_rollups_subject'), ['subject'], unique=False)
+        batch_op.create_index('ix_event_rollups_metric_granularity_bucket', ['metric', 'granularity', 'bucket_start'], unique=False)
+
+    op.create_table('event_rollup_watermarks',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('metric', sa.String(), nullable=False),
+    sa.Column('granularity', sa.String(), nullable=False),
+    sa.Column('covered_until', sa.Date(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('metric', 'granularity', name='uix_event_rollup_watermark')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('event_rollup_watermarks')
+    with op.batch_alter_table('event_rollups', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_rollups_metric_granularity_bucket')
+        batch_op.drop_index(batch_op.f('ix_event_rollups_subject'))
+        batch_op.drop_index(batch_op.f('ix_event_rollups_class_name'))
+
+    op.drop_table('event_rollups')
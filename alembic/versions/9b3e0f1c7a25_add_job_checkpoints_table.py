@@ -0,0 +1,39 @@
+"""Add job_checkpoints table
+
+Revision ID: 9b3e0f1c7a25
+Revises: f6ea1da72c43
+Create Date: 2026-10-18 15:02:17.554310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b3e0f1c7a25'
+down_revision: Union[str, Sequence[str], None] = 'f6ea1da72c43'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('job_checkpoints',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('cursor', sa.String(), nullable=True),
+    sa.Column('rows_done', sa.Integer(), nullable=True),
+    sa.Column('rows_total', sa.Integer(), nullable=True),
+    sa.Column('message', sa.String(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('job_checkpoints')
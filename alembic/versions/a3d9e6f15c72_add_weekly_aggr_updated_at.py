@@ -0,0 +1,51 @@
+"""Add updated_at to questions_weekly_aggr
+
+Revision ID: a3d9e6f15c72
+Revises: f2b7c4e90d16
+Create Date: 2026-10-19 14:37:08.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d9e6f15c72'
+down_revision: Union[str, Sequence[str], None] = 'f2b7c4e90d16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Nullable: existing rows fall back to created_at
+    op.add_column('questions_weekly_aggr', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    # The weekly aggregation may upsert counts with plain SQL: bump updated_at on any change
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(
+            "CREATE OR REPLACE FUNCTION questions_weekly_aggr_touch() RETURNS trigger AS $$ "
+            "BEGIN NEW.updated_at := now() AT TIME ZONE 'UTC'; RETURN NEW; END; $$ LANGUAGE plpgsql"
+        )
+        op.execute(
+            "CREATE TRIGGER trg_questions_weekly_aggr_updated_at BEFORE UPDATE ON questions_weekly_aggr "
+            "FOR EACH ROW EXECUTE FUNCTION questions_weekly_aggr_touch()"
+        )
+    else:
+        op.execute(
+            "CREATE TRIGGER trg_questions_weekly_aggr_updated_at "
+            "AFTER UPDATE OF user_id, profile_id, class_name, subject, count, date ON questions_weekly_aggr "
+            "BEGIN UPDATE questions_weekly_aggr SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = NEW.id; END"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS trg_questions_weekly_aggr_updated_at" + (
+        " ON questions_weekly_aggr" if op.get_bind().dialect.name == "postgresql" else ""
+    ))
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP FUNCTION IF EXISTS questions_weekly_aggr_touch()")
+    with op.batch_alter_table('questions_weekly_aggr', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,46 @@
+"""Add topic_sketches table
+
+Revision ID: a73cef83de26
+Revises: 4d40e461d082
+Create Date: 2026-10-18 13:02:47.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a73cef83de26'
+down_revision: Union[str, Sequence[str], None] = '4d40e461d082'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('topic_sketches',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('class_name', sa.String(), nullable=True),
+    sa.Column('subject', sa.String(), nullable=True),
+    sa.Column('week_start', sa.Date(), nullable=False),
+    sa.Column('sketch', sa.JSON(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('class_name', 'subject', 'week_start', name='uix_topic_sketch')
+    )
+    with op.batch_alter_table('topic_sketches', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_topic_sketches_class_name'), ['class_name'], unique=False)
+        batch_op.create_index(batch_op.f('ix_topic_sketches_subject'), ['subject'], unique=False)
+        batch_op.create_index(batch_op.f('ix_topic_sketches_week_start'), ['week_start'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('topic_sketches', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_topic_sketches_week_start'))
+        batch_op.drop_index(batch_op.f('ix_topic_sketches_subject'))
+        batch_op.drop_index(batch_op.f('ix_topic_sketches_class_name'))
+
+    op.drop_table('topic_sketches')
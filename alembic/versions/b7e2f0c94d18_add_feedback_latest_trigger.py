@@ -0,0 +1,63 @@
+"""Move the feedback latest pointer with an insert trigger
+
+Revision ID: b7e2f0c94d18
+Revises: a3d9e6f15c72
+Create Date: 2026-10-19 16:12:27.415903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2f0c94d18'
+down_revision: Union[str, Sequence[str], None] = 'a3d9e6f15c72'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Clear the old pointer first: ix_feedback_latest is checked row by row
+MOVE_LATEST = (
+    "UPDATE feedback SET is_latest = {false} "
+    "WHERE profile_id = NEW.profile_id AND subject = NEW.subject AND is_latest; "
+    "UPDATE feedback SET is_latest = {true} WHERE id = ("
+    "SELECT id FROM feedback WHERE profile_id = NEW.profile_id AND subject = NEW.subject "
+    "ORDER BY created_at DESC, id DESC LIMIT 1); "
+)
+
+NEWEST = (
+    "created_at = (SELECT MAX(f.created_at) FROM feedback f "
+    "WHERE f.profile_id = feedback.profile_id AND f.subject = feedback.subject)"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The weekly generator inserts feedback rows itself; the database moves the pointer for every writer
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(
+            "CREATE OR REPLACE FUNCTION feedback_move_latest() RETURNS trigger AS $$ BEGIN "
+            + MOVE_LATEST.format(false="FALSE", true="TRUE") + "RETURN NULL; END; $$ LANGUAGE plpgsql"
+        )
+        op.execute(
+            "CREATE TRIGGER trg_feedback_latest AFTER INSERT ON feedback "
+            "FOR EACH ROW EXECUTE FUNCTION feedback_move_latest()"
+        )
+    else:
+        op.execute(
+            "CREATE TRIGGER trg_feedback_latest AFTER INSERT ON feedback BEGIN "
+            + MOVE_LATEST.format(false=0, true=1) + "END"
+        )
+    # Rows inserted since the pointer was added never got it: repair (one row per profile, subject and week)
+    op.execute(f"UPDATE feedback SET is_latest = FALSE WHERE is_latest AND NOT ({NEWEST})")
+    op.execute(f"UPDATE feedback SET is_latest = TRUE WHERE NOT is_latest AND {NEWEST}")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS trg_feedback_latest" + (
+        " ON feedback" if op.get_bind().dialect.name == "postgresql" else ""
+    ))
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP FUNCTION IF EXISTS feedback_move_latest()")
@@ -0,0 +1,32 @@
+"""Add event timestamp indexes
+
+Revision ID: c4a7e2d91f08
+Revises: de58b2be8b05
+Create Date: 2026-10-18 17:40:05.119204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.migration_helpers import create_index_online, drop_index_online
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a7e2d91f08'
+down_revision: Union[str, Sequence[str], None] = 'de58b2be8b05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    create_index_online('ix_questions_asked_timestamp', 'questions_asked', ['timestamp'])
+    create_index_online('ix_test_papers_timestamp', 'test_papers', ['timestamp'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_index_online('ix_test_papers_timestamp', 'test_papers')
+    drop_index_online('ix_questions_asked_timestamp', 'questions_asked')
@@ -0,0 +1,32 @@
+"""Add profile timeline indexes
+
+Revision ID: d1bbc6f964a4
+Revises: 9b3e0f1c7a25
+Create Date: 2026-10-18 10:12:40.218734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.migration_helpers import create_index_online, drop_index_online
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1bbc6f964a4'
+down_revision: Union[str, Sequence[str], None] = '9b3e0f1c7a25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    create_index_online('ix_questions_asked_profile_id_timestamp', 'questions_asked', ['profile_id', 'timestamp'])
+    op.create_index('ix_questions_weekly_aggr_profile_id_date', 'questions_weekly_aggr', ['profile_id', 'date'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_questions_weekly_aggr_profile_id_date', table_name='questions_weekly_aggr')
+    drop_index_online('ix_questions_asked_profile_id_timestamp', 'questions_asked')
@@ -0,0 +1,42 @@
+"""Add feedback latest pointer and composite index
+
+Revision ID: d8f3b6a2e514
+Revises: c4a7e2d91f08
+Create Date: 2026-10-18 19:05:41.830126
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8f3b6a2e514'
+down_revision: Union[str, Sequence[str], None] = 'c4a7e2d91f08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # ADD COLUMN with a constant default does not rewrite the table on SQLite or Postgres
+    op.add_column('feedback', sa.Column('is_latest', sa.Boolean(), server_default='0', nullable=False))
+    # feedback holds one row per profile, subject and week, so a single UPDATE is fine here
+    op.execute(
+        "UPDATE feedback SET is_latest = TRUE WHERE created_at = ("
+        "SELECT MAX(f.created_at) FROM feedback f "
+        "WHERE f.profile_id = feedback.profile_id AND f.subject = feedback.subject)"
+    )
+    op.create_index('ix_feedback_profile_subject_created', 'feedback',
+                    ['profile_id', 'subject', sa.text('created_at DESC')], unique=False)
+    op.create_index('ix_feedback_latest', 'feedback', ['profile_id', 'subject'], unique=True,
+                    sqlite_where=sa.text('is_latest = 1'), postgresql_where=sa.text('is_latest'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_feedback_latest', table_name='feedback')
+    op.drop_index('ix_feedback_profile_subject_created', table_name='feedback')
+    with op.batch_alter_table('feedback', schema=None) as batch_op:
+        batch_op.drop_column('is_latest')
@@ -0,0 +1,47 @@
+"""Add engagement_digests table
+
+Revision ID: de58b2be8b05
+Revises: a73cef83de26
+Create Date: 2026-10-18 13:48:30.402871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'de58b2be8b05'
+down_revision: Union[str, Sequence[str], None] = 'a73cef83de26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('engagement_digests',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('class_name', sa.String(), nullable=True),
+    sa.Column('subject', sa.String(), nullable=True),
+    sa.Column('week_start', sa.Date(), nullable=False),
+    sa.Column('profiles', sa.Integer(), nullable=True),
+    sa.Column('digest', sa.JSON(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('class_name', 'subject', 'week_start', name='uix_engagement_digest')
+    )
+    with op.batch_alter_table('engagement_digests', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_engagement_digests_class_name'), ['class_name'], unique=False)
+        batch_op.create_index(batch_op.f('ix_engagement_digests_subject'), ['subject'], unique=False)
+        batch_op.create_index(batch_op.f('ix_engagement_digests_week_start'), ['week_start'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('engagement_digests', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_engagement_digests_week_start'))
+        batch_op.drop_index(batch_op.f('ix_engagement_digests_subject'))
+        batch_op.drop_index(batch_op.f('ix_engagement_digests_class_name'))
+
+    op.drop_table('engagement_digests')
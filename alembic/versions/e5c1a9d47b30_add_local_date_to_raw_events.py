@@ -0,0 +1,42 @@
+"""Add local_date to raw event tables
+
+Revision ID: e5c1a9d47b30
+Revises: d8f3b6a2e514
+Create Date: 2026-10-19 10:12:27.504318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.migration_helpers import create_index_online, drop_index_online, schedule_backfill
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5c1a9d47b30'
+down_revision: Union[str, Sequence[str], None] = 'd8f3b6a2e514'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Nullable, no default: a metadata-only change. Existing rows are filled by the
+    # local_date backfills in the background; rollups stay on UTC days until then
+    op.add_column('questions_asked', sa.Column('local_date', sa.Date(), nullable=True))
+    op.add_column('test_papers', sa.Column('local_date', sa.Date(), nullable=True))
+    create_index_online('ix_questions_asked_local_date', 'questions_asked', ['local_date'])
+    create_index_online('ix_test_papers_local_date', 'test_papers', ['local_date'])
+    schedule_backfill('local_date:questions_asked')
+    schedule_backfill('local_date:test_papers')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_index_online('ix_test_papers_local_date', 'test_papers')
+    drop_index_online('ix_questions_asked_local_date', 'questions_asked')
+    with op.batch_alter_table('test_papers', schema=None) as batch_op:
+        batch_op.drop_column('local_date')
+    with op.batch_alter_table('questions_asked', schema=None) as batch_op:
+        batch_op.drop_column('local_date')
@@ -0,0 +1,33 @@
+"""Add raw event created_at indexes
+
+Revision ID: f2b7c4e90d16
+Revises: e5c1a9d47b30
+Create Date: 2026-10-19 14:02:51.337610
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.migration_helpers import create_index_online, drop_index_online
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b7c4e90d16'
+down_revision: Union[str, Sequence[str], None] = 'e5c1a9d47b30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Rollup recovery after a restart reads the rows stored since the last refresh
+    create_index_online('ix_questions_asked_created_at', 'questions_asked', ['created_at'])
+    create_index_online('ix_test_papers_created_at', 'test_papers', ['created_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_index_online('ix_test_papers_created_at', 'test_papers')
+    drop_index_online('ix_questions_asked_created_at', 'questions_asked')
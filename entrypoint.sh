@@ -3,8 +3,17 @@ set -e
 
 export INSIGHTS_DB_URL="sqlite:///./db/tutor_insights.db"
 
-echo "Running DB migrations..."
-alembic upgrade head
+# Revisions only apply DDL here; data backfills and SQLite index builds they
+# schedule run inside the app in the background (job_checkpoints), so startup
+# does not wait on them.
+# The revision check reads alembic_version directly and skips Alembic (and the
+# model imports it needs) when the schema is already at head.
+if python -m src.startup check-revision; then
+    echo "Skipping DB migrations"
+else
+    echo "Running DB migrations..."
+    alembic upgrade head
+fi
 
 echo "Starting app..."
 exec uvicorn src.main:app --host 0.0.0.0 --port 4502
@@ -0,0 +1,84 @@
+import sys
+import os
+import argparse
+import json
+import logging
+
+# Add the current directory to sys.path to ensure 'src' module is found
+sys.path.append(os.getcwd())
+
+# Configure logging to see output
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+import boto3
+
+from src.config import settings
+from src.load_harness import LoadProfile, LoadTest, compare, service_metrics
+from src.services.ingest_service import QUESTION_ASKED, TEST_PAPER_GENERATED
+
+# Usage: python manual_load_harness.py [--endpoint http://localhost:9324] [--rate 200] [--duration 60]
+#        [--duplicates 0.05] [--malformed 0.01] [--burst-every 10] [--burst-size 500] [--token ...]
+# Start the emulator (e.g. `moto_server -p 9324` or ElasticMQ) and the service with
+# SQS_ENDPOINT_URL pointing at it and CONSUMER_ENABLED=true; the report is compared
+# with the previous one at --report before being written there.
+def main():
+    parser = argparse.ArgumentParser(description="Ingest load test against a local SQS emulator")
+    parser.add_argument("--endpoint", default=settings.SQS_ENDPOINT_URL or "http://localhost:9324",
+                        help="SQS emulator URL")
+    parser.add_argument("--rate", type=float, default=50, help="new events per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to publish for")
+    parser.add_argument("--question-share", type=float, default=0.8, help="share of QUESTION_ASKED events")
+    parser.add_argument("--duplicates", type=float, default=0.05, help="share of messages re-sending an earlier event")
+    parser.add_argument("--malformed", type=float, default=0.01, help="share of unparseable messages")
+    parser.add_argument("--burst-every", type=float, default=10, help="seconds between bursts (0: none)")
+    parser.add_argument("--burst-size", type=int, default=200, help="extra events per burst")
+    parser.add_argument("--users", type=int, default=500, help="distinct user ids")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for rows after publishing")
+    parser.add_argument("--service-url", default="http://localhost:8000", help="for consumer commit latency")
+    parser.add_argument("--token", default=None, help="admin bearer token for /api/insights/metrics")
+    parser.add_argument("--report", default="load_test_report.json")
+    parser.add_argument("--keep", action="store_true", help="keep this run's rows in the database")
+    args = parser.parse_args()
+
+    client = boto3.client("sqs", region_name=settings.AWS_REGION, endpoint_url=args.endpoint,
+                          aws_access_key_id="test", aws_secret_access_key="test")
+    queue_urls = {
+        QUESTION_ASKED: client.create_queue(QueueName=settings.TUTOR_QUEUE_NAME)["QueueUrl"],
+        TEST_PAPER_GENERATED: client.create_queue(QueueName=settings.EXAMINER_QUEUE_NAME)["QueueUrl"],
+    }
+    profile = LoadProfile(
+        rate=args.rate, duration=args.duration, question_share=args.question_share,
+        duplicate_rate=args.duplicates, malformed_rate=args.malformed,
+        burst_every=args.burst_every, burst_size=args.burst_size, users=args.users, seed=args.seed
+    )
+    run = LoadTest(client, queue_urls, profile, metrics=service_metrics(args.service_url, args.token))
+
+    print(f"Run {run.run_id}: publishing {profile.due(profile.duration)} messages over {profile.duration}s")
+    run.publish()
+    if not run.wait(args.timeout):
+        print(f"Timed out after {args.timeout}s with events still missing")
+    report = run.report()
+    if not args.keep:
+        print(f"Removed {run.cleanup()} rows")
+
+    print(json.dumps(report, indent=2))
+    if os.path.exists(args.report):
+        with open(args.report) as f:
+            baseline = json.load(f)
+        print(f"Compared with run {baseline.get('run_id')} ({baseline.get('started_at')}):")
+        for field, change in compare(report, baseline).items():
+            verdict = {True: "better", False: "WORSE", None: "-"}[change["better"]]
+            pct = f" ({change['change_pct']:+}%)" if "change_pct" in change else ""
+            print(f"  {field}: {change['baseline']} -> {change['now']}{pct} {verdict}")
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.report}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("Interrupted")
+    except Exception as e:
+        print(f"Error: {e}")
@@ -0,0 +1,32 @@
+import sys
+import os
+import argparse
+import logging
+
+# Add the current directory to sys.path to ensure 'src' module is found
+sys.path.append(os.getcwd())
+
+# Configure logging to see output
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+from src.services.replay_service import replay_service
+
+# Usage: python manual_replay_events.py events.ndjson [--workers 8] [--chunk-mb 16] [--restart]
+def main():
+    parser = argparse.ArgumentParser(description="Re-ingest an NDJSON dump of raw insight events")
+    parser.add_argument("path")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count)")
+    parser.add_argument("--chunk-mb", type=int, default=16, help="bytes per transaction, in MB")
+    parser.add_argument("--restart", action="store_true", help="ignore the saved byte offset")
+    args = parser.parse_args()
+
+    totals = replay_service.replay(args.path, args.workers, args.chunk_mb << 20, args.restart)
+    print(totals)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("Interrupted; run again to resume from the last committed chunk")
+    except Exception as e:
+        print(f"Error: {e}")
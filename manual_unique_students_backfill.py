@@ -0,0 +1,34 @@
+import sys
+import os
+import logging
+from datetime import date
+
+# Add the current directory to sys.path to ensure 'src' module is found
+sys.path.append(os.getcwd())
+
+# Configure logging to see output
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+from src.database import SessionLocal
+from src.services.rollup_service import bucket_end
+from src.services.unique_students_service import unique_students_service
+
+# Usage: python manual_unique_students_backfill.py 2026-01 2026-10
+def main(first_month: str, last_month: str):
+    month = date.fromisoformat(f"{first_month}-01")
+    last = date.fromisoformat(f"{last_month}-01")
+    db = SessionLocal()
+    try:
+        while month <= last:
+            unique_students_service.rebuild_month(db, month)
+            month = bucket_end(month, "month")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    try:
+        main(sys.argv[1], sys.argv[2])
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"Error: {e}")
@@ -0,0 +1,158 @@
+"""
+Admission control for /api/insights: every route is given a cost class,
+and each class has its own concurrency limit, bounded wait queue and
+deadline. A request that cannot start within the deadline (or finds the
+queue full) gets an immediate 503 with Retry-After instead of piling onto
+the database. Classes never borrow each other's slots, so a burst of
+`search=` scans cannot starve the cheap stats reads; /health, metrics and
+the live stream are not limited at all.
+
+Queue depth, admissions and shed counts are exported under "admission" in
+/api/insights/metrics.
+"""
+import asyncio
+import json
+import re
+from collections import deque
+from typing import Deque, Dict, List, Optional, Pattern, Tuple
+from urllib.parse import parse_qs
+
+from src.config import settings
+from src.metrics import register_collector
+
+CHEAP, STANDARD, EXPENSIVE = "cheap", "standard", "expensive"
+
+# First match wins; None means not limited. Insights routes matching nothing are STANDARD.
+ROUTE_COSTS: List[Tuple[Pattern, Optional[str]]] = [
+    (re.compile(r"^/api/insights/(metrics|stream)$"), None),
+    (re.compile(r"^/api/insights/stats/(dashboard|questions-by-subject|test-papers-by-subject)$"), CHEAP),
+    (re.compile(r"^/api/insights/(profiles/[^/]+/timeline|timeseries|suggest)$"), CHEAP),
+    (re.compile(r"^/api/insights/(questions|test-papers)/export$"), EXPENSIVE),
+    (re.compile(r"^/api/insights/batch$"), EXPENSIVE),
+    (re.compile(r"^/api/insights/stats/engagement-percentiles$"), EXPENSIVE),
+]
+
+# List endpoints whose `search=` turns into LIKE scans over the raw tables
+SEARCHABLE = re.compile(r"^/api/insights/(questions|test-papers)(/weekly|/monthly)?$")
+
+
+def classify(method: str, path: str, query_string: bytes = b"") -> Optional[str]:
+    if method == "OPTIONS" or not path.startswith("/api/insights"):
+        return None
+    for pattern, cost in ROUTE_COSTS:
+        if pattern.match(path):
+            return cost
+    if SEARCHABLE.match(path) and any(parse_qs(query_string.decode("latin-1")).get("search", [])):
+        return EXPENSIVE
+    return STANDARD
+
+
+class CostClass:
+    """Slots and FIFO waiters for one cost class. Only touched from the event loop."""
+
+    def __init__(self, name: str, limit: int, queue: int, max_wait: float):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.admitted = 0
+        self.shed = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> bool:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.queue:
+            self.shed += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # release() hands its slot straight to the waiter, so `active` is unchanged
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            # release() may have handed over its slot just as the deadline passed: use it
+            if not waiter.done() or waiter.cancelled():
+                self.shed += 1
+                return False
+        except asyncio.CancelledError:
+            # Client went away; pass on a slot that was handed over meanwhile
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self.admitted += 1
+        return True
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
+
+
+def default_classes() -> Dict[str, CostClass]:
+    max_wait = settings.ADMISSION_MAX_WAIT_MS / 1000
+    return {
+        CHEAP: CostClass(CHEAP, settings.ADMISSION_CHEAP_LIMIT, settings.ADMISSION_CHEAP_QUEUE, max_wait),
+        STANDARD: CostClass(STANDARD, settings.ADMISSION_STANDARD_LIMIT, settings.ADMISSION_STANDARD_QUEUE, max_wait),
+        EXPENSIVE: CostClass(EXPENSIVE, settings.ADMISSION_EXPENSIVE_LIMIT, settings.ADMISSION_EXPENSIVE_QUEUE, max_wait),
+    }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying the cost classes above."""
+
+    def __init__(self, app, classes: Optional[Dict[str, CostClass]] = None):
+        self.app = app
+        self.classes = classes or default_classes()
+        register_collector("admission", self.stats)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.ADMISSION_ENABLED:
+            return await self.app(scope, receive, send)
+        cost = classify(scope["method"], scope["path"], scope.get("query_string", b""))
+        if cost is None:
+            return await self.app(scope, receive, send)
+
+        cost_class = self.classes[cost]
+        if not await cost_class.acquire():
+            return await self._reject(send, cost)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            cost_class.release()
+
+    @staticmethod
+    async def _reject(send, cost: str):
+        body = json.dumps({"detail": f"Server busy ({cost} requests), retry shortly"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(settings.ADMISSION_RETRY_AFTER_SECONDS).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def stats(self) -> dict:
+        return {name: cost_class.stats() for name, cost_class in self.classes.items()}
@@ -0,0 +1,64 @@
+"""
+Calendar days in BUSINESS_TIMEZONE. Event timestamps are stored as naive
+UTC; `local_date` on the raw event tables holds the business-timezone day
+of each row, written at insert time (see models.py) so day grouping and
+day ranges never convert per row.
+"""
+from datetime import date, datetime, time, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+import sqlalchemy as sa
+
+from src.config import settings
+
+BUSINESS_TZ = ZoneInfo(settings.BUSINESS_TIMEZONE)
+
+# Backfill (job_checkpoints name) filling local_date on rows stored before the column existed
+LOCAL_DATE_BACKFILLS = {
+    "questions_asked": "local_date:questions_asked",
+    "test_papers": "local_date:test_papers",
+}
+
+
+def local_day(timestamp: Optional[datetime]) -> date:
+    """Business-timezone day of a naive UTC timestamp."""
+    timestamp = timestamp or datetime.utcnow()
+    return timestamp.replace(tzinfo=timezone.utc).astimezone(BUSINESS_TZ).date()
+
+
+def business_today() -> date:
+    return datetime.now(BUSINESS_TZ).date()
+
+
+def local_day_start(day: date) -> datetime:
+    """Naive UTC instant at which `day` starts in the business timezone."""
+    return datetime.combine(day, time.min, tzinfo=BUSINESS_TZ).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def local_date_default(context) -> date:
+    # Column default: derived from the row's own timestamp
+    return local_day(context.get_current_parameters().get("timestamp"))
+
+
+def fill_local_date(table: str):
+    """Backfill chunk for `table`: set local_date on rows lo < id <= hi that have none."""
+    def apply(conn, lo: int, hi: int) -> int:
+        if conn.dialect.name == "postgresql":
+            return conn.execute(sa.text(
+                f"UPDATE {table} SET local_date = (timestamp AT TIME ZONE 'UTC' AT TIME ZONE :tz)::date "
+                f"WHERE id > :lo AND id <= :hi AND local_date IS NULL AND timestamp IS NOT NULL"
+            ), {"tz": settings.BUSINESS_TIMEZONE, "lo": lo, "hi": hi}).rowcount
+        rows = conn.execute(sa.text(
+            f"SELECT id, timestamp FROM {table} "
+            f"WHERE id > :lo AND id <= :hi AND local_date IS NULL AND timestamp IS NOT NULL"
+        ), {"lo": lo, "hi": hi}).all()
+        if rows:
+            conn.execute(sa.text(f"UPDATE {table} SET local_date = :local_date WHERE id = :id"), [
+                {"id": row.id, "local_date": local_day(
+                    row.timestamp if isinstance(row.timestamp, datetime) else datetime.fromisoformat(row.timestamp)
+                ).isoformat()}
+                for row in rows
+            ])
+        return len(rows)
+    return apply
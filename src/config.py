@@ -13,6 +13,140 @@ class Settings(BaseSettings):
     PUBLIC_KEY: str = ""
     PUBLIC_KEY_BYTES: bytes = b""
 
+    # Per-profile timeline cache (number of profiles kept in memory)
+    TIMELINE_CACHE_SIZE: int = int(os.getenv("TIMELINE_CACHE_SIZE", "5000"))
+
+    # Activity heartbeat buffer
+    ACTIVITY_FLUSH_INTERVAL_SECONDS: int = int(os.getenv("ACTIVITY_FLUSH_INTERVAL_SECONDS", "15"))
+    ACTIVITY_BUFFER_MAX_KEYS: int = int(os.getenv("ACTIVITY_BUFFER_MAX_KEYS", "5000"))
+    ACTIVITY_MAX_HEARTBEAT_SECONDS: int = int(os.getenv("ACTIVITY_MAX_HEARTBEAT_SECONDS", "300"))
+
+    # Day/week/month rollups (event_rollups)
+    ROLLUP_REFRESH_MINUTES: int = int(os.getenv("ROLLUP_REFRESH_MINUTES", "60"))
+    TIMESERIES_MAX_BUCKETS: int = int(os.getenv("TIMESERIES_MAX_BUCKETS", "3700"))
+
+    # Distinct-student HyperLogLog sketches
+    UNIQUE_STUDENTS_FLUSH_SECONDS: int = int(os.getenv("UNIQUE_STUDENTS_FLUSH_SECONDS", "30"))
+
+    # Top-topics heavy hitters
+    TOP_TOPICS_CAPACITY: int = int(os.getenv("TOP_TOPICS_CAPACITY", "200"))
+    TOP_TOPICS_MAX_SKETCHES: int = int(os.getenv("TOP_TOPICS_MAX_SKETCHES", "500"))
+    TOP_TOPICS_PERSIST_SECONDS: int = int(os.getenv("TOP_TOPICS_PERSIST_SECONDS", "60"))
+
+    # Background data backfills scheduled by migrations (see src/migration_helpers.py)
+    BACKFILL_CHUNK_SIZE: int = int(os.getenv("BACKFILL_CHUNK_SIZE", "5000"))
+    BACKFILL_DUTY_CYCLE: float = float(os.getenv("BACKFILL_DUTY_CYCLE", "0.5"))
+    BACKFILL_POLL_MINUTES: int = int(os.getenv("BACKFILL_POLL_MINUTES", "10"))
+
+    # Cold storage of closed months (Parquet). Set ARCHIVE_S3_BUCKET to use an
+    # S3-compatible store (ARCHIVE_S3_ENDPOINT_URL for MinIO/LocalStack) instead of ARCHIVE_DIR.
+    ARCHIVE_ENABLED: bool = os.getenv("ARCHIVE_ENABLED", "false").lower() == "true"
+    ARCHIVE_DIR: str = os.getenv("ARCHIVE_DIR", "./db/archive")
+    ARCHIVE_S3_BUCKET: str = os.getenv("ARCHIVE_S3_BUCKET", "")
+    ARCHIVE_S3_PREFIX: str = os.getenv("ARCHIVE_S3_PREFIX", "tutor_insights")
+    ARCHIVE_S3_ENDPOINT_URL: str = os.getenv("ARCHIVE_S3_ENDPOINT_URL", "")
+    ARCHIVE_AFTER_MONTHS: int = int(os.getenv("ARCHIVE_AFTER_MONTHS", "6"))
+    ARCHIVE_ROW_GROUP_SIZE: int = int(os.getenv("ARCHIVE_ROW_GROUP_SIZE", "50000"))
+    ARCHIVE_DELETE_BATCH_SIZE: int = int(os.getenv("ARCHIVE_DELETE_BATCH_SIZE", "2000"))
+
+    # SQS consumers (AIMD-controlled receive loops and batch size per queue)
+    CONSUMER_ENABLED: bool = os.getenv("CONSUMER_ENABLED", "true").lower() == "true"
+    AWS_REGION: str = os.getenv("AWS_REGION", "ap-south-1")
+    SQS_ENDPOINT_URL: str = os.getenv("SQS_ENDPOINT_URL", "")
+    TUTOR_QUEUE_NAME: str = os.getenv("TUTOR_QUEUE_NAME", "tutor_queue")
+    EXAMINER_QUEUE_NAME: str = os.getenv("EXAMINER_QUEUE_NAME", "tutor_examiner_queue")
+    CONSUMER_MIN_WORKERS: int = int(os.getenv("CONSUMER_MIN_WORKERS", "1"))
+    CONSUMER_MAX_WORKERS: int = int(os.getenv("CONSUMER_MAX_WORKERS", "8"))
+    CONSUMER_MIN_BATCH: int = int(os.getenv("CONSUMER_MIN_BATCH", "1"))
+    CONSUMER_MAX_BATCH: int = int(os.getenv("CONSUMER_MAX_BATCH", "10"))
+    CONSUMER_TARGET_COMMIT_MS: float = float(os.getenv("CONSUMER_TARGET_COMMIT_MS", "50"))
+    CONSUMER_CONTROL_SECONDS: int = int(os.getenv("CONSUMER_CONTROL_SECONDS", "10"))
+    CONSUMER_WAIT_SECONDS: int = int(os.getenv("CONSUMER_WAIT_SECONDS", "10"))
+    # Queues that could not be resolved at startup are retried this often
+    CONSUMER_CONNECT_RETRY_SECONDS: int = int(os.getenv("CONSUMER_CONNECT_RETRY_SECONDS", "30"))
+
+    # Duplicate event_id fast path (scalable Bloom filter + exact set of recent ids)
+    EVENT_ID_FILTER_PATH: str = os.getenv("EVENT_ID_FILTER_PATH", "./db/event_id_filter.bin")
+    EVENT_ID_FILTER_CAPACITY: int = int(os.getenv("EVENT_ID_FILTER_CAPACITY", "1000000"))
+    EVENT_ID_FILTER_ERROR_RATE: float = float(os.getenv("EVENT_ID_FILTER_ERROR_RATE", "0.001"))
+    EVENT_ID_FILTER_MAX_LAYERS: int = int(os.getenv("EVENT_ID_FILTER_MAX_LAYERS", "6"))
+    EVENT_ID_FILTER_WARM_DAYS: int = int(os.getenv("EVENT_ID_FILTER_WARM_DAYS", "14"))
+    EVENT_ID_FILTER_PERSIST_SECONDS: int = int(os.getenv("EVENT_ID_FILTER_PERSIST_SECONDS", "300"))
+    EVENT_ID_RECENT_SIZE: int = int(os.getenv("EVENT_ID_RECENT_SIZE", "50000"))
+
+    # In-process NumPy copy of the /stats/* columns (opt-in; SQL is used until it has loaded)
+    COLUMNAR_STATS_ENABLED: bool = os.getenv("COLUMNAR_STATS_ENABLED", "false").lower() == "true"
+    COLUMNAR_CHECK_MINUTES: int = int(os.getenv("COLUMNAR_CHECK_MINUTES", "10"))
+
+    # Raw event retention in days (0 keeps rows forever). Rows are only purged
+    # once questions_weekly_aggr / test_papers_monthly and the daily rollups cover them.
+    RETENTION_ENABLED: bool = os.getenv("RETENTION_ENABLED", "false").lower() == "true"
+    QUESTIONS_RETENTION_DAYS: int = int(os.getenv("QUESTIONS_RETENTION_DAYS", "0"))
+    TEST_PAPERS_RETENTION_DAYS: int = int(os.getenv("TEST_PAPERS_RETENTION_DAYS", "0"))
+    RETENTION_BATCH_SIZE: int = int(os.getenv("RETENTION_BATCH_SIZE", "1000"))
+    RETENTION_DUTY_CYCLE: float = float(os.getenv("RETENTION_DUTY_CYCLE", "0.25"))
+    RETENTION_VACUUM_PAGES: int = int(os.getenv("RETENTION_VACUUM_PAGES", "1000"))
+
+    # POST /api/insights/batch
+    BATCH_MAX_QUERIES: int = int(os.getenv("BATCH_MAX_QUERIES", "10"))
+    BATCH_MAX_WORKERS: int = int(os.getenv("BATCH_MAX_WORKERS", "4"))
+
+    # Live dashboard feed (/api/insights/stream). Set LIVE_REDIS_URL to fan out across replicas.
+    LIVE_REDIS_URL: str = os.getenv("LIVE_REDIS_URL", "")
+    LIVE_REDIS_CHANNEL: str = os.getenv("LIVE_REDIS_CHANNEL", "tutor_insights:live")
+    LIVE_FLUSH_SECONDS: int = int(os.getenv("LIVE_FLUSH_SECONDS", "1"))
+    LIVE_MAX_EVENTS: int = int(os.getenv("LIVE_MAX_EVENTS", "50"))
+    LIVE_CLIENT_QUEUE: int = int(os.getenv("LIVE_CLIENT_QUEUE", "100"))
+    LIVE_KEEPALIVE_SECONDS: int = int(os.getenv("LIVE_KEEPALIVE_SECONDS", "15"))
+    LIVE_RESEED_MINUTES: int = int(os.getenv("LIVE_RESEED_MINUTES", "10"))
+
+    # Admission control for /api/insights (see src/admission.py): concurrent requests
+    # and queued waiters per cost class; waiters past ADMISSION_MAX_WAIT_MS get a 503
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_CHEAP_LIMIT: int = int(os.getenv("ADMISSION_CHEAP_LIMIT", "32"))
+    ADMISSION_CHEAP_QUEUE: int = int(os.getenv("ADMISSION_CHEAP_QUEUE", "64"))
+    ADMISSION_STANDARD_LIMIT: int = int(os.getenv("ADMISSION_STANDARD_LIMIT", "8"))
+    ADMISSION_STANDARD_QUEUE: int = int(os.getenv("ADMISSION_STANDARD_QUEUE", "16"))
+    ADMISSION_EXPENSIVE_LIMIT: int = int(os.getenv("ADMISSION_EXPENSIVE_LIMIT", "2"))
+    ADMISSION_EXPENSIVE_QUEUE: int = int(os.getenv("ADMISSION_EXPENSIVE_QUEUE", "4"))
+    ADMISSION_MAX_WAIT_MS: int = int(os.getenv("ADMISSION_MAX_WAIT_MS", "2000"))
+    ADMISSION_RETRY_AFTER_SECONDS: int = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "2"))
+
+    # Accounts service (plan features), with cached entitlement checks
+    ACCOUNTS_SERVICE_URL: str = os.getenv("ACCOUNTS_SERVICE_URL", "http://localhost:4501")
+    ACCOUNTS_TIMEOUT_SECONDS: float = float(os.getenv("ACCOUNTS_TIMEOUT_SECONDS", "3"))
+    ACCOUNTS_POOL_SIZE: int = int(os.getenv("ACCOUNTS_POOL_SIZE", "20"))
+    QUOTA_CACHE_TTL_SECONDS: int = int(os.getenv("QUOTA_CACHE_TTL_SECONDS", "300"))
+    QUOTA_NEGATIVE_TTL_SECONDS: int = int(os.getenv("QUOTA_NEGATIVE_TTL_SECONDS", "60"))
+    QUOTA_STALE_SECONDS: int = int(os.getenv("QUOTA_STALE_SECONDS", "3600"))
+    QUOTA_CACHE_SIZE: int = int(os.getenv("QUOTA_CACHE_SIZE", "20000"))
+
+    # Latest feedback per profile kept in memory, until new feedback for the profile shows up
+    FEEDBACK_CACHE_SIZE: int = int(os.getenv("FEEDBACK_CACHE_SIZE", "20000"))
+    # How often cached reads look for feedback written since (by any process)
+    FEEDBACK_CACHE_CHECK_SECONDS: float = float(os.getenv("FEEDBACK_CACHE_CHECK_SECONDS", "30"))
+
+    # Per-request profiling (X-Profile header on admin requests; see src/profiling.py)
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "./db/profiles")
+    PROFILE_MAX_FILES: int = int(os.getenv("PROFILE_MAX_FILES", "200"))
+    PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+    # Slow-query log: statements at or over SLOW_QUERY_MS are logged with their plan
+    SLOW_QUERY_LOG_ENABLED: bool = os.getenv("SLOW_QUERY_LOG_ENABLED", "true").lower() == "true"
+    SLOW_QUERY_MS: float = float(os.getenv("SLOW_QUERY_MS", "200"))
+    SLOW_QUERY_PLAN_TTL: int = int(os.getenv("SLOW_QUERY_PLAN_TTL", "600"))
+    SLOW_QUERY_DIGEST_SIZE: int = int(os.getenv("SLOW_QUERY_DIGEST_SIZE", "500"))
+
+    # Raw event sharding by user_id: comma-separated database URLs, empty = not sharded
+    SHARD_URLS: str = os.getenv("SHARD_URLS", "")
+
+    # /suggest prefix indexes, rebuilt from the rollups this often
+    SUGGEST_RELOAD_MINUTES: int = int(os.getenv("SUGGEST_RELOAD_MINUTES", "60"))
+
+    # Timezone whose calendar days the local_date column and day rollups use
+    BUSINESS_TIMEZONE: str = os.getenv("BUSINESS_TIMEZONE", "Asia/Kolkata")
+
     class Config:
         env_file = ".env"
         extra = "ignore"
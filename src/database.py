@@ -1,8 +1,12 @@
-from sqlalchemy import create_engine
+from typing import Optional
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 from .config import settings
 
 engine = create_engine(settings.INSIGHTS_DB_URL)
+if settings.SLOW_QUERY_LOG_ENABLED:
+    from .query_log import query_tracker
+    query_tracker.attach(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -13,3 +17,33 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def dialect_insert(bind):
+    """
+    Dialect-specific insert() for the bound engine, so callers can use
+    on_conflict_do_update / on_conflict_do_nothing on both SQLite and Postgres.
+    """
+    if bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def begin_snapshot(db) -> Optional[str]:
+    """
+    Pin `db` to one read snapshot for the rest of its transaction. On
+    Postgres the snapshot is exported and its id returned, so other sessions
+    can read the same data with join_snapshot(); on SQLite every read goes
+    through this one connection and None is returned.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
+        return db.execute(text("SELECT pg_export_snapshot()")).scalar()
+    # pysqlite does not open a transaction for SELECTs; an explicit BEGIN keeps one snapshot across them
+    db.connection().exec_driver_sql("BEGIN")
+    return None
+
+def join_snapshot(db, snapshot_id: str):
+    db.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
+    db.execute(text(f"SET TRANSACTION SNAPSHOT '{snapshot_id}'"))
@@ -1,9 +1,9 @@
-from fastapi import HTTPException, Depends, Header
+from fastapi import HTTPException, Depends, Header, Request
 from fastapi.security import OAuth2PasswordBearer
 import jwt
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.backends import default_backend
-from src.logger import set_user_id, warning, error
+from src.logger import set_user_id, set_route, warning, error
 import os
 from typing import Optional
 
@@ -72,3 +72,12 @@ async def validate_admin_access(session: dict = Depends(validate_token)):
     Currently just validates token presence via validate_token.
     """
     return session
+
+async def track_route(request: Request):
+    """
+    App-wide dependency recording the matched route template, so work done
+    for the request (e.g. slow-query logging) can say where it came from.
+    Async so the context variable is set in the request's own context.
+    """
+    route = request.scope.get("route")
+    set_route(f"{request.method} {getattr(route, 'path', request.url.path)}")
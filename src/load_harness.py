@@ -0,0 +1,328 @@
+"""
+Ingest load test against a local SQS emulator (moto server, ElasticMQ or
+LocalStack) and a running service consuming from it (SQS_ENDPOINT_URL).
+
+LoadTest publishes a LoadProfile to tutor_queue and tutor_examiner_queue:
+a steady rate of new events, plus redeliveries of already-sent events,
+malformed bodies and periodic bursts. It then waits for the rows to land
+and reports:
+
+- end-to-end lag: created_at of the stored row minus the time it was sent
+- throughput: rows stored per second from the first send to the last row
+- DB commit latency: the consumers' commit p90, sampled from /metrics
+- duplicate handling: rows stored more than once, events never stored,
+  and messages left on the queues (malformed ones should be deleted)
+
+Events carry a per-run event_id prefix and `loadtest-` user ids, so runs
+do not collide and can be removed afterwards with cleanup(). compare()
+puts a report next to the previous one (manual_load_harness.py keeps it).
+"""
+import json
+import random
+import time
+import urllib.request
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from src.database import SessionLocal
+from src.models import QuestionsAsked, TestPapers
+from src.services.event_consumer import percentile
+from src.services.ingest_service import QUESTION_ASKED, TEST_PAPER_GENERATED
+from src.services.shard_service import shard_service
+
+EVENT_MODELS = {QUESTION_ASKED: QuestionsAsked, TEST_PAPER_GENERATED: TestPapers}
+SUBJECTS = ["Math", "Science", "English", "Social Studies", "Hindi"]
+
+# Report fields compared against the baseline: (path, higher is better)
+COMPARED = [
+    (("throughput_per_s",), True),
+    (("lag_ms", "p50"), False),
+    (("lag_ms", "p90"), False),
+    (("lag_ms", "p99"), False),
+    (("commit_p90_ms", "max"), False),
+    (("missing",), False),
+    (("duplicate_rows",), False),
+]
+
+
+class LoadProfile:
+    """What to publish: `rate` new events per second for `duration` seconds, and the mix around them."""
+
+    def __init__(
+        self,
+        rate: float = 50,
+        duration: float = 30,
+        question_share: float = 0.8,
+        duplicate_rate: float = 0.05,
+        malformed_rate: float = 0.01,
+        burst_every: float = 10,
+        burst_size: int = 200,
+        users: int = 500,
+        seed: Optional[int] = None
+    ):
+        self.rate = rate
+        self.duration = duration
+        self.question_share = question_share
+        self.duplicate_rate = duplicate_rate
+        self.malformed_rate = malformed_rate
+        self.burst_every = burst_every
+        self.burst_size = burst_size
+        self.users = users
+        self.seed = seed
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+    def due(self, elapsed: float) -> int:
+        """Messages that should have been sent `elapsed` seconds in, bursts included."""
+        elapsed = min(elapsed, self.duration)
+        bursts = int(elapsed // self.burst_every) if self.burst_every and self.burst_size else 0
+        return int(elapsed * self.rate) + bursts * self.burst_size
+
+
+class LoadTest:
+    """
+    One load-test run: publish(), wait(), then report(). `queue_urls` maps
+    each event type to the queue it is published on.
+    """
+
+    def __init__(
+        self,
+        client,
+        queue_urls: Dict[str, str],
+        profile: LoadProfile,
+        session_factory=SessionLocal,
+        metrics: Optional[Callable[[], dict]] = None,
+        poll_seconds: float = 1.0
+    ):
+        self.client = client
+        self.queue_urls = queue_urls
+        self.profile = profile
+        self.session_factory = session_factory
+        self.metrics = metrics
+        self.poll_seconds = poll_seconds
+        self.run_id = uuid.uuid4().hex[:8]
+        self.prefix = f"loadtest-{self.run_id}-"
+        self._random = random.Random(profile.seed)
+        # event_id -> (event type, body, first send time)
+        self.sent: Dict[str, tuple] = {}
+        self.counts = Counter()
+        # event_id -> stored created_at, per stored row (a list, so double stores show)
+        self.stored: Dict[str, List[datetime]] = {}
+        self.commit_samples: List[float] = []
+        self.started_at: Optional[datetime] = None
+        self.send_seconds: Optional[float] = None
+        self.wait_seconds: Optional[float] = None
+
+    # --- Publishing ---
+
+    def _message(self) -> tuple:
+        """(event type, body, event_id or None) for the next message of the mix."""
+        roll = self._random.random()
+        if roll < self.profile.malformed_rate:
+            self.counts["malformed"] += 1
+            return self._random.choice(list(self.queue_urls)), '{"event_type": "QUESTION_ASKED", "event_id": ', None
+        if roll < self.profile.malformed_rate + self.profile.duplicate_rate and self.sent:
+            # A redelivery: the same body again
+            event_id = self._random.choice(list(self.sent))
+            event_type, body, _ = self.sent[event_id]
+            self.counts["duplicates"] += 1
+            return event_type, body, event_id
+
+        event_type = QUESTION_ASKED if self._random.random() < self.profile.question_share else TEST_PAPER_GENERATED
+        user = self._random.randrange(self.profile.users)
+        event_id = f"{self.prefix}{self.counts['events']}"
+        self.counts["events"] += 1
+        body = json.dumps({
+            "event_id": event_id,
+            "event_type": event_type,
+            "user_id": f"loadtest-u{user}",
+            "profile_id": f"loadtest-u{user}-p",
+            "class_name": f"Class {6 + user % 7}",
+            "subject": self._random.choice(SUBJECTS),
+            "data": {"run": self.run_id},
+            "timestamp": datetime.utcnow().isoformat()
+        })
+        return event_type, body, event_id
+
+    def _send(self, count: int):
+        batches: Dict[str, List[tuple]] = {event_type: [] for event_type in self.queue_urls}
+        for _ in range(count):
+            event_type, body, event_id = self._message()
+            batches[event_type].append((body, event_id))
+        for event_type, messages in batches.items():
+            # SendMessageBatch takes at most 10 entries
+            for i in range(0, len(messages), 10):
+                chunk = messages[i:i + 10]
+                self.client.send_message_batch(
+                    QueueUrl=self.queue_urls[event_type],
+                    Entries=[{"Id": str(n), "MessageBody": body} for n, (body, _) in enumerate(chunk)]
+                )
+                now = datetime.utcnow()
+                for body, event_id in chunk:
+                    if event_id is not None and event_id not in self.sent:
+                        self.sent[event_id] = (event_type, body, now)
+        self.counts["messages"] += count
+
+    def publish(self):
+        """Send the profile at its rate; returns once everything due by `duration` is out."""
+        self.started_at = datetime.utcnow()
+        start = time.monotonic()
+        done, last_sample = 0, start
+        total = self.profile.due(self.profile.duration)
+        while done < total:
+            elapsed = time.monotonic() - start
+            due = self.profile.due(elapsed)
+            if due > done:
+                self._send(due - done)
+                done = due
+            if time.monotonic() - last_sample >= self.poll_seconds:
+                self._sample()
+                last_sample = time.monotonic()
+            time.sleep(0.05)
+        self.send_seconds = time.monotonic() - start
+
+    # --- Measuring ---
+
+    def _sample(self):
+        if self.metrics is None:
+            return
+        try:
+            consumers = self.metrics().get("consumers", {})
+        except Exception as e:
+            print(f"Reading service metrics failed: {e}")
+            return
+        for stats in consumers.values():
+            if isinstance(stats, dict) and stats.get("commit_p90_ms") is not None:
+                self.commit_samples.append(stats["commit_p90_ms"])
+
+    def _poll(self, db) -> int:
+        """Record rows stored since the last poll. Returns how many sent events are still missing."""
+        pending = [event_id for event_id in self.sent if event_id not in self.stored]
+        by_type: Dict[str, List[str]] = {event_type: [] for event_type in EVENT_MODELS}
+        for event_id in pending:
+            by_type[self.sent[event_id][0]].append(event_id)
+        for event_type, ids in by_type.items():
+            model = EVENT_MODELS[event_type]
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                rows = shard_service.gather(db, lambda member_db: member_db.query(
+                    model.event_id, model.created_at
+                ).filter(model.event_id.in_(chunk)).all())
+                for event_id, created_at in rows:
+                    self.stored.setdefault(event_id, []).append(created_at)
+        return len(self.sent) - len(self.stored)
+
+    def wait(self, timeout: float = 120) -> bool:
+        """Poll until every sent event is stored or `timeout` passes. Returns True if all arrived."""
+        start = time.monotonic()
+        db = self.session_factory()
+        try:
+            while True:
+                missing = self._poll(db)
+                db.rollback()  # end the read transaction so the next poll sees new rows
+                self._sample()
+                if not missing or time.monotonic() - start >= timeout:
+                    break
+                time.sleep(self.poll_seconds)
+        finally:
+            db.close()
+        self.wait_seconds = time.monotonic() - start
+        return not missing
+
+    def queue_left(self) -> Dict[str, int]:
+        """Messages still on each queue, visible or in flight: malformed ones should not stay."""
+        left = {}
+        for url in self.queue_urls.values():
+            attributes = self.client.get_queue_attributes(
+                QueueUrl=url, AttributeNames=["ApproximateNumberOfMessages", "ApproximateNumberOfMessagesNotVisible"]
+            )["Attributes"]
+            left[url.rsplit("/", 1)[-1]] = int(attributes.get("ApproximateNumberOfMessages", 0)) + \
+                int(attributes.get("ApproximateNumberOfMessagesNotVisible", 0))
+        return left
+
+    def report(self) -> dict:
+        lags = [
+            (created[0] - self.sent[event_id][2]).total_seconds() * 1000
+            for event_id, created in self.stored.items()
+        ]
+        if self.stored:
+            last = max(created for rows in self.stored.values() for created in rows)
+            span = (last - self.started_at).total_seconds()
+        else:
+            span = None
+        return {
+            "run_id": self.run_id,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "profile": self.profile.to_dict(),
+            "published": {
+                "messages": self.counts["messages"],
+                "events": self.counts["events"],
+                "duplicates": self.counts["duplicates"],
+                "malformed": self.counts["malformed"],
+                "send_seconds": round(self.send_seconds, 2) if self.send_seconds is not None else None,
+            },
+            "stored": len(self.stored),
+            "missing": len(self.sent) - len(self.stored),
+            "duplicate_rows": sum(len(rows) - 1 for rows in self.stored.values()),
+            "throughput_per_s": round(len(self.stored) / span, 1) if span else None,
+            "lag_ms": {
+                "p50": round(percentile(lags, 0.5), 1) if lags else None,
+                "p90": round(percentile(lags, 0.9), 1) if lags else None,
+                "p99": round(percentile(lags, 0.99), 1) if lags else None,
+                "max": round(max(lags), 1) if lags else None,
+            },
+            "commit_p90_ms": {
+                "median": percentile(self.commit_samples, 0.5),
+                "max": max(self.commit_samples) if self.commit_samples else None,
+                "samples": len(self.commit_samples),
+            },
+            "queue_left": self.queue_left(),
+            "wait_seconds": round(self.wait_seconds, 2) if self.wait_seconds is not None else None,
+        }
+
+    def cleanup(self) -> int:
+        """Delete this run's rows. Returns how many were removed."""
+        db = self.session_factory()
+        try:
+            def delete(member_db):
+                removed = 0
+                for model in EVENT_MODELS.values():
+                    removed += member_db.query(model).filter(
+                        model.event_id.like(f"{self.prefix}%")
+                    ).delete(synchronize_session=False)
+                member_db.commit()
+                return removed
+            return sum(shard_service.scatter(db, delete))
+        finally:
+            db.close()
+
+
+def service_metrics(base_url: str, token: Optional[str] = None, timeout: float = 5) -> Callable[[], dict]:
+    """Reader for the running service's /api/insights/metrics."""
+    def read() -> dict:
+        request = urllib.request.Request(f"{base_url.rstrip('/')}/api/insights/metrics")
+        if token:
+            request.add_header("Authorization", f"Bearer {token}")
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    return read
+
+
+def compare(report: dict, baseline: dict) -> Dict[str, dict]:
+    """Change of each COMPARED field from `baseline` to `report`; `better` is None when either is missing."""
+    changes = {}
+    for path, higher_is_better in COMPARED:
+        before, after = baseline, report
+        for key in path:
+            before = (before or {}).get(key)
+            after = (after or {}).get(key)
+        change = {"baseline": before, "now": after, "better": None}
+        if before is not None and after is not None:
+            if before:
+                change["change_pct"] = round(100 * (after - before) / before, 1)
+            change["better"] = after == before or (after > before) == higher_is_better
+        changes[".".join(path)] = change
+    return changes
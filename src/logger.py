@@ -7,6 +7,7 @@ import sys
 logger = logging.getLogger('tutor_insights')
 session_context = contextvars.ContextVar("session_uuid", default=None)
 request_context = contextvars.ContextVar("request_id", default=None)
+route_context = contextvars.ContextVar("route", default=None)
 
 class ISTFormatter(logging.Formatter):
     """
@@ -51,6 +52,12 @@ def set_request_id(request_id: str):
 def get_request_id() -> str:
     return request_context.get()
 
+def set_route(route: str):
+    route_context.set(route)
+
+def get_route() -> str:
+    return route_context.get()
+
 def _format_message(message: str) -> str:
     user_id = session_context.get()
     request_id = request_context.get()
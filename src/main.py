@@ -1,14 +1,79 @@
-from fastapi import FastAPI
+from .startup import startup_timer
+from fastapi import FastAPI, Depends
+from contextlib import asynccontextmanager
 import logging
-from .routers import insights
+from .routers import insights, activity, feedback
+from .services.scheduler import scheduler
+from .services.activity_service import activity_buffer
+from .services.rollup_service import rollup_service
+from .services.unique_students_service import unique_students_service
+from .services.topics_service import top_topics_service
+from .services.engagement_service import engagement_service
+from .services.archive_service import archive_service
+from .services.retention_service import retention_service
+from .services.stats_service import stats_service
+from .services.suggest_service import suggest_service
+from .services.live_service import live_feed
+from .services.dedupe_service import event_id_filter
+from .services.event_consumer import event_consumer_service
+from .services.backfill_service import backfill_service
+from .services.shard_service import shard_service
+from .services.quota_service import quota_service
+from .metrics import register_collector
+from .admission import AdmissionMiddleware
+from .dependencies import track_route
 from fastapi.middleware.cors import CORSMiddleware
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("tutor_insights")
 
+startup_timer.mark("imports")
+register_collector("startup", startup_timer.report)
 
-app = FastAPI(title="Tutor Insights Service")
+# Started in this order; each start() only schedules work, heavy loading runs in jobs
+SERVICES = (
+    ("event_id_filter", event_id_filter),
+    ("activity_buffer", activity_buffer),
+    ("rollups", rollup_service),
+    ("unique_students", unique_students_service),
+    ("top_topics", top_topics_service),
+    ("engagement", engagement_service),
+    ("archive", archive_service),
+    ("retention", retention_service),
+    ("stats", stats_service),
+    ("suggest", suggest_service),
+    ("live", live_feed),
+    ("backfills", backfill_service),
+    ("shards", shard_service),
+    ("consumers", event_consumer_service),
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    for name, service in SERVICES:
+        with startup_timer.phase(name):
+            service.start(scheduler)
+    with startup_timer.phase("scheduler"):
+        scheduler.start()
+    logger.info(startup_timer.ready())
+    yield
+    event_consumer_service.stop()
+    scheduler.shutdown(wait=False)
+    # Flush buffered writes before the process exits
+    activity_buffer.stop()
+    unique_students_service.stop()
+    top_topics_service.stop()
+    event_id_filter.stop()
+    live_feed.stop()
+    await quota_service.client.close()
+
+
+app = FastAPI(title="Tutor Insights Service", lifespan=lifespan, dependencies=[Depends(track_route)])
+
+# Inside CORS, so 503s from load shedding still carry CORS headers
+app.add_middleware(AdmissionMiddleware)
 
 # CORS for direct access if needed (proxy is primary)
 app.add_middleware(
@@ -20,6 +85,8 @@ app.add_middleware(
 )
 
 app.include_router(insights.router)
+app.include_router(activity.router)
+app.include_router(feedback.router)
 
 
 
@@ -0,0 +1,24 @@
+from typing import Callable, Dict
+
+from src.logger import error
+
+# name -> zero-arg callable returning a JSON-serialisable dict
+_collectors: Dict[str, Callable[[], dict]] = {}
+
+
+def register_collector(name: str, collector: Callable[[], dict]):
+    """
+    Register a component's runtime stats under `name` for /api/insights/metrics.
+    """
+    _collectors[name] = collector
+
+
+def collect() -> dict:
+    snapshot = {}
+    for name, collector in list(_collectors.items()):
+        try:
+            snapshot[name] = collector()
+        except Exception as e:
+            error(f"Metrics collector {name} failed: {e}")
+            snapshot[name] = {"error": str(e)}
+    return snapshot
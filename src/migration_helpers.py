@@ -0,0 +1,284 @@
+"""
+Helpers for Alembic revisions that touch the large event tables
+(questions_asked, test_papers) without taking ingest offline:
+
+- create_index_online / drop_index_online: CREATE INDEX CONCURRENTLY on
+  Postgres; on SQLite the build is left to the app as a background job
+- schedule_backfill: record a data backfill for the app to run in the
+  background (see src/services/backfill_service.py) instead of inside the
+  revision
+- run_chunked: resumable, throttled key-range loop with a job_checkpoints row
+  (also used at runtime by the retention purge)
+- shadow_swap: SQLite column changes by copying into a shadow table in
+  chunks while triggers mirror live writes, then swapping names
+"""
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Connection
+
+from src.logger import log
+
+# Frozen view of job_checkpoints, so revisions do not depend on the current models
+checkpoints = sa.table(
+    "job_checkpoints",
+    sa.column("id", sa.Integer),
+    sa.column("name", sa.String),
+    sa.column("status", sa.String),
+    sa.column("cursor", sa.String),
+    sa.column("rows_done", sa.Integer),
+    sa.column("rows_total", sa.Integer),
+    sa.column("message", sa.String),
+    sa.column("updated_at", sa.DateTime),
+)
+
+# apply(conn, lo, hi) processes keys lo < key <= hi and returns rows affected
+ChunkFn = Callable[[Connection, int, int], int]
+
+
+# --- Indexes ---
+
+def index_job(index_name: str) -> str:
+    """job_checkpoints name of the background build of `index_name`."""
+    return f"index:{index_name}"
+
+
+def create_index_online(index_name: str, table: str, columns: List[str], unique: bool = False):
+    """
+    Create an index without blocking writers for the whole build. SQLite has
+    no concurrent build and CREATE INDEX holds the writer lock for a full
+    scan of the table, so there the revision only schedules the index, which
+    must be declared under the same name in the models; backfill_service
+    builds it after startup.
+    """
+    from alembic import op
+
+    if op.get_bind().dialect.name == "postgresql":
+        # CONCURRENTLY cannot run inside a transaction
+        with op.get_context().autocommit_block():
+            op.create_index(index_name, table, columns, unique=unique,
+                            postgresql_concurrently=True, if_not_exists=True)
+    else:
+        schedule_backfill(index_job(index_name))
+
+
+def drop_index_online(index_name: str, table: str):
+    from alembic import op
+
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.drop_index(index_name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    else:
+        # A build that has not run yet must not run after the downgrade
+        op.get_bind().execute(checkpoints.delete().where(checkpoints.c.name == index_job(index_name)))
+        op.drop_index(index_name, table_name=table, if_exists=True)
+
+
+# --- Checkpoints ---
+
+def get_checkpoint(conn: Connection, name: str):
+    return conn.execute(sa.select(checkpoints).where(checkpoints.c.name == name)).first()
+
+
+def save_checkpoint(conn: Connection, name: str, **values):
+    values["updated_at"] = datetime.utcnow()
+    if get_checkpoint(conn, name) is None:
+        values.setdefault("status", "pending")
+        conn.execute(checkpoints.insert().values(name=name, **values))
+    else:
+        conn.execute(checkpoints.update().where(checkpoints.c.name == name).values(**values))
+
+
+def schedule_backfill(name: str):
+    """Mark a registered backfill as pending; the app picks it up after startup."""
+    from alembic import op
+
+    conn = op.get_bind()
+    checkpoint = get_checkpoint(conn, name)
+    if checkpoint is None or checkpoint.status == "done":
+        save_checkpoint(conn, name, status="pending", cursor=None, rows_done=0, message=None)
+
+
+# --- Chunked loop ---
+
+def _key_range(key: str, after: Optional[int], until: Optional[int]) -> Tuple[str, dict]:
+    clauses, params = [], {}
+    if after is not None:
+        clauses.append(f"{key} > :after")
+        params["after"] = after
+    if until is not None:
+        clauses.append(f"{key} <= :until")
+        params["until"] = until
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _next_key(conn: Connection, table: str, key: str, after: Optional[int], chunk_size: int,
+              until: Optional[int] = None) -> Optional[int]:
+    condition, params = _key_range(key, after, until)
+    hi = conn.execute(sa.text(
+        f"SELECT {key} FROM {table} {condition} ORDER BY {key} LIMIT 1 OFFSET :offset"
+    ), dict(params, offset=chunk_size - 1)).scalar()
+    if hi is None:
+        hi = conn.execute(sa.text(f"SELECT MAX({key}) FROM {table} {condition}"), params).scalar()
+    return hi
+
+
+def run_chunked(
+    conn: Connection,
+    name: str,
+    table: str,
+    apply: ChunkFn,
+    chunk_size: int = 5000,
+    duty_cycle: float = 0.5,
+    key: str = "id",
+    progress_seconds: float = 10,
+    commit: Callable[[], None] = None,
+    until: Optional[int] = None,
+    data_conn: Optional[Connection] = None
+) -> int:
+    """
+    Call apply() over consecutive key ranges of `table`, committing and
+    checkpointing after each chunk so an interrupted run resumes where it
+    stopped. Sleeps between chunks so the job uses at most `duty_cycle` of
+    wall time, leaving the writer lock free for ingest the rest of the time.
+    Returns the rows processed over all runs.
+
+    `commit` defaults to conn.commit; pass a no-op for connections in
+    autocommit mode (e.g. inside op.get_context().autocommit_block()).
+    `until` stops the walk at that key instead of the end of the table.
+    `data_conn` holds `table` when it lives in another database than the
+    checkpoint (a shard); each chunk is committed there first, so apply()
+    must be idempotent for a chunk repeated after a crash.
+    """
+    commit = commit or conn.commit
+    data = data_conn or conn
+    checkpoint = get_checkpoint(conn, name)
+    if checkpoint is not None and checkpoint.status == "done":
+        return checkpoint.rows_done or 0
+
+    after = int(checkpoint.cursor) if checkpoint is not None and checkpoint.cursor else None
+    rows_done = (checkpoint.rows_done or 0) if checkpoint is not None else 0
+    rows_total = checkpoint.rows_total if checkpoint is not None else None
+    if rows_total is None:
+        condition, params = _key_range(key, None, until)
+        rows_total = data.execute(sa.text(f"SELECT COUNT(*) FROM {table} {condition}"), params).scalar()
+    save_checkpoint(conn, name, status="running", rows_total=rows_total, message=None)
+    commit()
+
+    last_report = time.monotonic()
+    while True:
+        hi = _next_key(data, table, key, after, chunk_size, until)
+        if hi is None:
+            break
+        started = time.monotonic()
+        # The first chunk starts below every key
+        lo = after if after is not None else -(1 << 62)
+        rows_done += apply(data, lo, hi) or 0
+        if data_conn is not None:
+            data_conn.commit()
+        after = hi
+        save_checkpoint(conn, name, cursor=str(after), rows_done=rows_done)
+        commit()
+
+        elapsed = time.monotonic() - started
+        if duty_cycle < 1:
+            time.sleep(elapsed * (1 - duty_cycle) / duty_cycle)
+        if time.monotonic() - last_report >= progress_seconds:
+            percent = f"{100 * rows_done / rows_total:.1f}%" if rows_total else "?"
+            log(f"{name}: {rows_done}/{rows_total} rows ({percent}), at {key} {after}")
+            last_report = time.monotonic()
+
+    save_checkpoint(conn, name, status="done", rows_done=rows_done)
+    commit()
+    log(f"{name}: done, {rows_done} rows")
+    return rows_done
+
+
+# --- Shadow table swap (SQLite) ---
+
+def _create_triggers(conn: Connection, table: str, shadow: str, mapping: Dict[str, str]):
+    targets = ", ".join(mapping)
+    new_values = ", ".join(f"NEW.{source}" for source in mapping.values())
+    for event in ("INSERT", "UPDATE"):
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {shadow}_{event.lower()} AFTER {event} ON {table} BEGIN "
+            f"INSERT OR REPLACE INTO {shadow} ({targets}) VALUES ({new_values}); END"
+        )
+    conn.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS {shadow}_delete AFTER DELETE ON {table} BEGIN "
+        f"DELETE FROM {shadow} WHERE id = OLD.id; END"
+    )
+
+
+def _drop_triggers(conn: Connection, shadow: str):
+    for event in ("insert", "update", "delete"):
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {shadow}_{event}")
+
+
+def shadow_swap(
+    table: str,
+    columns: List[sa.Column],
+    indexes: Sequence[str] = (),
+    renames: Optional[Dict[str, str]] = None,
+    chunk_size: int = 5000,
+    duty_cycle: float = 0.5
+):
+    """
+    Rebuild `table` with `columns` on SQLite without one long table-copy
+    transaction. Columns are copied by name (`renames` maps new -> old);
+    new columns start at their server default / NULL and can be filled by a
+    backfill. Triggers keep the shadow table in step with live writes while
+    chunks are copied, and the swap itself is two renames and a drop. The
+    old table's indexes go with it; `indexes` (names declared in the models)
+    are then scheduled like create_index_online().
+
+    Resumable: re-running the revision continues the copy from its checkpoint.
+    Postgres does not need this (ADD COLUMN does not rewrite the table).
+    """
+    from alembic import op
+
+    if op.get_bind().dialect.name != "sqlite":
+        raise NotImplementedError("shadow_swap is for SQLite; use op.add_column / op.alter_column on Postgres")
+
+    shadow, old = f"{table}__shadow", f"{table}__old"
+    name = f"shadow_swap:{table}"
+    renames = renames or {}
+
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        inspector = sa.inspect(conn)
+        existing = {c["name"] for c in inspector.get_columns(table)}
+        mapping = {c.name: renames.get(c.name, c.name) for c in columns if renames.get(c.name, c.name) in existing}
+        if "id" not in mapping:
+            raise ValueError("shadow_swap needs an id column carried over from the original table")
+
+        if not inspector.has_table(shadow):
+            sa.Table(shadow, sa.MetaData(), *columns).create(conn)
+        _create_triggers(conn, table, shadow, mapping)
+
+        targets = ", ".join(mapping)
+        sources = ", ".join(mapping.values())
+        copy = sa.text(
+            f"INSERT OR IGNORE INTO {shadow} ({targets}) SELECT {sources} FROM {table} WHERE id > :lo AND id <= :hi"
+        )
+        # OR IGNORE: rows already written by the triggers are newer than the copy
+        run_chunked(conn, name, table, lambda c, lo, hi: c.execute(copy, {"lo": lo, "hi": hi}).rowcount,
+                    chunk_size=chunk_size, duty_cycle=duty_cycle, commit=lambda: None)
+
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            _drop_triggers(conn, shadow)
+            conn.exec_driver_sql(f"ALTER TABLE {table} RENAME TO {old}")
+            conn.exec_driver_sql(f"ALTER TABLE {shadow} RENAME TO {table}")
+            conn.exec_driver_sql(f"DROP TABLE {old}")
+            conn.execute(checkpoints.delete().where(checkpoints.c.name == name))
+            conn.exec_driver_sql("COMMIT")
+        except Exception:
+            conn.exec_driver_sql("ROLLBACK")
+            raise
+        log(f"Swapped {shadow} in for {table}")
+
+        for index_name in indexes:
+            schedule_backfill(index_job(index_name))
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, String, Integer, DateTime, JSON, ForeignKey, func, UniqueConstraint, Date
+from sqlalchemy import Column, String, Integer, DateTime, JSON, ForeignKey, func, UniqueConstraint, Date, Index, LargeBinary, Boolean, true, DDL, event
 from .database import Base
+from .business_time import local_date_default
 import datetime
 import uuid
 
@@ -16,8 +17,10 @@ class TestPapers(Base):
     class_name = Column(String, index=True) 
     subject = Column(String, index=True)
     data = Column(JSON)
-    timestamp = Column(DateTime, default=datetime.datetime.utcnow)
-    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    # Day of `timestamp` in BUSINESS_TIMEZONE
+    local_date = Column(Date, default=local_date_default, index=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
 
 class TestPapersMonthly(Base):
     __tablename__ = "test_papers_monthly"
@@ -43,5 +46,216 @@ class QuestionsAsked(Base):
     class_name = Column(String, index=True) 
     subject = Column(String, index=True)
     data = Column(JSON)
-    timestamp = Column(DateTime, default=datetime.datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    # Day of `timestamp` in BUSINESS_TIMEZONE
+    local_date = Column(Date, default=local_date_default, index=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+    __table_args__ = (
+        # Serves per-profile timeline deltas as a range scan
+        Index('ix_questions_asked_profile_id_timestamp', 'profile_id', 'timestamp'),
+    )
+
+class QuestionsWeeklyAggr(Base):
+    __tablename__ = "questions_weekly_aggr"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String, index=True)
+    profile_id = Column(String, index=True)
+    class_name = Column(String, index=True)
+    subject = Column(String, index=True)
+    count = Column(Integer)
+    date = Column(Date, index=True) # week start
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    # Also bumped by a trigger, for writers that update counts outside the ORM
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'profile_id', 'class_name', 'subject', 'date', name='uix_question_weekly_aggr'),
+        Index('ix_questions_weekly_aggr_profile_id_date', 'profile_id', 'date'),
+    )
+
+class DailyActivity(Base):
+    __tablename__ = "daily_activity"
+
+    id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(String, nullable=False, index=True)
+    date = Column(Date, nullable=False, index=True)
+    seconds_active = Column(Integer, default=0)
+    subject = Column(String, index=True)
+
+    __table_args__ = (
+        UniqueConstraint('student_id', 'subject', 'date', name='uq_daily_activity_student_subject_date'),
+    )
+
+class WeeklyActivity(Base):
+    __tablename__ = "weekly_activity"
+
+    id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(String, nullable=False, index=True)
+    week_start = Column(Date, nullable=False)
+    week_end = Column(Date, nullable=False)
+    seconds_active = Column(Integer, default=0)
+    subject = Column(String, index=True)
+
+    __table_args__ = (
+        UniqueConstraint('student_id', 'subject', 'week_start', name='uq_weekly_activity_student_subject_week'),
+    )
+
+class EventRollup(Base):
+    """
+    Hierarchical (day/week/month) event counts per class and subject.
+    Week and month buckets are derived from day buckets.
+    """
+    __tablename__ = "event_rollups"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    metric = Column(String, nullable=False) # questions | test_papers
+    granularity = Column(String, nullable=False) # day | week | month
+    bucket_start = Column(Date, nullable=False)
+    class_name = Column(String, index=True)
+    subject = Column(String, index=True)
+    count = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('metric', 'granularity', 'bucket_start', 'class_name', 'subject', name='uix_event_rollup'),
+        Index('ix_event_rollups_metric_granularity_bucket', 'metric', 'granularity', 'bucket_start'),
+    )
+
+class EventRollupWatermark(Base):
+    """
+    Rollups for (metric, granularity) are complete for every bucket ending on or before covered_until.
+    The "final" row instead marks the day before which raw rows were purged or archived.
+    """
+    __tablename__ = "event_rollup_watermarks"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    metric = Column(String, nullable=False)
+    granularity = Column(String, nullable=False)
+    covered_until = Column(Date, nullable=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('metric', 'granularity', name='uix_event_rollup_watermark'),
+    )
+
+class QuestionStudentSketch(Base):
+    """
+    HyperLogLog sketch of the distinct profiles asking questions per class,
+    subject and day (plus a month-level sketch, so long ranges merge few blobs).
+    """
+    __tablename__ = "question_student_sketches"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    granularity = Column(String, nullable=False) # day | month
+    bucket_start = Column(Date, nullable=False)
+    class_name = Column(String, index=True)
+    subject = Column(String, index=True)
+    sketch = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('granularity', 'bucket_start', 'class_name', 'subject', name='uix_question_student_sketch'),
+        Index('ix_question_student_sketches_granularity_bucket', 'granularity', 'bucket_start'),
+    )
+
+class TopicSketch(Base):
+    """
+    Space-Saving summary of the most-asked topics per class, subject and week.
+    """
+    __tablename__ = "topic_sketches"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    class_name = Column(String, index=True)
+    subject = Column(String, index=True)
+    week_start = Column(Date, nullable=False, index=True)
+    sketch = Column(JSON)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('class_name', 'subject', 'week_start', name='uix_topic_sketch'),
+    )
+
+class EngagementDigest(Base):
+    """
+    t-digest of per-profile weekly question counts per class and subject,
+    built from questions_weekly_aggr. A week with no valid class/subject rows
+    gets one marker row with NULL class, subject and digest.
+    """
+    __tablename__ = "engagement_digests"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    class_name = Column(String, index=True)
+    subject = Column(String, index=True)
+    week_start = Column(Date, nullable=False, index=True)
+    profiles = Column(Integer, default=0)
+    digest = Column(JSON)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('class_name', 'subject', 'week_start', name='uix_engagement_digest'),
+    )
+
+class JobCheckpoint(Base):
+    """
+    Progress of a chunked, resumable background job (data backfills,
+    index builds, shadow-table copies, retention purges): the last key
+    processed and rows done so far.
+    """
+    __tablename__ = "job_checkpoints"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False, unique=True)
+    status = Column(String, nullable=False, default="pending")  # pending, running, done, failed
+    cursor = Column(String)
+    rows_done = Column(Integer, default=0)
+    rows_total = Column(Integer)
+    message = Column(String)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class Feedback(Base):
+    """
+    Weekly generated feedback per profile and subject. is_latest marks the
+    newest row of each (profile_id, subject) and is moved by an insert
+    trigger (see below and migration b7e2f0c94d18), whoever writes the row,
+    so "latest feedback" reads are a lookup instead of a sort.
+    """
+    __tablename__ = "feedback"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    profile_id = Column(String, index=True)
+    subject = Column(String, index=True)
+    feedback_text = Column(String)
+    is_latest = Column(Boolean, nullable=False, default=False, server_default="0")
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('profile_id', 'subject', 'created_at', name='uq_feedback_profile_subject_date'),
+        Index('ix_feedback_profile_subject_created', 'profile_id', 'subject', created_at.desc()),
+        # At most one latest row per (profile, subject)
+        Index('ix_feedback_latest', 'profile_id', 'subject', unique=True,
+              sqlite_where=is_latest == true(), postgresql_where=is_latest == true()),
+    )
+
+# Clear the old pointer first: ix_feedback_latest is checked row by row
+_FEEDBACK_LATEST_MOVE = (
+    "UPDATE feedback SET is_latest = {false} "
+    "WHERE profile_id = NEW.profile_id AND subject = NEW.subject AND is_latest; "
+    "UPDATE feedback SET is_latest = {true} WHERE id = ("
+    "SELECT id FROM feedback WHERE profile_id = NEW.profile_id AND subject = NEW.subject "
+    "ORDER BY created_at DESC, id DESC LIMIT 1); "
+)
+event.listen(Feedback.__table__, "after_create", DDL(
+    "CREATE TRIGGER trg_feedback_latest AFTER INSERT ON feedback BEGIN "
+    + _FEEDBACK_LATEST_MOVE.format(false=0, true=1) + "END"
+).execute_if(dialect="sqlite"))
+event.listen(Feedback.__table__, "after_create", DDL(
+    "CREATE OR REPLACE FUNCTION feedback_move_latest() RETURNS trigger AS $$ BEGIN "
+    + _FEEDBACK_LATEST_MOVE.format(false="FALSE", true="TRUE") + "RETURN NULL; END; $$ LANGUAGE plpgsql"
+).execute_if(dialect="postgresql"))
+event.listen(Feedback.__table__, "after_create", DDL(
+    "CREATE TRIGGER trg_feedback_latest AFTER INSERT ON feedback "
+    "FOR EACH ROW EXECUTE FUNCTION feedback_move_latest()"
+).execute_if(dialect="postgresql"))
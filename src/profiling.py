@@ -0,0 +1,232 @@
+"""
+Opt-in per-request profiling for /api/insights.
+
+An authenticated admin request carrying `X-Profile: sample` (stack
+sampling, default) or `X-Profile: cprofile` (deterministic, endpoint body
+only) is profiled, and the response carries `X-Profile-Id`. Profiles are kept
+in a bounded ring of files under PROFILE_DIR and served from
+/api/insights/debug/profiles/{id}. PROFILE_SAMPLE_RATE additionally samples a
+fraction of all insights requests for continuous low-overhead profiling.
+
+Profiling only starts once the endpoint is called, i.e. after the router's
+auth dependencies have passed. Requests that are not profiled pay for one
+header lookup and one context variable read.
+"""
+import cProfile
+import functools
+import inspect
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from fastapi.routing import APIRoute
+
+from src.config import settings
+from src.logger import error
+
+PROFILE_HEADER = "x-profile"
+MODES = ("sample", "cprofile")
+_PROFILE_ID = re.compile(r"^[0-9]{23}-[0-9a-f]{8}$")
+
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+
+
+def _label(code) -> str:
+    parts = code.co_filename.replace("\\", "/").split("/")
+    return f"{code.co_name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})"
+
+
+class RequestProfile:
+    """Profiling state of one request, shared by the route handler and the endpoint wrapper."""
+
+    def __init__(self, mode: str, method: str, path: str):
+        self.mode = mode
+        self.method = method
+        self.path = path
+        self.started: Optional[float] = None
+        self.duration_ms: Optional[float] = None
+        # thread id -> frame marking where the request's own frames start on that thread
+        self.anchors: Dict[int, object] = {}
+        self.stacks: Counter = Counter()
+        self.profiler: Optional[cProfile.Profile] = None
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self.started is not None:
+            return
+        self.started = time.perf_counter()
+        if self.mode == "sample":
+            self._sampler = threading.Thread(target=self._sample, name="request-profiler", daemon=True)
+            self._sampler.start()
+
+    def stop(self):
+        if self.started is None:
+            return
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self.duration_ms = round((time.perf_counter() - self.started) * 1000, 2)
+
+    def run(self, call, args, kwargs):
+        """Call the endpoint under this profile, on whatever thread it runs on."""
+        self.start()
+        if self.mode == "cprofile":
+            self.profiler = cProfile.Profile()
+            return self.profiler.runcall(call, *args, **kwargs)
+        tid = threading.get_ident()
+        added = tid not in self.anchors
+        if added:
+            self.anchors[tid] = sys._getframe()
+        try:
+            return call(*args, **kwargs)
+        finally:
+            if added:
+                self.anchors.pop(tid, None)
+
+    def _sample(self):
+        interval = settings.PROFILE_INTERVAL_MS / 1000
+        root = f"{self.method} {self.path}"
+        while not self._stop.wait(interval):
+            frames = sys._current_frames()
+            for tid, anchor in list(self.anchors.items()):
+                frame, stack = frames.get(tid), []
+                while frame is not None and frame is not anchor:
+                    stack.append(_label(frame.f_code))
+                    frame = frame.f_back
+                # No anchor on the stack: the thread is busy with something else (e.g. another request's coroutine)
+                if frame is anchor:
+                    self.stacks[";".join([root] + stack[::-1])] += 1
+
+    def render(self) -> bytes:
+        if self.mode == "cprofile":
+            import marshal
+            self.profiler.create_stats()
+            return marshal.dumps(self.profiler.stats)
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()).encode()
+
+
+class ProfileStore:
+    """Profiles as files in a directory, keeping only the newest PROFILE_MAX_FILES."""
+
+    EXTENSIONS = {"sample": "collapsed", "cprofile": "pstats"}
+
+    def __init__(self, directory: str = settings.PROFILE_DIR, max_profiles: int = settings.PROFILE_MAX_FILES):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    def save(self, profile: RequestProfile) -> str:
+        # Sorts by creation time, which is what the ring buffer trims by
+        stamp = time.time_ns()
+        profile_id = f"{time.strftime('%Y%m%d%H%M%S', time.gmtime(stamp // 10**9))}{stamp % 10**9:09d}-{uuid.uuid4().hex[:8]}"
+        meta = {
+            "id": profile_id,
+            "method": profile.method,
+            "path": profile.path,
+            "mode": profile.mode,
+            "duration_ms": profile.duration_ms,
+            "samples": sum(profile.stacks.values()) if profile.mode == "sample" else None,
+            "file": f"{profile_id}.{self.EXTENSIONS[profile.mode]}",
+        }
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, meta["file"]), "wb") as f:
+                f.write(profile.render())
+            with open(os.path.join(self.directory, f"{profile_id}.json"), "w") as f:
+                json.dump(meta, f)
+            self._trim()
+        return profile_id
+
+    def _trim(self):
+        ids = sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith(".json"))
+        for old in ids[:max(0, len(ids) - self.max_profiles)]:
+            for name in os.listdir(self.directory):
+                if name.startswith(old + "."):
+                    os.remove(os.path.join(self.directory, name))
+
+    def list(self) -> List[dict]:
+        if not os.path.isdir(self.directory):
+            return []
+        metas = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if name.endswith(".json"):
+                with open(os.path.join(self.directory, name)) as f:
+                    metas.append(json.load(f))
+        return metas
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            meta = json.load(f)
+        meta["path"] = os.path.join(self.directory, meta["file"])
+        return meta
+
+
+profile_store = ProfileStore()
+
+
+def _wrap_endpoint(call):
+    if inspect.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def profiled(*args, **kwargs):
+            profile = _current.get()
+            if profile is not None:
+                # Runs on the loop thread, which the route handler already anchored. cProfile
+                # there would also record other requests' coroutines, so sample instead.
+                profile.mode = "sample"
+                profile.start()
+            return await call(*args, **kwargs)
+    else:
+        @functools.wraps(call)
+        def profiled(*args, **kwargs):
+            profile = _current.get()
+            if profile is None:
+                return call(*args, **kwargs)
+            return profile.run(call, args, kwargs)
+    return profiled
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute that profiles requests asking for it (see module docstring)."""
+
+    def get_route_handler(self):
+        self.dependant.call = _wrap_endpoint(self.dependant.call)
+        handler = super().get_route_handler()
+
+        async def profiled_handler(request):
+            mode = request.headers.get(PROFILE_HEADER)
+            if mode is None and settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+                mode = "sample"
+            if mode not in MODES:
+                return await handler(request)
+
+            profile = RequestProfile(mode, request.method, self.path)
+            profile.anchors[threading.get_ident()] = sys._getframe()
+            token = _current.set(profile)
+            try:
+                response = await handler(request)
+            finally:
+                _current.reset(token)
+                profile.stop()
+            # Not started means the endpoint never ran (e.g. auth failed): nothing to keep
+            if profile.started is not None:
+                try:
+                    response.headers["X-Profile-Id"] = profile_store.save(profile)
+                except OSError as e:
+                    error(f"Saving profile of {request.method} {self.path} failed: {e}")
+            return response
+
+        return profiled_handler
@@ -0,0 +1,180 @@
+"""
+Statement timing on the SQLAlchemy engine (attached in src/database.py).
+
+Every statement is timed and folded into a digest keyed by its normalized
+SQL (literals and IN lists collapsed), with call counts, total/max time and
+the routes it came from. Statements slower than SLOW_QUERY_MS are logged
+with their parameter shape, route and query plan (EXPLAIN QUERY PLAN on
+SQLite, EXPLAIN on Postgres; captured at most once per SLOW_QUERY_PLAN_TTL
+seconds per statement). The digest is served, top-N by total time, from
+/api/insights/debug/queries.
+"""
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+
+from src.config import settings
+from src.logger import warning, get_route
+from src.metrics import register_collector
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_NAMED = re.compile(r"%\(\w+\)s|(?<!:):\w+")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+_EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+
+
+def normalize_sql(statement: str) -> str:
+    sql = _STRING.sub("?", statement)
+    sql = _NAMED.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("(?...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def param_shape(parameters, executemany: bool = False) -> str:
+    """Types of the bound parameters, never their values."""
+    if executemany:
+        rows = list(parameters or [])
+        return f"{len(rows)} x {param_shape(rows[0])}" if rows else "0 x ()"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(v).__name__ for v in parameters) + ")"
+    return "()"
+
+
+class _Stat:
+    __slots__ = ("calls", "total_ms", "max_ms", "slow", "routes", "plan", "plan_at")
+
+    def __init__(self):
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.slow = 0
+        self.routes: Counter = Counter()
+        self.plan: Optional[str] = None
+        self.plan_at = 0.0
+
+
+class QueryTracker:
+    def __init__(self, slow_ms: float = settings.SLOW_QUERY_MS, max_statements: int = settings.SLOW_QUERY_DIGEST_SIZE):
+        self.slow_ms = slow_ms
+        self.max_statements = max_statements
+        self._stats: Dict[str, _Stat] = {}
+        self._lock = threading.Lock()
+        register_collector("queries", self.stats)
+
+    def attach(self, engine):
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    # The start time lives on the execution context, so statements that raise leave nothing behind
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.query_started = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "query_started", None)
+        if started is None:
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        sql = normalize_sql(statement)
+        route = get_route() or "background"
+        slow = elapsed_ms >= self.slow_ms
+
+        with self._lock:
+            stat = self._stats.get(sql)
+            if stat is None:
+                stat = self._stats[sql] = _Stat()
+                if len(self._stats) > self.max_statements:
+                    self._evict()
+            stat.calls += 1
+            stat.total_ms += elapsed_ms
+            stat.max_ms = max(stat.max_ms, elapsed_ms)
+            stat.routes[route] += 1
+            if slow:
+                stat.slow += 1
+            explain = slow and not executemany and time.monotonic() - stat.plan_at > settings.SLOW_QUERY_PLAN_TTL
+            if explain:
+                stat.plan_at = time.monotonic()
+
+        if not slow:
+            return
+        if explain:
+            plan = self._explain(conn, statement, parameters)
+            with self._lock:
+                stat.plan = plan
+        else:
+            plan = stat.plan
+        warning(
+            f"Slow query {elapsed_ms:.1f}ms on {route}: {sql} params={param_shape(parameters, executemany)}"
+            + (f"\nplan:\n{plan}" if plan else "")
+        )
+
+    def _evict(self):
+        # Keep the statements that cost the most; the newest entry is kept so it can accumulate
+        newest = next(reversed(self._stats))
+        cheapest = min((sql for sql in self._stats if sql != newest), key=lambda sql: self._stats[sql].total_ms)
+        del self._stats[cheapest]
+
+    @staticmethod
+    def _explain(conn, statement: str, parameters) -> Optional[str]:
+        if not statement.lstrip().upper().startswith(_EXPLAINABLE):
+            return None
+        prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+        try:
+            cursor = conn.connection.cursor()
+            try:
+                cursor.execute(prefix + statement, parameters)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        except Exception as e:
+            return f"(plan unavailable: {e})"
+        if conn.dialect.name == "sqlite":
+            # (id, parent, notused, detail)
+            depth = {0: -1}
+            lines = []
+            for row in rows:
+                depth[row[0]] = depth.get(row[1], -1) + 1
+                lines.append("  " * depth[row[0]] + str(row[3]))
+            return "\n".join(lines)
+        return "\n".join(str(row[0]) for row in rows)
+
+    def digest(self, limit: int = 20) -> List[dict]:
+        with self._lock:
+            top = sorted(self._stats.items(), key=lambda item: item[1].total_ms, reverse=True)[:limit]
+            return [
+                {
+                    "sql": sql,
+                    "calls": stat.calls,
+                    "total_ms": round(stat.total_ms, 2),
+                    "mean_ms": round(stat.total_ms / stat.calls, 3),
+                    "max_ms": round(stat.max_ms, 2),
+                    "slow_calls": stat.slow,
+                    "routes": dict(stat.routes.most_common(5)),
+                    "plan": stat.plan,
+                }
+                for sql, stat in top
+            ]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "statements": len(self._stats),
+                "calls": sum(stat.calls for stat in self._stats.values()),
+                "slow_calls": sum(stat.slow for stat in self._stats.values()),
+            }
+
+
+query_tracker = QueryTracker()
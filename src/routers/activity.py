@@ -0,0 +1,19 @@
+from fastapi import APIRouter, HTTPException, Depends
+from src.dependencies import validate_token
+from src.schemas import ActivityHeartbeatIn
+from src.services.activity_service import activity_buffer
+
+router = APIRouter(
+    prefix="/api/v1/activity",
+    tags=["activity"]
+)
+
+@router.post("/heartbeat", status_code=202)
+def post_activity_heartbeat(heartbeat: ActivityHeartbeatIn, session: dict = Depends(validate_token)):
+    profile_id = session.get("profile_id")
+    if not profile_id:
+        raise HTTPException(status_code=400, detail="Profile ID not found in session")
+
+    # Buffered; written to daily_activity / weekly_activity on the next flush
+    activity_buffer.add(profile_id, heartbeat.subject, heartbeat.seconds)
+    return {"status": "accepted"}
@@ -0,0 +1,46 @@
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from typing import List
+from src.database import get_db
+from src.dependencies import validate_token
+from src.schemas import FeedbackOut
+from src.services.quota_service import quota_service, AccountsServiceError, FEEDBACK_FEATURE
+from src.services.latest_feedback_service import latest_feedback_service
+
+router = APIRouter(
+    prefix="/api/v1/feedback",
+    tags=["feedback"]
+)
+
+async def _check_access(session: dict) -> str:
+    # 1. Profile from the student context
+    profile_id = session.get("profile_id")
+    if not profile_id:
+        raise HTTPException(status_code=400, detail="Profile ID not found in session")
+
+    # 2. Plan check (cached in quota_service, so usually no call to the accounts service)
+    try:
+        allowed = await quota_service.check_feature(session.get("user_id"), FEEDBACK_FEATURE, session.get("token"))
+    except AccountsServiceError:
+        raise HTTPException(status_code=503, detail="Could not verify the plan, please try again")
+    if not allowed:
+        raise HTTPException(status_code=403, detail="Feedback report is not part of the plan, please upgrade your plan")
+    return profile_id
+
+@router.get("/", response_model=FeedbackOut)
+async def get_feedback(subject: str, session: dict = Depends(validate_token), db: Session = Depends(get_db)):
+    profile_id = await _check_access(session)
+
+    # 3. Latest feedback for the subject
+    feedback = await run_in_threadpool(latest_feedback_service.get_latest, db, profile_id, subject)
+    if feedback is None:
+        raise HTTPException(status_code=404, detail="Feedback not found")
+    return feedback
+
+@router.get("/all", response_model=List[FeedbackOut])
+async def get_all_feedback(session: dict = Depends(validate_token), db: Session = Depends(get_db)):
+    profile_id = await _check_access(session)
+
+    # 3. Latest feedback of every subject, in one query
+    return await run_in_threadpool(latest_feedback_service.get_all, db, profile_id)
@@ -1,62 +1,189 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse, FileResponse
 from typing import List, Optional
 from sqlalchemy.orm import Session
 from sqlalchemy import desc, text, func, cast, String
-from src.database import get_db
+from src.database import get_db, SessionLocal, begin_snapshot, join_snapshot
 from fastapi import Depends
 from src.models import QuestionsAsked, TestPapers, TestPapersMonthly
-from src.schemas import QuestionAskedOut, QuestionsWeeklyOut, TestPaperOut, TestPaperMonthlyOut, DashboardStatsOut, ClassSubjectStatsOut
-from datetime import datetime, timedelta
+from src.schemas import QuestionAskedOut, QuestionsWeeklyOut, TestPaperOut, TestPaperMonthlyOut, DashboardStatsOut, ClassSubjectStatsOut, ProfileTimelineOut, TimeSeriesOut, UniqueStudentsOut, TopTopicsOut, EngagementPercentilesOut, BatchIn, BatchQueryIn, BatchOut, BatchResultOut, PageParamsIn, TimeSeriesParamsIn, SuggestionOut
+from src.services.timeline_service import timeline_service
+from src.metrics import collect
+from src.services.rollup_service import GRANULARITIES, METRIC_MODELS
+from src.services.timeseries_service import timeseries_service, output_buckets
+from src.services.unique_students_service import unique_students_service, GROUP_BY_OPTIONS
+from src.services.topics_service import top_topics_service
+from src.services.rollup_service import week_start
+from src.services.engagement_service import engagement_service
+from src.services.archive_service import archive_service
+from src.services.stats_service import stats_service
+from src.services.live_service import live_feed
+from src.services.shard_service import shard_service
+from src.services.suggest_service import suggest_service, FIELDS as SUGGEST_FIELDS
+from src.config import settings
+from datetime import datetime, timedelta, date
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+from src.logger import error
+import time
 
 from src.dependencies import validate_admin_access
+from src.profiling import ProfiledRoute, profile_store
+from src.query_log import query_tracker
 
 router = APIRouter(
     prefix="/api/insights",
     tags=["insights"],
-    dependencies=[Depends(validate_admin_access)]
+    dependencies=[Depends(validate_admin_access)],
+    route_class=ProfiledRoute
 )
 
+@router.get("/metrics")
+def get_metrics():
+    return collect()
+
+@router.get("/debug/profiles")
+def list_profiles():
+    return profile_store.list()
+
+@router.get("/debug/profiles/{profile_id}")
+def get_profile(profile_id: str):
+    meta = profile_store.get(profile_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    # .collapsed feeds flamegraph.pl / speedscope; .pstats loads with pstats.Stats
+    return FileResponse(meta["path"], filename=meta["file"], media_type="application/octet-stream")
+
+@router.get("/debug/queries")
+def get_query_digest(limit: int = Query(20, ge=1, le=200)):
+    # Normalized statements by total time spent, with the plan of the last slow run
+    return query_tracker.digest(limit)
+
+@router.get("/stream")
+async def stream_dashboard(request: Request):
+    # Snapshot first, then deltas as events are committed; no database reads per client
+    return StreamingResponse(
+        live_feed.stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/suggest", response_model=List[SuggestionOut])
+def suggest(
+    field: str,
+    prefix: str = "",
+    limit: int = Query(default=10, ge=1, le=50)
+):
+    if field not in SUGGEST_FIELDS:
+        raise HTTPException(status_code=400, detail=f"field must be one of {', '.join(SUGGEST_FIELDS)}")
+    # In-memory prefix index; no database access
+    return suggest_service.suggest(field, prefix, limit)
+
 @router.get("/stats/dashboard", response_model=DashboardStatsOut)
 def get_dashboard_stats(db: Session = Depends(get_db)):
-    return None
+    return DashboardStatsOut(**stats_service.dashboard(db))
 
 @router.get("/stats/questions-by-subject", response_model=List[ClassSubjectStatsOut])
 def get_questions_by_subject_stats(db: Session = Depends(get_db)):
-    return None
+    # 1. Aggregated weeks plus the raw questions after them
+    stats_map = stats_service.class_subject_counts(db, "questions")
+
+    # 2. Distinct students
+    unique_map = stats_service.unique_students(db)
+
+    final_stats = []
+    for (class_name, subject), count in stats_map.items():
+        if class_name and subject:
+            final_stats.append(ClassSubjectStatsOut(
+                class_name=class_name,
+                subject=subject,
+                count=count,
+                unique_students=unique_map.get((class_name, subject))
+            ))
+
+    final_stats.sort(key=lambda x: (x.class_name, x.subject))
+
+    return final_stats
+
+@router.get("/stats/unique-students", response_model=List[UniqueStudentsOut])
+def get_unique_students_stats(
+    from_date: Optional[date] = Query(default=None, alias="from"),
+    to_date: Optional[date] = Query(default=None, alias="to"),
+    group_by: str = "class_subject",
+    class_name: Optional[str] = Query(default=None, alias="class"),
+    subject: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    if group_by not in GROUP_BY_OPTIONS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(GROUP_BY_OPTIONS)}")
+    if (from_date is None) != (to_date is None):
+        raise HTTPException(status_code=400, detail="from and to must be given together")
+    if from_date and to_date < from_date:
+        raise HTTPException(status_code=400, detail="to must not be before from")
+
+    end = to_date + timedelta(days=1) if to_date else None
+    results = unique_students_service.unique_students(db, from_date, end, class_name, subject, group_by)
+    return [
+        UniqueStudentsOut(
+            class_name=row["class_name"] or None,
+            subject=row["subject"] or None,
+            unique_students=row["unique_students"]
+        )
+        for row in results
+    ]
+
+@router.get("/stats/top-topics", response_model=TopTopicsOut)
+def get_top_topics_stats(
+    week: Optional[date] = None,
+    class_name: Optional[str] = Query(default=None, alias="class"),
+    subject: Optional[str] = None,
+    k: int = Query(default=10, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    week = week_start(week or datetime.utcnow().date())
+    return TopTopicsOut(
+        week_start=week,
+        class_name=class_name,
+        subject=subject,
+        topics=top_topics_service.top_topics(db, week, class_name, subject, k)
+    )
+
+@router.get("/stats/engagement-percentiles", response_model=EngagementPercentilesOut)
+def get_engagement_percentiles(
+    class_name: str = Query(alias="class"),
+    subject: str = Query(),
+    from_week: Optional[date] = Query(default=None, alias="from"),
+    to_week: Optional[date] = Query(default=None, alias="to"),
+    q: List[float] = Query(default=[0.25, 0.5, 0.9]),
+    profile_id: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    if any(not 0 <= value <= 1 for value in q):
+        raise HTTPException(status_code=400, detail="q values must be between 0 and 1")
+
+    # Default: the last four completed weeks
+    to_week = week_start(to_week or (datetime.utcnow().date() - timedelta(days=7)))
+    from_week = week_start(from_week or (to_week - timedelta(weeks=3)))
+    if to_week < from_week:
+        raise HTTPException(status_code=400, detail="to must not be before from")
+
+    result = engagement_service.percentiles(
+        db, class_name, subject, from_week, to_week + timedelta(days=7), q, profile_id
+    )
+    return EngagementPercentilesOut(
+        class_name=class_name,
+        subject=subject,
+        from_week=from_week,
+        to_week=to_week,
+        profile_id=profile_id,
+        **result
+    )
 
 @router.get("/stats/test-papers-by-subject", response_model=List[ClassSubjectStatsOut])
 def get_test_papers_by_subject_stats(db: Session = Depends(get_db)):
-    # 1. Historical Data (from TestPapersMonthly)
-    hist_results = db.query(
-        TestPapersMonthly.class_name,
-        TestPapersMonthly.subject,
-        func.sum(TestPapersMonthly.no_of_tests).label('count')
-    ).group_by(
-        TestPapersMonthly.class_name,
-        TestPapersMonthly.subject
-    ).all()
-
-    # 2. Recent Data (from TestPapers)
-    recent_results = db.query(
-        TestPapers.class_name,
-        TestPapers.subject,
-        func.count(TestPapers.id).label('count')
-    ).group_by(
-        TestPapers.class_name,
-        TestPapers.subject
-    ).all()
-
-    stats_map = {}
-
-    # Initial population from historical
-    for row in hist_results:
-        key = (row.class_name, row.subject)
-        stats_map[key] = stats_map.get(key, 0) + (row.count or 0)
-
-    # Add recent data
-    for row in recent_results:
-        key = (row.class_name, row.subject)
-        stats_map[key] = stats_map.get(key, 0) + (row.count or 0)
+    # Monthly aggregates plus raw test papers
+    stats_map = stats_service.class_subject_counts(db, "test_papers")
 
     # Convert to list
     final_stats = []
@@ -73,6 +200,34 @@ def get_test_papers_by_subject_stats(db: Session = Depends(get_db)):
     
     return final_stats
 
+@router.get("/timeseries", response_model=TimeSeriesOut)
+def get_timeseries(
+    metric: str,
+    from_date: date = Query(alias="from"),
+    to_date: date = Query(alias="to"),
+    granularity: str = "day",
+    class_name: Optional[str] = Query(default=None, alias="class"),
+    subject: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    if metric not in METRIC_MODELS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of {', '.join(METRIC_MODELS)}")
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(GRANULARITIES)}")
+    if to_date < from_date:
+        raise HTTPException(status_code=400, detail="to must not be before from")
+
+    # `to` is inclusive
+    end = to_date + timedelta(days=1)
+    if len(output_buckets(from_date, end, granularity)) > settings.TIMESERIES_MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail="Range too large for the requested granularity")
+
+    return TimeSeriesOut(
+        metric=metric,
+        granularity=granularity,
+        points=timeseries_service.query(db, metric, granularity, from_date, end, class_name, subject)
+    )
+
 # --- Questions ---
 
 @router.get("/questions", response_model=List[QuestionAskedOut])
@@ -82,34 +237,21 @@ def get_questions(
     search: str = "",
     sort_by: str = "timestamp",
     sort_order: str = "desc",
+    cursor: Optional[str] = None,
+    response: Response = None,
     db: Session = Depends(get_db)
 ):
-    query = db.query(QuestionsAsked)
-
+    filters = []
     if search:
         search_filter = f"%{search}%"
-        query = query.filter(
+        filters.append(
             (QuestionsAsked.subject.ilike(search_filter)) |
             (QuestionsAsked.class_name.ilike(search_filter)) |
             (QuestionsAsked.user_id.ilike(search_filter)) |
             (cast(QuestionsAsked.data, String).ilike(search_filter))
         )
 
-    if sort_by:
-        field = getattr(QuestionsAsked, sort_by, None)
-        if field:
-            if sort_order == "desc":
-                query = query.order_by(desc(field))
-            else:
-                query = query.order_by(field)
-        else:
-            # Default sort
-            query = query.order_by(desc(QuestionsAsked.timestamp))
-    else:
-        query = query.order_by(desc(QuestionsAsked.timestamp))
-
-    offset = (page - 1) * limit
-    return query.offset(offset).limit(limit).all()
+    return _page_events(db, QuestionsAsked, filters, page, limit, sort_by, sort_order, cursor, response)
 
 @router.get("/questions/weekly", response_model=List[QuestionsWeeklyOut])
 def get_questions_weekly(
@@ -122,6 +264,34 @@ def get_questions_weekly(
 ):
     return None
 
+@router.get("/questions/export")
+def export_questions(
+    from_date: date = Query(alias="from"),
+    to_date: date = Query(alias="to")
+):
+    return _export("questions_asked", QuestionsAsked, QuestionAskedOut, from_date, to_date)
+
+@router.get("/questions/{event_id}", response_model=QuestionAskedOut)
+def get_question(event_id: str, db: Session = Depends(get_db)):
+    return _get_event("questions_asked", QuestionsAsked, event_id, db)
+
+# --- Profiles ---
+
+@router.get("/profiles/{profile_id}/timeline", response_model=ProfileTimelineOut)
+def get_profile_timeline(
+    profile_id: str,
+    granularity: str = "week",
+    db: Session = Depends(get_db)
+):
+    if granularity not in timeline_service.GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(timeline_service.GRANULARITIES)}")
+
+    return ProfileTimelineOut(
+        profile_id=profile_id,
+        granularity=granularity,
+        buckets=timeline_service.get_timeline(db, profile_id, granularity)
+    )
+
 # --- Test Papers ---
 
 @router.get("/test-papers", response_model=List[TestPaperOut])
@@ -131,33 +301,28 @@ def get_test_papers(
     search: str = "",
     sort_by: str = "timestamp",
     sort_order: str = "desc",
+    cursor: Optional[str] = None,
+    response: Response = None,
     db: Session = Depends(get_db)
 ):
-    query = db.query(TestPapers)
-
+    filters = []
     if search:
         search_filter = f"%{search}%"
-        query = query.filter(
+        filters.append(
             (TestPapers.subject.ilike(search_filter)) |
             (TestPapers.class_name.ilike(search_filter)) |
             (TestPapers.user_id.ilike(search_filter)) |
             (cast(TestPapers.data, String).ilike(search_filter))
         )
 
-    if sort_by:
-        field = getattr(TestPapers, sort_by, None)
-        if field:
-            if sort_order == "desc":
-                query = query.order_by(desc(field))
-            else:
-                query = query.order_by(field)
-        else:
-            query = query.order_by(desc(TestPapers.timestamp))
-    else:
-        query = query.order_by(desc(TestPapers.timestamp))
+    return _page_events(db, TestPapers, filters, page, limit, sort_by, sort_order, cursor, response)
 
-    offset = (page - 1) * limit
-    return query.offset(offset).limit(limit).all()
+@router.get("/test-papers/export")
+def export_test_papers(
+    from_date: date = Query(alias="from"),
+    to_date: date = Query(alias="to")
+):
+    return _export("test_papers", TestPapers, TestPaperOut, from_date, to_date)
 
 @router.get("/test-papers/monthly", response_model=List[TestPaperMonthlyOut])
 def get_test_papers_monthly(
@@ -191,3 +356,146 @@ def get_test_papers_monthly(
 
     offset = (page - 1) * limit
     return query.offset(offset).limit(limit).all()
+
+@router.get("/test-papers/{event_id}", response_model=TestPaperOut)
+def get_test_paper(event_id: str, db: Session = Depends(get_db)):
+    return _get_event("test_papers", TestPapers, event_id, db)
+
+# --- Batch ---
+
+# query -> (params model or None, fn(db, params)); results are encoded like the matching GET endpoint
+BATCH_QUERIES = {
+    "dashboard": (None, lambda db, p: get_dashboard_stats(db)),
+    "questions_by_subject": (None, lambda db, p: get_questions_by_subject_stats(db)),
+    "test_papers_by_subject": (None, lambda db, p: get_test_papers_by_subject_stats(db)),
+    "questions": (PageParamsIn, lambda db, p: [
+        QuestionAskedOut.model_validate(row) for row in get_questions(db=db, **p.model_dump())
+    ]),
+    "test_papers": (PageParamsIn, lambda db, p: [
+        TestPaperOut.model_validate(row) for row in get_test_papers(db=db, **p.model_dump())
+    ]),
+    "timeseries": (TimeSeriesParamsIn, lambda db, p: get_timeseries(db=db, **p.model_dump())),
+}
+
+_batch_pool = ThreadPoolExecutor(max_workers=settings.BATCH_MAX_WORKERS, thread_name_prefix="batch")
+
+@router.post("/batch", response_model=BatchOut)
+def run_batch(batch: BatchIn, db: Session = Depends(get_db)):
+    started = time.perf_counter()
+
+    # 1. Reject the whole batch up front on shape errors
+    if len(batch.queries) > settings.BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BATCH_MAX_QUERIES} queries per batch")
+    unknown = sorted({q.query for q in batch.queries} - set(BATCH_QUERIES))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown queries: {', '.join(unknown)}; expected one of {', '.join(BATCH_QUERIES)}")
+
+    # 2. One snapshot for every sub-query (auth already ran once for the request)
+    snapshot_id = begin_snapshot(db)
+
+    # 3. Postgres: concurrent sessions joined to the exported snapshot. SQLite serves all
+    # reads from the one connection holding the snapshot, so they run in turn there.
+    if snapshot_id is None:
+        results = [_run_batch_query(db, q) for q in batch.queries]
+    else:
+        results = list(_batch_pool.map(lambda q: _run_in_snapshot(snapshot_id, q), batch.queries))
+
+    return BatchOut(results=results, elapsed_ms=round((time.perf_counter() - started) * 1000, 2))
+
+def _run_in_snapshot(snapshot_id: str, query: BatchQueryIn) -> BatchResultOut:
+    db = SessionLocal()
+    try:
+        join_snapshot(db, snapshot_id)
+        return _run_batch_query(db, query)
+    finally:
+        db.close()
+
+def _run_batch_query(db: Session, query: BatchQueryIn) -> BatchResultOut:
+    params_model, fn = BATCH_QUERIES[query.query]
+    started = time.perf_counter()
+    status, data, detail = 200, None, None
+    try:
+        params = params_model.model_validate(query.params) if params_model else None
+        data = jsonable_encoder(fn(db, params))
+    except ValidationError as e:
+        status, detail = 422, str(e)
+    except HTTPException as e:
+        status, detail = e.status_code, e.detail
+    except Exception as e:
+        error(f"Batch query {query.name} ({query.query}) failed: {e}")
+        status, detail = 500, "Internal error"
+    return BatchResultOut(
+        name=query.name,
+        query=query.query,
+        status=status,
+        data=data,
+        error=detail,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 2)
+    )
+
+# --- Raw event pages ---
+
+def _page_events(db: Session, model, filters, page: int, limit: int, sort_by: str, sort_order: str,
+                 cursor: Optional[str], response: Optional[Response]):
+    field = getattr(model, sort_by, None) if sort_by else None
+    descending = sort_order == "desc"
+    if field is None:
+        # Default sort
+        field, descending = model.timestamp, True
+
+    # Sharded (or continuing from a cursor): merge-sorted keyset page over every database
+    if shard_service.enabled or cursor:
+        try:
+            rows, next_cursor = shard_service.page(
+                db, model, field, descending, limit, offset=(page - 1) * limit, cursor=cursor, filters=filters
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        order = shard_service.ordering(model, field, descending)
+        rows = db.query(model).filter(*filters).order_by(*order).offset((page - 1) * limit).limit(limit).all()
+        next_cursor = shard_service.encode_cursor(getattr(rows[-1], field.key), 0, rows[-1].id) \
+            if rows and len(rows) == limit else None
+
+    if response is not None and next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+# --- Archive fallback ---
+
+def _get_event(table: str, model, event_id: str, db: Session):
+    # A user's events live on one shard, but which one is not known from the event_id
+    row = next((found for found in shard_service.scatter(
+        db, lambda member_db: member_db.query(model).filter(model.event_id == event_id).first()
+    ) if found is not None), None)
+    if row is None:
+        # Closed months live in the Parquet archive
+        row = archive_service.find_event(table, event_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    return row
+
+def _export(table: str, model, schema, from_date: date, to_date: date):
+    if to_date < from_date:
+        raise HTTPException(status_code=400, detail="to must not be before from")
+    start = datetime.combine(from_date, datetime.min.time())
+    end = datetime.combine(to_date + timedelta(days=1), datetime.min.time())
+
+    def generate():
+        # Archived months first, then whatever is still in the live table
+        for record in archive_service.iter_range(table, start, end):
+            yield schema.model_validate(record).model_dump_json() + "\n"
+
+        db = SessionLocal()
+        try:
+            # Live rows of every shard, merged in timestamp order
+            rows = shard_service.iter_sorted(db, model, model.timestamp, filters=(
+                model.timestamp >= start,
+                model.timestamp < end
+            ))
+            for row in rows:
+                yield schema.model_validate(row).model_dump_json() + "\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
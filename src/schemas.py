@@ -1,6 +1,6 @@
-from pydantic import BaseModel
-from datetime import datetime
-from typing import Optional, Any
+from pydantic import BaseModel, Field
+from datetime import datetime, date
+from typing import Optional, Any, List
 
 class QuestionAskedOut(BaseModel):
     id: int
@@ -64,3 +64,108 @@ class ClassSubjectStatsOut(BaseModel):
     class_name: str
     subject: str
     count: int
+    unique_students: Optional[int] = None
+
+class UniqueStudentsOut(BaseModel):
+    class_name: Optional[str] = None
+    subject: Optional[str] = None
+    unique_students: int
+
+class TimelineBucketOut(BaseModel):
+    period_start: date
+    subject: Optional[str] = None
+    count: int
+    # Month includes a whole week that also runs into the next month
+    estimated: bool = False
+
+class ProfileTimelineOut(BaseModel):
+    profile_id: str
+    granularity: str
+    buckets: List[TimelineBucketOut]
+
+class ActivityHeartbeatIn(BaseModel):
+    subject: Optional[str] = None
+    seconds: int
+
+class TimeSeriesPointOut(BaseModel):
+    bucket_start: date
+    count: int
+
+class TimeSeriesOut(BaseModel):
+    metric: str
+    granularity: str
+    points: List[TimeSeriesPointOut]
+
+class TopicCountOut(BaseModel):
+    topic: str
+    count: int
+    error: int
+
+class SuggestionOut(BaseModel):
+    value: str
+    count: int
+
+class TopTopicsOut(BaseModel):
+    week_start: date
+    class_name: Optional[str] = None
+    subject: Optional[str] = None
+    topics: List[TopicCountOut]
+
+class QuantileOut(BaseModel):
+    q: float
+    value: Optional[float] = None
+
+class EngagementPercentilesOut(BaseModel):
+    class_name: str
+    subject: str
+    from_week: date
+    to_week: date
+    samples: int
+    quantiles: List[QuantileOut]
+    profile_id: Optional[str] = None
+    profile_weekly_average: Optional[float] = None
+    profile_percentile: Optional[float] = None
+
+class PageParamsIn(BaseModel):
+    page: int = 1
+    limit: int = 50
+    search: str = ""
+    sort_by: str = "timestamp"
+    sort_order: str = "desc"
+
+class TimeSeriesParamsIn(BaseModel):
+    metric: str
+    from_date: date = Field(alias="from")
+    to_date: date = Field(alias="to")
+    granularity: str = "day"
+    class_name: Optional[str] = Field(default=None, alias="class")
+    subject: Optional[str] = None
+
+class BatchQueryIn(BaseModel):
+    name: str
+    query: str
+    params: dict = {}
+
+class BatchIn(BaseModel):
+    queries: List[BatchQueryIn]
+
+class BatchResultOut(BaseModel):
+    name: str
+    query: str
+    status: int
+    data: Optional[Any] = None
+    error: Optional[str] = None
+    elapsed_ms: float
+
+class BatchOut(BaseModel):
+    results: List[BatchResultOut]
+    elapsed_ms: float
+
+class FeedbackOut(BaseModel):
+    profile_id: Optional[str] = None
+    subject: Optional[str] = None
+    feedback_text: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
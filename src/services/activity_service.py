@@ -0,0 +1,187 @@
+import atexit
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func
+
+from src.config import settings
+from src.database import SessionLocal, dialect_insert
+from src.logger import log, error
+from src.metrics import register_collector
+from src.models import DailyActivity, WeeklyActivity
+from src.services.ingest_service import ingest_service, parse_timestamp
+
+ACTIVITY_HEARTBEAT = "ACTIVITY_HEARTBEAT"
+
+# Rows per INSERT statement; keeps SQLite well under its bound-parameter limit
+UPSERT_CHUNK_SIZE = 500
+
+ActivityKey = Tuple[str, str, date]
+
+
+class ActivityBuffer:
+    """
+    Coalesces activity heartbeats in memory, keyed by (student, subject, day),
+    and writes merged deltas to daily_activity / weekly_activity with one
+    batched upsert per flush instead of one statement per heartbeat.
+
+    Flushes run on a fixed interval (scheduler job), when the buffer reaches
+    ACTIVITY_BUFFER_MAX_KEYS keys, and on shutdown. A failed flush puts its
+    deltas back so nothing is lost.
+    """
+
+    def __init__(
+        self,
+        max_keys: int = settings.ACTIVITY_BUFFER_MAX_KEYS,
+        max_heartbeat_seconds: int = settings.ACTIVITY_MAX_HEARTBEAT_SECONDS,
+        session_factory=SessionLocal
+    ):
+        self.max_keys = max_keys
+        self.max_heartbeat_seconds = max_heartbeat_seconds
+        self.session_factory = session_factory
+        self._pending: Dict[ActivityKey, int] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+        self.heartbeats_received = 0
+        self.rows_flushed = 0
+        self.flush_count = 0
+        self.failed_flushes = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.last_flush_at: Optional[datetime] = None
+
+    def add(self, student_id: str, subject: Optional[str], seconds: int, day: Optional[date] = None):
+        if not student_id or seconds <= 0:
+            return
+        seconds = min(int(seconds), self.max_heartbeat_seconds)
+        # NULLs never conflict in a unique constraint, so store a missing subject as ""
+        key = (student_id, subject or "", day or datetime.utcnow().date())
+
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + seconds
+            self.heartbeats_received += 1
+            full = len(self._pending) >= self.max_keys
+
+        if full:
+            self.flush()
+
+    def add_event(self, event: dict):
+        """Ingest handler for ACTIVITY_HEARTBEAT events."""
+        data = event.get("data") or {}
+        self.add(
+            event.get("profile_id"),
+            event.get("subject"),
+            int(data.get("seconds", 0)),
+            parse_timestamp(event.get("timestamp")).date()
+        )
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> int:
+        """Write all buffered deltas. Returns the number of daily keys flushed."""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending
+                self._pending = {}
+            if not batch:
+                return 0
+
+            start = time.perf_counter()
+            try:
+                self._write(batch)
+            except Exception as e:
+                # Put the deltas back (merging with anything that arrived meanwhile)
+                with self._lock:
+                    for key, seconds in batch.items():
+                        self._pending[key] = self._pending.get(key, 0) + seconds
+                self.failed_flushes += 1
+                error(f"Activity flush of {len(batch)} keys failed, will retry: {e}")
+                return 0
+
+            elapsed = time.perf_counter() - start
+            self.flush_count += 1
+            self.rows_flushed += len(batch)
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            self.last_flush_at = datetime.utcnow()
+            return len(batch)
+
+    def _write(self, batch: Dict[ActivityKey, int]):
+        daily_rows = [
+            {"student_id": student_id, "subject": subject, "date": day, "seconds_active": seconds}
+            for (student_id, subject, day), seconds in batch.items()
+        ]
+
+        # Weekly rows are derived from the same daily deltas
+        weekly: Dict[ActivityKey, int] = {}
+        for (student_id, subject, day), seconds in batch.items():
+            key = (student_id, subject, day - timedelta(days=day.weekday()))
+            weekly[key] = weekly.get(key, 0) + seconds
+        weekly_rows = [
+            {
+                "student_id": student_id,
+                "subject": subject,
+                "week_start": week_start,
+                "week_end": week_start + timedelta(days=6),
+                "seconds_active": seconds
+            }
+            for (student_id, subject, week_start), seconds in weekly.items()
+        ]
+
+        db = self.session_factory()
+        try:
+            insert = dialect_insert(db.get_bind())
+            self._upsert(db, insert, DailyActivity, daily_rows, ["student_id", "subject", "date"])
+            self._upsert(db, insert, WeeklyActivity, weekly_rows, ["student_id", "subject", "week_start"])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _upsert(self, db, insert, model, rows, conflict_columns):
+        for i in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            stmt = insert(model).values(rows[i:i + UPSERT_CHUNK_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=conflict_columns,
+                set_={"seconds_active": func.coalesce(model.seconds_active, 0) + stmt.excluded.seconds_active}
+            )
+            db.execute(stmt)
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "heartbeats_received": self.heartbeats_received,
+            "rows_flushed": self.rows_flushed,
+            "flush_count": self.flush_count,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_ms": round(self.last_flush_seconds * 1000, 3),
+            "max_flush_ms": round(self.max_flush_seconds * 1000, 3),
+            "last_flush_at": self.last_flush_at.isoformat() if self.last_flush_at else None,
+        }
+
+    def start(self, scheduler):
+        scheduler.add_job(
+            self.flush, "interval",
+            seconds=settings.ACTIVITY_FLUSH_INTERVAL_SECONDS,
+            id="activity_buffer_flush", replace_existing=True,
+            max_instances=1, coalesce=True
+        )
+
+    def stop(self):
+        flushed = self.flush()
+        if flushed:
+            log(f"Flushed {flushed} buffered activity keys on shutdown")
+
+
+activity_buffer = ActivityBuffer()
+ingest_service.register_handler(ACTIVITY_HEARTBEAT, activity_buffer.add_event)
+register_collector("activity_buffer", activity_buffer.stats)
+# Last line of defence if the process exits without running the lifespan shutdown
+atexit.register(activity_buffer.stop)
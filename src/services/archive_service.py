@@ -0,0 +1,407 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.database import SessionLocal
+from src.logger import log, warning, error
+from src.models import QuestionsAsked, TestPapers, TestPapersMonthly, QuestionsWeeklyAggr
+from src.sketches import ScalableBloomFilter
+from src.services.rollup_service import rollup_service, month_start, bucket_end, day_range_start
+from src.services.shard_service import shard_service
+
+ARCHIVED_MODELS = {
+    "questions_asked": QuestionsAsked,
+    "test_papers": TestPapers,
+}
+
+COLUMNS = ("id", "event_id", "user_id", "profile_id", "class_name", "subject", "data", "timestamp", "created_at")
+
+# False positives of the per-file event_id filters: a wasted file read each
+BLOOM_ERROR_RATE = 0.001
+
+
+class LocalArchiveStore:
+    """Archive files in a local directory (the Docker volume by default)."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def put(self, key: str, local_path: str):
+        target = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = target + ".tmp"
+        shutil.copyfile(local_path, tmp)
+        os.replace(tmp, target)
+
+    def fetch(self, key: str) -> Optional[str]:
+        path = os.path.join(self.root, key)
+        return path if os.path.exists(path) else None
+
+    def list(self, prefix: str) -> List[str]:
+        directory = os.path.join(self.root, prefix)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(f"{prefix}/{name}" for name in os.listdir(directory) if name.endswith(".parquet"))
+
+
+class S3ArchiveStore:
+    """
+    Archive files in an S3-compatible bucket. Objects are downloaded to a
+    local cache on first read, since archived months are immutable.
+    """
+
+    def __init__(self, bucket: str, prefix: str, endpoint_url: str, cache_dir: str):
+        import boto3
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.cache_dir = cache_dir
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None)
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def put(self, key: str, local_path: str):
+        self.client.upload_file(local_path, self.bucket, self._object_key(key))
+        cached = os.path.join(self.cache_dir, key)
+        if os.path.exists(cached):
+            os.remove(cached)
+
+    def fetch(self, key: str) -> Optional[str]:
+        cached = os.path.join(self.cache_dir, key)
+        if os.path.exists(cached):
+            return cached
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        try:
+            self.client.download_file(self.bucket, self._object_key(key), cached + ".tmp")
+        except self.client.exceptions.ClientError:
+            return None
+        os.replace(cached + ".tmp", cached)
+        return cached
+
+    def list(self, prefix: str) -> List[str]:
+        keys = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        strip = len(self.prefix) + 1 if self.prefix else 0
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._object_key(prefix) + "/"):
+            keys.extend(obj["Key"][strip:] for obj in page.get("Contents", []) if obj["Key"].endswith(".parquet"))
+        return sorted(keys)
+
+
+def month_key(table: str, month: date) -> str:
+    return f"{table}/{month:%Y-%m}.parquet"
+
+
+def bloom_key(key: str) -> str:
+    """Sidecar holding the Bloom filter of an archive file's event_ids."""
+    return key[:-len(".parquet")] + ".bloom"
+
+
+def key_month(key: str) -> date:
+    return date.fromisoformat(os.path.basename(key)[:7] + "-01")
+
+
+class ArchiveService:
+    """
+    Moves closed months of raw questions_asked / test_papers rows into one
+    zstd-compressed Parquet file per table and month, then deletes them from
+    the live tables. Rows are streamed in id-ordered batches, one row group
+    each, sorted by event_id within the group. Each file has a Bloom filter
+    of its event_ids next to it, so a single-event lookup only fetches the
+    files that may contain the id; within a file, row-group min/max
+    statistics on event_id skip groups that cannot.
+
+    A month is archived only once its rows are reflected in the rollups the
+    stats endpoints read (event_rollups plus questions_weekly_aggr /
+    test_papers_monthly), so archiving never changes a reported count.
+    """
+
+    def __init__(self, store=None, session_factory=SessionLocal):
+        self._store = store
+        self.session_factory = session_factory
+        self._footer_cache: Dict[str, List[Tuple[int, str, str]]] = {}
+        self._blooms: Dict[str, Optional[ScalableBloomFilter]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        if self._store is None:
+            if settings.ARCHIVE_S3_BUCKET:
+                self._store = S3ArchiveStore(
+                    settings.ARCHIVE_S3_BUCKET, settings.ARCHIVE_S3_PREFIX,
+                    settings.ARCHIVE_S3_ENDPOINT_URL, os.path.join(settings.ARCHIVE_DIR, ".cache")
+                )
+            else:
+                self._store = LocalArchiveStore(settings.ARCHIVE_DIR)
+        return self._store
+
+    # --- Archiving ---
+
+    def archive_closed_months(self, today: Optional[date] = None) -> int:
+        """Archive every eligible month older than ARCHIVE_AFTER_MONTHS. Returns rows archived."""
+        shard_service.require_unsharded("Archiving")
+        today = today or datetime.utcnow().date()
+        cutoff = month_start(today)
+        for _ in range(settings.ARCHIVE_AFTER_MONTHS):
+            cutoff = month_start(cutoff - timedelta(days=1))
+
+        archived = 0
+        db = self.session_factory()
+        try:
+            for table, model in ARCHIVED_MODELS.items():
+                first = db.query(func.min(model.timestamp)).scalar()
+                if first is None:
+                    continue
+                month = month_start(first)
+                while month < cutoff:
+                    if self.is_month_covered(db, table, month):
+                        archived += self.archive_month(db, table, month)
+                    else:
+                        warning(f"Not archiving {table} {month:%Y-%m}: not yet covered by rollups")
+                    month = bucket_end(month, "month")
+        except Exception as e:
+            db.rollback()
+            error(f"Archiving failed: {e}")
+        finally:
+            db.close()
+        return archived
+
+    def is_month_covered(self, db: Session, table: str, month: date) -> bool:
+        end = bucket_end(month, "month")
+        metric = "questions" if table == "questions_asked" else "test_papers"
+        day_mark = rollup_service.get_watermarks(db, metric).get("day")
+        # Including the business day the month's last UTC hours fall in
+        if day_mark is None or day_mark < rollup_service.first_day_from(db, metric, day_range_start(end)):
+            return False
+
+        if table == "questions_asked":
+            last_week = db.query(func.max(QuestionsWeeklyAggr.date)).scalar()
+            return last_week is not None and last_week + timedelta(days=7) >= end
+        return db.query(TestPapersMonthly.id).filter(
+            TestPapersMonthly.month_start >= day_range_start(month),
+            TestPapersMonthly.month_start < day_range_start(end)
+        ).first() is not None
+
+    def archive_month(self, db: Session, table: str, month: date) -> int:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        model = ARCHIVED_MODELS[table]
+        start, end = day_range_start(month), day_range_start(bucket_end(month, "month"))
+        in_month = (model.timestamp >= start, model.timestamp < end)
+        total = db.query(func.count(model.id)).filter(*in_month).scalar()
+        if not total:
+            return 0
+
+        key = month_key(table, month)
+        existing = self.store.fetch(key)
+        existing_rows = pq.ParquetFile(existing).metadata.num_rows if existing else 0
+        bloom = ScalableBloomFilter(initial_capacity=max(1000, total + existing_rows), error_rate=BLOOM_ERROR_RATE)
+        schema = self._schema()
+        # Live rows are streamed in id order; each batch is one row group, sorted by event_id
+        known, ranges, written = set(), [], 0
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "month.parquet")
+            with pq.ParquetWriter(path, schema, compression="zstd", write_statistics=True) as writer:
+                for rows in self._batches(db, model, in_month):
+                    records = sorted((self._to_record(row) for row in rows), key=lambda r: r["event_id"] or "")
+                    writer.write_table(pa.Table.from_pylist(records, schema=schema))
+                    for record in records:
+                        bloom.add(record["event_id"] or "")
+                        if existing:
+                            known.add(record["event_id"])
+                    ranges.extend(self._id_ranges([row.id for row in rows]))
+                    written += len(records)
+                # Late rows for an already archived month are added to the existing file
+                if existing:
+                    for batch in pq.ParquetFile(existing).iter_batches(batch_size=settings.ARCHIVE_ROW_GROUP_SIZE):
+                        records = [r for r in batch.to_pylist() if r["event_id"] not in known]
+                        if records:
+                            writer.write_table(pa.Table.from_pylist(records, schema=schema))
+                            for record in records:
+                                bloom.add(record["event_id"] or "")
+                            written += len(records)
+            if pq.ParquetFile(path).metadata.num_rows != written:
+                raise RuntimeError(f"Archive verification failed for {key}")
+            bloom_path = os.path.join(tmp, "month.bloom")
+            with open(bloom_path, "wb") as f:
+                f.write(bloom.to_bytes())
+            # The filter goes first: a file without one is scanned, one with a stale filter could be missed
+            self.store.put(bloom_key(key), bloom_path)
+            self.store.put(key, path)
+
+        with self._lock:
+            self._footer_cache.pop(key, None)
+            self._blooms.pop(key, None)
+
+        # Late rows for these days now land in the archive only; their rollups must not be rebuilt
+        rollup_service.freeze(db, "questions" if table == "questions_asked" else "test_papers", end)
+        archived = 0
+        for lo, hi in ranges:
+            archived += db.query(model).filter(model.id >= lo, model.id <= hi, *in_month).delete(
+                synchronize_session=False
+            )
+            db.commit()
+
+        log(f"Archived {archived} {table} rows for {month:%Y-%m} to {key}")
+        return archived
+
+    @staticmethod
+    def _batches(db: Session, model, filters) -> Iterator[list]:
+        """Rows matching `filters` in id order, ARCHIVE_ROW_GROUP_SIZE at a time."""
+        columns = [getattr(model, column) for column in COLUMNS]
+        after = None
+        while True:
+            query = db.query(*columns).filter(*filters)
+            if after is not None:
+                query = query.filter(model.id > after)
+            rows = query.order_by(model.id).limit(settings.ARCHIVE_ROW_GROUP_SIZE).all()
+            if not rows:
+                return
+            yield rows
+            after = rows[-1].id
+
+    @staticmethod
+    def _id_ranges(ids: List[int]) -> List[Tuple[int, int]]:
+        """Inclusive id ranges of ARCHIVE_DELETE_BATCH_SIZE rows each, for the deletes."""
+        batch = settings.ARCHIVE_DELETE_BATCH_SIZE
+        return [(ids[i], ids[min(i + batch, len(ids)) - 1]) for i in range(0, len(ids), batch)]
+
+    @staticmethod
+    def _to_record(row) -> dict:
+        return {
+            "id": row.id,
+            "event_id": row.event_id,
+            "user_id": row.user_id,
+            "profile_id": row.profile_id,
+            "class_name": row.class_name,
+            "subject": row.subject,
+            "data": json.dumps(row.data) if row.data is not None else None,
+            "timestamp": row.timestamp,
+            "created_at": row.created_at,
+        }
+
+    @staticmethod
+    def _schema():
+        import pyarrow as pa
+        return pa.schema([
+            ("id", pa.int64()),
+            ("event_id", pa.string()),
+            ("user_id", pa.string()),
+            ("profile_id", pa.string()),
+            ("class_name", pa.string()),
+            ("subject", pa.string()),
+            ("data", pa.string()),
+            ("timestamp", pa.timestamp("us")),
+            ("created_at", pa.timestamp("us")),
+        ])
+
+    @staticmethod
+    def _from_record(record: dict) -> dict:
+        record = dict(record)
+        if record.get("data") is not None:
+            record["data"] = json.loads(record["data"])
+        return record
+
+    # --- Reads ---
+
+    def _row_group_ranges(self, key: str, path: str) -> List[Tuple[int, str, str]]:
+        import pyarrow.parquet as pq
+
+        with self._lock:
+            cached = self._footer_cache.get(key)
+        if cached is not None:
+            return cached
+
+        metadata = pq.ParquetFile(path).metadata
+        column = COLUMNS.index("event_id")
+        ranges = []
+        for i in range(metadata.num_row_groups):
+            stats = metadata.row_group(i).column(column).statistics
+            if stats is not None and stats.has_min_max:
+                ranges.append((i, stats.min, stats.max))
+            else:
+                ranges.append((i, None, None))
+        with self._lock:
+            self._footer_cache[key] = ranges
+        return ranges
+
+    def _bloom(self, key: str) -> Optional[ScalableBloomFilter]:
+        """The file's event_id filter; None for files archived before filters were written."""
+        with self._lock:
+            if key in self._blooms:
+                return self._blooms[key]
+        path = self.store.fetch(bloom_key(key))
+        bloom = None
+        if path is not None:
+            with open(path, "rb") as f:
+                bloom = ScalableBloomFilter.from_bytes(f.read())
+        with self._lock:
+            self._blooms[key] = bloom
+        return bloom
+
+    def find_event(self, table: str, event_id: str) -> Optional[dict]:
+        """Look up one archived event, skipping files and row groups that cannot contain it."""
+        import pyarrow.parquet as pq
+
+        for key in reversed(self.store.list(table)):
+            bloom = self._bloom(key)
+            if bloom is not None and event_id not in bloom:
+                continue
+            path = self.store.fetch(key)
+            if path is None:
+                continue
+            candidates = [i for i, lo, hi in self._row_group_ranges(key, path)
+                          if lo is None or lo <= event_id <= hi]
+            if not candidates:
+                continue
+            parquet = pq.ParquetFile(path)
+            for i in candidates:
+                for record in parquet.read_row_group(i).to_pylist():
+                    if record["event_id"] == event_id:
+                        return self._from_record(record)
+        return None
+
+    def iter_range(self, table: str, start: datetime, end: datetime) -> Iterator[dict]:
+        """Archived events with start <= timestamp < end, oldest month first."""
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        for key in self.store.list(table):
+            month = key_month(key)
+            if day_range_start(bucket_end(month, "month")) <= start or day_range_start(month) >= end:
+                continue
+            path = self.store.fetch(key)
+            if path is None:
+                continue
+            arrow_table = pq.read_table(path)
+            mask = pc.and_(
+                pc.greater_equal(arrow_table["timestamp"], start),
+                pc.less(arrow_table["timestamp"], end)
+            )
+            filtered = arrow_table.filter(mask).sort_by("timestamp")
+            for record in filtered.to_pylist():
+                yield self._from_record(record)
+
+    def start(self, scheduler):
+        if not settings.ARCHIVE_ENABLED:
+            return
+        if shard_service.enabled:
+            warning("Not scheduling archiving: it only covers the main database and SHARD_URLS is set")
+            return
+        scheduler.add_job(
+            self.archive_closed_months, "cron",
+            day=1, hour=2, minute=30,
+            id="archive_closed_months", replace_existing=True,
+            max_instances=1, coalesce=True
+        )
+
+
+archive_service = ArchiveService()
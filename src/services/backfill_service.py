@@ -0,0 +1,147 @@
+import threading
+import time
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from src.config import settings
+from src.database import Base, SessionLocal, engine
+from src.logger import log, error
+from src.metrics import register_collector
+from src.migration_helpers import ChunkFn, get_checkpoint, index_job, run_chunked, save_checkpoint
+from src.models import JobCheckpoint
+
+
+class Backfill:
+    """
+    A chunked data backfill over one table, keyed by its integer id.
+    `on_done` is called once, by the run that finishes it. `bind` is the
+    engine holding the table when that is not the main database (a shard);
+    the checkpoint stays in the main database either way.
+    """
+
+    def __init__(self, name: str, table: str, apply: ChunkFn, chunk_size: int = None,
+                 on_done: Callable[[], None] = None, bind=None):
+        self.name = name
+        self.table = table
+        self.apply = apply
+        self.chunk_size = chunk_size or settings.BACKFILL_CHUNK_SIZE
+        self.on_done = on_done
+        self.bind = bind
+
+
+class BackfillService:
+    """
+    Runs data backfills that revisions scheduled with
+    migration_helpers.schedule_backfill(), in the background after startup,
+    so `alembic upgrade head` only has to apply DDL. Progress is kept in
+    job_checkpoints; a restart resumes from the last committed chunk.
+
+    Also builds the SQLite indexes that create_index_online() scheduled,
+    from their declaration in the models, after the data backfills (filling
+    a column is cheaper before it is indexed). The build still holds the
+    writer lock while it scans the table, but ingest retries, and startup
+    no longer waits on it.
+    """
+
+    def __init__(self, bind=engine, session_factory=SessionLocal):
+        self.bind = bind
+        self.session_factory = session_factory
+        self._backfills: Dict[str, Backfill] = {}
+        self._indexes = {
+            index_job(index.name): index for table in Base.metadata.tables.values() for index in table.indexes
+        }
+        self._lock = threading.Lock()
+        register_collector("backfills", self.stats)
+
+    def register(self, backfill: Backfill):
+        self._backfills[backfill.name] = backfill
+
+    def run(self, name: str) -> int:
+        if name in self._indexes:
+            return self._build_index(name)
+        backfill = self._backfills[name]
+        with self._lock, self.bind.connect() as conn, ExitStack() as stack:
+            data_conn = stack.enter_context(backfill.bind.connect()) if backfill.bind is not None else None
+            checkpoint = get_checkpoint(conn, name)
+            finished = checkpoint is not None and checkpoint.status == "done"
+            try:
+                rows = run_chunked(
+                    conn, backfill.name, backfill.table, backfill.apply,
+                    chunk_size=backfill.chunk_size,
+                    duty_cycle=settings.BACKFILL_DUTY_CYCLE,
+                    data_conn=data_conn
+                )
+            except Exception as e:
+                conn.rollback()
+                if data_conn is not None:
+                    data_conn.rollback()
+                save_checkpoint(conn, name, status="failed", message=str(e)[:500])
+                conn.commit()
+                raise
+        if backfill.on_done and not finished:
+            backfill.on_done()
+        return rows
+
+    def _build_index(self, name: str) -> int:
+        index = self._indexes[name]
+        with self._lock, self.bind.connect() as conn:
+            save_checkpoint(conn, name, status="running", message=None)
+            conn.commit()
+            started = time.monotonic()
+            try:
+                index.create(conn, checkfirst=True)
+                save_checkpoint(conn, name, status="done")
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                save_checkpoint(conn, name, status="failed", message=str(e)[:500])
+                conn.commit()
+                raise
+        log(f"{name}: built in {time.monotonic() - started:.1f}s")
+        return 0
+
+    def pending(self) -> List[str]:
+        db = self.session_factory()
+        try:
+            rows = db.query(JobCheckpoint.name).filter(
+                JobCheckpoint.name.in_(list(self._backfills) + list(self._indexes)),
+                JobCheckpoint.status != "done"
+            ).all()
+            return sorted((name for (name,) in rows), key=lambda name: name in self._indexes)
+        finally:
+            db.close()
+
+    def run_pending(self):
+        for name in self.pending():
+            try:
+                self.run(name)
+            except Exception as e:
+                error(f"Backfill {name} failed, will retry: {e}")
+
+    def stats(self) -> dict:
+        db = self.session_factory()
+        try:
+            return {
+                row.name: {
+                    "status": row.status,
+                    "rows_done": row.rows_done,
+                    "rows_total": row.rows_total,
+                    "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+                }
+                for row in db.query(JobCheckpoint).all()
+            }
+        finally:
+            db.close()
+
+    def start(self, scheduler):
+        scheduler.add_job(
+            self.run_pending, "interval",
+            minutes=settings.BACKFILL_POLL_MINUTES,
+            next_run_time=datetime.now(scheduler.timezone) + timedelta(seconds=30),
+            id="backfills", replace_existing=True,
+            max_instances=1, coalesce=True
+        )
+
+
+backfill_service = BackfillService()
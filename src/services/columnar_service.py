@@ -0,0 +1,336 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from src.startup import lazy_import
+from sqlalchemy import func, null
+
+from src.database import SessionLocal
+from src.logger import log, error
+from src.metrics import register_collector
+from src.models import QuestionsAsked, TestPapers, QuestionsWeeklyAggr, TestPapersMonthly
+from src.services.ingest_service import ingest_service
+from src.services.rollup_service import EVENT_METRICS
+
+np = lazy_import("numpy")
+
+# Timestamp code for rows without a timestamp; excluded by every range filter, like NULL in SQL
+NULL_TS = -(1 << 63)
+
+ClassSubject = Tuple[Optional[str], Optional[str]]
+
+
+def to_epoch(value: Optional[datetime]) -> int:
+    if value is None:
+        return NULL_TS
+    return int(np.datetime64(value, "s").astype(np.int64))
+
+
+def questions_boundary(db) -> Optional[datetime]:
+    """Raw questions before this point are already summed into questions_weekly_aggr."""
+    last_week = db.query(func.max(QuestionsWeeklyAggr.date)).scalar()
+    if last_week is None:
+        return None
+    return datetime.combine(last_week + timedelta(days=7), datetime.min.time())
+
+
+class _Dictionary:
+    """String <-> int code mapping; code 0 stands for NULL / empty."""
+
+    def __init__(self):
+        self.values: List[Optional[str]] = [None]
+        self.codes: Dict[str, int] = {}
+
+    def encode(self, value: Optional[str]) -> int:
+        if not value:
+            return 0
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __len__(self):
+        return len(self.values)
+
+
+class _Columns:
+    """Append-only set of equally long NumPy columns with amortised growth."""
+
+    FIELDS = (
+        ("class_code", "int32"),
+        ("subject_code", "int32"),
+        ("profile_code", "int32"),
+        ("ts", "int64"),
+        ("weight", "int64"),
+    )
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.arrays = {name: np.zeros(capacity, dtype=dtype) for name, dtype in self.FIELDS}
+
+    def _reserve(self, extra: int):
+        capacity = len(self.arrays["ts"])
+        if self.size + extra <= capacity:
+            return
+        while capacity < self.size + extra:
+            capacity *= 2
+        # Readers keep slicing the old arrays, so grow into new ones rather than resizing in place
+        self.arrays = {
+            name: np.concatenate([array[:self.size], np.zeros(capacity - self.size, dtype=array.dtype)])
+            for name, array in self.arrays.items()
+        }
+
+    def extend(self, **columns):
+        count = len(columns["ts"])
+        self._reserve(count)
+        for name, values in columns.items():
+            self.arrays[name][self.size:self.size + count] = values
+        self.size += count
+
+    def view(self) -> Dict[str, "np.ndarray"]:
+        return {name: array[:self.size] for name, array in self.arrays.items()}
+
+
+class _MetricColumns:
+    def __init__(self):
+        # Rows of the weekly/monthly aggregate table (weight = aggregated count)
+        self.rollup = _Columns()
+        # Raw event rows (weight 1)
+        self.raw = _Columns()
+        self.max_raw_id = 0
+        # Epoch seconds; raw rows before it are already in the aggregate (questions only)
+        self.boundary: Optional[int] = None
+        self.rollup_signature: Tuple[int, int] = (0, 0)
+
+
+class ColumnarEngine:
+    """
+    In-process, dictionary-encoded copy of the columns the /stats/* endpoints
+    group on: class and subject codes, profile codes, int64 epoch-second
+    timestamps and a weight. Raw events carry weight 1; rows of
+    questions_weekly_aggr / test_papers_monthly carry their aggregated count,
+    so the same "aggregate + raw after it" totals the SQL queries compute
+    become np.bincount over combined class/subject codes.
+
+    Loaded in the background at startup (the endpoints use SQL until it is
+    ready), appended to from the ingest listener, and reloaded whenever the
+    periodic consistency check finds it has drifted from the database
+    (aggregation jobs, archiving, or writes from another process).
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self.ready = False
+        self._metrics: Dict[str, _MetricColumns] = {}
+        self._classes = _Dictionary()
+        self._subjects = _Dictionary()
+        self._profiles = _Dictionary()
+        self._lock = threading.Lock()
+        self._loading = False
+        self._backlog = []
+        self.loads = 0
+        self.last_load_seconds = None
+        ingest_service.add_listener(self._on_event)
+        register_collector("columnar", self.stats)
+
+    # --- Loading ---
+
+    def load(self):
+        started = time.perf_counter()
+        with self._lock:
+            self._loading = True
+            self._backlog = []
+
+        classes, subjects, profiles = _Dictionary(), _Dictionary(), _Dictionary()
+        metrics = {"questions": _MetricColumns(), "test_papers": _MetricColumns()}
+        db = self.session_factory()
+        try:
+            boundary = questions_boundary(db)
+            metrics["questions"].boundary = to_epoch(boundary) if boundary else None
+
+            self._load_rows(
+                metrics["questions"].rollup, classes, subjects, profiles,
+                db.query(QuestionsWeeklyAggr.class_name, QuestionsWeeklyAggr.subject,
+                         QuestionsWeeklyAggr.profile_id, QuestionsWeeklyAggr.date, QuestionsWeeklyAggr.count)
+            )
+            self._load_rows(
+                metrics["test_papers"].rollup, classes, subjects, profiles,
+                db.query(TestPapersMonthly.class_name, TestPapersMonthly.subject, null(),
+                         TestPapersMonthly.month_start, TestPapersMonthly.no_of_tests)
+            )
+            for metric, model in (("questions", QuestionsAsked), ("test_papers", TestPapers)):
+                columns = metrics[metric]
+                columns.max_raw_id = self._load_rows(
+                    columns.raw, classes, subjects, profiles,
+                    db.query(model.class_name, model.subject, model.profile_id, model.timestamp, model.id)
+                    .order_by(model.id),
+                    raw=True
+                )
+            metrics["questions"].rollup_signature = self._signature(metrics["questions"].rollup)
+            metrics["test_papers"].rollup_signature = self._signature(metrics["test_papers"].rollup)
+        except Exception as e:
+            with self._lock:
+                self._loading = False
+                self._backlog = []
+            error(f"Loading columnar stats engine failed: {e}")
+            return
+        finally:
+            db.close()
+
+        with self._lock:
+            self._classes, self._subjects, self._profiles = classes, subjects, profiles
+            self._metrics = metrics
+            # Events ingested while the snapshot was being read
+            for metric, row in self._backlog:
+                if row.id > metrics[metric].max_raw_id:
+                    self._append(metric, row)
+            self._backlog = []
+            self._loading = False
+            self.ready = True
+
+        self.loads += 1
+        self.last_load_seconds = round(time.perf_counter() - started, 3)
+        log(f"Columnar stats engine loaded {self.row_count()} rows in {self.last_load_seconds}s")
+
+    @staticmethod
+    def _load_rows(columns: _Columns, classes, subjects, profiles, query, raw: bool = False, chunk: int = 50000) -> int:
+        max_id = 0
+        buffer = []
+        for row in query.yield_per(chunk):
+            buffer.append(row)
+            if len(buffer) >= chunk:
+                max_id = max(max_id, ColumnarEngine._extend(columns, classes, subjects, profiles, buffer, raw))
+                buffer = []
+        if buffer:
+            max_id = max(max_id, ColumnarEngine._extend(columns, classes, subjects, profiles, buffer, raw))
+        return max_id
+
+    @staticmethod
+    def _extend(columns: _Columns, classes, subjects, profiles, rows, raw: bool) -> int:
+        columns.extend(
+            class_code=np.fromiter((classes.encode(r[0]) for r in rows), np.int32, len(rows)),
+            subject_code=np.fromiter((subjects.encode(r[1]) for r in rows), np.int32, len(rows)),
+            profile_code=np.fromiter((profiles.encode(r[2]) for r in rows), np.int32, len(rows)),
+            ts=np.fromiter((to_epoch(r[3]) for r in rows), np.int64, len(rows)),
+            weight=np.ones(len(rows), dtype=np.int64) if raw else
+            np.fromiter((r[4] or 0 for r in rows), np.int64, len(rows))
+        )
+        return rows[-1][4] if raw else 0
+
+    @staticmethod
+    def _signature(columns: _Columns) -> Tuple[int, int]:
+        return columns.size, int(columns.view()["weight"].sum())
+
+    # --- Incremental appends ---
+
+    def _on_event(self, event_type: str, row):
+        metric = EVENT_METRICS.get(event_type)
+        if metric is None:
+            return
+        with self._lock:
+            if self._loading:
+                self._backlog.append((metric, row))
+            elif self.ready:
+                self._append(metric, row)
+
+    def _append(self, metric: str, row):
+        columns = self._metrics[metric]
+        columns.raw.extend(
+            class_code=[self._classes.encode(row.class_name)],
+            subject_code=[self._subjects.encode(row.subject)],
+            profile_code=[self._profiles.encode(row.profile_id)],
+            ts=[to_epoch(row.timestamp)],
+            weight=[1]
+        )
+        columns.max_raw_id = max(columns.max_raw_id, row.id or 0)
+
+    # --- Queries ---
+
+    def _snapshot(self, metric: str):
+        with self._lock:
+            columns = self._metrics[metric]
+            # Codes in the views are always below the dictionary sizes read after them
+            return (columns.rollup.view(), columns.raw.view(), columns.boundary,
+                    list(self._classes.values), list(self._subjects.values), len(self._profiles))
+
+    @staticmethod
+    def _counted_raw(raw: Dict[str, "np.ndarray"], boundary: Optional[int]) -> Dict[str, "np.ndarray"]:
+        if boundary is None:
+            return raw
+        mask = raw["ts"] >= boundary
+        return {name: values[mask] for name, values in raw.items()}
+
+    def class_subject_counts(self, metric: str) -> Dict[ClassSubject, int]:
+        """Event count per (class, subject): aggregate rows plus raw rows not yet aggregated."""
+        rollup, raw, boundary, classes, subjects, _ = self._snapshot(metric)
+        raw = self._counted_raw(raw, boundary)
+        n_subjects = len(subjects)
+        size = len(classes) * n_subjects
+
+        counts = np.zeros(size, dtype=np.int64)
+        for part in (rollup, raw):
+            if len(part["ts"]):
+                combined = part["class_code"].astype(np.int64) * n_subjects + part["subject_code"]
+                counts += np.bincount(combined, weights=part["weight"], minlength=size).astype(np.int64)
+
+        return {
+            (classes[code // n_subjects], subjects[code % n_subjects]): int(counts[code])
+            for code in np.flatnonzero(counts)
+        }
+
+    def unique_profiles(self, metric: str) -> Dict[ClassSubject, int]:
+        """Exact distinct profiles per (class, subject) over the same rows as class_subject_counts()."""
+        rollup, raw, boundary, classes, subjects, n_profiles = self._snapshot(metric)
+        raw = self._counted_raw(raw, boundary)
+        n_subjects = len(subjects)
+
+        keys = []
+        for part in (rollup, raw):
+            known = part["profile_code"] > 0
+            group = part["class_code"][known].astype(np.int64) * n_subjects + part["subject_code"][known]
+            keys.append(group * n_profiles + part["profile_code"][known])
+        distinct = np.unique(np.concatenate(keys)) // n_profiles
+        counts = np.bincount(distinct, minlength=len(classes) * n_subjects)
+
+        return {
+            (classes[code // n_subjects], subjects[code % n_subjects]): int(counts[code])
+            for code in np.flatnonzero(counts)
+        }
+
+    def total(self, metric: str) -> int:
+        rollup, raw, boundary, _, _, _ = self._snapshot(metric)
+        counted = self._counted_raw(raw, boundary)
+        return int(rollup["weight"].sum()) + len(counted["ts"])
+
+    def count_range(self, metric: str, start: datetime, end: datetime) -> int:
+        """Raw events with start <= timestamp < end."""
+        _, raw, _, _, _, _ = self._snapshot(metric)
+        ts = raw["ts"]
+        return int(np.count_nonzero((ts >= to_epoch(start)) & (ts < to_epoch(end))))
+
+    def signature(self, metric: str) -> dict:
+        """Cheap totals the consistency check compares against the database."""
+        with self._lock:
+            columns = self._metrics[metric]
+            return {
+                "boundary": columns.boundary,
+                "rollup": columns.rollup_signature,
+                "raw_rows": columns.raw.size,
+            }
+
+    def row_count(self) -> int:
+        with self._lock:
+            return sum(c.rollup.size + c.raw.size for c in self._metrics.values())
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "rows": self.row_count(),
+            "loads": self.loads,
+            "last_load_seconds": self.last_load_seconds,
+        }
+
+
+columnar_engine = ColumnarEngine()
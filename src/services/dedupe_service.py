@@ -0,0 +1,212 @@
+import json
+import os
+import struct
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict
+
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.database import SessionLocal
+from src.logger import log, error
+from src.metrics import register_collector
+from src.models import QuestionsAsked, TestPapers
+from src.sketches import ScalableBloomFilter
+from src.services.shard_service import member_job, shard_service
+
+FILTERED_MODELS = {
+    "questions_asked": QuestionsAsked,
+    "test_papers": TestPapers,
+}
+
+
+def _max_id_key(table: str, member: int) -> str:
+    # Each read-set member has its own id sequence; the main database keeps the plain table name
+    return member_job(table, member) if member else table
+
+
+class EventIdFilter:
+    """
+    Fast path for at-least-once redelivery. Before an insert, ingest asks
+    whether the event_id was seen:
+
+    - in the exact set of the most recently stored ids -> duplicate, no query
+    - not in the Bloom filter -> definitely new, insert straight away
+    - otherwise ("maybe seen") -> one indexed SELECT decides
+
+    The unique index on event_id stays the source of truth; the filter only
+    saves failed inserts and rollbacks. It is warmed from the last saved
+    snapshot plus newer rows (or EVENT_ID_FILTER_WARM_DAYS of rows) of the
+    main database and every shard, and until then only the exact recent set
+    is consulted.
+    """
+
+    def __init__(self, path: str = settings.EVENT_ID_FILTER_PATH, session_factory=SessionLocal):
+        self.path = path
+        self.session_factory = session_factory
+        self._bloom = self._new_bloom()
+        self._recent: "OrderedDict[str, str]" = OrderedDict()
+        self._max_ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.ready = False
+        self.counters = {"recent_hits": 0, "definitely_new": 0, "exact_checks": 0, "exact_duplicates": 0}
+        register_collector("event_id_filter", self.stats)
+
+    @staticmethod
+    def _new_bloom() -> ScalableBloomFilter:
+        return ScalableBloomFilter(
+            initial_capacity=settings.EVENT_ID_FILTER_CAPACITY,
+            error_rate=settings.EVENT_ID_FILTER_ERROR_RATE,
+            max_layers=settings.EVENT_ID_FILTER_MAX_LAYERS
+        )
+
+    def is_duplicate(self, db: Session, table: str, event_id: str) -> bool:
+        if not event_id:
+            return False
+        with self._lock:
+            if self._recent.get(event_id) == table:
+                self._recent.move_to_end(event_id)
+                self.counters["recent_hits"] += 1
+                return True
+            if not self.ready:
+                return False
+            if event_id not in self._bloom:
+                self.counters["definitely_new"] += 1
+                return False
+            self.counters["exact_checks"] += 1
+
+        model = FILTERED_MODELS[table]
+        exists = db.query(model.id).filter(model.event_id == event_id).first() is not None
+        if exists:
+            with self._lock:
+                self.counters["exact_duplicates"] += 1
+        return exists
+
+    def add(self, table: str, event_id: str, row_id: int = None, member: int = 0):
+        if not event_id:
+            return
+        with self._lock:
+            # Known ids (e.g. a duplicate caught by the unique index) would only fill the filter faster
+            if event_id not in self._bloom:
+                self._bloom.add(event_id)
+            self._recent[event_id] = table
+            self._recent.move_to_end(event_id)
+            while len(self._recent) > settings.EVENT_ID_RECENT_SIZE:
+                self._recent.popitem(last=False)
+            if row_id:
+                key = _max_id_key(table, member)
+                self._max_ids[key] = max(self._max_ids.get(key, 0), row_id)
+
+    def reset(self):
+        with self._lock:
+            self._bloom = self._new_bloom()
+            self._recent.clear()
+            self._max_ids = {}
+            self.ready = False
+
+    # --- Warm-up and persistence ---
+
+    def warm(self):
+        bloom, max_ids = self._load_snapshot()
+        since = datetime.utcnow() - timedelta(days=settings.EVENT_ID_FILTER_WARM_DAYS)
+        # Shards are scanned in parallel
+        bloom_lock = threading.Lock()
+
+        def scan(member: int, member_db: Session):
+            added, newest = 0, {}
+            for table, model in FILTERED_MODELS.items():
+                key = _max_id_key(table, member)
+                query = member_db.query(model.id, model.event_id)
+                if key in max_ids:
+                    query = query.filter(model.id > max_ids[key])
+                else:
+                    query = query.filter(model.timestamp >= since)
+                rows = iter(query.yield_per(10000))
+                while True:
+                    batch = list(islice(rows, 10000))
+                    if not batch:
+                        break
+                    with bloom_lock:
+                        for row_id, event_id in batch:
+                            if event_id:
+                                bloom.add(event_id)
+                                added += 1
+                    newest[key] = max(newest.get(key, 0), max(row_id for row_id, _ in batch))
+            return added, newest
+
+        db = self.session_factory()
+        try:
+            results = shard_service.scatter_members(db, scan)
+        except Exception as e:
+            error(f"Warming event_id filter failed: {e}")
+            return
+        finally:
+            db.close()
+        added = 0
+        for member_added, newest in results:
+            added += member_added
+            for key, row_id in newest.items():
+                max_ids[key] = max(max_ids.get(key, 0), row_id)
+
+        with self._lock:
+            # Ids added while warming are not in the snapshot yet
+            for event_id in self._recent:
+                bloom.add(event_id)
+            for key, row_id in self._max_ids.items():
+                max_ids[key] = max(max_ids.get(key, 0), row_id)
+            self._bloom, self._max_ids = bloom, max_ids
+            self.ready = True
+        log(f"Event_id filter warmed with {added} ids from the database ({len(bloom)} total)")
+
+    def _load_snapshot(self):
+        if not os.path.exists(self.path):
+            return self._new_bloom(), {}
+        try:
+            with open(self.path, "rb") as f:
+                raw = f.read()
+            (length,) = struct.unpack(">I", raw[:4])
+            max_ids = json.loads(raw[4:4 + length])
+            return ScalableBloomFilter.from_bytes(raw[4 + length:]), max_ids
+        except Exception as e:
+            error(f"Ignoring unreadable event_id filter snapshot {self.path}: {e}")
+            return self._new_bloom(), {}
+
+    def persist(self):
+        if not self.ready:
+            return
+        with self._lock:
+            blob = self._bloom.to_bytes()
+            header = json.dumps(self._max_ids).encode("utf-8")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(struct.pack(">I", len(header)) + header + blob)
+        os.replace(tmp, self.path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters, ready=self.ready, ids=len(self._bloom), layers=len(self._bloom.layers))
+
+    def start(self, scheduler):
+        scheduler.add_job(
+            self.warm, "date",
+            id="event_id_filter_warm", replace_existing=True
+        )
+        scheduler.add_job(
+            self.persist, "interval",
+            seconds=settings.EVENT_ID_FILTER_PERSIST_SECONDS,
+            id="event_id_filter_persist", replace_existing=True,
+            max_instances=1, coalesce=True
+        )
+
+    def stop(self):
+        try:
+            self.persist()
+        except Exception as e:
+            error(f"Persisting event_id filter failed: {e}")
+
+
+event_id_filter = EventIdFilter()
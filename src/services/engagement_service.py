@@ -0,0 +1,157 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from src.database import SessionLocal
+from src.logger import log, error
+from src.models import QuestionsWeeklyAggr, EngagementDigest
+from src.sketches import TDigest
+
+
+class EngagementService:
+    """
+    Where a student sits against their class: per (class, subject, week)
+    t-digests of per-profile question counts, built from questions_weekly_aggr
+    once a week is aggregated. Percentile queries merge the digests of the
+    requested weeks, so their cost depends on the number of weeks, not the
+    cohort size.
+
+    Only profiles that asked at least one question in a week are in that
+    week's digest.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+
+    def build_week(self, db: Session, week: date) -> int:
+        rows = db.query(
+            QuestionsWeeklyAggr.class_name,
+            QuestionsWeeklyAggr.subject,
+            QuestionsWeeklyAggr.profile_id,
+            func.sum(QuestionsWeeklyAggr.count).label('count')
+        ).filter(
+            QuestionsWeeklyAggr.date == week
+        ).group_by(
+            QuestionsWeeklyAggr.class_name,
+            QuestionsWeeklyAggr.subject,
+            QuestionsWeeklyAggr.profile_id
+        ).all()
+
+        digests: Dict[Tuple[str, str], TDigest] = {}
+        for row in rows:
+            if not row.class_name or not row.subject or not row.profile_id:
+                continue
+            key = (row.class_name, row.subject)
+            digest = digests.get(key)
+            if digest is None:
+                digest = digests[key] = TDigest()
+            digest.add(row.count or 0)
+
+        db.query(EngagementDigest).filter(EngagementDigest.week_start == week).delete(synchronize_session=False)
+        now = datetime.utcnow()
+        if not digests:
+            # Records that the week was built, so it is not rebuilt on every run
+            db.add(EngagementDigest(week_start=week, profiles=0, digest=None, updated_at=now))
+        for (class_name, subject), digest in digests.items():
+            db.add(EngagementDigest(
+                class_name=class_name,
+                subject=subject,
+                week_start=week,
+                profiles=int(digest.total),
+                digest=digest.to_dict(),
+                updated_at=now
+            ))
+        db.commit()
+        return len(digests)
+
+    def stale_weeks(self, db: Session) -> List[date]:
+        """Aggregated weeks with no digest yet, or with aggregates inserted or updated since it was built."""
+        aggregated = dict(db.query(
+            QuestionsWeeklyAggr.date,
+            func.max(func.coalesce(QuestionsWeeklyAggr.updated_at, QuestionsWeeklyAggr.created_at))
+        ).group_by(QuestionsWeeklyAggr.date).all())
+        built = dict(db.query(
+            EngagementDigest.week_start,
+            func.min(EngagementDigest.updated_at)
+        ).group_by(EngagementDigest.week_start).all())
+
+        return sorted(
+            week for week, aggregated_at in aggregated.items()
+            if week is not None and (
+                week not in built or (aggregated_at and built[week] and aggregated_at > built[week])
+            )
+        )
+
+    def build_missing(self):
+        """Scheduled catch-up after the weekly aggregation job has run."""
+        db = self.session_factory()
+        try:
+            weeks = self.stale_weeks(db)
+            for week in weeks:
+                self.build_week(db, week)
+            if weeks:
+                log(f"Built engagement digests for {len(weeks)} weeks")
+        except Exception as e:
+            db.rollback()
+            error(f"Building engagement digests failed: {e}")
+        finally:
+            db.close()
+
+    def percentiles(
+        self,
+        db: Session,
+        class_name: str,
+        subject: str,
+        start: date,
+        end: date,
+        quantiles: List[float],
+        profile_id: Optional[str] = None
+    ) -> dict:
+        rows = db.query(EngagementDigest.digest).filter(
+            EngagementDigest.class_name == class_name,
+            EngagementDigest.subject == subject,
+            EngagementDigest.week_start >= start,
+            EngagementDigest.week_start < end
+        ).all()
+
+        merged = TDigest()
+        for row in rows:
+            if row.digest:
+                merged.merge(TDigest.from_dict(row.digest))
+
+        result = {
+            "samples": int(merged.total),
+            "quantiles": [{"q": q, "value": self._round(merged.quantile(q))} for q in quantiles],
+        }
+
+        if profile_id:
+            # The student's own average over the weeks they were active in the range
+            counts = [count for (count,) in db.query(func.sum(QuestionsWeeklyAggr.count)).filter(
+                QuestionsWeeklyAggr.profile_id == profile_id,
+                QuestionsWeeklyAggr.class_name == class_name,
+                QuestionsWeeklyAggr.subject == subject,
+                QuestionsWeeklyAggr.date >= start,
+                QuestionsWeeklyAggr.date < end
+            ).group_by(QuestionsWeeklyAggr.date).all()]
+            average = sum(counts) / len(counts) if counts else 0.0
+            result["profile_weekly_average"] = round(average, 2)
+            result["profile_percentile"] = self._round(merged.cdf(average) * 100 if counts and merged.total else None)
+        return result
+
+    @staticmethod
+    def _round(value):
+        return round(value, 2) if value is not None else None
+
+    def start(self, scheduler):
+        scheduler.add_job(
+            self.build_missing, "interval",
+            hours=1,
+            next_run_time=datetime.now(scheduler.timezone) + timedelta(minutes=1),
+            id="engagement_digest_build", replace_existing=True,
+            max_instances=1, coalesce=True
+        )
+
+
+engagement_service = EngagementService()
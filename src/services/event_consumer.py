@@ -0,0 +1,321 @@
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional
+
+from sqlalchemy.exc import OperationalError
+
+from src.config import settings
+from src.database import SessionLocal
+from src.logger import log, warning, error
+from src.metrics import register_collector
+from src.services.ingest_service import ingest_service
+from src.services.shard_service import shard_service
+
+
+def is_lock_error(exc: Exception) -> bool:
+    message = str(exc).lower()
+    return isinstance(exc, OperationalError) and ("locked" in message or "busy" in message or "lock timeout" in message)
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class AimdController:
+    """
+    Additive-increase / multiplicative-decrease control of receive-loop
+    concurrency and receive batch size for one queue.
+
+    - lock timeouts, or p90 commit latency above twice the target: halve both
+    - backlog beyond what the current loops drain in one interval and
+      latency within target: grow the batch first, then add a loop
+    - empty queue: shed one loop at a time
+    """
+
+    def __init__(
+        self,
+        min_workers: int = settings.CONSUMER_MIN_WORKERS,
+        max_workers: int = settings.CONSUMER_MAX_WORKERS,
+        min_batch: int = settings.CONSUMER_MIN_BATCH,
+        max_batch: int = settings.CONSUMER_MAX_BATCH,
+        target_commit_ms: float = settings.CONSUMER_TARGET_COMMIT_MS
+    ):
+        self.min_workers, self.max_workers = min_workers, max_workers
+        self.min_batch, self.max_batch = min_batch, max_batch
+        self.target_commit_ms = target_commit_ms
+        self.workers = min_workers
+        self.batch_size = min_batch
+        self.last_decision = "start"
+
+    def observe(self, queue_depth: Optional[int], commit_p90_ms: Optional[float], lock_errors: int) -> str:
+        overloaded = lock_errors > 0 or (commit_p90_ms is not None and commit_p90_ms > 2 * self.target_commit_ms)
+        healthy = commit_p90_ms is None or commit_p90_ms <= self.target_commit_ms
+
+        if overloaded:
+            self.workers = max(self.min_workers, self.workers // 2)
+            self.batch_size = max(self.min_batch, self.batch_size // 2)
+            decision = "decrease"
+        elif queue_depth and queue_depth > self.workers * self.batch_size and healthy:
+            if self.batch_size < self.max_batch:
+                self.batch_size += 1
+                decision = "increase_batch"
+            elif self.workers < self.max_workers:
+                self.workers += 1
+                decision = "increase_workers"
+            else:
+                decision = "hold_at_max"
+        elif queue_depth == 0 and self.workers > self.min_workers:
+            self.workers -= 1
+            decision = "idle_shrink"
+        else:
+            decision = "hold"
+        self.last_decision = decision
+        return decision
+
+    def snapshot(self) -> dict:
+        return {"workers": self.workers, "batch_size": self.batch_size, "last_decision": self.last_decision}
+
+
+class QueueConsumer:
+    """
+    Receive loops for one SQS queue feeding ingest_service. The number of
+    loops and the receive batch size follow the queue's AimdController,
+    which is fed queue depth (ApproximateNumberOfMessages), commit latency
+    and lock-timeout counts every CONSUMER_CONTROL_SECONDS.
+
+    Messages are deleted only once stored (or rejected as unparseable);
+    anything that failed on a lock is left for redelivery.
+    """
+
+    def __init__(self, name: str, client, queue_url: str, controller: AimdController = None,
+                 session_factory=SessionLocal, wait_seconds: int = settings.CONSUMER_WAIT_SECONDS):
+        self.name = name
+        self.client = client
+        self.queue_url = queue_url
+        self.controller = controller or AimdController()
+        self.session_factory = session_factory
+        self.wait_seconds = wait_seconds
+        self._threads: Dict[int, threading.Thread] = {}
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._latencies: Deque[float] = deque(maxlen=1000)
+        self._lock_errors = 0
+        self.queue_depth: Optional[int] = None
+        self.commit_p90_ms: Optional[float] = None
+        self.processed = 0
+        self.failed = 0
+        self.delete_failures = 0
+
+    # --- Receive loops ---
+
+    def _run(self, slot: int):
+        while not self._stop.is_set() and slot < self.controller.workers:
+            try:
+                response = self.client.receive_message(
+                    QueueUrl=self.queue_url,
+                    MaxNumberOfMessages=self.controller.batch_size,
+                    WaitTimeSeconds=self.wait_seconds
+                )
+            except Exception as e:
+                error(f"Receiving from {self.name} failed: {e}")
+                self._stop.wait(5)
+                continue
+            messages = response.get("Messages", [])
+            if messages:
+                self.process(messages)
+        with self._lock:
+            self._threads.pop(slot, None)
+
+    def process(self, messages: List[dict]):
+        done = []
+        # One session per database written to: the main one, or each shard the batch touches
+        sessions = {}
+        try:
+            for message in messages:
+                try:
+                    event = self._parse(message["Body"])
+                except ValueError as e:
+                    error(f"Dropping unparseable message on {self.name}: {e}")
+                    done.append(message)
+                    continue
+
+                factory = shard_service.writer(event.get("user_id")) or self.session_factory
+                db = sessions.get(factory)
+                if db is None:
+                    db = sessions[factory] = factory()
+
+                started = time.perf_counter()
+                try:
+                    ingest_service.save_event(db, event)
+                except Exception as e:
+                    db.rollback()
+                    with self._lock:
+                        self.failed += 1
+                        if is_lock_error(e):
+                            self._lock_errors += 1
+                    warning(f"Storing event {event.get('event_id')} from {self.name} failed, will be redelivered: {e}")
+                    continue
+                with self._lock:
+                    self._latencies.append((time.perf_counter() - started) * 1000)
+                    self.processed += 1
+                done.append(message)
+        finally:
+            for db in sessions.values():
+                db.close()
+
+        if done:
+            self._delete(done)
+
+    def _delete_batch(self, messages: List[dict]) -> List[dict]:
+        response = self.client.delete_message_batch(
+            QueueUrl=self.queue_url,
+            Entries=[{"Id": str(i), "ReceiptHandle": m["ReceiptHandle"]} for i, m in enumerate(messages)]
+        ) or {}
+        return [dict(f, message=messages[int(f["Id"])]) for f in response.get("Failed", [])]
+
+    def _delete(self, messages: List[dict]):
+        """Delete handled messages. Server-side failures get one more try; the rest are redelivered and deduplicated."""
+        failed = self._delete_batch(messages)
+        retry = [f["message"] for f in failed if not f.get("SenderFault")]
+        if retry:
+            failed = [f for f in failed if f.get("SenderFault")] + self._delete_batch(retry)
+        if failed:
+            with self._lock:
+                self.delete_failures += len(failed)
+            codes = ", ".join(sorted({f.get("Code", "?") for f in failed}))
+            warning(f"{len(failed)} handled messages on {self.name} were not deleted ({codes}); they will be redelivered")
+
+    @staticmethod
+    def _parse(body: str) -> dict:
+        event = json.loads(body)
+        # SNS -> SQS fan-out wraps the event in an envelope
+        if isinstance(event, dict) and "event_type" not in event and isinstance(event.get("Message"), str):
+            event = json.loads(event["Message"])
+        if not isinstance(event, dict):
+            raise ValueError("message body is not a JSON object")
+        return event
+
+    # --- Control ---
+
+    def _scale(self):
+        with self._lock:
+            for slot in range(self.controller.workers):
+                if slot not in self._threads and not self._stop.is_set():
+                    thread = threading.Thread(target=self._run, args=(slot,), name=f"{self.name}-{slot}", daemon=True)
+                    self._threads[slot] = thread
+                    thread.start()
+
+    def control(self) -> str:
+        try:
+            attributes = self.client.get_queue_attributes(
+                QueueUrl=self.queue_url, AttributeNames=["ApproximateNumberOfMessages"]
+            )["Attributes"]
+            self.queue_depth = int(attributes["ApproximateNumberOfMessages"])
+        except Exception as e:
+            warning(f"Reading depth of {self.name} failed: {e}")
+            self.queue_depth = None
+
+        with self._lock:
+            latencies = list(self._latencies)
+            self._latencies.clear()
+            lock_errors, self._lock_errors = self._lock_errors, 0
+        self.commit_p90_ms = percentile(latencies, 0.9)
+
+        before = (self.controller.workers, self.controller.batch_size)
+        decision = self.controller.observe(self.queue_depth, self.commit_p90_ms, lock_errors)
+        if (self.controller.workers, self.controller.batch_size) != before:
+            log(f"{self.name}: {decision} to {self.controller.workers} loops x {self.controller.batch_size} "
+                f"(depth={self.queue_depth}, p90={self.commit_p90_ms}, lock_errors={lock_errors})")
+        self._scale()
+        return decision
+
+    def start(self):
+        self._stop.clear()
+        self._scale()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            running = len(self._threads)
+        return dict(
+            self.controller.snapshot(),
+            running=running,
+            queue_depth=self.queue_depth,
+            commit_p90_ms=round(self.commit_p90_ms, 2) if self.commit_p90_ms is not None else None,
+            processed=self.processed,
+            failed=self.failed,
+            delete_failures=self.delete_failures
+        )
+
+
+class EventConsumerService:
+    """Consumers for tutor_queue and tutor_examiner_queue, driven by the shared scheduler."""
+
+    def __init__(self):
+        self.consumers: List[QueueConsumer] = []
+        register_collector("consumers", self.stats)
+
+    def _client(self):
+        import boto3
+        return boto3.client(
+            "sqs",
+            region_name=settings.AWS_REGION,
+            endpoint_url=settings.SQS_ENDPOINT_URL or None
+        )
+
+    def start(self, scheduler, client=None):
+        if not settings.CONSUMER_ENABLED:
+            return
+        # Resolving queue URLs can block on the network; keep it off the startup path
+        scheduler.add_job(
+            self._connect, "date", args=[scheduler, client],
+            id="consumer_connect", replace_existing=True
+        )
+
+    def _connect(self, scheduler, client=None):
+        """Start a consumer for every queue that has none; retried until all queues resolve."""
+        client = client or self._client()
+        consumed = {consumer.name for consumer in self.consumers}
+        unresolved = []
+        for queue_name in (settings.TUTOR_QUEUE_NAME, settings.EXAMINER_QUEUE_NAME):
+            if queue_name in consumed:
+                continue
+            try:
+                queue_url = client.get_queue_url(QueueName=queue_name)["QueueUrl"]
+            except Exception as e:
+                error(f"Not consuming {queue_name} yet, retrying in {settings.CONSUMER_CONNECT_RETRY_SECONDS}s: {e}")
+                unresolved.append(queue_name)
+                continue
+            consumer = QueueConsumer(queue_name, client, queue_url)
+            consumer.start()
+            scheduler.add_job(
+                consumer.control, "interval",
+                seconds=settings.CONSUMER_CONTROL_SECONDS,
+                id=f"consumer_control_{queue_name}", replace_existing=True,
+                max_instances=1, coalesce=True
+            )
+            self.consumers.append(consumer)
+        if unresolved:
+            scheduler.add_job(
+                self._connect, "date", args=[scheduler, client],
+                run_date=datetime.now(scheduler.timezone) + timedelta(seconds=settings.CONSUMER_CONNECT_RETRY_SECONDS),
+                id="consumer_connect", replace_existing=True
+            )
+
+    def stop(self):
+        for consumer in self.consumers:
+            consumer.stop()
+
+    def stats(self) -> dict:
+        return {consumer.name: consumer.stats() for consumer in self.consumers}
+
+
+event_consumer_service = EventConsumerService()
@@ -0,0 +1,124 @@
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.business_time import local_day
+from src.models import QuestionsAsked, TestPapers
+from src.logger import log, warning, error
+from src.services.dedupe_service import event_id_filter
+from src.services.shard_service import shard_service
+
+QUESTION_ASKED = "QUESTION_ASKED"
+TEST_PAPER_GENERATED = "TEST_PAPER_GENERATED"
+
+EVENT_MODELS = {
+    QUESTION_ASKED: QuestionsAsked,
+    TEST_PAPER_GENERATED: TestPapers,
+}
+
+# listener(event_type, row) is called after the row has been committed
+IngestListener = Callable[[str, object], None]
+# handler(event) consumes event types that have no raw table of their own
+EventHandler = Callable[[dict], None]
+
+
+def parse_timestamp(value) -> datetime:
+    """
+    Parse an event timestamp into a naive UTC datetime (the storage convention).
+    """
+    if isinstance(value, datetime):
+        ts = value
+    elif value:
+        ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    else:
+        return datetime.utcnow()
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+class IngestService:
+    """
+    Single write path for raw insight events coming off the SQS queues.
+    Components that keep derived state (caches, sketches) register a listener
+    and are notified once per committed row.
+    """
+
+    def __init__(self):
+        self._listeners: List[IngestListener] = []
+        self._handlers: Dict[str, EventHandler] = {}
+
+    def add_listener(self, listener: IngestListener):
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: IngestListener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def register_handler(self, event_type: str, handler: EventHandler):
+        self._handlers[event_type] = handler
+
+    def build_row(self, event: dict):
+        model = EVENT_MODELS.get(event.get("event_type"))
+        if model is None:
+            return None
+        timestamp = parse_timestamp(event.get("timestamp"))
+        return model(
+            event_id=event.get("event_id"),
+            user_id=event.get("user_id"),
+            profile_id=event.get("profile_id"),
+            class_name=event.get("class_name"),
+            subject=event.get("subject"),
+            data=event.get("data"),
+            timestamp=timestamp,
+            local_date=local_day(timestamp),
+        )
+
+    def save_event(self, db: Session, event: dict) -> Optional[object]:
+        """
+        Persist one event. Returns the stored row, or None when the event
+        is unknown or a duplicate (event_id is unique).
+        """
+        event_type = event.get("event_type")
+        handler = self._handlers.get(event_type)
+        if handler is not None:
+            handler(event)
+            return None
+
+        row = self.build_row(event)
+        if row is None:
+            warning(f"Ignoring event with unknown type {event_type}")
+            return None
+
+        table = row.__tablename__
+        # Redeliveries are usually caught here without an insert attempt
+        if event_id_filter.is_duplicate(db, table, row.event_id):
+            log(f"Duplicate event {row.event_id} skipped")
+            return None
+
+        db.add(row)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            event_id_filter.add(table, row.event_id)
+            log(f"Duplicate event {event.get('event_id')} skipped")
+            return None
+
+        event_id_filter.add(table, row.event_id, row.id, shard_service.member_of(db))
+
+        self.notify(event_type, row)
+        return row
+
+    def notify(self, event_type: str, row):
+        for listener in list(self._listeners):
+            try:
+                listener(event_type, row)
+            except Exception as e:
+                error(f"Ingest listener {getattr(listener, '__qualname__', listener)} failed: {e}")
+
+
+ingest_service = IngestService()
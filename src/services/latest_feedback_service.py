@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.models import Feedback
+from src.schemas import FeedbackOut
+
+
+class _ProfileEntry:
+    def __init__(self):
+        self.subjects: Dict[str, FeedbackOut] = {}
+        # True once every subject of the profile has been loaded (by get_all)
+        self.complete = False
+
+
+class LatestFeedbackService:
+    """
+    Latest feedback per profile and subject, read through the is_latest
+    pointer (moved by the trg_feedback_latest trigger on every insert, so
+    rows written directly by the weekly generator count too) and cached per
+    profile.
+
+    Cache validity follows the newest feedback id: at most every
+    FEEDBACK_CACHE_CHECK_SECONDS a read checks MAX(id), and profiles that
+    got feedback since the last check are dropped from the cache.
+    """
+
+    def __init__(self, max_profiles: int = settings.FEEDBACK_CACHE_SIZE,
+                 check_seconds: float = settings.FEEDBACK_CACHE_CHECK_SECONDS):
+        self.max_profiles = max_profiles
+        self.check_seconds = check_seconds
+        self._cache: "OrderedDict[str, _ProfileEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Newest feedback id seen by the last check, and when that was
+        self._newest_id: Optional[int] = None
+        self._checked_at: Optional[float] = None
+        # Bumped on every invalidation; a load that straddles one is not cached
+        self._generation = 0
+
+    def _entry(self, profile_id: str) -> _ProfileEntry:
+        """Cached entry for the profile, created (evicting the least recent) if needed."""
+        entry = self._cache.get(profile_id)
+        if entry is None:
+            entry = _ProfileEntry()
+            self._cache[profile_id] = entry
+            while len(self._cache) > self.max_profiles:
+                self._cache.popitem(last=False)
+        self._cache.move_to_end(profile_id)
+        return entry
+
+    def _check(self, db: Session):
+        """Drop cached profiles that got feedback since the last check."""
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.check_seconds:
+                return
+            self._checked_at = now
+            seen = self._newest_id
+
+        newest = db.query(func.max(Feedback.id)).scalar()
+        if newest == seen:
+            return
+        profiles = []
+        if seen is not None:
+            # Served by the primary key: only rows written since the last check
+            profiles = [profile_id for (profile_id,) in db.query(Feedback.profile_id).filter(
+                Feedback.id > seen
+            ).distinct()]
+        with self._lock:
+            self._newest_id = newest
+            for profile_id in profiles:
+                self._cache.pop(profile_id, None)
+            self._generation += 1
+
+    def get_latest(self, db: Session, profile_id: str, subject: str) -> Optional[FeedbackOut]:
+        self._check(db)
+        with self._lock:
+            entry = self._entry(profile_id)
+            if subject in entry.subjects or entry.complete:
+                return entry.subjects.get(subject)
+            generation = self._generation
+
+        # Served by ix_feedback_latest; the sort only matters for rows written before the pointer existed
+        row = db.query(Feedback).filter(
+            Feedback.profile_id == profile_id,
+            Feedback.subject == subject,
+            Feedback.is_latest == True
+        ).order_by(Feedback.created_at.desc()).first()
+        if row is None:
+            return None
+
+        feedback = FeedbackOut.model_validate(row)
+        with self._lock:
+            if self._generation == generation:
+                self._entry(profile_id).subjects[subject] = feedback
+        return feedback
+
+    def get_all(self, db: Session, profile_id: str) -> List[FeedbackOut]:
+        self._check(db)
+        with self._lock:
+            entry = self._entry(profile_id)
+            if entry.complete:
+                return sorted(entry.subjects.values(), key=lambda f: f.subject or "")
+            generation = self._generation
+
+        rows = db.query(Feedback).filter(
+            Feedback.profile_id == profile_id,
+            Feedback.is_latest == True
+        ).order_by(Feedback.subject).all()
+        feedback = [FeedbackOut.model_validate(row) for row in rows]
+
+        with self._lock:
+            if self._generation == generation:
+                entry = self._entry(profile_id)
+                entry.subjects = {f.subject: f for f in feedback}
+                entry.complete = True
+        return feedback
+
+    def save(self, db: Session, profile_id: str, subject: str, feedback_text: str,
+             created_at: Optional[datetime] = None) -> Feedback:
+        """Write a new feedback row; the insert trigger moves the latest pointer."""
+        row = Feedback(
+            profile_id=profile_id,
+            subject=subject,
+            feedback_text=feedback_text,
+            created_at=created_at or datetime.utcnow()
+        )
+        db.add(row)
+        db.commit()
+        self.invalidate(profile_id)
+        return row
+
+    def invalidate(self, profile_id: Optional[str] = None):
+        with self._lock:
+            if profile_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(profile_id, None)
+            self._generation += 1
+
+
+latest_feedback_service = LatestFeedbackService()
@@ -0,0 +1,314 @@
+import asyncio
+import json
+import threading
+import time
+from collections import Counter
+from datetime import date
+from typing import Dict, List, Optional, Set
+
+from src.business_time import business_today, local_day
+from src.config import settings
+from src.database import SessionLocal
+from src.logger import log, warning, error
+from src.metrics import register_collector
+from src.services.ingest_service import ingest_service, QUESTION_ASKED, TEST_PAPER_GENERATED
+from src.services.rollup_service import METRIC_MODELS
+from src.services.shard_service import shard_service
+from src.services.stats_service import stats_service
+
+METRICS = {QUESTION_ASKED: "questions", TEST_PAPER_GENERATED: "test_papers"}
+
+# Queued to a client in place of its backlog once it falls behind
+RESYNC = object()
+
+
+def _key(class_name: Optional[str], subject: Optional[str]) -> str:
+    return f"{class_name or ''}|{subject or ''}"
+
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _summary(metric: str, row) -> dict:
+    return {
+        "metric": metric,
+        "event_id": row.event_id,
+        "profile_id": row.profile_id,
+        "class_name": row.class_name,
+        "subject": row.subject,
+        "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+    }
+
+
+class LiveClient:
+    """One open /stream connection: a bounded queue owned by its event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_queue: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.resyncs = 0
+
+    def offer(self, message: dict):
+        """Runs on the client's loop. A full queue means the client is too slow: drop its backlog."""
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            self.resyncs += 1
+
+
+class LiveFeed:
+    """
+    Pushes dashboard changes to /api/insights/stream clients instead of
+    having every open console poll /stats/* and the first pages of events.
+
+    Committed rows (via the ingest listener) are coalesced for
+    LIVE_FLUSH_SECONDS into one delta message: per (class, subject) count
+    increments and summaries of the newest events. With LIVE_REDIS_URL set,
+    deltas go through Redis pub/sub so every replica sees every replica's
+    events; otherwise they are fanned out in-process.
+
+    The feed also applies each delta to an in-memory snapshot (the /stats
+    dashboard, by-subject counts and newest events), so connecting and
+    resyncing clients are served without touching the database. The
+    snapshot is re-read from the database only on first use, at day
+    rollover and every LIVE_RESEED_MINUTES while clients are connected.
+    Each delta carries the time its rows were taken from the pending
+    counters; a seed first flushes what is pending, and deltas taken up to
+    then are not applied to the new snapshot, which already read their rows.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+        self._clients: Set[LiveClient] = set()
+        self._pending: Dict[str, Counter] = {metric: Counter() for metric in METRICS.values()}
+        self._pending_events: List[dict] = []
+        # Events timestamped before today, by day: they move the yesterday / last-7-days counts
+        self._pending_late: Dict[str, Counter] = {metric: Counter() for metric in METRICS.values()}
+        self._snapshot: Optional[dict] = None
+        # Deltas taken at or before this were committed before the snapshot was read
+        self._seeded_at = 0.0
+        self._seq = 0
+        self._redis = None
+        self._subscriber: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.deltas_sent = 0
+        self._closed_resyncs = 0
+        ingest_service.add_listener(self._on_event)
+        register_collector("live", self.stats)
+
+    # --- Ingest side ---
+
+    def _on_event(self, event_type: str, row):
+        metric = METRICS.get(event_type)
+        if metric is None:
+            return
+        with self._lock:
+            self._pending[metric][_key(row.class_name, row.subject)] += 1
+            self._pending_events.append(_summary(metric, row))
+            if len(self._pending_events) > settings.LIVE_MAX_EVENTS:
+                del self._pending_events[0]
+            if row.timestamp and local_day(row.timestamp) < business_today():
+                self._pending_late[metric][local_day(row.timestamp).isoformat()] += 1
+
+    def flush(self) -> float:
+        """Publish what was committed since the last flush as one delta. Returns when it was taken."""
+        with self._lock:
+            taken_at = time.time()
+            counts = {metric: dict(counter) for metric, counter in self._pending.items() if counter}
+            late = {metric: dict(counter) for metric, counter in self._pending_late.items() if counter}
+            events = self._pending_events
+            self._pending = {metric: Counter() for metric in METRICS.values()}
+            self._pending_late = {metric: Counter() for metric in METRICS.values()}
+            self._pending_events = []
+        if counts:
+            message = {"counts": counts, "late": late, "events": events, "taken_at": taken_at}
+            if self._redis is not None:
+                try:
+                    self._redis.publish(settings.LIVE_REDIS_CHANNEL, json.dumps(message))
+                    return taken_at
+                except Exception as e:
+                    warning(f"Publishing live delta to Redis failed, delivering locally: {e}")
+            self.deliver(message)
+        return taken_at
+
+    # --- Fan-out side ---
+
+    def deliver(self, message: dict):
+        """Apply a delta to the snapshot and queue it for every connected client."""
+        with self._lock:
+            self._seq += 1
+            message = dict(message, seq=self._seq)
+            if self._snapshot is not None:
+                if message.get("taken_at", self._seeded_at + 1) > self._seeded_at:
+                    self._apply(self._snapshot, message)
+                self._snapshot["seq"] = self._seq
+            clients = list(self._clients)
+        for client in clients:
+            client.loop.call_soon_threadsafe(client.offer, message)
+        self.deltas_sent += 1
+
+    @staticmethod
+    def _apply(snapshot: dict, message: dict):
+        for event in message["events"]:
+            recent = snapshot["recent"][event["metric"]]
+            recent.insert(0, event)
+            del recent[settings.LIVE_MAX_EVENTS:]
+
+        today = date.fromisoformat(snapshot["day"])
+        dashboard = snapshot["dashboard"]
+        for metric, counts in message["counts"].items():
+            by_subject = snapshot[metric]
+            for key, count in counts.items():
+                by_subject[key] = by_subject.get(key, 0) + count
+            dashboard[f"total_{metric}"] += sum(counts.values())
+        # Only late events land in the closed yesterday / last-7-days windows
+        for metric, days in message.get("late", {}).items():
+            for day, count in days.items():
+                age = (today - date.fromisoformat(day)).days
+                if age == 1:
+                    dashboard[f"{metric}_yesterday"] += count
+                if 1 <= age <= 7:
+                    dashboard[f"{metric}_last_7_days"] += count
+
+    def subscribe(self, loop: asyncio.AbstractEventLoop) -> LiveClient:
+        client = LiveClient(loop, settings.LIVE_CLIENT_QUEUE)
+        with self._lock:
+            self._clients.add(client)
+        return client
+
+    def unsubscribe(self, client: LiveClient):
+        with self._lock:
+            self._clients.discard(client)
+            self._closed_resyncs += client.resyncs
+
+    # --- Snapshot ---
+
+    def seed(self, today: Optional[date] = None):
+        """(Re)read the snapshot from the database."""
+        today = today or business_today()
+        # Rows still pending are already committed, so the read below counts them
+        seeded_at = self.flush()
+        db = self.session_factory()
+        try:
+            snapshot = {
+                "day": today.isoformat(),
+                "dashboard": stats_service.dashboard(db, today),
+                "questions": {_key(*k): v for k, v in stats_service.class_subject_counts(db, "questions").items()},
+                "test_papers": {_key(*k): v for k, v in stats_service.class_subject_counts(db, "test_papers").items()},
+                "recent": {
+                    # Across the read set: while sharded, new rows only land on the shards
+                    metric: [
+                        _summary(metric, row) for row in shard_service.page(
+                            db, model, model.timestamp, descending=True, limit=settings.LIVE_MAX_EVENTS
+                        )[0]
+                    ]
+                    for metric, model in METRIC_MODELS.items()
+                },
+            }
+        finally:
+            db.close()
+        with self._lock:
+            snapshot["seq"] = self._seq
+            self._snapshot = snapshot
+            self._seeded_at = seeded_at
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            current = self._snapshot
+        if current is None or current["day"] != business_today().isoformat():
+            self.seed()
+        with self._lock:
+            return json.loads(json.dumps(self._snapshot))
+
+    def reseed(self):
+        with self._lock:
+            connected = bool(self._clients)
+        if connected:
+            self.seed()
+            with self._lock:
+                clients = list(self._clients)
+            for client in clients:
+                client.loop.call_soon_threadsafe(client.offer, RESYNC)
+
+    async def stream(self, request):
+        """SSE generator for one client: a snapshot, then deltas; a new snapshot after falling behind."""
+        client = self.subscribe(asyncio.get_running_loop())
+        try:
+            yield format_sse("snapshot", await asyncio.to_thread(self.snapshot))
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(client.queue.get(), timeout=settings.LIVE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if message is RESYNC:
+                    yield format_sse("snapshot", await asyncio.to_thread(self.snapshot))
+                else:
+                    yield format_sse("delta", message)
+        finally:
+            self.unsubscribe(client)
+
+    # --- Redis ---
+
+    def _listen(self, pubsub):
+        while not self._stop.is_set():
+            try:
+                item = pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if item is not None:
+                    self.deliver(json.loads(item["data"]))
+            except Exception as e:
+                error(f"Live feed Redis subscription failed: {e}")
+                self._stop.wait(5)
+
+    def _connect_redis(self):
+        try:
+            import redis
+            client = redis.Redis.from_url(settings.LIVE_REDIS_URL)
+            pubsub = client.pubsub()
+            pubsub.subscribe(settings.LIVE_REDIS_CHANNEL)
+        except Exception as e:
+            error(f"Live feed Redis unavailable, fanning out in-process only: {e}")
+            return
+        self._redis = client
+        self._subscriber = threading.Thread(target=self._listen, args=(pubsub,), name="live-feed-redis", daemon=True)
+        self._subscriber.start()
+        log(f"Live feed fan-out through Redis channel {settings.LIVE_REDIS_CHANNEL}")
+
+    def start(self, scheduler):
+        if settings.LIVE_REDIS_URL:
+            self._connect_redis()
+        scheduler.add_job(
+            self.flush, "interval",
+            seconds=settings.LIVE_FLUSH_SECONDS,
+            id="live_feed_flush", replace_existing=True,
+            max_instances=1, coalesce=True
+        )
+        scheduler.add_job(
+            self.reseed, "interval",
+            minutes=settings.LIVE_RESEED_MINUTES,
+            id="live_feed_reseed", replace_existing=True,
+            max_instances=1, coalesce=True
+        )
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            clients = len(self._clients)
+            resyncs = self._closed_resyncs + sum(client.resyncs for client in self._clients)
+        return {
+            "clients": clients,
+            "seq": self._seq,
+            "deltas_sent": self.deltas_sent,
+            "slow_client_resyncs": resyncs,
+            "redis": self._redis is not None,
+        }
+
+
+live_feed = LiveFeed()
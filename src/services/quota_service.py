@@ -0,0 +1,160 @@
+import asyncio
+import time
+import weakref
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional
+
+from src.config import settings
+from src.logger import warning, error
+from src.metrics import register_collector
+
+FEEDBACK_FEATURE = "BASIC_FEEDBACK_REPORT"
+
+
+class AccountsServiceError(Exception):
+    """The accounts service could not answer and there was no cached answer to fall back on."""
+
+
+class AccountsClient:
+    """
+    Keep-alive HTTP client for the accounts service. One pooled
+    aiohttp.ClientSession per event loop (the app loop, plus any loop a
+    background job runs on) instead of a session per call.
+    """
+
+    def __init__(self, base_url: str = settings.ACCOUNTS_SERVICE_URL):
+        self.base_url = base_url.rstrip("/")
+        self._sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+
+    def _session(self):
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=settings.ACCOUNTS_POOL_SIZE, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=settings.ACCOUNTS_TIMEOUT_SECONDS)
+            )
+            self._sessions[loop] = session
+        return session
+
+    async def has_feature(self, feature: str, token: Optional[str]) -> bool:
+        """Whether the user owning `token` has `feature` on their plan."""
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        async with self._session().get(f"{self.base_url}/features/{feature}", headers=headers) as response:
+            if response.status in (402, 403, 404):
+                return False
+            if response.status != 200:
+                raise AccountsServiceError(f"accounts service returned {response.status}")
+            body = await response.json()
+        return bool(body.get("enabled") if isinstance(body, dict) else body)
+
+    async def profiles_with_feature(self, feature: str) -> List[str]:
+        async with self._session().get(f"{self.base_url}/features/profiles/{feature}") as response:
+            if response.status != 200:
+                raise AccountsServiceError(f"accounts service returned {response.status}")
+            return list(await response.json())
+
+    async def close(self):
+        for session in list(self._sessions.values()):
+            await session.close()
+        self._sessions.clear()
+
+
+class _Entry:
+    __slots__ = ("value", "fresh_until", "stale_until")
+
+    def __init__(self, value, fresh_until: float, stale_until: float):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class QuotaService:
+    """
+    Feature entitlements from the accounts service, cached per (user,
+    feature) so the common case costs no cross-service round trip.
+
+    - fresh for QUOTA_CACHE_TTL_SECONDS (QUOTA_NEGATIVE_TTL_SECONDS for a
+      "no", so upgrades show up quickly)
+    - then served stale for up to QUOTA_STALE_SECONDS while one background
+      refresh runs; also served stale if that refresh fails
+    - concurrent misses for the same key share one upstream call
+    """
+
+    def __init__(self, client: AccountsClient = None, clock: Callable[[], float] = time.monotonic):
+        self.client = client or AccountsClient()
+        self.clock = clock
+        self._cache: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        # In-flight lookups, per event loop so futures are only awaited on their own loop
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "upstream_calls": 0, "errors": 0}
+        register_collector("quota", self.stats)
+
+    async def check_feature(self, user_id: str, feature: str = FEEDBACK_FEATURE, token: Optional[str] = None) -> bool:
+        return await self._get(("feature", user_id, feature), lambda: self.client.has_feature(feature, token))
+
+    async def profiles_with_feature(self, feature: str = FEEDBACK_FEATURE) -> List[str]:
+        return await self._get(("profiles", feature), lambda: self.client.profiles_with_feature(feature))
+
+    def invalidate(self, user_id: Optional[str] = None):
+        """Forget cached answers, for one user or everyone (e.g. after a plan change webhook)."""
+        for key in list(self._cache):
+            if user_id is None or (key[0] == "feature" and key[1] == user_id):
+                self._cache.pop(key, None)
+
+    # --- Cache ---
+
+    async def _get(self, key: Hashable, fetch: Callable[[], Awaitable]):
+        now = self.clock()
+        entry = self._cache.get(key)
+        if entry is not None and now < entry.fresh_until:
+            self.counters["hits"] += 1
+            self._cache.move_to_end(key)
+            return entry.value
+        if entry is not None and now < entry.stale_until:
+            self.counters["stale_hits"] += 1
+            self._lookup(key, fetch)  # refresh in the background
+            return entry.value
+
+        self.counters["misses"] += 1
+        return await asyncio.shield(self._lookup(key, fetch))
+
+    def _lookup(self, key: Hashable, fetch: Callable[[], Awaitable]) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.get((loop, key))
+        if inflight is not None:
+            self.counters["coalesced"] += 1
+            return inflight
+        task = loop.create_task(self._refresh(key, fetch))
+        self._inflight[(loop, key)] = task
+        task.add_done_callback(lambda _: self._inflight.pop((loop, key), None))
+        return task
+
+    async def _refresh(self, key: Hashable, fetch: Callable[[], Awaitable]):
+        self.counters["upstream_calls"] += 1
+        try:
+            value = await fetch()
+        except Exception as e:
+            self.counters["errors"] += 1
+            entry = self._cache.get(key)
+            if entry is not None and self.clock() < entry.stale_until:
+                warning(f"Accounts lookup {key} failed, serving cached answer: {e}")
+                return entry.value
+            error(f"Accounts lookup {key} failed: {e}")
+            raise AccountsServiceError(str(e)) from e
+
+        now = self.clock()
+        ttl = settings.QUOTA_CACHE_TTL_SECONDS if value else settings.QUOTA_NEGATIVE_TTL_SECONDS
+        self._cache[key] = _Entry(value, now + ttl, now + ttl + settings.QUOTA_STALE_SECONDS)
+        self._cache.move_to_end(key)
+        while len(self._cache) > settings.QUOTA_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return value
+
+    def stats(self) -> dict:
+        return dict(self.counters, entries=len(self._cache))
+
+
+quota_service = QuotaService()
@@ -0,0 +1,199 @@
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Set, Tuple
+
+from sqlalchemy.engine import Connection
+
+from src.database import SessionLocal, engine, dialect_insert
+from src.logger import log, warning
+from src.migration_helpers import get_checkpoint, save_checkpoint
+from src.business_time import local_day
+from src.services.ingest_service import EVENT_MODELS, QUESTION_ASKED, parse_timestamp
+from src.services.rollup_service import EVENT_METRICS, rollup_service, month_start
+from src.services.shard_service import shard_service
+from src.services.topics_service import top_topics_service
+from src.services.unique_students_service import unique_students_service
+
+# (start offset, end offset, raw lines)
+Chunk = Tuple[int, int, bytes]
+
+
+def iter_chunks(path: str, offset: int = 0, chunk_bytes: int = 16 << 20) -> Iterator[Chunk]:
+    """Read `path` from `offset` in blocks of about chunk_bytes, cut at line ends."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        carry = b""
+        start = offset
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+            data = carry + block
+            cut = data.rfind(b"\n")
+            if cut < 0:
+                carry = data
+                continue
+            yield start, start + cut + 1, data[:cut + 1]
+            start += cut + 1
+            carry = data[cut + 1:]
+        if carry.strip():
+            yield start, start + len(carry), carry
+
+
+def parse_chunk(chunk: Chunk) -> Tuple[int, int, Dict[str, List[dict]], int, int]:
+    """
+    Parse NDJSON lines into insert mappings per event type (runs in worker
+    processes). Returns (start, end, rows by event type, skipped, bad).
+    """
+    start, end, data = chunk
+    rows: Dict[str, List[dict]] = defaultdict(list)
+    skipped = bad = 0
+    now = datetime.utcnow()
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        try:
+            event = json.loads(line)
+            event_type = event.get("event_type")
+            if event_type not in EVENT_MODELS or not event.get("event_id"):
+                skipped += 1
+                continue
+            timestamp = parse_timestamp(event.get("timestamp"))
+            rows[event_type].append({
+                "event_id": event["event_id"],
+                "user_id": event.get("user_id"),
+                "profile_id": event.get("profile_id"),
+                "class_name": event.get("class_name"),
+                "subject": event.get("subject"),
+                "data": event.get("data"),
+                "timestamp": timestamp,
+                "local_date": local_day(timestamp),
+                "created_at": now,
+            })
+        except (ValueError, AttributeError, TypeError):
+            bad += 1
+    return start, end, dict(rows), skipped, bad
+
+
+class ReplayService:
+    """
+    Re-ingests NDJSON dumps of raw events (the shape verify_insights.py
+    publishes). Lines are parsed in a process pool, each chunk is inserted
+    in one transaction with ON CONFLICT (event_id) DO NOTHING, and the byte
+    offset reached is checkpointed in the same transaction, so an
+    interrupted replay resumes without double counting.
+
+    Only the rollup days (and unique-student months) that received new rows
+    are rebuilt at the end. Top-topic summaries of the new questions are
+    merged into topic_sketches with each chunk. Ingest listeners are
+    bypassed; in-memory state in the running app (columnar engine, caches,
+    topic summaries) catches up through its own consistency checks.
+    """
+
+    def __init__(self, bind=engine, session_factory=SessionLocal):
+        self.bind = bind
+        self.session_factory = session_factory
+
+    @staticmethod
+    def checkpoint_name(path: str) -> str:
+        return f"replay:{os.path.abspath(path)}"
+
+    def replay(self, path: str, workers: int = None, chunk_bytes: int = 16 << 20, restart: bool = False) -> dict:
+        # Rows and the offset checkpoint are committed together, which needs one database
+        shard_service.require_unsharded("Replay")
+        name = self.checkpoint_name(path)
+        insert = dialect_insert(self.bind)
+        totals = {"inserted": 0, "duplicates": 0, "skipped": 0, "bad": 0}
+
+        with self.bind.connect() as conn:
+            checkpoint = get_checkpoint(conn, name)
+            offset, touched = 0, defaultdict(set)
+            if checkpoint is not None and not restart:
+                if checkpoint.status == "done":
+                    log(f"{path} was already replayed; pass restart=True to replay it again")
+                    return totals
+                offset = int(checkpoint.cursor or 0)
+                touched = self._load_touched(checkpoint.message)
+                totals["inserted"] = checkpoint.rows_done or 0
+            size = os.path.getsize(path)
+            if offset:
+                log(f"Resuming replay of {path} at byte {offset} of {size}")
+
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # Bounded read-ahead keeps memory flat on very large files
+                window = (workers or os.cpu_count() or 1) * 2
+                pending = []
+                chunks = iter_chunks(path, offset, chunk_bytes)
+                for chunk in chunks:
+                    pending.append(pool.submit(parse_chunk, chunk))
+                    if len(pending) >= window:
+                        self._apply(conn, insert, name, size, pending.pop(0).result(), touched, totals)
+                for future in pending:
+                    self._apply(conn, insert, name, size, future.result(), touched, totals)
+
+            save_checkpoint(conn, name, status="done", message=self._dump_touched(touched))
+            conn.commit()
+
+        self.rebuild(touched)
+        log(f"Replayed {path}: {totals}")
+        return totals
+
+    def _apply(self, conn: Connection, insert, name: str, size: int, parsed, touched, totals):
+        start, end, rows, skipped, bad = parsed
+        inserted = 0
+        for event_type, mappings in rows.items():
+            table = EVENT_MODELS[event_type].__table__
+            stmt = insert(table).on_conflict_do_nothing(index_elements=["event_id"]).returning(
+                table.c.timestamp, table.c.class_name, table.c.subject, table.c.data
+            )
+            # RETURNING yields only the rows actually inserted, not the skipped duplicates
+            returned = conn.execute(stmt, mappings).all()
+            # Both day bases: rollups bucket by UTC day until the local_date backfill is done
+            touched[EVENT_METRICS[event_type]].update(
+                day for row in returned if row.timestamp is not None
+                for day in (row.timestamp.date(), local_day(row.timestamp))
+            )
+            if event_type == QUESTION_ASKED:
+                top_topics_service.merge_into(conn, top_topics_service.summarize(returned))
+            inserted += len(returned)
+            totals["duplicates"] += len(mappings) - len(returned)
+        totals["inserted"] += inserted
+        totals["skipped"] += skipped
+        totals["bad"] += bad
+        save_checkpoint(conn, name, status="running", cursor=str(end), rows_done=totals["inserted"],
+                        rows_total=size, message=self._dump_touched(touched))
+        conn.commit()
+        if bad:
+            warning(f"{bad} unparseable lines between bytes {start} and {end}")
+        log(f"Replay {100 * end / size:.1f}% ({totals['inserted']} inserted, {totals['duplicates']} duplicates)")
+
+    @staticmethod
+    def _dump_touched(touched: Dict[str, Set[date]]) -> str:
+        return json.dumps({metric: sorted(d.isoformat() for d in days) for metric, days in touched.items()})
+
+    @staticmethod
+    def _load_touched(message: str) -> Dict[str, Set[date]]:
+        touched = defaultdict(set)
+        if message:
+            for metric, days in json.loads(message).items():
+                touched[metric].update(date.fromisoformat(d) for d in days)
+        return touched
+
+    def rebuild(self, touched: Dict[str, Set[date]]):
+        """Recompute only the rollup days and unique-student months that received replayed rows."""
+        db = self.session_factory()
+        try:
+            for metric, days in touched.items():
+                if days:
+                    rollup_service.rebuild_days(db, metric, days)
+            for month in sorted({month_start(d) for d in touched.get("questions", ())}):
+                unique_students_service.rebuild_month(db, month)
+            db.commit()
+        finally:
+            db.close()
+
+
+replay_service = ReplayService()
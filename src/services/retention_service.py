@@ -0,0 +1,170 @@
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+import sqlalchemy as sa
+from sqlalchemy import func
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.database import SessionLocal, engine
+from src.logger import log, warning, error
+from src.migration_helpers import get_checkpoint, run_chunked, save_checkpoint
+from src.models import QuestionsWeeklyAggr, TestPapersMonthly
+from src.services.rollup_service import rollup_service, month_start, bucket_end
+from src.services.shard_service import shard_service
+
+# table -> (rollup metric, retention days setting)
+RETENTION_TABLES = {
+    "questions_asked": ("questions", "QUESTIONS_RETENTION_DAYS"),
+    "test_papers": ("test_papers", "TEST_PAPERS_RETENTION_DAYS"),
+}
+
+
+class RetentionService:
+    """
+    Deletes raw questions_asked / test_papers rows older than their
+    retention period, in small id-ranged batches with sleeps in between
+    (RETENTION_DUTY_CYCLE), so ingest and reads never wait on one long
+    DELETE. Only rows already counted in the weekly/monthly aggregates and
+    the daily rollups are eligible, and their rollup days are frozen first
+    so late rows for them never trigger a rebuild from what is left.
+
+    Progress is checkpointed in job_checkpoints (retention:<table>); an
+    interrupted purge resumes at the last batch. Afterwards freed pages are
+    handed back to the filesystem with incremental vacuum (when the
+    database uses auto_vacuum=INCREMENTAL) and the WAL is truncated.
+    """
+
+    def __init__(self, bind=engine, session_factory=SessionLocal):
+        self.bind = bind
+        self.session_factory = session_factory
+
+    # --- Policy ---
+
+    def covered_until(self, db: Session, table: str) -> Optional[date]:
+        """Exclusive day up to which `table` rows are reflected in every aggregate read from it."""
+        metric = RETENTION_TABLES[table][0]
+        day_mark = rollup_service.get_watermarks(db, metric).get("day")
+        if table == "questions_asked":
+            last_week = db.query(func.max(QuestionsWeeklyAggr.date)).scalar()
+            aggregated = bucket_end(last_week, "week") if last_week is not None else None
+        else:
+            last_month = db.query(func.max(TestPapersMonthly.month_start)).scalar()
+            aggregated = bucket_end(month_start(last_month), "month") if last_month is not None else None
+        if day_mark is None or aggregated is None:
+            return None
+        return min(day_mark, aggregated)
+
+    def cutoff(self, db: Session, table: str, today: Optional[date] = None) -> Optional[datetime]:
+        """Rows with timestamp before the returned time may be purged; None when nothing may be."""
+        days = getattr(settings, RETENTION_TABLES[table][1])
+        if days <= 0:
+            return None
+        today = today or datetime.utcnow().date()
+        covered = self.covered_until(db, table)
+        if covered is None:
+            warning(f"Not purging {table}: aggregates have not been built yet")
+            return None
+        return rollup_service.day_start(db, RETENTION_TABLES[table][0], min(today - timedelta(days=days), covered))
+
+    # --- Purge ---
+
+    def purge(self, table: str, today: Optional[date] = None) -> int:
+        """Delete expired rows from `table`. Returns rows deleted by this run."""
+        shard_service.require_unsharded("Retention purge")
+        db = self.session_factory()
+        try:
+            cutoff = self.cutoff(db, table, today)
+            if cutoff is not None:
+                rollup_service.freeze(db, RETENTION_TABLES[table][0], cutoff)
+        finally:
+            db.close()
+        if cutoff is None:
+            return 0
+
+        name = f"retention:{table}"
+        delete = sa.text(f"DELETE FROM {table} WHERE id > :lo AND id <= :hi AND timestamp < :cutoff")
+        with self.bind.connect() as conn:
+            until = conn.execute(
+                sa.text(f"SELECT MAX(id) FROM {table} WHERE timestamp < :cutoff"), {"cutoff": cutoff}
+            ).scalar()
+            if until is None:
+                return 0
+
+            checkpoint = get_checkpoint(conn, name)
+            # A run left "running" was interrupted: continue from its cursor. Otherwise start a new pass.
+            if checkpoint is None or checkpoint.status != "running":
+                rows_total = conn.execute(
+                    sa.text(f"SELECT COUNT(*) FROM {table} WHERE timestamp < :cutoff"), {"cutoff": cutoff}
+                ).scalar()
+                save_checkpoint(conn, name, status="pending", cursor=None, rows_done=0,
+                                rows_total=rows_total, message=None)
+                conn.commit()
+            done_before = 0 if checkpoint is None or checkpoint.status != "running" else (checkpoint.rows_done or 0)
+
+            try:
+                deleted = run_chunked(
+                    conn, name, table,
+                    lambda c, lo, hi: c.execute(delete, {"lo": lo, "hi": hi, "cutoff": cutoff}).rowcount,
+                    chunk_size=settings.RETENTION_BATCH_SIZE,
+                    duty_cycle=settings.RETENTION_DUTY_CYCLE,
+                    until=until
+                ) - done_before
+            except Exception as e:
+                conn.rollback()
+                save_checkpoint(conn, name, status="failed", message=str(e)[:500])
+                conn.commit()
+                raise
+
+            if deleted:
+                log(f"Purged {deleted} {table} rows older than {cutoff:%Y-%m-%d}")
+                self.reclaim(conn)
+        return deleted
+
+    def purge_all(self, today: Optional[date] = None) -> Dict[str, int]:
+        results = {}
+        for table in RETENTION_TABLES:
+            try:
+                results[table] = self.purge(table, today)
+            except Exception as e:
+                error(f"Retention purge of {table} failed, will retry: {e}")
+        return results
+
+    # --- Space reclamation ---
+
+    def reclaim(self, conn: Connection):
+        """Return freed pages to the filesystem without a blocking full VACUUM."""
+        if conn.dialect.name != "sqlite":
+            return  # Postgres autovacuum handles dead tuples
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2:
+            while conn.exec_driver_sql("PRAGMA freelist_count").scalar():
+                started = time.monotonic()
+                conn.exec_driver_sql(f"PRAGMA incremental_vacuum({settings.RETENTION_VACUUM_PAGES})")
+                conn.commit()
+                if settings.RETENTION_DUTY_CYCLE < 1:
+                    elapsed = time.monotonic() - started
+                    time.sleep(elapsed * (1 - settings.RETENTION_DUTY_CYCLE) / settings.RETENTION_DUTY_CYCLE)
+        else:
+            # Freed pages stay in the freelist and are reused by new rows
+            log("auto_vacuum is not INCREMENTAL; freed pages will be reused but the file does not shrink")
+        if conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal":
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            conn.commit()
+
+    def start(self, scheduler):
+        if not settings.RETENTION_ENABLED:
+            return
+        if shard_service.enabled:
+            warning("Not scheduling the retention purge: it only covers the main database and SHARD_URLS is set")
+            return
+        scheduler.add_job(
+            self.purge_all, "cron",
+            hour=3, minute=30,
+            id="retention_purge", replace_existing=True,
+            max_instances=1, coalesce=True
+        )
+
+
+retention_service = RetentionService()
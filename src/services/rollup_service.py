@@ -0,0 +1,486 @@
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.database import SessionLocal
+from src.logger import log, error
+from src.business_time import LOCAL_DATE_BACKFILLS, business_today, fill_local_date, local_day, local_day_start
+from src.models import QuestionsAsked, TestPapers, EventRollup, EventRollupWatermark, JobCheckpoint
+from src.services.backfill_service import Backfill, backfill_service
+from src.services.ingest_service import ingest_service, QUESTION_ASKED, TEST_PAPER_GENERATED
+from src.services.shard_service import member_job, shard_service
+
+GRANULARITIES = ("day", "week", "month")
+
+# Watermark "granularity" marking the day before which raw rows were purged or archived
+FINAL = "final"
+
+# Rows are stamped with created_at before their transaction commits
+RECOVERY_MARGIN = timedelta(minutes=5)
+
+METRIC_MODELS = {
+    "questions": QuestionsAsked,
+    "test_papers": TestPapers,
+}
+
+EVENT_METRICS = {
+    QUESTION_ASKED: "questions",
+    TEST_PAPER_GENERATED: "test_papers",
+}
+
+
+def week_start(value) -> date:
+    d = value.date() if isinstance(value, datetime) else value
+    return d - timedelta(days=d.weekday())
+
+
+def month_start(value) -> date:
+    d = value.date() if isinstance(value, datetime) else value
+    return d.replace(day=1)
+
+
+def bucket_start(value, granularity: str) -> date:
+    if granularity == "month":
+        return month_start(value)
+    if granularity == "week":
+        return week_start(value)
+    return value.date() if isinstance(value, datetime) else value
+
+
+def bucket_end(start: date, granularity: str) -> date:
+    """Exclusive end of the bucket starting at `start`."""
+    if granularity == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    if granularity == "week":
+        return start + timedelta(days=7)
+    return start + timedelta(days=1)
+
+
+def as_date(value) -> date:
+    # func.date() returns a string on SQLite and a date on Postgres
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def day_range_start(d: date) -> datetime:
+    return datetime.combine(d, datetime.min.time())
+
+
+def local_date_jobs(metric: str) -> List[str]:
+    """local_date backfills (main database, then each shard) that must finish before `metric` uses local days."""
+    name = LOCAL_DATE_BACKFILLS[METRIC_MODELS[metric].__tablename__]
+    return [name] + [member_job(name, member) for member in range(1, len(shard_service.engines) + 1)]
+
+
+class RollupService:
+    """
+    Maintains event_rollups: per (class, subject) question and test-paper counts
+    at day granularity computed from raw rows, and week/month buckets derived
+    from the day buckets.
+
+    Only closed buckets are rolled up; the per-(metric, granularity) watermark
+    records how far rollups are complete. Rows ingested late for an already
+    rolled-up day mark that day dirty so it (and its week/month) is recomputed
+    on the next refresh. Dirty days are kept in memory; after a restart they
+    are re-derived from rows created since the last refresh (the day
+    watermark's updated_at), for days the watermark already covers.
+
+    Before retention or archiving deletes raw rows, freeze() records the
+    first day that still has all of them (the "final" watermark). Day buckets
+    before it are final: late rows for those days are not counted, since a
+    rebuild from the surviving rows would replace the stored count.
+
+    Days are BUSINESS_TIMEZONE days read from the indexed local_date column.
+    Until the local_date backfills of a table (main database and every
+    shard) have finished, that metric falls back to UTC days of `timestamp`;
+    when they finish, rebucket() rebuilds the days that still have all
+    their raw rows on local days and keeps the older buckets.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self._dirty: Dict[str, Set[date]] = {metric: set() for metric in METRIC_MODELS}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        # Metrics whose rows all have local_date; never goes back to False
+        self._local_ready: Set[str] = set()
+        # Metrics whose dirty days from before this process started were recovered
+        self._recovered: Set[str] = set()
+        ingest_service.add_listener(self._on_event)
+
+    def _on_event(self, event_type: str, row):
+        metric = EVENT_METRICS.get(event_type)
+        if metric and row.timestamp:
+            # Both day bases, so this is right either side of the local_date switch
+            self.mark_dirty(metric, {row.timestamp.date(), local_day(row.timestamp)})
+
+    def mark_dirty(self, metric: str, days: Iterable[date]):
+        with self._lock:
+            self._dirty[metric].update(days)
+
+    def _pop_dirty(self, metric: str, before: date) -> Set[date]:
+        # Days at or after the day watermark are rolled up when they close anyway
+        with self._lock:
+            dirty = {d for d in self._dirty[metric] if d < before}
+            self._dirty[metric] -= dirty
+            return dirty
+
+    def _recover_dirty(self, db: Session, metric: str):
+        """Mark dirty the covered days of rows created since the last refresh (lost with the process)."""
+        mark = db.query(EventRollupWatermark).filter(
+            EventRollupWatermark.metric == metric,
+            EventRollupWatermark.granularity == "day"
+        ).first()
+        if mark is None or mark.updated_at is None:
+            return
+        model = METRIC_MODELS[metric]
+        since = mark.updated_at - RECOVERY_MARGIN
+        day = self.day_column(db, metric)
+        days = {as_date(d) for (d,) in shard_service.gather(db, lambda member_db: member_db.query(day).filter(
+            model.created_at >= since
+        ).distinct().all()) if d is not None}
+        late = {d for d in days if d < mark.covered_until}
+        if late:
+            self.mark_dirty(metric, late)
+            log(f"Recovered {len(late)} {metric} rollup days with rows stored since {since:%Y-%m-%d %H:%M}")
+
+    def local_days(self, db: Session, metric: str) -> bool:
+        """Whether `metric` is bucketed by local_date (its backfill is done, or was never needed)."""
+        if metric in self._local_ready:
+            return True
+        statuses = db.query(JobCheckpoint.status).filter(JobCheckpoint.name.in_(local_date_jobs(metric))).all()
+        if any(status != "done" for (status,) in statuses):
+            return False
+        self._local_ready.add(metric)
+        return True
+
+    def day_column(self, db: Session, metric: str):
+        """Expression for the day a raw row of `metric` is bucketed in."""
+        model = METRIC_MODELS[metric]
+        return model.local_date if self.local_days(db, metric) else func.date(model.timestamp)
+
+    def day_filter(self, db: Session, metric: str, start: date, end: date):
+        """(day expression, filters) selecting raw rows of `metric` on days [start, end)."""
+        model = METRIC_MODELS[metric]
+        if self.local_days(db, metric):
+            return model.local_date, (model.local_date >= start, model.local_date < end)
+        return func.date(model.timestamp), (
+            model.timestamp >= day_range_start(start),
+            model.timestamp < day_range_start(end)
+        )
+
+    def day_start(self, db: Session, metric: str, d: date) -> datetime:
+        """UTC instant at which day `d` of `metric` starts."""
+        return local_day_start(d) if self.local_days(db, metric) else day_range_start(d)
+
+    def first_day_from(self, db: Session, metric: str, moment: datetime) -> date:
+        """First day of `metric` starting at or after `moment`."""
+        last = moment - timedelta(microseconds=1)
+        return (local_day(last) if self.local_days(db, metric) else last.date()) + timedelta(days=1)
+
+    def today(self, db: Session, metric: str) -> date:
+        """First day that is still open for `metric`."""
+        return business_today() if self.local_days(db, metric) else datetime.utcnow().date()
+
+    def get_watermarks(self, db: Session, metric: str) -> Dict[str, date]:
+        rows = db.query(EventRollupWatermark).filter(EventRollupWatermark.metric == metric).all()
+        return {row.granularity: row.covered_until for row in rows}
+
+    def final_until(self, db: Session, metric: str) -> Optional[date]:
+        """Day before which the day buckets of `metric` are final (raw rows partly deleted)."""
+        return db.query(EventRollupWatermark.covered_until).filter(
+            EventRollupWatermark.metric == metric,
+            EventRollupWatermark.granularity == FINAL
+        ).scalar()
+
+    def freeze(self, db: Session, metric: str, before: datetime):
+        """
+        Mark the day buckets holding rows with timestamp before `before` final;
+        call (it commits) before deleting those raw rows.
+        """
+        until = self.first_day_from(db, metric, before)
+        with self._refresh_lock:
+            current = self.final_until(db, metric)
+            if current is None or current < until:
+                self._set_watermark(db, metric, FINAL, until)
+            db.commit()
+
+    def _set_watermark(self, db: Session, metric: str, granularity: str, covered_until: date):
+        row = db.query(EventRollupWatermark).filter(
+            EventRollupWatermark.metric == metric,
+            EventRollupWatermark.granularity == granularity
+        ).first()
+        if row is None:
+            row = EventRollupWatermark(metric=metric, granularity=granularity, covered_until=covered_until)
+            db.add(row)
+        row.covered_until = covered_until
+        row.updated_at = datetime.utcnow()
+
+    def refresh(self, today: Optional[date] = None):
+        """Roll up newly closed buckets and recompute dirty ones, for every metric."""
+        with self._refresh_lock:
+            db = self.session_factory()
+            try:
+                for metric in METRIC_MODELS:
+                    self.refresh_metric(db, metric, today)
+            except Exception as e:
+                db.rollback()
+                error(f"Rollup refresh failed: {e}")
+            finally:
+                db.close()
+
+    def refresh_metric(self, db: Session, metric: str, today: Optional[date] = None):
+        model = METRIC_MODELS[metric]
+        started = datetime.utcnow()
+        today = today or self.today(db, metric)
+        if metric not in self._recovered:
+            self._recover_dirty(db, metric)
+            self._recovered.add(metric)
+        marks = self.get_watermarks(db, metric)
+
+        day_mark = marks.get("day")
+        if day_mark is None:
+            firsts = [ts for ts in shard_service.scatter(
+                db, lambda member_db: member_db.query(func.min(model.timestamp)).scalar()
+            ) if ts]
+            if not firsts:
+                return
+            day_mark = local_day(min(firsts)) if self.local_days(db, metric) else min(firsts).date()
+
+        # 1. Day buckets from raw rows
+        dirty = self._pop_dirty(metric, day_mark)
+        try:
+            for start, end in self._contiguous_ranges(dirty):
+                self._rebuild_days(db, metric, start, end)
+            if day_mark < today:
+                self._rebuild_days(db, metric, day_mark, today)
+                self._set_watermark(db, metric, "day", today)
+                day_mark = today
+
+            # 2. Week and month buckets derived from day buckets
+            first_day = db.query(func.min(EventRollup.bucket_start)).filter(
+                EventRollup.metric == metric,
+                EventRollup.granularity == "day"
+            ).scalar()
+            if first_day is not None:
+                for granularity in ("week", "month"):
+                    self._refresh_derived(db, metric, granularity, marks.get(granularity), first_day, day_mark, dirty)
+
+            # Rows stored before `started` are reflected now; recovery after a restart starts here
+            db.query(EventRollupWatermark).filter(
+                EventRollupWatermark.metric == metric,
+                EventRollupWatermark.granularity == "day"
+            ).update({"updated_at": started}, synchronize_session=False)
+            db.commit()
+        except Exception:
+            self.mark_dirty(metric, dirty)
+            raise
+
+        if dirty:
+            log(f"Recomputed {len(dirty)} late {metric} rollup days")
+
+    def _refresh_derived(self, db: Session, metric: str, granularity: str, mark: Optional[date],
+                         first_day: date, day_mark: date, dirty: Set[date]):
+        start = mark or bucket_start(first_day, granularity)
+
+        # Recompute already-covered buckets that contain late days
+        for bucket in sorted({bucket_start(d, granularity) for d in dirty if d < start}):
+            self._rebuild_derived(db, metric, granularity, bucket, bucket_end(bucket, granularity))
+
+        # Roll up buckets that have closed since the last refresh
+        end = start
+        while bucket_end(end, granularity) <= day_mark:
+            end = bucket_end(end, granularity)
+        if end > start:
+            self._rebuild_derived(db, metric, granularity, start, end)
+        if end > start or mark is None:
+            self._set_watermark(db, metric, granularity, end)
+
+    def rebuild_days(self, db: Session, metric: str, days: Iterable[date]):
+        """Recompute the given day buckets and their weeks/months (e.g. after a replay)."""
+        days = set(days)
+        marks = self.get_watermarks(db, metric)
+        day_mark = marks.get("day")
+        covered = {d for d in days if day_mark and d < day_mark}
+        for start, end in self._contiguous_ranges(covered):
+            self._rebuild_days(db, metric, start, end)
+        for granularity in ("week", "month"):
+            mark = marks.get(granularity)
+            for bucket in sorted({bucket_start(d, granularity) for d in covered}):
+                if mark and bucket_end(bucket, granularity) <= mark:
+                    self._rebuild_derived(db, metric, granularity, bucket, bucket_end(bucket, granularity))
+
+    def _rebuild_days(self, db: Session, metric: str, start: date, end: date):
+        model = METRIC_MODELS[metric]
+        # Counts of days whose rows were partly purged or archived cannot be rebuilt
+        final = self.final_until(db, metric)
+        if final is not None and start < final:
+            start = final
+        if start >= end:
+            return
+        self._delete(db, metric, "day", start, end)
+
+        day, filters = self.day_filter(db, metric, start, end)
+
+        def partial(member_db: Session):
+            return member_db.query(
+                model.class_name,
+                model.subject,
+                day.label('day'),
+                func.count(model.id).label('count')
+            ).filter(*filters).group_by(
+                model.class_name,
+                model.subject,
+                day
+            ).all()
+
+        # Per-shard partial counts of the same bucket add up
+        counts: Dict[tuple, int] = {}
+        for row in shard_service.gather(db, partial):
+            key = (row.class_name, row.subject, as_date(row.day))
+            counts[key] = counts.get(key, 0) + row.count
+
+        now = datetime.utcnow()
+        db.bulk_insert_mappings(EventRollup, [
+            {
+                "metric": metric,
+                "granularity": "day",
+                "bucket_start": day_start,
+                "class_name": class_name,
+                "subject": subject,
+                "count": count,
+                "updated_at": now
+            }
+            for (class_name, subject, day_start), count in counts.items()
+        ])
+
+    def _rebuild_derived(self, db: Session, metric: str, granularity: str, start: date, end: date):
+        self._delete(db, metric, granularity, start, end)
+
+        rows = db.query(
+            EventRollup.class_name,
+            EventRollup.subject,
+            EventRollup.bucket_start,
+            EventRollup.count
+        ).filter(
+            EventRollup.metric == metric,
+            EventRollup.granularity == "day",
+            EventRollup.bucket_start >= start,
+            EventRollup.bucket_start < end
+        ).all()
+
+        totals: Dict[tuple, int] = {}
+        for row in rows:
+            key = (row.class_name, row.subject, bucket_start(row.bucket_start, granularity))
+            totals[key] = totals.get(key, 0) + (row.count or 0)
+
+        now = datetime.utcnow()
+        db.bulk_insert_mappings(EventRollup, [
+            {
+                "metric": metric,
+                "granularity": granularity,
+                "bucket_start": bucket,
+                "class_name": class_name,
+                "subject": subject,
+                "count": count,
+                "updated_at": now
+            }
+            for (class_name, subject, bucket), count in totals.items()
+        ])
+
+    def _delete(self, db: Session, metric: str, granularity: str, start: date, end: date):
+        db.query(EventRollup).filter(
+            EventRollup.metric == metric,
+            EventRollup.granularity == granularity,
+            EventRollup.bucket_start >= start,
+            EventRollup.bucket_start < end
+        ).delete(synchronize_session=False)
+
+    def rebucket(self, metric: str):
+        """
+        Move `metric` from UTC to local days once its local_date backfills are
+        done. Day buckets from the first day that still has all its raw rows
+        up to the day watermark are rebuilt a month at a time, then the weeks
+        and months over them; older buckets (rows purged or archived) keep
+        their UTC-day counts.
+        """
+        model = METRIC_MODELS[metric]
+        db = self.session_factory()
+        try:
+            # Another table part may still be filling; its own completion calls this again
+            if not self.local_days(db, metric):
+                return
+            marks = self.get_watermarks(db, metric)
+            day_mark = marks.get("day")
+            if day_mark is None:
+                return
+            final = self.final_until(db, metric)
+            if final is not None:
+                # Frozen on UTC days: the local day around that midnight lost rows too
+                final = self.first_day_from(db, metric, day_range_start(final))
+                with self._refresh_lock:
+                    self._set_watermark(db, metric, FINAL, final)
+                    db.commit()
+            firsts = [d for d in shard_service.scatter(
+                db, lambda member_db: member_db.query(func.min(model.local_date)).scalar()
+            ) if d]
+            if not firsts:
+                return
+            start = max(min(firsts), final) if final else min(firsts)
+
+            chunk = start
+            while chunk < day_mark:
+                end = min(bucket_end(month_start(chunk), "month"), day_mark)
+                with self._refresh_lock:
+                    self._rebuild_days(db, metric, chunk, end)
+                    db.commit()
+                chunk = end
+            with self._refresh_lock:
+                for granularity in ("week", "month"):
+                    mark = marks.get(granularity)
+                    if mark and bucket_start(start, granularity) < mark:
+                        self._rebuild_derived(db, metric, granularity, bucket_start(start, granularity), mark)
+                db.commit()
+        finally:
+            db.close()
+        if start < day_mark:
+            log(f"Rebuilt {metric} rollups on local days from {start} to {day_mark}")
+
+    @staticmethod
+    def _contiguous_ranges(days: Iterable[date]) -> List[tuple]:
+        ranges = []
+        for d in sorted(days):
+            if ranges and ranges[-1][1] == d:
+                ranges[-1][1] = d + timedelta(days=1)
+            else:
+                ranges.append([d, d + timedelta(days=1)])
+        return [tuple(r) for r in ranges]
+
+    def start(self, scheduler):
+        scheduler.add_job(
+            self.refresh, "interval",
+            minutes=settings.ROLLUP_REFRESH_MINUTES,
+            next_run_time=datetime.now(scheduler.timezone),
+            id="event_rollup_refresh", replace_existing=True,
+            max_instances=1, coalesce=True
+        )
+
+
+rollup_service = RollupService()
+
+
+# Rows stored before local_date existed, in the main database and on each shard;
+# once all are filled, the metric's rollups move to local days
+for _metric, _model in METRIC_MODELS.items():
+    for _name, _bind in zip(local_date_jobs(_metric), [None] + shard_service.engines):
+        backfill_service.register(Backfill(
+            _name, _model.__tablename__, fill_local_date(_model.__tablename__),
+            on_done=lambda metric=_metric: rollup_service.rebucket(metric), bind=_bind
+        ))
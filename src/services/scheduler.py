@@ -0,0 +1,5 @@
+from apscheduler.schedulers.background import BackgroundScheduler
+
+# Shared background scheduler for periodic in-process jobs (flushes, rollups).
+# Started and stopped by the application lifespan in src/main.py.
+scheduler = BackgroundScheduler(timezone="Asia/Kolkata")
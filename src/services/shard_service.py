@@ -0,0 +1,269 @@
+import base64
+import heapq
+import json
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, create_engine, desc, false, inspect, or_, select, true
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.business_time import LOCAL_DATE_BACKFILLS
+from src.config import settings
+from src.database import Base, SessionLocal
+from src.logger import log
+from src.metrics import register_collector
+from src.migration_helpers import get_checkpoint, save_checkpoint
+from src.models import QuestionsAsked, TestPapers
+
+SHARDED_TABLES = (QuestionsAsked.__table__, TestPapers.__table__)
+
+
+def parse_urls(value: str) -> List[str]:
+    return [url.strip() for url in value.split(",") if url.strip()]
+
+
+def member_job(name: str, member: int) -> str:
+    """job_checkpoints name of job `name` run against read-set member `member` (1 = first shard)."""
+    return f"{name}@shard{member}"
+
+
+def _sort_key(value) -> tuple:
+    # NULLs order before everything (NULLS FIRST ascending, NULLS LAST descending)
+    return (0,) if value is None else (1, value)
+
+
+class ShardService:
+    """
+    Optional split of the raw event tables (questions_asked, test_papers)
+    across SHARD_URLS, so ingest is not limited by one database's writer
+    lock. Each event goes to the shard picked by a stable hash of its
+    user_id; a user's rows (and so each profile's) live on one shard, which
+    keeps event_id duplicates and distinct-profile counts shard-local.
+
+    Reads fan out over the "read set": the main database first (it keeps
+    the rows stored before sharding was switched on and gets no new raw
+    writes), then every shard. Partial aggregates are computed in parallel
+    and combined by the caller; list pages are merge-sorted by (sort value,
+    read-set index, id), which is also what keyset cursors encode. Reads
+    across shards do not share one snapshot.
+
+    Maintenance jobs that write raw rows with main-database bookkeeping
+    (archive, retention, replay) refuse to run while sharding is on.
+
+    With SHARD_URLS empty everything stays on the main database.
+    """
+
+    def __init__(self, urls: Optional[List[str]] = None, session_factory=SessionLocal):
+        urls = parse_urls(settings.SHARD_URLS) if urls is None else urls
+        self.session_factory = session_factory
+        self.engines = [create_engine(url) for url in urls]
+        if settings.SLOW_QUERY_LOG_ENABLED:
+            from src.query_log import query_tracker
+            for engine in self.engines:
+                query_tracker.attach(engine)
+        self._shards = [sessionmaker(autocommit=False, autoflush=False, bind=engine) for engine in self.engines]
+        self._pool = ThreadPoolExecutor(max_workers=len(urls), thread_name_prefix="shard") if urls else None
+        self.writes = [0] * len(urls)
+        self.scatters = 0
+        register_collector("shards", self.stats)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._shards)
+
+    def shard_for(self, user_id: Optional[str]) -> int:
+        # crc32 rather than hash(): the mapping must not change between processes
+        return zlib.crc32((user_id or "").encode()) % len(self._shards)
+
+    def writer(self, user_id: Optional[str]) -> Optional[sessionmaker]:
+        """Session factory for storing `user_id`'s raw events, or None when not sharded."""
+        if not self.enabled:
+            return None
+        shard = self.shard_for(user_id)
+        self.writes[shard] += 1
+        return self._shards[shard]
+
+    def ensure_schema(self):
+        """
+        Create the raw tables on every shard (the main database stays under
+        Alembic). Tables from before a column was added get it, nullable,
+        plus any missing index; rows left without local_date get a pending
+        backfill (see rollup_service) checkpointed in the main database.
+        """
+        for member, engine in enumerate(self.engines, 1):
+            Base.metadata.create_all(engine, tables=list(SHARDED_TABLES))
+            for table in SHARDED_TABLES:
+                existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+                with engine.begin() as conn:
+                    for column in table.columns:
+                        if column.name not in existing:
+                            conn.exec_driver_sql(
+                                f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                            )
+                for index in table.indexes:
+                    index.create(engine, checkfirst=True)
+                with engine.connect() as conn:
+                    unfilled = conn.execute(select(table.c.id).where(
+                        table.c.local_date.is_(None), table.c.timestamp.isnot(None)
+                    ).limit(1)).first()
+                if unfilled is not None:
+                    self._schedule(member_job(LOCAL_DATE_BACKFILLS[table.name], member))
+
+    def _schedule(self, name: str):
+        db = self.session_factory()
+        try:
+            conn = db.connection()
+            if get_checkpoint(conn, name) is None:
+                save_checkpoint(conn, name, status="pending", cursor=None, rows_done=0, message=None)
+                log(f"Scheduled backfill {name}")
+            db.commit()
+        finally:
+            db.close()
+
+    def require_unsharded(self, job: str):
+        """Raise for `job`, which only knows the main database, while raw events are sharded."""
+        if self.enabled:
+            raise RuntimeError(f"{job} only covers the main database and is not supported while SHARD_URLS is set")
+
+    def start(self, scheduler):
+        if self.enabled:
+            self.ensure_schema()
+            log(f"Raw events sharded over {len(self._shards)} databases")
+
+    # --- Scatter-gather ---
+
+    def scatter(self, db: Session, fn: Callable[[Session], object]) -> list:
+        """fn(session) for every member of the read set, `db` (main) first; shards run in parallel."""
+        return self._scatter_members(db, lambda member: fn)
+
+    def _scatter_members(self, db: Session, make: Callable[[int], Callable[[Session], object]]) -> list:
+        if not self.enabled:
+            return [make(0)(db)]
+        self.scatters += 1
+
+        def run(member: int, factory):
+            member_db = factory()
+            try:
+                return make(member)(member_db)
+            finally:
+                member_db.close()
+
+        pending = [self._pool.submit(run, member, factory) for member, factory in enumerate(self._shards, 1)]
+        # The main database is read on this thread, while the shards are busy
+        return [make(0)(db)] + [future.result() for future in pending]
+
+    def scatter_members(self, db: Session, fn: Callable[[int, Session], object]) -> list:
+        """scatter() for functions that also take the read-set member (0 = main, then 1.. for shards)."""
+        return self._scatter_members(db, lambda member: lambda member_db: fn(member, member_db))
+
+    def member_of(self, db: Session) -> int:
+        """Read-set member that `db` is bound to (0 for the main database)."""
+        bind = db.get_bind()
+        for member, engine in enumerate(self.engines, 1):
+            if bind is engine:
+                return member
+        return 0
+
+    def gather(self, db: Session, fn: Callable[[Session], list]) -> list:
+        """scatter() for functions returning rows, concatenated."""
+        return [row for part in self.scatter(db, fn) for row in part]
+
+    # --- Merged pages ---
+
+    @staticmethod
+    def encode_cursor(value, member: int, row_id: int) -> str:
+        kind = "dt" if isinstance(value, datetime) else "v"
+        payload = [kind, value.isoformat() if kind == "dt" else value, member, row_id]
+        return base64.urlsafe_b64encode(json.dumps(payload, default=str).encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[object, int, int]:
+        try:
+            kind, value, member, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            if kind == "dt":
+                value = datetime.fromisoformat(value)
+            return value, int(member), int(row_id)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid cursor: {e}") from e
+
+    @staticmethod
+    def ordering(model, field, descending: bool) -> tuple:
+        """ORDER BY of a page: NULLs placed explicitly so every dialect agrees with the merge and the cursors."""
+        return (desc(field).nulls_last(), desc(model.id)) if descending else (field.nulls_first(), model.id)
+
+    @staticmethod
+    def _after(model, field, member: int, cursor: Tuple[object, int, int], descending: bool):
+        """Rows of read-set member `member` that sort after `cursor`."""
+        value, cursor_member, cursor_id = cursor
+        if member == cursor_member:
+            tie = model.id < cursor_id if descending else model.id > cursor_id
+        else:
+            tie = true() if (member < cursor_member) == descending else false()
+        if descending:
+            if value is None:
+                return and_(field.is_(None), tie)
+            return or_(field < value, field.is_(None), and_(field == value, tie))
+        if value is None:
+            return or_(field.isnot(None), and_(field.is_(None), tie))
+        return or_(field > value, and_(field == value, tie))
+
+    def page(self, db: Session, model, field, descending: bool, limit: int, offset: int = 0,
+             cursor: Optional[str] = None, filters=()) -> Tuple[list, Optional[str]]:
+        """
+        One page over the whole read set, ordered by `field` then (member, id).
+        With a cursor the page starts right after it and `offset` is ignored.
+        Returns the rows and the cursor of the next page (None on the last one).
+        """
+        after = self.decode_cursor(cursor) if cursor else None
+        fetch = limit if after else offset + limit
+        order = self.ordering(model, field, descending)
+
+        def fetch_member(member: int):
+            def run(member_db: Session):
+                query = member_db.query(model).filter(*filters)
+                if after:
+                    query = query.filter(self._after(model, field, member, after, descending))
+                return [((_sort_key(getattr(row, field.key)), member, row.id), row)
+                        for row in query.order_by(*order).limit(fetch).all()]
+            return run
+
+        parts = self._scatter_members(db, fetch_member)
+        start = 0 if after else offset
+        merged = list(heapq.merge(*parts, key=lambda item: item[0], reverse=descending))
+        window = merged[start:start + limit]
+
+        next_cursor = None
+        more = len(merged) > start + limit or any(len(part) == fetch for part in parts)
+        if len(window) == limit and more:
+            (_, member, row_id), row = window[-1]
+            next_cursor = self.encode_cursor(getattr(row, field.key), member, row_id)
+        return [row for _, row in window], next_cursor
+
+    def iter_sorted(self, db: Session, model, field, filters=(), batch_size: int = 1000) -> Iterator:
+        """
+        Every row matching `filters` over the whole read set, ascending by
+        `field` then (member, id), streamed from one open query per member.
+        """
+        sessions = [db] + [factory() for factory in self._shards]
+        order = self.ordering(model, field, False)
+
+        def stream(member: int, member_db: Session):
+            query = member_db.query(model).filter(*filters).order_by(*order).yield_per(batch_size)
+            for row in query:
+                yield (_sort_key(getattr(row, field.key)), member, row.id), row
+
+        try:
+            streams = [stream(member, member_db) for member, member_db in enumerate(sessions)]
+            for _, row in heapq.merge(*streams, key=lambda item: item[0]):
+                yield row
+        finally:
+            for member_db in sessions[1:]:
+                member_db.close()
+
+    def stats(self) -> dict:
+        return {"shards": len(self._shards), "writes": list(self.writes), "scatters": self.scatters}
+
+
+shard_service = ShardService()
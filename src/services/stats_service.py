@@ -0,0 +1,185 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from src.business_time import business_today, local_day_start
+from src.config import settings
+from src.database import SessionLocal
+from src.logger import warning, error
+from src.models import QuestionsAsked, TestPapers, QuestionsWeeklyAggr, TestPapersMonthly
+from src.services.shard_service import shard_service
+from src.services.columnar_service import columnar_engine, questions_boundary, to_epoch, ClassSubject
+from src.services.unique_students_service import unique_students_service
+
+
+class StatsService:
+    """
+    The /stats/* class/subject totals and dashboard counts. Answered from the
+    columnar engine once it has loaded (COLUMNAR_STATS_ENABLED), otherwise
+    with the equivalent SQL, which is also what the consistency check
+    compares the engine against.
+    """
+
+    def __init__(self, engine=columnar_engine, session_factory=SessionLocal):
+        self.engine = engine
+        self.session_factory = session_factory
+        self.checks = 0
+        self.reloads = 0
+
+    def class_subject_counts(self, db: Session, metric: str) -> Dict[ClassSubject, int]:
+        if self.engine.ready:
+            return self.engine.class_subject_counts(metric)
+        return self.db_class_subject_counts(db, metric)
+
+    def unique_students(self, db: Session) -> Dict[ClassSubject, int]:
+        if self.engine.ready:
+            # Exact, from the profile codes of the same rows the counts come from
+            return self.engine.unique_profiles("questions")
+        return {
+            (row["class_name"], row["subject"]): row["unique_students"]
+            for row in unique_students_service.unique_students(db)
+        }
+
+    def dashboard(self, db: Session, today: Optional[date] = None) -> dict:
+        # Business-timezone days, as UTC timestamp ranges
+        today = today or business_today()
+        midnight = local_day_start(today)
+        yesterday, week_ago = local_day_start(today - timedelta(days=1)), local_day_start(today - timedelta(days=7))
+
+        result = {}
+        for metric, prefix in (("questions", "questions"), ("test_papers", "test_papers")):
+            if self.engine.ready:
+                total = self.engine.total(metric)
+                last_day = self.engine.count_range(metric, yesterday, midnight)
+                last_week = self.engine.count_range(metric, week_ago, midnight)
+            else:
+                total = sum(self.db_class_subject_counts(db, metric).values())
+                last_day = self._db_count_range(db, metric, yesterday, midnight)
+                last_week = self._db_count_range(db, metric, week_ago, midnight)
+            result[f"total_{prefix}"] = total
+            result[f"{prefix}_yesterday"] = last_day
+            result[f"{prefix}_last_7_days"] = last_week
+        return result
+
+    # --- SQL path ---
+
+    def db_class_subject_counts(self, db: Session, metric: str) -> Dict[ClassSubject, int]:
+        if metric == "questions":
+            # 1. Historical Data (from QuestionsWeeklyAggr)
+            hist_query = db.query(
+                QuestionsWeeklyAggr.class_name,
+                QuestionsWeeklyAggr.subject,
+                func.sum(QuestionsWeeklyAggr.count).label('count')
+            ).group_by(QuestionsWeeklyAggr.class_name, QuestionsWeeklyAggr.subject)
+
+            # 2. Recent Data (from QuestionsAsked), after the last aggregated week
+            boundary = questions_boundary(db)
+
+            def recent(member_db: Session):
+                query = member_db.query(
+                    QuestionsAsked.class_name,
+                    QuestionsAsked.subject,
+                    func.count(QuestionsAsked.id).label('count')
+                )
+                if boundary:
+                    query = query.filter(QuestionsAsked.timestamp >= boundary)
+                return query.group_by(QuestionsAsked.class_name, QuestionsAsked.subject).all()
+        else:
+            # 1. Historical Data (from TestPapersMonthly)
+            hist_query = db.query(
+                TestPapersMonthly.class_name,
+                TestPapersMonthly.subject,
+                func.sum(TestPapersMonthly.no_of_tests).label('count')
+            ).group_by(TestPapersMonthly.class_name, TestPapersMonthly.subject)
+
+            # 2. Recent Data (from TestPapers)
+            def recent(member_db: Session):
+                return member_db.query(
+                    TestPapers.class_name,
+                    TestPapers.subject,
+                    func.count(TestPapers.id).label('count')
+                ).group_by(TestPapers.class_name, TestPapers.subject).all()
+
+        stats_map = {}
+        # Raw rows may be spread over shards: partial counts per group add up
+        for row in list(hist_query.all()) + shard_service.gather(db, recent):
+            # NULL and empty class/subject are the same group
+            key = (row.class_name or None, row.subject or None)
+            stats_map[key] = stats_map.get(key, 0) + (row.count or 0)
+        return {key: count for key, count in stats_map.items() if count}
+
+    @staticmethod
+    def _db_count_range(db: Session, metric: str, start: datetime, end: datetime) -> int:
+        model = QuestionsAsked if metric == "questions" else TestPapers
+        return sum(shard_service.scatter(db, lambda member_db: member_db.query(func.count(model.id)).filter(
+            model.timestamp >= start, model.timestamp < end
+        ).scalar() or 0))
+
+    def _db_signature(self, db: Session, metric: str) -> dict:
+        if metric == "questions":
+            boundary = questions_boundary(db)
+            rollup = db.query(func.count(QuestionsWeeklyAggr.id), func.sum(QuestionsWeeklyAggr.count)).one()
+            raw_rows = db.query(func.count(QuestionsAsked.id)).scalar()
+        else:
+            boundary = None
+            rollup = db.query(func.count(TestPapersMonthly.id), func.sum(TestPapersMonthly.no_of_tests)).one()
+            raw_rows = db.query(func.count(TestPapers.id)).scalar()
+        return {
+            "boundary": to_epoch(boundary) if boundary else None,
+            "rollup": (rollup[0] or 0, int(rollup[1] or 0)),
+            "raw_rows": raw_rows or 0,
+        }
+
+    # --- Consistency check ---
+
+    def check(self) -> bool:
+        """Compare the engine with the database and reload it on any drift. Returns True if consistent."""
+        if not self.engine.ready:
+            return True
+        self.checks += 1
+        db = self.session_factory()
+        try:
+            for metric in ("questions", "test_papers"):
+                expected = self._db_signature(db, metric)
+                actual = self.engine.signature(metric)
+                if expected != actual:
+                    warning(f"Columnar {metric} drifted from the database ({actual} != {expected}), reloading")
+                    break
+                if self.engine.class_subject_counts(metric) != self.db_class_subject_counts(db, metric):
+                    warning(f"Columnar {metric} counts differ from the database, reloading")
+                    break
+            else:
+                return True
+        except Exception as e:
+            error(f"Columnar consistency check failed: {e}")
+            return True
+        finally:
+            db.close()
+
+        self.reloads += 1
+        self.engine.load()
+        return False
+
+    def start(self, scheduler):
+        if not settings.COLUMNAR_STATS_ENABLED:
+            return
+        if shard_service.enabled:
+            # The engine loads from the main database only
+            warning("Columnar stats are not available with sharded raw events, using SQL")
+            return
+        # Load off the startup path; the endpoints use SQL until it is ready
+        scheduler.add_job(
+            self.engine.load, "date",
+            id="columnar_load", replace_existing=True
+        )
+        scheduler.add_job(
+            self.check, "interval",
+            minutes=settings.COLUMNAR_CHECK_MINUTES,
+            id="columnar_check", replace_existing=True,
+            max_instances=1, coalesce=True
+        )
+
+
+stats_service = StatsService()
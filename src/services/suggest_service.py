@@ -0,0 +1,177 @@
+import heapq
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from src.business_time import local_day, local_day_start
+from src.config import settings
+from src.database import SessionLocal
+from src.logger import log, error
+from src.metrics import register_collector
+from src.models import EventRollup, EventRollupWatermark, QuestionsWeeklyAggr
+from src.services.columnar_service import questions_boundary
+from src.services.ingest_service import ingest_service, QUESTION_ASKED
+
+# ?field= name -> raw event column
+FIELDS = {"class": "class_name", "subject": "subject", "user": "user_id"}
+
+
+class PrefixIndex:
+    """Distinct values of one field with occurrence counts, kept sorted by lowercased value."""
+
+    def __init__(self, counts: Optional[Dict[str, int]] = None):
+        self.counts: Dict[str, int] = dict(counts or {})
+        self.keys: List[Tuple[str, str]] = sorted((value.lower(), value) for value in self.counts)
+
+    def add(self, value: str, count: int = 1):
+        if value not in self.counts:
+            self.counts[value] = 0
+            insort(self.keys, (value.lower(), value))
+        self.counts[value] += count
+
+    def top(self, prefix: str, limit: int) -> List[Tuple[str, int]]:
+        prefix = prefix.lower()
+        start = bisect_left(self.keys, (prefix,))
+        end = bisect_left(self.keys, (prefix + "\U0010ffff",)) if prefix else len(self.keys)
+        matches = self.keys[start:end]
+        best = heapq.nlargest(limit, matches, key=lambda key: self.counts[key[1]])
+        return [(value, self.counts[value]) for _, value in best]
+
+
+class SuggestService:
+    """
+    Autocomplete for the console's class, subject and user filters, from
+    in-memory prefix indexes instead of DISTINCT / LIKE scans of the raw
+    tables.
+
+    Indexes are (re)built from the rollups: class and subject counts from
+    the day buckets in event_rollups, user counts from questions_weekly_aggr.
+    Ingested rows newer than what those tables cover are added as they
+    arrive, so new values show up immediately and nothing is counted twice;
+    they are also kept per day and re-applied on reload until the rollups
+    cover their day. Users seen only on test papers appear once ingested.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, PrefixIndex] = {field: PrefixIndex() for field in FIELDS}
+        # Rows before these points are already in the loaded counts
+        self._covered: Dict[str, Optional[datetime]] = {"rollups": None, "users": None}
+        # Ingested counts not yet in the rollups, by day: re-applied after a reload
+        self._recent: Dict[date, Dict[str, Counter]] = {}
+        # No rollup has users per test paper, so these are never dropped
+        self._paper_users: Counter = Counter()
+        self.ready = False
+        self.queries = 0
+        ingest_service.add_listener(self._on_event)
+        register_collector("suggest", self.stats)
+
+    def _on_event(self, event_type: str, row):
+        if row.timestamp is None:
+            return
+        with self._lock:
+            recent = self._recent.setdefault(local_day(row.timestamp), {field: Counter() for field in FIELDS})
+            if self._after("rollups", row.timestamp):
+                for field in ("class", "subject"):
+                    value = getattr(row, FIELDS[field])
+                    if value:
+                        recent[field][value] += 1
+                        self._indexes[field].add(value)
+            if row.user_id:
+                # questions_weekly_aggr only covers questions
+                if event_type != QUESTION_ASKED:
+                    self._paper_users[row.user_id] += 1
+                    self._indexes["user"].add(row.user_id)
+                elif self._after("users", row.timestamp):
+                    recent["user"][row.user_id] += 1
+                    self._indexes["user"].add(row.user_id)
+
+    def _after(self, source: str, timestamp: datetime) -> bool:
+        covered = self._covered[source]
+        return covered is None or timestamp >= covered
+
+    def load(self):
+        db = self.session_factory()
+        try:
+            indexes, covered = self._read(db)
+        except Exception as e:
+            error(f"Loading suggestion indexes failed: {e}")
+            return
+        finally:
+            db.close()
+        with self._lock:
+            self._covered = covered
+            # Drop what the rollups now include, re-apply the rest
+            for day in list(self._recent):
+                counts = self._recent[day]
+                midnight = local_day_start(day)
+                for field, source in (("class", "rollups"), ("subject", "rollups"), ("user", "users")):
+                    if not self._after(source, midnight):
+                        counts[field].clear()
+                    for value, count in counts[field].items():
+                        indexes[field].add(value, count)
+                if not any(counts.values()):
+                    del self._recent[day]
+            for value, count in self._paper_users.items():
+                indexes["user"].add(value, count)
+            self._indexes = indexes
+            self.ready = True
+        log(f"Suggestion indexes loaded: {', '.join(f'{len(i.counts)} {f}' for f, i in indexes.items())}")
+
+    @staticmethod
+    def _read(db: Session):
+        counts = {field: {} for field in FIELDS}
+        for field in ("class", "subject"):
+            column = getattr(EventRollup, FIELDS[field])
+            rows = db.query(column, func.sum(EventRollup.count)).filter(
+                EventRollup.granularity == "day", column.isnot(None), column != ""
+            ).group_by(column).all()
+            counts[field] = {value: int(total or 0) for value, total in rows}
+        rows = db.query(QuestionsWeeklyAggr.user_id, func.sum(QuestionsWeeklyAggr.count)).filter(
+            QuestionsWeeklyAggr.user_id.isnot(None), QuestionsWeeklyAggr.user_id != ""
+        ).group_by(QuestionsWeeklyAggr.user_id).all()
+        counts["user"] = {value: int(total or 0) for value, total in rows}
+
+        # Day rollups are complete up to the lowest day watermark over both metrics
+        marks = [mark for (mark,) in db.query(EventRollupWatermark.covered_until).filter(
+            EventRollupWatermark.granularity == "day"
+        )]
+        covered = {
+            "rollups": local_day_start(min(marks)) if marks else None,
+            "users": questions_boundary(db),
+        }
+        return {field: PrefixIndex(c) for field, c in counts.items()}, covered
+
+    def suggest(self, field: str, prefix: str = "", limit: int = 10) -> List[dict]:
+        """Most frequent values of `field` starting with `prefix` (case-insensitive)."""
+        with self._lock:
+            self.queries += 1
+            top = self._indexes[field].top(prefix, limit)
+        return [{"value": value, "count": count} for value, count in top]
+
+    def start(self, scheduler):
+        # Load off the startup path; until then only newly ingested values are suggested
+        scheduler.add_job(
+            self.load, "date",
+            id="suggest_load", replace_existing=True
+        )
+        scheduler.add_job(
+            self.load, "interval",
+            minutes=settings.SUGGEST_RELOAD_MINUTES,
+            id="suggest_reload", replace_existing=True,
+            max_instances=1, coalesce=True
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict({field: len(index.counts) for field, index in self._indexes.items()},
+                        ready=self.ready, queries=self.queries)
+
+
+suggest_service = SuggestService()
@@ -0,0 +1,201 @@
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.models import QuestionsAsked, QuestionsWeeklyAggr
+from src.services.ingest_service import ingest_service, QUESTION_ASKED
+from src.services.rollup_service import week_start, month_start, as_date
+from src.services.shard_service import shard_service
+
+# (counts keyed by (day, subject), keys holding a whole boundary week)
+TimelineCounts = Tuple[Dict[Tuple[date, str], int], Set[Tuple[date, str]]]
+
+
+class TimelineService:
+    """
+    Per-student question history, served from the weekly per-profile rollups
+    (questions_weekly_aggr) plus the raw rows newer than the last rolled-up week.
+
+    Months are summed from the same counts, with weeks that cross a month
+    boundary split between the two months by the days of their raw rows.
+    A boundary week whose raw rows are gone stays whole in the month it
+    starts in, and that month is flagged `estimated`. The merged counts are
+    cached per profile and dropped as soon as that profile ingests a new
+    question.
+    """
+
+    GRANULARITIES = ("week", "month")
+
+    def __init__(self, max_profiles: int = settings.TIMELINE_CACHE_SIZE):
+        self.max_profiles = max_profiles
+        self._cache: "OrderedDict[str, TimelineCounts]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        ingest_service.add_listener(self._on_event)
+
+    def _on_event(self, event_type: str, row):
+        if event_type == QUESTION_ASKED and row.profile_id:
+            self.invalidate(row.profile_id)
+
+    def invalidate(self, profile_id: str):
+        with self._lock:
+            self._cache.pop(profile_id, None)
+            self._generations[profile_id] = self._generations.get(profile_id, 0) + 1
+
+    def clear(self):
+        """Drop every cached profile, e.g. after the weekly aggregation rewrote rollups."""
+        with self._lock:
+            self._cache.clear()
+            self._generations.clear()
+
+    def get_timeline(self, db: Session, profile_id: str, granularity: str = "week") -> List[dict]:
+        counts, unsplit = self._get_counts(db, profile_id)
+
+        buckets: Dict[Tuple[date, str], int] = {}
+        estimated: Set[Tuple[date, str]] = set()
+        for (day, subject), count in counts.items():
+            period = week_start(day) if granularity == "week" else month_start(day)
+            key = (period, subject)
+            buckets[key] = buckets.get(key, 0) + count
+            if granularity == "month" and (day, subject) in unsplit:
+                estimated.add(key)
+
+        return [
+            {"period_start": period, "subject": subject, "count": count, "estimated": (period, subject) in estimated}
+            for (period, subject), count in sorted(buckets.items(), key=lambda x: (x[0][0], x[0][1] or ""))
+        ]
+
+    def _get_counts(self, db: Session, profile_id: str) -> TimelineCounts:
+        with self._lock:
+            cached = self._cache.get(profile_id)
+            if cached is not None:
+                self._cache.move_to_end(profile_id)
+                return cached
+            generation = self._generations.get(profile_id, 0)
+
+        counts = self._load_counts(db, profile_id)
+
+        with self._lock:
+            # Skip caching if an ingest invalidated the profile while we were loading
+            if self._generations.get(profile_id, 0) == generation:
+                self._cache[profile_id] = counts
+                self._cache.move_to_end(profile_id)
+                while len(self._cache) > self.max_profiles:
+                    self._cache.popitem(last=False)
+        return counts
+
+    def _load_counts(self, db: Session, profile_id: str) -> TimelineCounts:
+        """
+        Counts keyed by (day, subject), where the day is a week start, or for a
+        week that crosses a month boundary, the first day of its part in each
+        month; so both week and month buckets are exact sums of the keys.
+        Boundary weeks that cannot be split are keyed by their start and
+        returned in the second set.
+        """
+        counts: Dict[Tuple[date, str], int] = {}
+
+        def add(day: date, subject: str, count: int):
+            if not count:
+                return
+            key = (day, subject)
+            counts[key] = counts.get(key, 0) + count
+
+        # 1. Rolled-up weeks (from QuestionsWeeklyAggr)
+        rollups = db.query(
+            QuestionsWeeklyAggr.date,
+            QuestionsWeeklyAggr.subject,
+            func.sum(QuestionsWeeklyAggr.count).label('count')
+        ).filter(
+            QuestionsWeeklyAggr.profile_id == profile_id
+        ).group_by(
+            QuestionsWeeklyAggr.date,
+            QuestionsWeeklyAggr.subject
+        ).all()
+
+        last_rolled_week = None
+        straddling: Dict[Tuple[date, str], int] = {}
+        for row in rollups:
+            if row.date is None:
+                continue
+            if month_start(row.date) != month_start(row.date + timedelta(days=6)):
+                straddling[(row.date, row.subject)] = row.count or 0
+            else:
+                add(row.date, row.subject, row.count or 0)
+            if last_rolled_week is None or row.date > last_rolled_week:
+                last_rolled_week = row.date
+
+        # Weeks crossing a month boundary are split by the days of their raw rows
+        split = self._split_weeks(db, profile_id, straddling)
+        unsplit = set()
+        for (week, subject), count in straddling.items():
+            parts = split.get((week, subject))
+            if parts is None:
+                unsplit.add((week, subject))
+                parts = {week: count}
+            for day, part in parts.items():
+                add(day, subject, part)
+
+        # 2. Recent delta (from QuestionsAsked), only after the last rolled-up week
+        cutoff = None
+        if last_rolled_week is not None:
+            cutoff = datetime.combine(last_rolled_week + timedelta(days=7), datetime.min.time())
+
+        def recent(member_db: Session):
+            query = member_db.query(QuestionsAsked.subject, QuestionsAsked.timestamp).filter(
+                QuestionsAsked.profile_id == profile_id
+            )
+            if cutoff is not None:
+                query = query.filter(QuestionsAsked.timestamp >= cutoff)
+            return query.all()
+
+        for subject, timestamp in shard_service.gather(db, recent):
+            if timestamp is None:
+                continue
+            add(_part_start(timestamp.date()), subject, 1)
+
+        return counts, unsplit
+
+    @staticmethod
+    def _split_weeks(db: Session, profile_id: str, weeks: Dict[Tuple[date, str], int]) -> Dict[Tuple[date, str], Dict[date, int]]:
+        """
+        Split rolled-up weeks that cross a month boundary into their part in
+        each month, by the days of their raw rows. Weeks whose raw rows no
+        longer add up to the rollup count (purged or archived) are left out.
+        """
+        if not weeks:
+            return {}
+        first = min(week for week, _ in weeks)
+        last = max(week for week, _ in weeks) + timedelta(days=7)
+        day = func.date(QuestionsAsked.timestamp)
+
+        def partial(member_db: Session):
+            return member_db.query(
+                QuestionsAsked.subject, day.label('day'), func.count(QuestionsAsked.id).label('count')
+            ).filter(
+                QuestionsAsked.profile_id == profile_id,
+                QuestionsAsked.timestamp >= datetime.combine(first, datetime.min.time()),
+                QuestionsAsked.timestamp < datetime.combine(last, datetime.min.time())
+            ).group_by(QuestionsAsked.subject, day).all()
+
+        raw: Dict[Tuple[date, str], Dict[date, int]] = {}
+        for row in shard_service.gather(db, partial):
+            d = as_date(row.day)
+            key = (week_start(d), row.subject)
+            if key in weeks:
+                parts = raw.setdefault(key, {})
+                parts[_part_start(d)] = parts.get(_part_start(d), 0) + row.count
+
+        return {key: parts for key, parts in raw.items() if sum(parts.values()) == weeks[key]}
+
+
+def _part_start(day: date) -> date:
+    """First day of `day`'s week that is in the same month as `day`."""
+    return max(week_start(day), month_start(day))
+
+
+timeline_service = TimelineService()
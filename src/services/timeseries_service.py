@@ -0,0 +1,151 @@
+from bisect import bisect_right
+from datetime import date
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from src.models import EventRollup
+from src.services.rollup_service import (
+    rollup_service, GRANULARITIES, METRIC_MODELS,
+    bucket_start, bucket_end, as_date
+)
+from src.services.shard_service import shard_service
+
+
+class Segment(NamedTuple):
+    bucket: date   # output bucket this segment contributes to
+    source: str    # rollup granularity ("month" / "week" / "day") or "raw"
+    start: date
+    end: date      # exclusive
+
+
+def output_buckets(start: date, end: date, granularity: str) -> List[date]:
+    buckets = []
+    current = bucket_start(start, granularity)
+    while current < end:
+        buckets.append(current)
+        current = bucket_end(current, granularity)
+    return buckets
+
+
+def plan(start: date, end: date, granularity: str, watermarks: Dict[str, date]) -> List[Segment]:
+    """
+    Cover [start, end) with segments, per output bucket, using the coarsest
+    complete rollup buckets first (month, then week, then day) and raw rows
+    only for the open edges no rollup covers.
+
+    Rollups coarser than the requested granularity are never used, since
+    they cannot be split back into smaller output buckets.
+    """
+    levels = list(GRANULARITIES[:GRANULARITIES.index(granularity) + 1])[::-1]
+    segments: List[Segment] = []
+    for bucket in output_buckets(start, end, granularity):
+        s = max(bucket, start)
+        e = min(bucket_end(bucket, granularity), end)
+        _cover(bucket, s, e, levels, watermarks, segments)
+    return segments
+
+
+def _cover(bucket: date, s: date, e: date, levels: List[str], watermarks: Dict[str, date], out: List[Segment]):
+    if s >= e:
+        return
+    if not levels:
+        out.append(Segment(bucket, "raw", s, e))
+        return
+
+    level, finer = levels[0], levels[1:]
+    covered_until = watermarks.get(level)
+    if covered_until is None:
+        _cover(bucket, s, e, finer, watermarks, out)
+        return
+
+    # Aligned run of complete `level` buckets inside [s, min(e, covered_until))
+    first = s if bucket_start(s, level) == s else bucket_end(bucket_start(s, level), level)
+    last = bucket_start(min(e, covered_until), level)
+    if last <= first:
+        _cover(bucket, s, e, finer, watermarks, out)
+        return
+
+    _cover(bucket, s, first, finer, watermarks, out)
+    out.append(Segment(bucket, level, first, last))
+    _cover(bucket, last, e, finer, watermarks, out)
+
+
+class TimeSeriesService:
+    """
+    Question / test-paper counts over arbitrary date ranges, read from
+    event_rollups wherever complete buckets exist. Cost is proportional to the
+    number of buckets touched, not the number of raw events.
+    """
+
+    def query(
+        self,
+        db: Session,
+        metric: str,
+        granularity: str,
+        start: date,
+        end: date,
+        class_name: Optional[str] = None,
+        subject: Optional[str] = None
+    ) -> List[dict]:
+        watermarks = rollup_service.get_watermarks(db, metric)
+        segments = plan(start, end, granularity, watermarks)
+        counts = {bucket: 0 for bucket in output_buckets(start, end, granularity)}
+
+        # 1. Rollup segments: one grouped query per rollup granularity
+        for level in GRANULARITIES:
+            level_segments = sorted((s for s in segments if s.source == level), key=lambda s: s.start)
+            if not level_segments:
+                continue
+            query = db.query(
+                EventRollup.bucket_start,
+                func.sum(EventRollup.count).label('count')
+            ).filter(
+                EventRollup.metric == metric,
+                EventRollup.granularity == level,
+                EventRollup.bucket_start >= level_segments[0].start,
+                EventRollup.bucket_start < level_segments[-1].end
+            )
+            query = self._filter(query, EventRollup, class_name, subject)
+            rows = query.group_by(EventRollup.bucket_start).all()
+            self._assign(counts, level_segments, [(row.bucket_start, row.count) for row in rows])
+
+        # 2. Raw edges: a single grouped-by-day query over the uncovered span
+        raw_segments = sorted((s for s in segments if s.source == "raw"), key=lambda s: s.start)
+        if raw_segments:
+            model = METRIC_MODELS[metric]
+            # Same day basis as the rollups the other segments come from
+            day, filters = rollup_service.day_filter(db, metric, raw_segments[0].start, raw_segments[-1].end)
+
+            def partial(member_db: Session):
+                query = member_db.query(
+                    day.label('day'),
+                    func.count(model.id).label('count')
+                ).filter(*filters)
+                query = self._filter(query, model, class_name, subject)
+                return query.group_by(day).all()
+
+            rows = shard_service.gather(db, partial)
+            self._assign(counts, raw_segments, [(as_date(row.day), row.count) for row in rows])
+
+        return [{"bucket_start": bucket, "count": count} for bucket, count in counts.items()]
+
+    @staticmethod
+    def _filter(query, model, class_name: Optional[str], subject: Optional[str]):
+        if class_name:
+            query = query.filter(model.class_name == class_name)
+        if subject:
+            query = query.filter(model.subject == subject)
+        return query
+
+    @staticmethod
+    def _assign(counts: Dict[date, int], segments: List[Segment], rows):
+        starts = [s.start for s in segments]
+        for key, count in rows:
+            i = bisect_right(starts, key) - 1
+            if i >= 0 and key < segments[i].end:
+                counts[segments[i].bucket] += count or 0
+
+
+timeseries_service = TimeSeriesService()
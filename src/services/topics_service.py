@@ -0,0 +1,282 @@
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.database import SessionLocal
+from src.logger import error
+from src.models import TopicSketch
+from src.sketches import SpaceSaving
+from src.services.ingest_service import ingest_service, QUESTION_ASKED
+from src.services.rollup_service import week_start
+
+MAX_TOPIC_LENGTH = 120
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+# Keys in QUESTION_ASKED data, in order of preference
+TAG_FIELDS = ("topics", "topic", "tags")
+TEXT_FIELDS = ("q", "question", "text", "content")
+
+# (class_name, subject, week_start)
+TopicKey = Tuple[str, str, date]
+
+
+def normalize_topic(text: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace so rephrasings count together."""
+    return _NON_WORD.sub(" ", str(text).lower()).strip()[:MAX_TOPIC_LENGTH].strip()
+
+
+def extract_topics(data) -> List[str]:
+    """Topic tags if the event carries them, otherwise the normalized question text."""
+    if not isinstance(data, dict):
+        return []
+    for field in TAG_FIELDS:
+        value = data.get(field)
+        if value:
+            values = value if isinstance(value, list) else [value]
+            return [t for t in (normalize_topic(v) for v in values) if t]
+    for field in TEXT_FIELDS:
+        value = data.get(field)
+        if value:
+            topic = normalize_topic(value)
+            return [topic] if topic else []
+    return []
+
+
+class TopTopicsService:
+    """
+    Most-asked topics per (class, subject, week), kept as bounded Space-Saving
+    summaries updated on every ingested question.
+
+    At most TOP_TOPICS_MAX_SKETCHES summaries (of TOP_TOPICS_CAPACITY counters
+    each) live in memory; dirty ones are persisted to topic_sketches
+    periodically and the least recently touched are evicted once saved.
+
+    Each in-memory summary is the stored row as of its updated_at plus the
+    additions not persisted yet. Rows may also be changed by another
+    process (replays merge their rows in with merge_into()); when a row's
+    updated_at has moved on, reads and the next persist use the stored row
+    plus those additions instead.
+    """
+
+    def __init__(
+        self,
+        capacity: int = settings.TOP_TOPICS_CAPACITY,
+        max_sketches: int = settings.TOP_TOPICS_MAX_SKETCHES,
+        session_factory=SessionLocal
+    ):
+        self.capacity = capacity
+        self.max_sketches = max_sketches
+        self.session_factory = session_factory
+        self._sketches: "OrderedDict[TopicKey, SpaceSaving]" = OrderedDict()
+        # Additions since the last persist, per dirty summary
+        self._dirty: Dict[TopicKey, SpaceSaving] = {}
+        # updated_at of the stored row each in-memory summary starts from
+        self._seen: Dict[TopicKey, Optional[datetime]] = {}
+        self._lock = threading.RLock()
+        ingest_service.add_listener(self._on_event)
+
+    def _on_event(self, event_type: str, row):
+        if event_type == QUESTION_ASKED and row.timestamp:
+            self.add(row.class_name, row.subject, row.timestamp, extract_topics(row.data))
+
+    def add(self, class_name: Optional[str], subject: Optional[str], timestamp, topics: List[str]):
+        if not topics:
+            return
+        key = (class_name or "", subject or "", week_start(timestamp))
+        with self._lock:
+            sketch = self._get_or_load(key)
+            added = self._dirty.setdefault(key, SpaceSaving(self.capacity))
+            for topic in topics:
+                sketch.add(topic)
+                added.add(topic)
+            self._sketches.move_to_end(key)
+
+    def _get_or_load(self, key: TopicKey) -> SpaceSaving:
+        sketch = self._sketches.get(key)
+        if sketch is not None:
+            return sketch
+
+        # Continue a summary persisted before a restart or eviction
+        db = self.session_factory()
+        try:
+            row = self._find_row(db, key)
+            sketch = SpaceSaving.from_dict(row.sketch) if row is not None and row.sketch else SpaceSaving(self.capacity)
+        finally:
+            db.close()
+
+        self._evict(self.max_sketches - 1)
+        self._sketches[key] = sketch
+        self._seen[key] = row.updated_at if row is not None else None
+        return sketch
+
+    def _evict(self, limit: int):
+        # Only clean summaries can be dropped; dirty ones wait for the next persist
+        for key in list(self._sketches):
+            if len(self._sketches) <= limit:
+                break
+            if key not in self._dirty:
+                del self._sketches[key]
+                self._seen.pop(key, None)
+
+    @staticmethod
+    def _find_row(db: Session, key: TopicKey) -> Optional[TopicSketch]:
+        class_name, subject, week = key
+        return db.query(TopicSketch).filter(
+            TopicSketch.class_name == class_name,
+            TopicSketch.subject == subject,
+            TopicSketch.week_start == week
+        ).first()
+
+    def _rebase(self, row: TopicSketch, added: Optional[SpaceSaving]) -> SpaceSaving:
+        """The stored row plus `added`."""
+        sketch = SpaceSaving.from_dict(row.sketch) if row.sketch else SpaceSaving(self.capacity)
+        if added is not None:
+            sketch.merge(SpaceSaving.from_dict(added.to_dict()))
+        return sketch
+
+    def persist(self) -> int:
+        with self._lock:
+            dirty = {key: (self._sketches[key].to_dict(), added, self._seen.get(key))
+                     for key, added in self._dirty.items() if key in self._sketches}
+            self._dirty = {}
+        if not dirty:
+            return 0
+
+        db = self.session_factory()
+        saved, retry = {}, {}
+        try:
+            now = datetime.utcnow()
+            for key, (payload, added, seen) in dirty.items():
+                row = self._find_row(db, key)
+                if row is None:
+                    class_name, subject, week = key
+                    db.add(TopicSketch(class_name=class_name, subject=subject, week_start=week, sketch=payload, updated_at=now))
+                    saved[key] = None
+                    continue
+                rebased = row.updated_at != seen
+                if rebased:
+                    payload = self._rebase(row, added).to_dict()
+                # Only if nobody rewrote the row since it was read
+                updated = db.query(TopicSketch).filter(
+                    TopicSketch.id == row.id, TopicSketch.updated_at == row.updated_at
+                ).update({"sketch": payload, "updated_at": now}, synchronize_session=False)
+                if updated:
+                    saved[key] = payload if rebased else None
+                else:
+                    retry[key] = added
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            with self._lock:
+                self._restore({key: added for key, (_, added, _) in dirty.items()})
+            error(f"Persisting {len(dirty)} topic sketches failed, will retry: {e}")
+            return 0
+        finally:
+            db.close()
+
+        with self._lock:
+            self._restore(retry)
+            for key, payload in saved.items():
+                self._seen[key] = now
+                if payload is not None and key in self._sketches:
+                    sketch = SpaceSaving.from_dict(payload)
+                    if key in self._dirty:
+                        sketch.merge(SpaceSaving.from_dict(self._dirty[key].to_dict()))
+                    self._sketches[key] = sketch
+            self._evict(self.max_sketches)
+        return len(saved)
+
+    def _restore(self, additions: Dict[TopicKey, SpaceSaving]):
+        # Put back additions that were not saved, in front of any made meanwhile
+        for key, added in additions.items():
+            newer = self._dirty.get(key)
+            self._dirty[key] = added.merge(newer) if newer is not None else added
+
+    # --- Replays ---
+
+    def summarize(self, rows: Iterable) -> Dict[TopicKey, SpaceSaving]:
+        """Summaries of QUESTION_ASKED rows (class_name, subject, timestamp, data) per key."""
+        summaries: Dict[TopicKey, SpaceSaving] = {}
+        for row in rows:
+            topics = extract_topics(row.data) if row.timestamp else []
+            if topics:
+                key = (row.class_name or "", row.subject or "", week_start(row.timestamp))
+                summary = summaries.setdefault(key, SpaceSaving(self.capacity))
+                for topic in topics:
+                    summary.add(topic)
+        return summaries
+
+    def merge_into(self, conn: Connection, summaries: Dict[TopicKey, SpaceSaving]):
+        """
+        Merge `summaries` of rows stored without going through ingest into
+        topic_sketches, in the caller's transaction. Running apps pick the
+        change up by its updated_at.
+        """
+        table = TopicSketch.__table__
+        now = datetime.utcnow()
+        for (class_name, subject, week), summary in summaries.items():
+            row = conn.execute(table.select().where(
+                table.c.class_name == class_name, table.c.subject == subject, table.c.week_start == week
+            )).first()
+            if row is None:
+                conn.execute(table.insert().values(class_name=class_name, subject=subject, week_start=week,
+                                                   sketch=summary.to_dict(), updated_at=now))
+            else:
+                conn.execute(table.update().where(table.c.id == row.id).values(
+                    sketch=self._rebase(row, summary).to_dict(), updated_at=now
+                ))
+
+    def top_topics(
+        self,
+        db: Session,
+        week: date,
+        class_name: Optional[str] = None,
+        subject: Optional[str] = None,
+        k: int = 10
+    ) -> List[dict]:
+        """Top-k topics for a week, merging summaries when class or subject is left open."""
+        week = week_start(week)
+        query = db.query(TopicSketch).filter(TopicSketch.week_start == week)
+        if class_name:
+            query = query.filter(TopicSketch.class_name == class_name)
+        if subject:
+            query = query.filter(TopicSketch.subject == subject)
+
+        rows = {(row.class_name, row.subject, row.week_start): row for row in query.all()}
+        summaries: Dict[TopicKey, SpaceSaving] = {
+            key: SpaceSaving.from_dict(row.sketch) for key, row in rows.items() if row.sketch
+        }
+        # In-memory summaries are at least as fresh as the row they started from
+        with self._lock:
+            for key, sketch in self._sketches.items():
+                if key[2] == week and (not class_name or key[0] == class_name) and (not subject or key[1] == subject):
+                    row = rows.get(key)
+                    if row is not None and row.updated_at != self._seen.get(key):
+                        summaries[key] = self._rebase(row, self._dirty.get(key))
+                    else:
+                        summaries[key] = SpaceSaving.from_dict(sketch.to_dict())
+
+        merged = SpaceSaving(self.capacity)
+        for sketch in summaries.values():
+            merged.merge(sketch)
+        return [{"topic": topic, "count": count, "error": err} for topic, count, err in merged.top(k)]
+
+    def start(self, scheduler):
+        scheduler.add_job(
+            self.persist, "interval",
+            seconds=settings.TOP_TOPICS_PERSIST_SECONDS,
+            id="top_topics_persist", replace_existing=True,
+            max_instances=1, coalesce=True
+        )
+
+    def stop(self):
+        self.persist()
+
+
+top_topics_service = TopTopicsService()
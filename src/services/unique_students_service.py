@@ -0,0 +1,221 @@
+import threading
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.business_time import local_day, local_day_start
+from src.database import SessionLocal
+from src.logger import log, error
+from src.models import QuestionsAsked, QuestionStudentSketch
+from src.sketches import HyperLogLog
+from src.services.ingest_service import ingest_service, QUESTION_ASKED
+from src.services.rollup_service import month_start, bucket_end
+from src.services.timeseries_service import plan
+
+GROUP_BY_OPTIONS = ("class_subject", "class", "subject", "none")
+
+# (granularity, bucket_start, class_name, subject)
+SketchKey = Tuple[str, date, str, str]
+
+
+class UniqueStudentsService:
+    """
+    Distinct question-asking students per class/subject/period from
+    HyperLogLog sketches, so "unique students" never needs a
+    COUNT(DISTINCT profile_id) over raw questions.
+
+    Days and months are BUSINESS_TIMEZONE ones, like the rollups.
+    Each ingested question updates an in-memory day sketch and month sketch;
+    those are merged into question_student_sketches on a short interval.
+    Reads merge the stored blobs covering the range (month sketches for whole
+    months, day sketches for the edges) plus anything not yet flushed.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self._pending: Dict[SketchKey, HyperLogLog] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        ingest_service.add_listener(self._on_event)
+
+    def _on_event(self, event_type: str, row):
+        if event_type == QUESTION_ASKED and row.profile_id and row.timestamp:
+            self.add(row.profile_id, row.class_name, row.subject, local_day(row.timestamp))
+
+    def add(self, profile_id: str, class_name: Optional[str], subject: Optional[str], day: date):
+        class_name, subject = class_name or "", subject or ""
+        with self._lock:
+            for key in (("day", day, class_name, subject), ("month", month_start(day), class_name, subject)):
+                sketch = self._pending.get(key)
+                if sketch is None:
+                    sketch = self._pending[key] = HyperLogLog()
+                sketch.add(profile_id)
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending
+                self._pending = {}
+            if not batch:
+                return 0
+
+            db = self.session_factory()
+            try:
+                self._merge_into_db(db, batch)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                with self._lock:
+                    for key, sketch in batch.items():
+                        if key in self._pending:
+                            sketch.merge(self._pending[key])
+                        self._pending[key] = sketch
+                error(f"Unique-student sketch flush failed, will retry: {e}")
+                return 0
+            finally:
+                db.close()
+            return len(batch)
+
+    def _merge_into_db(self, db: Session, batch: Dict[SketchKey, HyperLogLog], replace: bool = False):
+        now = datetime.utcnow()
+        for (granularity, bucket, class_name, subject), sketch in batch.items():
+            row = db.query(QuestionStudentSketch).filter(
+                QuestionStudentSketch.granularity == granularity,
+                QuestionStudentSketch.bucket_start == bucket,
+                QuestionStudentSketch.class_name == class_name,
+                QuestionStudentSketch.subject == subject
+            ).first()
+            if row is None:
+                db.add(QuestionStudentSketch(
+                    granularity=granularity, bucket_start=bucket,
+                    class_name=class_name, subject=subject,
+                    sketch=sketch.to_bytes(), updated_at=now
+                ))
+                continue
+            if not replace:
+                sketch = sketch.copy().merge(HyperLogLog.from_bytes(row.sketch))
+            row.sketch = sketch.to_bytes()
+            row.updated_at = now
+
+    def unique_students(
+        self,
+        db: Session,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        class_name: Optional[str] = None,
+        subject: Optional[str] = None,
+        group_by: str = "class_subject"
+    ) -> List[dict]:
+        """
+        Distinct students in [start, end) (all time when no range is given),
+        grouped by class and/or subject.
+        """
+        query = db.query(
+            QuestionStudentSketch.granularity,
+            QuestionStudentSketch.bucket_start,
+            QuestionStudentSketch.class_name,
+            QuestionStudentSketch.subject,
+            QuestionStudentSketch.sketch
+        )
+        if start is None or end is None:
+            ranges = [("month", date.min, date.max)]
+            query = query.filter(QuestionStudentSketch.granularity == "month")
+        else:
+            # Sketches are updated at ingest, so every bucket is complete
+            segments = plan(start, end, "month", {"month": end, "day": end})
+            ranges = [(s.source, s.start, s.end) for s in segments]
+            query = query.filter(or_(*[
+                (QuestionStudentSketch.granularity == granularity) &
+                (QuestionStudentSketch.bucket_start >= s) &
+                (QuestionStudentSketch.bucket_start < e)
+                for granularity, s, e in ranges
+            ]))
+        if class_name:
+            query = query.filter(QuestionStudentSketch.class_name == class_name)
+        if subject:
+            query = query.filter(QuestionStudentSketch.subject == subject)
+
+        stored = [(row.granularity, row.bucket_start, row.class_name, row.subject, HyperLogLog.from_bytes(row.sketch))
+                  for row in query.all()]
+        with self._lock:
+            pending = [key + (sketch.copy(),) for key, sketch in self._pending.items()
+                       if (not class_name or key[2] == class_name) and (not subject or key[3] == subject)]
+
+        merged: Dict[Tuple[str, str], HyperLogLog] = {}
+        for granularity, bucket, row_class, row_subject, sketch in stored + pending:
+            if not any(granularity == g and s <= bucket < e for g, s, e in ranges):
+                continue
+            group = self._group_key(group_by, row_class, row_subject)
+            if group in merged:
+                merged[group].merge(sketch)
+            else:
+                merged[group] = sketch
+
+        return [
+            {"class_name": group[0], "subject": group[1], "unique_students": sketch.count()}
+            for group, sketch in sorted(merged.items())
+        ]
+
+    @staticmethod
+    def _group_key(group_by: str, class_name: str, subject: str) -> Tuple[str, str]:
+        if group_by == "class":
+            return (class_name, "")
+        if group_by == "subject":
+            return ("", subject)
+        if group_by == "none":
+            return ("", "")
+        return (class_name, subject)
+
+    def rebuild_month(self, db: Session, month: date):
+        """
+        Rebuild the day and month sketches of one month from raw questions
+        (backfill for history that predates ingest-time sketching).
+        """
+        month = month_start(month)
+        end = bucket_end(month, "month")
+        rows = db.query(
+            QuestionsAsked.profile_id,
+            QuestionsAsked.class_name,
+            QuestionsAsked.subject,
+            QuestionsAsked.timestamp,
+            QuestionsAsked.local_date
+        ).filter(or_(
+            and_(QuestionsAsked.local_date >= month, QuestionsAsked.local_date < end),
+            # Rows the local_date backfill has not reached yet
+            and_(QuestionsAsked.local_date.is_(None),
+                 QuestionsAsked.timestamp >= local_day_start(month),
+                 QuestionsAsked.timestamp < local_day_start(end))
+        )).yield_per(10000)
+
+        batch: Dict[SketchKey, HyperLogLog] = {}
+        for profile_id, row_class, row_subject, timestamp, local_date in rows:
+            if not profile_id or timestamp is None:
+                continue
+            row_class, row_subject = row_class or "", row_subject or ""
+            day = local_date or local_day(timestamp)
+            for key in (("day", day, row_class, row_subject), ("month", month, row_class, row_subject)):
+                sketch = batch.get(key)
+                if sketch is None:
+                    sketch = batch[key] = HyperLogLog()
+                sketch.add(profile_id)
+
+        self._merge_into_db(db, batch, replace=True)
+        db.commit()
+        log(f"Rebuilt {len(batch)} unique-student sketches for {month:%Y-%m}")
+
+    def start(self, scheduler):
+        scheduler.add_job(
+            self.flush, "interval",
+            seconds=settings.UNIQUE_STUDENTS_FLUSH_SECONDS,
+            id="unique_students_flush", replace_existing=True,
+            max_instances=1, coalesce=True
+        )
+
+    def stop(self):
+        self.flush()
+
+
+unique_students_service = UniqueStudentsService()
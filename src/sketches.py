@@ -0,0 +1,362 @@
+"""
+Compact, mergeable summaries used for insights that cannot be summed from
+rollup counts (distinct students, heavy hitters, quantiles), and the
+membership filter used to short-circuit duplicate events.
+"""
+import hashlib
+import json
+import math
+import struct
+import zlib
+
+from src.startup import lazy_import
+
+# numpy is only loaded once a sketch is actually built
+np = lazy_import("numpy")
+
+
+def hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter. With the default precision of 14
+    (16384 one-byte registers) the standard error is about 0.8%.
+    Sketches with equal precision merge by register-wise max.
+    """
+
+    def __init__(self, precision: int = 14, registers: "np.ndarray" = None):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = registers if registers is not None else np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, value: str):
+        h = hash64(value)
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def copy(self) -> "HyperLogLog":
+        return HyperLogLog(self.precision, self.registers.copy())
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int32))))
+        if estimate <= 2.5 * m:
+            # Small-range correction (linear counting)
+            zeros = int(m - np.count_nonzero(self.registers))
+            if zeros:
+                estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        # Sparse sketches are mostly zero registers and compress very well
+        return zlib.compress(bytes([self.precision]) + self.registers.tobytes())
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "HyperLogLog":
+        raw = zlib.decompress(blob)
+        return cls(raw[0], np.frombuffer(raw[1:], dtype=np.uint8).copy())
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitter summary (Metwally et al.). Tracks at most
+    `capacity` items; any item whose true frequency exceeds N / capacity is
+    guaranteed to be present, and each reported count overestimates the true
+    count by at most its recorded error.
+    """
+
+    def __init__(self, capacity: int = 200):
+        self.capacity = capacity
+        self.counters = {}  # item -> [count, error]
+
+    def add(self, item: str, weight: int = 1):
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += weight
+        elif len(self.counters) < self.capacity:
+            self.counters[item] = [weight, 0]
+        else:
+            evicted = min(self.counters, key=lambda k: self.counters[k][0])
+            floor = self.counters.pop(evicted)[0]
+            self.counters[item] = [floor + weight, floor]
+
+    def min_count(self) -> int:
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(c[0] for c in self.counters.values())
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        # Items missing from a full summary may have occurred up to its minimum count
+        self_floor, other_floor = self.min_count(), other.min_count()
+        merged = {}
+        for item in set(self.counters) | set(other.counters):
+            a = self.counters.get(item, [self_floor, self_floor])
+            b = other.counters.get(item, [other_floor, other_floor])
+            merged[item] = [a[0] + b[0], a[1] + b[1]]
+        top = sorted(merged.items(), key=lambda kv: kv[1][0], reverse=True)[:self.capacity]
+        self.counters = {item: counter for item, counter in top}
+        return self
+
+    def top(self, k: int = 10):
+        """Top-k items as (item, count, error), highest count first."""
+        ranked = sorted(self.counters.items(), key=lambda kv: (-kv[1][0], kv[0]))
+        return [(item, counter[0], counter[1]) for item, counter in ranked[:k]]
+
+    def to_dict(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "counters": [[item, c[0], c[1]] for item, c in self.counters.items()]
+        }
+
+    @classmethod
+    def from_dict(cls, payload: dict) -> "SpaceSaving":
+        summary = cls(payload.get("capacity", 200))
+        summary.counters = {item: [count, error] for item, count, error in payload.get("counters", [])}
+        return summary
+
+
+class TDigest:
+    """
+    Merging t-digest (Dunning) for approximate quantiles. Keeps at most
+    O(compression) centroids whatever the number of samples, with small
+    centroids near the tails so extreme quantiles stay accurate.
+    Digests merge by re-compressing the union of their centroids.
+    """
+
+    def __init__(self, compression: int = 100):
+        self.compression = compression
+        self.centroids = []  # sorted [mean, weight]
+        self._buffer = []
+        self.min = math.inf
+        self.max = -math.inf
+
+    @property
+    def total(self) -> float:
+        return sum(w for _, w in self.centroids) + sum(w for _, w in self._buffer)
+
+    def add(self, value: float, weight: float = 1):
+        self._buffer.append([float(value), float(weight)])
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self._buffer) >= 10 * self.compression:
+            self._compress()
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        other._compress()
+        if other.centroids:
+            self._buffer.extend([m, w] for m, w in other.centroids)
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._compress()
+        return self
+
+    def _k(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _k_inverse(self, k: float) -> float:
+        return (math.sin(min(max(k * 2 * math.pi / self.compression, -math.pi / 2), math.pi / 2)) + 1) / 2
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        items = sorted(self.centroids + self._buffer, key=lambda c: c[0])
+        self._buffer = []
+        total = sum(w for _, w in items)
+
+        merged = [list(items[0])]
+        cumulative = 0.0
+        limit = self._k_inverse(self._k(0.0) + 1) * total
+        for mean, weight in items[1:]:
+            current = merged[-1]
+            if cumulative + current[1] + weight <= limit:
+                new_weight = current[1] + weight
+                current[0] += (mean - current[0]) * weight / new_weight
+                current[1] = new_weight
+            else:
+                cumulative += current[1]
+                limit = self._k_inverse(self._k(cumulative / total) + 1) * total
+                merged.append([mean, weight])
+        self.centroids = merged
+
+    def quantile(self, q: float):
+        self._compress()
+        if not self.centroids:
+            return None
+        if len(self.centroids) == 1:
+            return self.centroids[0][0]
+
+        total = self.total
+        index = q * total
+        first, last = self.centroids[0], self.centroids[-1]
+        if index <= first[1] / 2:
+            return self.min + (first[0] - self.min) * index / (first[1] / 2)
+        if index >= total - last[1] / 2:
+            return last[0] + (self.max - last[0]) * (index - (total - last[1] / 2)) / (last[1] / 2)
+
+        cumulative = first[1] / 2
+        for left, right in zip(self.centroids, self.centroids[1:]):
+            step = (left[1] + right[1]) / 2
+            if index <= cumulative + step:
+                return left[0] + (right[0] - left[0]) * (index - cumulative) / step
+            cumulative += step
+        return last[0]
+
+    def cdf(self, value: float):
+        """Approximate rank of `value` as a fraction of all samples (inverse of quantile())."""
+        self._compress()
+        if not self.centroids:
+            return None
+        if value < self.min:
+            return 0.0
+        if value >= self.max:
+            return 1.0
+
+        # Same piecewise-linear rank function quantile() inverts
+        total = self.total
+        xs, ranks = [self.min], [0.0]
+        cumulative = 0.0
+        for mean, weight in self.centroids:
+            xs.append(mean)
+            ranks.append(cumulative + weight / 2)
+            cumulative += weight
+        xs.append(self.max)
+        ranks.append(total)
+
+        for i in range(1, len(xs)):
+            if value <= xs[i]:
+                if xs[i] == xs[i - 1]:
+                    return ranks[i] / total
+                return (ranks[i - 1] + (ranks[i] - ranks[i - 1]) * (value - xs[i - 1]) / (xs[i] - xs[i - 1])) / total
+        return 1.0
+
+    def to_dict(self) -> dict:
+        self._compress()
+        return {
+            "compression": self.compression,
+            "min": self.min if self.centroids else None,
+            "max": self.max if self.centroids else None,
+            "centroids": self.centroids
+        }
+
+    @classmethod
+    def from_dict(cls, payload: dict) -> "TDigest":
+        digest = cls(payload.get("compression", 100))
+        digest.centroids = [list(c) for c in payload.get("centroids", [])]
+        if digest.centroids:
+            digest.min = payload["min"]
+            digest.max = payload["max"]
+        return digest
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter sized for `capacity` items at `error_rate`
+    false positives. Never reports a false negative.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, bits: "np.ndarray" = None, count: int = 0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.m = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.k = max(1, int(round(self.m / capacity * math.log(2))))
+        self.bits = bits if bits is not None else np.zeros((self.m + 7) // 8, dtype=np.uint8)
+        self.count = count
+
+    def _positions(self, value: str):
+        # Double hashing (Kirsch-Mitzenmacher) from one 128-bit digest
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.m for i in range(self.k)]
+
+    def add(self, value: str):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+
+class ScalableBloomFilter:
+    """
+    Scalable Bloom filter (Almeida et al.): a chain of Bloom filters, each
+    `growth` times larger with a tighter error rate, so the overall false
+    positive rate stays below `error_rate` however many items are added.
+    Layers are chronological; with `max_layers` set the oldest is dropped
+    when a new one is needed, which only forgets the oldest items. A layer
+    is sized by its position among the retained layers, so memory stays
+    bounded by `max_layers` however long the filter runs.
+    """
+
+    def __init__(self, initial_capacity: int = 100000, error_rate: float = 0.001,
+                 growth: int = 2, tightening: float = 0.5, max_layers: int = 0):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.max_layers = max_layers
+        self.layers = []
+
+    def _new_layer(self, index: int) -> BloomFilter:
+        return BloomFilter(
+            self.initial_capacity * self.growth ** index,
+            self.error_rate * (1 - self.tightening) * self.tightening ** index
+        )
+
+    def add(self, value: str):
+        if not self.layers or self.layers[-1].full:
+            if self.max_layers and len(self.layers) >= self.max_layers:
+                self.layers.pop(0)
+            self.layers.append(self._new_layer(len(self.layers)))
+        self.layers[-1].add(value)
+
+    def __contains__(self, value: str) -> bool:
+        return any(value in layer for layer in reversed(self.layers))
+
+    def __len__(self) -> int:
+        return sum(layer.count for layer in self.layers)
+
+    def to_bytes(self) -> bytes:
+        header = json.dumps({
+            "initial_capacity": self.initial_capacity,
+            "error_rate": self.error_rate,
+            "growth": self.growth,
+            "tightening": self.tightening,
+            "max_layers": self.max_layers,
+            "layers": [[layer.capacity, layer.error_rate, layer.count] for layer in self.layers],
+        }).encode("utf-8")
+        return zlib.compress(struct.pack(">I", len(header)) + header + b"".join(l.bits.tobytes() for l in self.layers))
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "ScalableBloomFilter":
+        raw = zlib.decompress(blob)
+        (length,) = struct.unpack(">I", raw[:4])
+        header = json.loads(raw[4:4 + length])
+        bloom = cls(header["initial_capacity"], header["error_rate"], header["growth"],
+                    header["tightening"], header["max_layers"])
+        offset = 4 + length
+        for capacity, error_rate, count in header["layers"]:
+            layer = BloomFilter(capacity, error_rate, count=count)
+            size = len(layer.bits)
+            layer.bits = np.frombuffer(raw[offset:offset + size], dtype=np.uint8).copy()
+            offset += size
+            bloom.layers.append(layer)
+        return bloom
@@ -0,0 +1,124 @@
+"""
+Startup helpers kept free of heavy imports, so they are cheap to run from
+entrypoint.sh:
+
+    python -m src.startup check-revision   # exit 0 if the schema is at head
+
+plus deferred imports for optional heavy dependencies and the startup phase
+timing reported at boot and under "startup" in /api/insights/metrics.
+"""
+import importlib.util
+import os
+import re
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+_STARTED = time.perf_counter()
+
+VERSIONS_DIR = Path(__file__).resolve().parent.parent / "alembic" / "versions"
+_REVISION = re.compile(r"^revision(?:\s*:\s*str)?\s*=\s*['\"](\w+)['\"]", re.MULTILINE)
+_DOWN_REVISION = re.compile(r"^down_revision(?:\s*:[^=]+)?=\s*(.+)$", re.MULTILINE)
+
+
+def lazy_import(name: str):
+    """
+    Module object whose real import happens on first attribute access, so
+    modules that only some requests or jobs need do not slow down boot.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+# --- Migration check ---
+
+def head_revisions(versions_dir: Path = VERSIONS_DIR) -> Set[str]:
+    """Alembic heads, read from the revision files without importing them."""
+    revisions, parents = set(), set()
+    for path in versions_dir.glob("*.py"):
+        source = path.read_text()
+        revision = _REVISION.search(source)
+        if revision is None:
+            continue
+        revisions.add(revision.group(1))
+        down = _DOWN_REVISION.search(source)
+        if down is not None:
+            parents.update(re.findall(r"['\"](\w+)['\"]", down.group(1)))
+    return revisions - parents
+
+
+def current_revision(db_url: str) -> Optional[str]:
+    """
+    Revision stamped in alembic_version, read with sqlite3 directly.
+    None when it cannot be read cheaply (missing file, other databases).
+    """
+    if not db_url.startswith("sqlite:///"):
+        return None
+    path = db_url[len("sqlite:///"):]
+    if not path or path == ":memory:" or not os.path.exists(path):
+        return None
+    try:
+        with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as conn:
+            row = conn.execute("SELECT version_num FROM alembic_version").fetchone()
+    except sqlite3.Error:
+        return None
+    return row[0] if row else None
+
+
+def schema_is_current(db_url: str, versions_dir: Path = VERSIONS_DIR) -> bool:
+    heads = head_revisions(versions_dir)
+    return len(heads) == 1 and current_revision(db_url) in heads
+
+
+# --- Phase timing ---
+
+class StartupTimer:
+    """Durations of named boot phases, measured from the first import of this module."""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.ready_seconds: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.perf_counter() - started, 4)
+
+    def mark(self, name: str):
+        """Record time since process start as a phase (e.g. module imports)."""
+        self.phases[name] = round(time.perf_counter() - _STARTED, 4)
+
+    def ready(self) -> str:
+        self.ready_seconds = round(time.perf_counter() - _STARTED, 4)
+        slowest = sorted(self.phases.items(), key=lambda kv: kv[1], reverse=True)
+        return f"Ready in {self.ready_seconds}s (" + ", ".join(f"{name} {seconds}s" for name, seconds in slowest) + ")"
+
+    def report(self) -> dict:
+        return {"ready_seconds": self.ready_seconds, "phases": dict(self.phases)}
+
+
+startup_timer = StartupTimer()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["check-revision"]:
+        print("usage: python -m src.startup check-revision", file=sys.stderr)
+        sys.exit(2)
+    db_url = os.getenv("INSIGHTS_DB_URL", "sqlite:///./tutor_insights.db")
+    started = time.perf_counter()
+    current = schema_is_current(db_url)
+    print(f"Schema {'is' if current else 'is not'} at head (checked in {time.perf_counter() - started:.3f}s)")
+    sys.exit(0 if current else 1)
@@ -0,0 +1,37 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.database import Base
+from src.services.dedupe_service import event_id_filter
+from src.services.ingest_service import ingest_service
+
+
+@pytest.fixture(autouse=True)
+def reset_event_id_filter():
+    # Tests use a fresh database each, so ids seen by earlier tests are not duplicates
+    event_id_filter.reset()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def detach_listeners():
+    # Services built by a test register on the shared ingest_service; only the module singletons stay attached
+    attached = list(ingest_service._listeners)
+    yield
+    for listener in list(ingest_service._listeners):
+        if listener not in attached:
+            ingest_service.remove_listener(listener)
+
+
+@pytest.fixture
+def bind(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(bind):
+    return sessionmaker(bind=bind)
@@ -0,0 +1,39 @@
+from datetime import date
+from src.models import DailyActivity, WeeklyActivity
+from src.services.activity_service import ActivityBuffer
+
+
+def test_heartbeats_coalesce_into_daily_and_weekly_rows(session_factory):
+    buffer = ActivityBuffer(max_keys=100, max_heartbeat_seconds=300, session_factory=session_factory)
+    buffer.add("p1", "Math", 30, date(2026, 10, 12))
+    buffer.add("p1", "Math", 30, date(2026, 10, 12))
+    buffer.add("p1", "Math", 900, date(2026, 10, 13))  # clamped to 300
+    assert buffer.depth == 2
+
+    assert buffer.flush() == 2
+    buffer.add("p1", "Math", 40, date(2026, 10, 12))
+    buffer.flush()
+
+    db = session_factory()
+    daily = {(r.date, r.seconds_active) for r in db.query(DailyActivity).all()}
+    assert daily == {(date(2026, 10, 12), 100), (date(2026, 10, 13), 300)}
+
+    weekly = db.query(WeeklyActivity).one()
+    assert weekly.week_start == date(2026, 10, 12)
+    assert weekly.week_end == date(2026, 10, 18)
+    assert weekly.seconds_active == 400
+    assert buffer.stats()["depth"] == 0
+
+
+def test_failed_flush_keeps_deltas(session_factory):
+    def broken_factory():
+        raise RuntimeError("database is locked")
+
+    buffer = ActivityBuffer(max_keys=100, session_factory=broken_factory)
+    buffer.add("p1", "Math", 30, date(2026, 10, 12))
+    assert buffer.flush() == 0
+    assert buffer.depth == 1
+    assert buffer.failed_flushes == 1
+
+    buffer.session_factory = session_factory
+    assert buffer.flush() == 1
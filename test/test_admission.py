@@ -0,0 +1,95 @@
+import asyncio
+import httpx
+from fastapi import FastAPI
+from src.admission import AdmissionMiddleware, CostClass, classify, CHEAP, STANDARD, EXPENSIVE
+
+
+def test_classify_routes():
+    assert classify("GET", "/health") is None
+    assert classify("GET", "/api/insights/stream") is None
+    assert classify("OPTIONS", "/api/insights/questions") is None
+    assert classify("GET", "/api/insights/stats/dashboard") == CHEAP
+    assert classify("GET", "/api/insights/questions", b"page=2") == STANDARD
+    assert classify("GET", "/api/insights/questions", b"search=") == STANDARD
+    assert classify("GET", "/api/insights/questions", b"page=1&search=algebra") == EXPENSIVE
+    assert classify("GET", "/api/insights/test-papers/export", b"from=2026-01-01&to=2026-02-01") == EXPENSIVE
+    assert classify("POST", "/api/insights/batch") == EXPENSIVE
+
+
+def make_app(release: asyncio.Event, classes) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/insights/questions")
+    async def questions(search: str = ""):
+        await release.wait()
+        return {"search": search}
+
+    @app.get("/api/insights/stats/dashboard")
+    async def dashboard():
+        return {"ok": True}
+
+    app.add_middleware(AdmissionMiddleware, classes=classes)
+    return app
+
+
+def test_expensive_requests_are_shed_without_blocking_cheap_reads():
+    async def run():
+        release = asyncio.Event()
+        classes = {
+            CHEAP: CostClass(CHEAP, 1, 1, 0.5),
+            STANDARD: CostClass(STANDARD, 1, 1, 0.5),
+            EXPENSIVE: CostClass(EXPENSIVE, 1, 1, 0.05),
+        }
+        app = make_app(release, classes)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            searches = [asyncio.create_task(client.get("/api/insights/questions", params={"search": "x"}))
+                        for _ in range(3)]
+            await asyncio.sleep(0.01)
+            # One running, one queued, one over the queue bound; cheap reads are unaffected
+            dashboard = await client.get("/api/insights/stats/dashboard")
+            assert dashboard.status_code == 200
+
+            await asyncio.sleep(0.1)  # the queued search passes its deadline
+            release.set()
+            responses = await asyncio.gather(*searches)
+            assert sorted(r.status_code for r in responses) == [200, 503, 503]
+            shed = [r for r in responses if r.status_code == 503]
+            assert all(r.headers["retry-after"] for r in shed)
+            assert classes[EXPENSIVE].stats() == {"limit": 1, "active": 0, "queued": 0, "admitted": 1, "shed": 2}
+
+    asyncio.run(run())
+
+
+def test_released_slot_goes_to_the_oldest_waiter():
+    async def run():
+        cost_class = CostClass(STANDARD, 1, 2, 1.0)
+        assert await cost_class.acquire()
+        waiter = asyncio.create_task(cost_class.acquire())
+        await asyncio.sleep(0)
+        assert cost_class.stats()["queued"] == 1
+        cost_class.release()
+        assert await waiter
+        assert cost_class.stats() == {"limit": 1, "active": 1, "queued": 0, "admitted": 2, "shed": 0}
+        cost_class.release()
+        assert cost_class.active == 0
+
+    asyncio.run(run())
+
+
+def test_slot_handed_over_at_the_deadline_is_not_lost(monkeypatch):
+    async def run():
+        cost_class = CostClass(STANDARD, 1, 2, 0.01)
+        assert await cost_class.acquire()
+
+        async def handed_over_then_timed_out(waiter, timeout):
+            cost_class.release()
+            raise asyncio.TimeoutError
+
+        monkeypatch.setattr(asyncio, "wait_for", handed_over_then_timed_out)
+        assert await cost_class.acquire()
+        assert cost_class.stats() == {"limit": 1, "active": 1, "queued": 0, "admitted": 2, "shed": 0}
+        cost_class.release()
+        assert cost_class.active == 0
+
+    asyncio.run(run())
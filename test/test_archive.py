@@ -0,0 +1,88 @@
+from datetime import date, datetime
+from src.models import QuestionsAsked, QuestionsWeeklyAggr
+from src.services.archive_service import ArchiveService, LocalArchiveStore
+from src.services.rollup_service import RollupService
+import src.services.archive_service as archive_module
+
+
+def test_archive_month_and_read_back(session_factory, tmp_path, monkeypatch):
+    db = session_factory()
+    for i in range(30):
+        db.add(QuestionsAsked(
+            event_id=f"evt-{i:03d}", profile_id="p1", class_name="Class 10", subject="Math",
+            data={"q": f"question {i}"}, timestamp=datetime(2026, 1, 1 + i, 10)
+        ))
+    db.add(QuestionsAsked(event_id="live", profile_id="p1", subject="Math", timestamp=datetime(2026, 10, 1)))
+    db.add(QuestionsWeeklyAggr(profile_id="p1", subject="Math", count=30, date=date(2026, 9, 28)))
+    db.commit()
+
+    rollups = RollupService(session_factory=session_factory)
+    rollups.refresh(today=date(2026, 10, 18))
+    monkeypatch.setattr(archive_module, "rollup_service", rollups)
+    monkeypatch.setattr(archive_module.settings, "ARCHIVE_ROW_GROUP_SIZE", 8)
+
+    service = ArchiveService(store=LocalArchiveStore(str(tmp_path / "archive")), session_factory=session_factory)
+    assert service.archive_closed_months(today=date(2026, 10, 18)) == 30
+    assert db.query(QuestionsAsked).count() == 1
+    assert (tmp_path / "archive" / "questions_asked" / "2026-01.parquet").exists()
+
+    # Only the row group whose event_id range contains the id is read
+    ranges = service._row_group_ranges("questions_asked/2026-01.parquet", str(tmp_path / "archive" / "questions_asked" / "2026-01.parquet"))
+    assert len(ranges) == 4
+    assert sum(1 for _, lo, hi in ranges if lo <= "evt-012" <= hi) == 1
+
+    found = service.find_event("questions_asked", "evt-012")
+    assert found["data"] == {"q": "question 12"}
+    assert found["timestamp"] == datetime(2026, 1, 13, 10)
+    assert service.find_event("questions_asked", "missing") is None
+
+    exported = list(service.iter_range("questions_asked", datetime(2026, 1, 10), datetime(2026, 1, 13)))
+    assert [r["event_id"] for r in exported] == ["evt-009", "evt-010", "evt-011"]
+
+
+class CountingStore(LocalArchiveStore):
+    def __init__(self, root):
+        super().__init__(root)
+        self.fetched = []
+
+    def fetch(self, key):
+        self.fetched.append(key)
+        return super().fetch(key)
+
+
+def test_archive_streams_batches_and_lookups_skip_files_by_bloom_filter(session_factory, tmp_path, monkeypatch):
+    db = session_factory()
+    for month in (1, 2):
+        for i in range(20):
+            db.add(QuestionsAsked(event_id=f"m{month}-{i:03d}", profile_id="p1", subject="Math",
+                                  timestamp=datetime(2026, month, 1 + i, 10)))
+    db.add(QuestionsWeeklyAggr(profile_id="p1", subject="Math", count=40, date=date(2026, 9, 28)))
+    db.commit()
+
+    rollups = RollupService(session_factory=session_factory)
+    rollups.refresh(today=date(2026, 10, 18))
+    monkeypatch.setattr(archive_module, "rollup_service", rollups)
+    monkeypatch.setattr(archive_module.settings, "ARCHIVE_ROW_GROUP_SIZE", 8)
+    monkeypatch.setattr(archive_module.settings, "ARCHIVE_DELETE_BATCH_SIZE", 3)
+
+    store = CountingStore(str(tmp_path / "archive"))
+    service = ArchiveService(store=store, session_factory=session_factory)
+    assert service.archive_closed_months(today=date(2026, 10, 18)) == 40
+    assert db.query(QuestionsAsked).count() == 0
+
+    # A late row (and a redelivered one) for January is merged into its file
+    db.add(QuestionsAsked(event_id="m1-late", profile_id="p1", subject="Math", timestamp=datetime(2026, 1, 25)))
+    db.add(QuestionsAsked(event_id="m1-005", profile_id="p1", subject="Math", timestamp=datetime(2026, 1, 6, 10)))
+    db.commit()
+    assert service.archive_month(db, "questions_asked", date(2026, 1, 1)) == 2
+    import pyarrow.parquet as pq
+    january = pq.ParquetFile(str(tmp_path / "archive" / "questions_asked" / "2026-01.parquet"))
+    assert january.metadata.num_rows == 21
+    assert january.metadata.num_row_groups == 4
+
+    store.fetched.clear()
+    assert service.find_event("questions_asked", "m1-late")["timestamp"] == datetime(2026, 1, 25)
+    assert "questions_asked/2026-02.parquet" not in store.fetched
+    store.fetched.clear()
+    assert service.find_event("questions_asked", "nowhere") is None
+    assert not any(key.endswith(".parquet") for key in store.fetched)
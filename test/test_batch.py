@@ -0,0 +1,80 @@
+from datetime import datetime
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.database import get_db
+from src.dependencies import validate_admin_access
+from src.models import QuestionsAsked, TestPapers
+from src.routers import insights
+
+
+@pytest.fixture
+def client(session_factory):
+    db = session_factory()
+    for i in range(3):
+        db.add(QuestionsAsked(event_id=f"q{i}", user_id="u1", profile_id="p1", class_name="Class 10",
+                              subject="Math", timestamp=datetime(2026, 10, 1 + i)))
+    db.add(TestPapers(event_id="t1", user_id="u1", profile_id="p1", class_name="Class 10",
+                      subject="Science", timestamp=datetime(2026, 10, 2)))
+    db.commit()
+    db.close()
+
+    calls = []
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def override_admin():
+        calls.append(1)
+        return {"user_id": "admin"}
+
+    app = FastAPI()
+    app.include_router(insights.router)
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[validate_admin_access] = override_admin
+    test_client = TestClient(app)
+    test_client.auth_calls = calls
+    return test_client
+
+
+def test_batch_runs_dashboard_queries_together(client):
+    response = client.post("/api/insights/batch", json={"queries": [
+        {"name": "stats", "query": "dashboard"},
+        {"name": "by_subject", "query": "questions_by_subject"},
+        {"name": "papers_by_subject", "query": "test_papers_by_subject"},
+        {"name": "recent", "query": "questions", "params": {"limit": 2}},
+        {"name": "papers", "query": "test_papers"},
+        {"name": "series", "query": "timeseries",
+         "params": {"metric": "questions", "from": "2026-10-01", "to": "2026-10-03"}},
+    ]})
+    assert response.status_code == 200
+    results = {r["name"]: r for r in response.json()["results"]}
+    assert client.auth_calls == [1]
+    assert all(r["status"] == 200 and r["elapsed_ms"] >= 0 for r in results.values())
+    assert results["stats"]["data"]["total_questions"] == 3
+    assert results["by_subject"]["data"] == [
+        {"class_name": "Class 10", "subject": "Math", "count": 3, "unique_students": None}
+    ]
+    assert [q["event_id"] for q in results["recent"]["data"]] == ["q2", "q1"]
+    assert results["papers"]["data"][0]["event_id"] == "t1"
+    assert sum(p["count"] for p in results["series"]["data"]["points"]) == 3
+
+
+def test_batch_reports_errors_per_sub_query(client):
+    response = client.post("/api/insights/batch", json={"queries": [
+        {"name": "bad_params", "query": "timeseries", "params": {"metric": "questions"}},
+        {"name": "bad_metric", "query": "timeseries",
+         "params": {"metric": "nope", "from": "2026-10-01", "to": "2026-10-03"}},
+        {"name": "ok", "query": "dashboard"},
+    ]})
+    results = {r["name"]: r for r in response.json()["results"]}
+    assert results["bad_params"]["status"] == 422
+    assert results["bad_metric"]["status"] == 400
+    assert results["ok"]["status"] == 200
+
+    response = client.post("/api/insights/batch", json={"queries": [{"name": "x", "query": "drop_tables"}]})
+    assert response.status_code == 400
@@ -0,0 +1,64 @@
+from datetime import date, datetime
+from src.models import QuestionsAsked, QuestionsWeeklyAggr, TestPapers, TestPapersMonthly
+from src.services.ingest_service import ingest_service, QUESTION_ASKED
+from src.services.columnar_service import ColumnarEngine
+from src.services.stats_service import StatsService
+import pytest
+
+
+@pytest.fixture
+def session_factory(session_factory):
+    db = session_factory()
+    db.add_all([
+        QuestionsWeeklyAggr(user_id="u1", profile_id="p1", class_name="Class 10", subject="Math", count=4, date=date(2026, 10, 5)),
+        QuestionsWeeklyAggr(user_id="u2", profile_id="p2", class_name="Class 10", subject="Math", count=2, date=date(2026, 10, 5)),
+        QuestionsWeeklyAggr(user_id="u3", profile_id="p3", class_name="Class 9", subject="Science", count=1, date=date(2026, 10, 5)),
+        # Already in the aggregate above, so not counted again
+        QuestionsAsked(event_id="q0", profile_id="p1", class_name="Class 10", subject="Math", timestamp=datetime(2026, 10, 6, 9)),
+        QuestionsAsked(event_id="q1", profile_id="p1", class_name="Class 10", subject="Math", timestamp=datetime(2026, 10, 14, 9)),
+        QuestionsAsked(event_id="q2", profile_id="p4", class_name="Class 10", subject="Math", timestamp=datetime(2026, 10, 17, 9)),
+        QuestionsAsked(event_id="q3", profile_id="p5", class_name=None, subject="Math", timestamp=datetime(2026, 10, 17, 10)),
+        TestPapersMonthly(class_name="Class 10", subject="Math", no_of_tests=5, month_start=datetime(2026, 9, 1)),
+        TestPapers(event_id="t1", profile_id="p1", class_name="Class 10", subject="Math", timestamp=datetime(2026, 10, 17, 8)),
+    ])
+    db.commit()
+    db.close()
+    return session_factory
+
+
+def test_engine_matches_sql_and_follows_ingest(session_factory):
+    engine = ColumnarEngine(session_factory=session_factory)
+    stats = StatsService(engine=engine, session_factory=session_factory)
+    db = session_factory()
+
+    sql_counts = {m: stats.class_subject_counts(db, m) for m in ("questions", "test_papers")}
+    sql_dashboard = stats.dashboard(db, date(2026, 10, 18))
+    assert sql_counts["questions"] == {("Class 10", "Math"): 8, ("Class 9", "Science"): 1, (None, "Math"): 1}
+    assert sql_dashboard["questions_yesterday"] == 2
+
+    engine.load()
+    assert engine.ready
+    for metric in ("questions", "test_papers"):
+        assert stats.class_subject_counts(db, metric) == sql_counts[metric]
+    assert stats.dashboard(db, date(2026, 10, 18)) == sql_dashboard
+    assert stats.unique_students(db)[("Class 10", "Math")] == 3
+    assert stats.check()
+
+    # Ingested events are appended without a reload
+    ingest_service.save_event(db, {
+        "event_type": QUESTION_ASKED, "event_id": "q4", "profile_id": "p6",
+        "class_name": "Class 9", "subject": "Science", "timestamp": "2026-10-17T12:00:00"
+    })
+    assert engine.class_subject_counts("questions")[("Class 9", "Science")] == 2
+    assert engine.count_range("questions", datetime(2026, 10, 17), datetime(2026, 10, 18)) == 3
+    assert stats.check()
+    assert engine.loads == 1
+
+    # Writes the engine did not see (e.g. an aggregation job) trigger a reload
+    db.add(TestPapersMonthly(class_name="Class 9", subject="Science", no_of_tests=3, month_start=datetime(2026, 8, 1)))
+    db.commit()
+    assert not stats.check()
+    assert engine.loads == 2
+    assert engine.class_subject_counts("test_papers") == stats.db_class_subject_counts(db, "test_papers")
+
+    db.close()
@@ -0,0 +1,54 @@
+from datetime import date
+from src.models import QuestionsWeeklyAggr
+from src.services.engagement_service import EngagementService
+import pytest
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+def test_percentiles_merge_weekly_digests(db):
+    for week in (date(2026, 9, 28), date(2026, 10, 5)):
+        for i in range(1, 101):
+            db.add(QuestionsWeeklyAggr(profile_id=f"p{i}", class_name="Class 10", subject="Math", count=i, date=week))
+    db.add(QuestionsWeeklyAggr(profile_id="p1", class_name="Class 9", subject="Math", count=500, date=date(2026, 10, 5)))
+    db.commit()
+
+    service = EngagementService()
+    assert service.stale_weeks(db) == [date(2026, 9, 28), date(2026, 10, 5)]
+    for week in service.stale_weeks(db):
+        service.build_week(db, week)
+    assert service.stale_weeks(db) == []
+
+    result = service.percentiles(db, "Class 10", "Math", date(2026, 9, 28), date(2026, 10, 12), [0.25, 0.5, 0.9], "p90")
+    assert result["samples"] == 200
+    values = [q["value"] for q in result["quantiles"]]
+    assert abs(values[0] - 25) <= 2 and abs(values[1] - 50) <= 2 and abs(values[2] - 90) <= 2
+    assert result["profile_weekly_average"] == 90
+    assert abs(result["profile_percentile"] - 90) <= 2
+
+
+def test_stale_weeks_follow_in_place_updates_and_empty_weeks(db):
+    week = date(2026, 10, 5)
+    row = QuestionsWeeklyAggr(profile_id="p1", class_name="Class 10", subject="Math", count=3, date=week)
+    db.add(row)
+    # Only rows without a subject: nothing to digest, but the week counts as built
+    db.add(QuestionsWeeklyAggr(profile_id="p2", class_name="Class 10", subject=None, count=4, date=date(2026, 10, 12)))
+    db.commit()
+
+    service = EngagementService()
+    for stale in service.stale_weeks(db):
+        service.build_week(db, stale)
+    assert service.stale_weeks(db) == []
+
+    # Re-aggregated in place: same row, new count
+    row.count = 5
+    db.commit()
+    assert service.stale_weeks(db) == [week]
+    service.build_week(db, week)
+    result = service.percentiles(db, "Class 10", "Math", week, date(2026, 10, 12), [0.5])
+    assert result["quantiles"][0]["value"] == 5
@@ -0,0 +1,156 @@
+import json
+import threading
+import time
+from collections import deque
+from src.models import QuestionsAsked
+from src.config import settings
+from src.services.event_consumer import AimdController, QueueConsumer, event_consumer_service
+from src.services.ingest_service import ingest_service
+
+
+class LocalSQS:
+    """Minimal in-memory stand-in for the SQS calls the consumer makes."""
+
+    def __init__(self):
+        self.messages = deque()
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.counter = 0
+
+    def send(self, body: dict):
+        with self.lock:
+            self.counter += 1
+            self.messages.append({"MessageId": str(self.counter), "ReceiptHandle": f"r{self.counter}", "Body": json.dumps(body)})
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages, WaitTimeSeconds):
+        with self.lock:
+            batch = [self.messages.popleft() for _ in range(min(MaxNumberOfMessages, len(self.messages)))]
+            for message in batch:
+                self.in_flight[message["ReceiptHandle"]] = message
+        if not batch:
+            time.sleep(0.01)
+        return {"Messages": batch}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        with self.lock:
+            for entry in Entries:
+                self.in_flight.pop(entry["ReceiptHandle"], None)
+
+    def get_queue_attributes(self, QueueUrl, AttributeNames):
+        with self.lock:
+            return {"Attributes": {"ApproximateNumberOfMessages": str(len(self.messages))}}
+
+
+def test_aimd_grows_on_backlog_and_backs_off_on_slow_commits():
+    controller = AimdController(min_workers=1, max_workers=4, min_batch=1, max_batch=3, target_commit_ms=50)
+    decisions = [controller.observe(1000, 10, 0) for _ in range(5)]
+    assert decisions == ["increase_batch", "increase_batch", "increase_workers", "increase_workers", "increase_workers"]
+    assert (controller.workers, controller.batch_size) == (4, 3)
+    assert controller.observe(1000, 10, 0) == "hold_at_max"
+
+    assert controller.observe(1000, 150, 0) == "decrease"
+    assert (controller.workers, controller.batch_size) == (2, 1)
+    assert controller.observe(1000, 10, 2) == "decrease"
+    assert controller.observe(0, None, 0) == "hold"
+    assert (controller.workers, controller.batch_size) == (1, 1)
+
+
+def test_consumer_drains_queue_and_reacts_to_injected_latency(session_factory):
+    sqs = LocalSQS()
+    for i in range(40):
+        sqs.send({"event_type": "QUESTION_ASKED", "event_id": f"e{i}", "profile_id": "p1",
+                  "timestamp": "2026-10-17T09:00:00"})
+    sqs.send({"event_type": "QUESTION_ASKED", "event_id": "e0", "timestamp": "2026-10-17T09:00:00"})  # redelivery
+    sqs.messages.append({"MessageId": "bad", "ReceiptHandle": "bad", "Body": "not json"})
+
+    controller = AimdController(min_workers=1, max_workers=4, min_batch=2, max_batch=5, target_commit_ms=20)
+    consumer = QueueConsumer("tutor_queue", sqs, "local", controller, session_factory, wait_seconds=0)
+    assert consumer.control() == "increase_batch"
+    consumer.start()
+
+    deadline = time.time() + 10
+    while (sqs.messages or sqs.in_flight) and time.time() < deadline:
+        time.sleep(0.02)
+    assert not sqs.messages and not sqs.in_flight
+    db = session_factory()
+    assert db.query(QuestionsAsked).count() == 40
+    db.close()
+    assert consumer.control() == "hold"
+    assert consumer.stats()["processed"] == 41
+
+    # Slow commits: the controller halves concurrency and batch size
+    def slow_listener(event_type, row):
+        time.sleep(0.05)
+    ingest_service.add_listener(slow_listener)
+    try:
+        for i in range(40, 44):
+            sqs.send({"event_type": "QUESTION_ASKED", "event_id": f"e{i}", "timestamp": "2026-10-17T09:00:00"})
+        deadline = time.time() + 10
+        while (sqs.messages or sqs.in_flight) and time.time() < deadline:
+            time.sleep(0.02)
+        assert consumer.control() == "decrease"
+        assert consumer.stats()["commit_p90_ms"] >= 40
+    finally:
+        ingest_service.remove_listener(slow_listener)
+        consumer.stop()
+
+
+class FlakySQS(LocalSQS):
+    """Resolves the examiner queue from the second lookup on; fails the first delete call and the third with a sender fault."""
+
+    def __init__(self):
+        super().__init__()
+        self.lookups = []
+        self.deletes = []
+
+    def get_queue_url(self, QueueName):
+        self.lookups.append(QueueName)
+        if self.lookups.count(QueueName) == 1 and QueueName == settings.EXAMINER_QUEUE_NAME:
+            raise RuntimeError("AWS.SimpleQueueService.NonExistentQueue")
+        return {"QueueUrl": f"local/{QueueName}"}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        self.deletes.append([entry["ReceiptHandle"] for entry in Entries])
+        if len(self.deletes) == 1:
+            return {"Failed": [{"Id": entry["Id"], "Code": "InternalError", "SenderFault": False} for entry in Entries]}
+        if len(self.deletes) == 3:
+            return {"Failed": [{"Id": Entries[0]["Id"], "Code": "ReceiptHandleIsInvalid", "SenderFault": True}]}
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries]}
+
+
+class RecordingScheduler:
+    timezone = None
+
+    def __init__(self):
+        self.jobs = {}
+
+    def add_job(self, func, trigger, id, args=(), **kwargs):
+        self.jobs[id] = (func, trigger, args)
+
+
+def test_unresolved_queues_are_retried_and_failed_deletes_retried(session_factory):
+    sqs = FlakySQS()
+    scheduler = RecordingScheduler()
+    service = event_consumer_service
+    try:
+        service._connect(scheduler, sqs)
+        assert [c.name for c in service.consumers] == [settings.TUTOR_QUEUE_NAME]
+        func, trigger, args = scheduler.jobs["consumer_connect"]
+        assert trigger == "date"
+
+        del scheduler.jobs["consumer_connect"]
+        func(*args)
+        assert [c.name for c in service.consumers] == [settings.TUTOR_QUEUE_NAME, settings.EXAMINER_QUEUE_NAME]
+        assert "consumer_connect" not in scheduler.jobs
+        assert sqs.lookups.count(settings.TUTOR_QUEUE_NAME) == 1
+    finally:
+        service.stop()
+        service.consumers.clear()
+
+    consumer = QueueConsumer("tutor_queue", sqs, "local", AimdController(1, 1, 2, 2), session_factory, wait_seconds=0)
+    consumer._delete([{"ReceiptHandle": "r1"}, {"ReceiptHandle": "r2"}])
+    assert sqs.deletes == [["r1", "r2"], ["r1", "r2"]]
+    assert consumer.delete_failures == 0
+    consumer._delete([{"ReceiptHandle": "r3"}, {"ReceiptHandle": "r4"}])
+    assert sqs.deletes[2:] == [["r3", "r4"]]
+    assert consumer.delete_failures == 1
@@ -0,0 +1,48 @@
+from datetime import datetime
+from src.models import QuestionsAsked
+from src.services.dedupe_service import EventIdFilter
+from src.services.ingest_service import ingest_service, QUESTION_ASKED, TEST_PAPER_GENERATED
+
+
+def test_filter_warms_from_db_and_snapshot(session_factory, tmp_path):
+    db = session_factory()
+    db.add_all([
+        QuestionsAsked(event_id=f"q{i}", profile_id="p1", timestamp=datetime.utcnow()) for i in range(50)
+    ])
+    db.commit()
+
+    path = str(tmp_path / "filter.bin")
+    event_filter = EventIdFilter(path=path, session_factory=session_factory)
+    # Before warming only the exact recent set is consulted
+    assert not event_filter.is_duplicate(db, "questions_asked", "q1")
+    event_filter.warm()
+    assert event_filter.is_duplicate(db, "questions_asked", "q1")
+    assert not event_filter.is_duplicate(db, "test_papers", "q1")
+    assert not event_filter.is_duplicate(db, "questions_asked", "new")
+    assert event_filter.counters["exact_duplicates"] == 1
+
+    event_filter.add("questions_asked", "q1")
+    assert event_filter.is_duplicate(db, "questions_asked", "q1")
+    assert event_filter.counters["recent_hits"] == 1
+
+    db.add(QuestionsAsked(event_id="q50", profile_id="p1", timestamp=datetime.utcnow()))
+    db.commit()
+    event_filter.persist()
+
+    # Restarted process: snapshot plus rows newer than it
+    restarted = EventIdFilter(path=path, session_factory=session_factory)
+    restarted.warm()
+    assert restarted.is_duplicate(db, "questions_asked", "q50")
+    assert restarted.is_duplicate(db, "questions_asked", "q0")
+    db.close()
+
+
+def test_redelivered_event_skips_the_insert(session_factory):
+    db = session_factory()
+    event = {"event_type": QUESTION_ASKED, "event_id": "dup", "profile_id": "p1", "timestamp": "2026-10-17T09:00:00"}
+    assert ingest_service.save_event(db, event) is not None
+    assert ingest_service.save_event(db, event) is None
+    # The same id in the other table is a different event
+    assert ingest_service.save_event(db, dict(event, event_type=TEST_PAPER_GENERATED)) is not None
+    assert db.query(QuestionsAsked).count() == 1
+    db.close()
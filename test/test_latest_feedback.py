@@ -0,0 +1,70 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from src.models import Feedback
+from src.services.latest_feedback_service import LatestFeedbackService
+
+
+@pytest.fixture
+def session_factory(bind, session_factory):
+    session_factory.statements = []
+    event.listen(bind, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: session_factory.statements.append(statement))
+    return session_factory
+
+
+def test_save_moves_pointer_and_reads_are_cached_until_next_write(session_factory):
+    service = LatestFeedbackService()
+    db = session_factory()
+    service.save(db, "p1", "Math", "week 1", datetime(2026, 10, 5))
+    service.save(db, "p1", "Math", "week 2", datetime(2026, 10, 12))
+    service.save(db, "p1", "Science", "science week 2", datetime(2026, 10, 12))
+    service.save(db, "p2", "Math", "other profile", datetime(2026, 10, 12))
+
+    assert db.query(Feedback).filter(Feedback.is_latest == True).count() == 3
+    assert service.get_latest(db, "p1", "Math").feedback_text == "week 2"
+
+    all_feedback = service.get_all(db, "p1")
+    assert [(f.subject, f.feedback_text) for f in all_feedback] == [("Math", "week 2"), ("Science", "science week 2")]
+
+    session_factory.statements.clear()
+    assert service.get_latest(db, "p1", "Science").feedback_text == "science week 2"
+    assert service.get_latest(db, "p1", "History") is None
+    assert len(service.get_all(db, "p1")) == 2
+    assert session_factory.statements == []
+
+    service.save(db, "p1", "Math", "week 3", datetime(2026, 10, 19))
+    assert service.get_latest(db, "p1", "Math").feedback_text == "week 3"
+    db.close()
+
+
+def test_only_one_latest_row_per_profile_and_subject(session_factory):
+    db = session_factory()
+    db.add(Feedback(profile_id="p1", subject="Math", feedback_text="a", is_latest=True, created_at=datetime(2026, 10, 5)))
+    db.add(Feedback(profile_id="p1", subject="Math", feedback_text="b", is_latest=True, created_at=datetime(2026, 10, 12)))
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.close()
+
+
+def test_rows_written_by_the_generator_become_latest_and_refresh_the_cache(session_factory):
+    service = LatestFeedbackService(check_seconds=0)
+    db = session_factory()
+    service.save(db, "p1", "Math", "week 1", datetime(2026, 10, 5))
+    assert service.get_latest(db, "p1", "Math").feedback_text == "week 1"
+    assert len(service.get_all(db, "p1")) == 1
+
+    # The weekly generator inserts its rows directly, from another process
+    generator = session_factory()
+    generator.add(Feedback(profile_id="p1", subject="Math", feedback_text="week 2", created_at=datetime(2026, 10, 12)))
+    generator.add(Feedback(profile_id="p1", subject="Science", feedback_text="science", created_at=datetime(2026, 10, 12)))
+    generator.add(Feedback(profile_id="p1", subject="Math", feedback_text="re-run", created_at=datetime(2026, 9, 28)))
+    generator.commit()
+    generator.close()
+
+    latest = db.query(Feedback.feedback_text).filter(Feedback.is_latest == True).order_by(Feedback.subject).all()
+    assert [text for (text,) in latest] == ["week 2", "science"]
+    assert service.get_latest(db, "p1", "Math").feedback_text == "week 2"
+    assert [f.feedback_text for f in service.get_all(db, "p1")] == ["week 2", "science"]
+    db.close()
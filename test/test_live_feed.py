@@ -0,0 +1,93 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from src.config import settings
+from src.models import QuestionsAsked
+from src.services.ingest_service import ingest_service
+from src.services.live_service import LiveFeed, RESYNC
+
+
+@pytest.fixture
+def feed(session_factory):
+    db = session_factory()
+    db.add(QuestionsAsked(event_id="old", class_name="Class 10", subject="Math",
+                          timestamp=datetime.utcnow() - timedelta(days=30)))
+    db.commit()
+    db.close()
+    return LiveFeed(session_factory=session_factory)
+
+
+def ingest(feed, event_id, timestamp, subject="Math"):
+    db = feed.session_factory()
+    ingest_service.save_event(db, {
+        "event_id": event_id, "event_type": "QUESTION_ASKED", "profile_id": "p1",
+        "class_name": "Class 10", "subject": subject, "timestamp": timestamp.isoformat()
+    })
+    db.close()
+
+
+def test_deltas_update_clients_and_snapshot_without_reads(feed):
+    async def run():
+        client = feed.subscribe(asyncio.get_running_loop())
+        assert feed.snapshot()["dashboard"]["total_questions"] == 1
+
+        now = datetime.utcnow()
+        ingest(feed, "a", now)
+        ingest(feed, "b", now, subject="Science")
+        ingest(feed, "late", now - timedelta(days=1))
+        feed.flush()
+        feed.flush()  # nothing new: no message
+        message = await asyncio.wait_for(client.queue.get(), 1)
+        assert client.queue.empty()
+        assert message["counts"] == {"questions": {"Class 10|Math": 2, "Class 10|Science": 1}}
+        assert [e["event_id"] for e in message["events"]] == ["a", "b", "late"]
+
+        # The snapshot follows the deltas; it would be stale had it been re-read
+        feed.session_factory = None
+        snapshot = feed.snapshot()
+        assert snapshot["seq"] == message["seq"]
+        assert snapshot["dashboard"]["total_questions"] == 4
+        assert snapshot["dashboard"]["questions_yesterday"] == 1
+        assert snapshot["dashboard"]["questions_last_7_days"] == 1
+        assert snapshot["questions"] == {"Class 10|Math": 3, "Class 10|Science": 1}
+        assert snapshot["recent"]["questions"][0]["event_id"] == "late"
+        feed.unsubscribe(client)
+
+    asyncio.run(run())
+
+
+def test_slow_client_backlog_is_replaced_by_resync(feed, monkeypatch):
+    monkeypatch.setattr(settings, "LIVE_CLIENT_QUEUE", 2)
+
+    async def run():
+        slow = feed.subscribe(asyncio.get_running_loop())
+        for i in range(3):
+            ingest(feed, f"e{i}", datetime.utcnow())
+            feed.flush()
+        await asyncio.sleep(0)
+        assert slow.queue.qsize() == 1
+        assert slow.queue.get_nowait() is RESYNC
+        assert feed.stats()["slow_client_resyncs"] == 1
+        feed.unsubscribe(slow)
+        assert feed.stats()["clients"] == 0
+
+    asyncio.run(run())
+
+
+def test_seed_does_not_count_pending_rows_twice(feed):
+    async def run():
+        client = feed.subscribe(asyncio.get_running_loop())
+        ingest(feed, "pending", datetime.utcnow())
+        # Committed but not yet flushed when the snapshot is read
+        assert feed.snapshot()["dashboard"]["total_questions"] == 2
+        message = await asyncio.wait_for(client.queue.get(), 1)
+        assert [e["event_id"] for e in message["events"]] == ["pending"]
+
+        ingest(feed, "after", datetime.utcnow())
+        feed.flush()
+        snapshot = feed.snapshot()
+        assert snapshot["dashboard"]["total_questions"] == 3
+        assert [e["event_id"] for e in snapshot["recent"]["questions"]] == ["after", "pending", "old"]
+        feed.unsubscribe(client)
+
+    asyncio.run(run())
@@ -0,0 +1,96 @@
+import json
+import threading
+import time
+from collections import deque
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.database import Base
+from src.load_harness import LoadProfile, LoadTest, compare
+from src.services.event_consumer import AimdController, QueueConsumer
+from src.services.ingest_service import QUESTION_ASKED, TEST_PAPER_GENERATED
+
+
+class LocalSQS:
+    """In-memory stand-in for the SQS calls of the consumer and the load test, for any number of queues."""
+
+    def __init__(self):
+        self.queues = {}
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.counter = 0
+
+    def send_message_batch(self, QueueUrl, Entries):
+        with self.lock:
+            for entry in Entries:
+                self.counter += 1
+                self.queues.setdefault(QueueUrl, deque()).append(
+                    {"MessageId": str(self.counter), "ReceiptHandle": f"r{self.counter}", "Body": entry["MessageBody"]}
+                )
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages, WaitTimeSeconds):
+        with self.lock:
+            queue = self.queues.setdefault(QueueUrl, deque())
+            batch = [queue.popleft() for _ in range(min(MaxNumberOfMessages, len(queue)))]
+            for message in batch:
+                self.in_flight[message["ReceiptHandle"]] = QueueUrl
+        if not batch:
+            time.sleep(0.01)
+        return {"Messages": batch}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        with self.lock:
+            for entry in Entries:
+                self.in_flight.pop(entry["ReceiptHandle"], None)
+
+    def get_queue_attributes(self, QueueUrl, AttributeNames):
+        with self.lock:
+            return {"Attributes": {
+                "ApproximateNumberOfMessages": str(len(self.queues.get(QueueUrl, ()))),
+                "ApproximateNumberOfMessagesNotVisible": str(sum(1 for url in self.in_flight.values() if url == QueueUrl)),
+            }}
+
+
+def test_load_test_measures_an_in_process_ingest(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'load.db'}")
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    sqs = LocalSQS()
+    queue_urls = {QUESTION_ASKED: "local/tutor_queue", TEST_PAPER_GENERATED: "local/tutor_examiner_queue"}
+    consumers = [
+        QueueConsumer(url.split("/")[-1], sqs, url, AimdController(1, 1, 5, 5), session_factory, wait_seconds=0)
+        for url in queue_urls.values()
+    ]
+    for consumer in consumers:
+        consumer.start()
+
+    profile = LoadProfile(rate=200, duration=0.5, duplicate_rate=0.1, malformed_rate=0.05,
+                          burst_every=0.25, burst_size=10, users=20, seed=7)
+    run = LoadTest(sqs, queue_urls, profile, session_factory=session_factory, poll_seconds=0.05,
+                   metrics=lambda: {"consumers": {c.name: {"commit_p90_ms": 3.0} for c in consumers}})
+    try:
+        run.publish()
+        assert run.wait(timeout=10)
+        # Redeliveries and malformed messages sent last may still be in flight
+        deadline = time.monotonic() + 5
+        while any(run.queue_left().values()) and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        for consumer in consumers:
+            consumer.stop()
+
+    report = run.report()
+    published = report["published"]
+    assert published["messages"] == profile.due(profile.duration) == 120
+    assert published["events"] + published["duplicates"] + published["malformed"] == 120
+    assert published["duplicates"] > 0 and published["malformed"] > 0
+    assert (report["stored"], report["missing"], report["duplicate_rows"]) == (published["events"], 0, 0)
+    assert report["queue_left"] == {"tutor_queue": 0, "tutor_examiner_queue": 0}
+    assert report["lag_ms"]["p50"] is not None and report["throughput_per_s"] > 0
+    assert report["commit_p90_ms"]["max"] == 3.0
+    json.dumps(report)
+
+    slower = dict(report, lag_ms=dict(report["lag_ms"], p90=report["lag_ms"]["p90"] * 2 + 1))
+    assert compare(slower, report)["lag_ms.p90"]["better"] is False
+    assert compare(report, report)["missing"] == {"baseline": 0, "now": 0, "better": True}
+
+    assert run.cleanup() == published["events"]
@@ -0,0 +1,141 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine
+from src.business_time import fill_local_date, local_day, local_day_start
+from src.config import settings
+from src.models import QuestionsAsked, QuestionsWeeklyAggr, EventRollup, JobCheckpoint
+from src.services import retention_service as retention_module, rollup_service as rollup_module
+from src.services.backfill_service import Backfill, BackfillService
+from src.services.ingest_service import ingest_service
+from src.services.retention_service import RetentionService
+from src.services.rollup_service import RollupService
+from src.services.shard_service import ShardService
+
+
+def test_local_day_boundaries():
+    # Asia/Kolkata is UTC+05:30
+    assert local_day(datetime(2026, 10, 17, 18, 29)) == date(2026, 10, 17)
+    assert local_day(datetime(2026, 10, 17, 18, 30)) == date(2026, 10, 18)
+    assert local_day_start(date(2026, 10, 18)) == datetime(2026, 10, 17, 18, 30)
+
+
+def counts(db, granularity="day"):
+    rows = db.query(EventRollup).filter(EventRollup.granularity == granularity).all()
+    return {row.bucket_start: row.count for row in rows}
+
+
+def test_rollups_switch_to_local_days_when_backfill_finishes(bind, session_factory):
+    db = session_factory()
+    ingest_service.save_event(db, {
+        "event_id": "evening", "event_type": "QUESTION_ASKED",
+        "class_name": "Class 10", "subject": "Math", "timestamp": "2026-10-15T20:00:00"
+    })
+    assert db.query(QuestionsAsked.local_date).scalar() == date(2026, 10, 16)
+
+    # Rows stored before the column existed
+    for i, hour in enumerate((3, 19, 21)):
+        db.add(QuestionsAsked(event_id=f"old{i}", class_name="Class 10", subject="Math",
+                              timestamp=datetime(2026, 10, 14, hour)))
+    db.flush()
+    db.query(QuestionsAsked).filter(QuestionsAsked.event_id.like("old%")).update(
+        {"local_date": None}, synchronize_session=False
+    )
+    db.add(JobCheckpoint(name="local_date:questions_asked", status="pending"))
+    db.commit()
+
+    rollups = RollupService(session_factory=session_factory)
+    assert rollups.local_days(db, "questions") is False
+    rollups.refresh(today=date(2026, 10, 17))
+    assert counts(db) == {date(2026, 10, 14): 3, date(2026, 10, 15): 1}
+
+    backfills = BackfillService(bind=bind, session_factory=session_factory)
+    backfills.register(Backfill("local_date:questions_asked", "questions_asked", fill_local_date("questions_asked"),
+                                on_done=lambda: rollups.rebucket("questions")))
+    backfills.run_pending()
+    db.expire_all()
+    assert db.query(QuestionsAsked).filter(QuestionsAsked.local_date.is_(None)).count() == 0
+    assert rollups.local_days(db, "questions") is True
+    assert counts(db) == {date(2026, 10, 14): 1, date(2026, 10, 15): 2, date(2026, 10, 16): 1}
+
+    rollups.refresh(today=date(2026, 10, 17))
+    assert counts(db) == {date(2026, 10, 14): 1, date(2026, 10, 15): 2, date(2026, 10, 16): 1}
+    db.close()
+
+
+def test_rebucketing_keeps_days_whose_rows_were_purged(bind, session_factory, monkeypatch):
+    db = session_factory()
+    day = date(2026, 9, 1)
+    while day < date(2026, 10, 17):
+        for hour in (3, 20):
+            db.add(QuestionsAsked(event_id=f"q{day}-{hour}", profile_id="p1", class_name="Class 10", subject="Math",
+                                  timestamp=datetime.combine(day, datetime.min.time()) + timedelta(hours=hour)))
+        day += timedelta(days=1)
+    # Local day Oct 11
+    db.add(QuestionsAsked(event_id="late-evening", profile_id="p1", class_name="Class 10", subject="Math",
+                          timestamp=datetime(2026, 10, 10, 19)))
+    db.flush()
+    db.query(QuestionsAsked).update({"local_date": None}, synchronize_session=False)
+    db.add(JobCheckpoint(name="local_date:questions_asked", status="pending"))
+    db.commit()
+
+    rollups = RollupService(session_factory=session_factory)
+    rollups.refresh(today=date(2026, 10, 17))
+    before = {granularity: counts(db, granularity) for granularity in ("day", "week", "month")}
+    assert before["day"][date(2026, 10, 10)] == 3 and before["month"][date(2026, 9, 1)] == 60
+
+    # September is purged while the backfill is still pending
+    db.add(QuestionsWeeklyAggr(user_id="u1", profile_id="p1", class_name="Class 10", subject="Math",
+                               count=1, date=date(2026, 10, 5)))
+    db.commit()
+    monkeypatch.setattr(settings, "QUESTIONS_RETENTION_DAYS", 30)
+    monkeypatch.setattr(retention_module, "rollup_service", rollups)
+    assert RetentionService(bind=bind, session_factory=session_factory).purge("questions_asked", date(2026, 10, 31)) == 60
+
+    backfills = BackfillService(bind=bind, session_factory=session_factory)
+    backfills.register(Backfill("local_date:questions_asked", "questions_asked", fill_local_date("questions_asked"),
+                                on_done=lambda: rollups.rebucket("questions")))
+    backfills.run_pending()
+    db.expire_all()
+    # Local Oct 1 lost its Sep 30 evening row: it stays frozen on its UTC count
+    assert rollups.final_until(db, "questions") == date(2026, 10, 2)
+    assert counts(db, "day") == {**before["day"], date(2026, 10, 10): 2, date(2026, 10, 11): 3}
+    assert {granularity: counts(db, granularity) for granularity in ("week", "month")} == \
+        {granularity: before[granularity] for granularity in ("week", "month")}
+    db.close()
+
+
+def test_shard_rows_are_backfilled_before_switching_to_local_days(bind, session_factory, tmp_path, monkeypatch):
+    db = session_factory()
+    db.add(QuestionsAsked(event_id="main", class_name="Class 10", subject="Math", timestamp=datetime(2026, 10, 14, 20)))
+    db.commit()
+
+    # A shard created before local_date existed
+    shard_url = f"sqlite:///{tmp_path / 'shard.db'}"
+    with create_engine(shard_url).begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE questions_asked (id INTEGER PRIMARY KEY, event_id VARCHAR UNIQUE, "
+                             "user_id VARCHAR, profile_id VARCHAR, class_name VARCHAR, subject VARCHAR, data JSON, "
+                             "timestamp DATETIME, created_at DATETIME)")
+        for i, timestamp in enumerate(("2026-10-14 03:00:00", "2026-10-15 19:00:00")):
+            conn.exec_driver_sql(f"INSERT INTO questions_asked (id, event_id, class_name, subject, timestamp) "
+                                 f"VALUES ({i + 1}, 'shard{i}', 'Class 10', 'Math', '{timestamp}')")
+    shards = ShardService([shard_url], session_factory=session_factory)
+    shards.ensure_schema()
+    monkeypatch.setattr(rollup_module, "shard_service", shards)
+    assert db.query(JobCheckpoint.status).filter(
+        JobCheckpoint.name == "local_date:questions_asked@shard1").scalar() == "pending"
+
+    rollups = RollupService(session_factory=session_factory)
+    assert rollups.local_days(db, "questions") is False
+    rollups.refresh(today=date(2026, 10, 17))
+    assert counts(db, "day") == {date(2026, 10, 14): 2, date(2026, 10, 15): 1}
+
+    backfills = BackfillService(bind=bind, session_factory=session_factory)
+    backfills.register(Backfill("local_date:questions_asked@shard1", "questions_asked",
+                                fill_local_date("questions_asked"), on_done=lambda: rollups.rebucket("questions"),
+                                bind=shards.engines[0]))
+    backfills.run_pending()
+    with shards.engines[0].connect() as conn:
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM questions_asked WHERE local_date IS NULL").scalar() == 0
+    db.expire_all()
+    assert rollups.local_days(db, "questions") is True
+    assert counts(db, "day") == {date(2026, 10, 14): 1, date(2026, 10, 15): 1, date(2026, 10, 16): 1}
+    db.close()
@@ -0,0 +1,121 @@
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+import sqlalchemy as sa
+from src.database import Base
+from src.migration_helpers import (
+    create_index_online, drop_index_online, schedule_backfill, shadow_swap, get_checkpoint, _create_triggers
+)
+from src.services.backfill_service import Backfill, BackfillService
+import pytest
+
+
+@pytest.fixture
+def bind(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    Base.metadata.create_all(engine, tables=[Base.metadata.tables["job_checkpoints"]])
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE events (id INTEGER PRIMARY KEY, event_id VARCHAR UNIQUE, name VARCHAR)")
+        conn.exec_driver_sql("CREATE INDEX ix_events_name ON events (name)")
+        for i in range(1, 24):
+            conn.exec_driver_sql(f"INSERT INTO events (id, event_id, name) VALUES ({i}, 'e{i}', 'n{i}')")
+    return engine
+
+
+def run_revision(bind, fn):
+    with bind.connect() as conn:
+        context = MigrationContext.configure(conn)
+        # Alembic wraps each revision like this on SQLite (non-transactional DDL)
+        with Operations.context(context), context.begin_transaction(_per_migration=True):
+            fn()
+        conn.commit()
+
+
+def test_shadow_swap_copies_in_chunks_and_renames(bind):
+    run_revision(bind, lambda: shadow_swap(
+        "events",
+        [
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("event_id", sa.String, unique=True),
+            sa.Column("title", sa.String),
+            sa.Column("local_date", sa.Date),
+        ],
+        indexes=["ix_questions_asked_local_date"],
+        renames={"title": "name"},
+        chunk_size=5,
+        duty_cycle=1
+    ))
+
+    inspector = sa.inspect(bind)
+    assert [c["name"] for c in inspector.get_columns("events")] == ["id", "event_id", "title", "local_date"]
+    # The old table's indexes went with it; the new ones are built by the app
+    assert [i["name"] for i in inspector.get_indexes("events")] == []
+    assert not inspector.has_table("events__shadow") and not inspector.has_table("events__old")
+    with bind.connect() as conn:
+        assert conn.exec_driver_sql("SELECT COUNT(*), MAX(title) FROM events").one() == (23, "n9")
+        assert get_checkpoint(conn, "shadow_swap:events") is None
+        assert get_checkpoint(conn, "index:ix_questions_asked_local_date").status == "pending"
+
+
+def test_triggers_mirror_writes_during_copy(bind):
+    with bind.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE events__shadow (id INTEGER PRIMARY KEY, event_id VARCHAR, title VARCHAR)")
+        _create_triggers(conn, "events", "events__shadow", {"id": "id", "event_id": "event_id", "title": "name"})
+        conn.exec_driver_sql("INSERT INTO events (id, event_id, name) VALUES (100, 'late', 'x')")
+        conn.exec_driver_sql("UPDATE events SET name = 'renamed' WHERE id = 2")
+        conn.exec_driver_sql("DELETE FROM events WHERE id = 100")
+        rows = conn.exec_driver_sql("SELECT id, title FROM events__shadow").all()
+    assert rows == [(2, "renamed")]
+
+
+def test_scheduled_backfill_resumes_from_checkpoint(bind):
+    run_revision(bind, lambda: schedule_backfill("events_upper"))
+
+    calls = []
+
+    def apply(conn, lo, hi):
+        calls.append((lo, hi))
+        if len(calls) == 3:
+            raise RuntimeError("interrupted")
+        return conn.exec_driver_sql(f"UPDATE events SET name = upper(name) WHERE id > {lo} AND id <= {hi}").rowcount
+
+    service = BackfillService(bind=bind, session_factory=sa.orm.sessionmaker(bind=bind))
+    service.register(Backfill("events_upper", "events", apply, chunk_size=10))
+    assert service.pending() == ["events_upper"]
+    service.run_pending()
+    with bind.connect() as conn:
+        checkpoint = get_checkpoint(conn, "events_upper")
+        assert (checkpoint.status, checkpoint.cursor, checkpoint.rows_done) == ("failed", "20", 20)
+
+    service.run_pending()
+    assert calls[-1] == (20, 23)
+    assert service.pending() == []
+    with bind.connect() as conn:
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM events WHERE name = upper(name)").scalar() == 23
+
+
+def test_create_index_online_leaves_sqlite_builds_to_the_app(bind):
+    Base.metadata.tables["questions_asked"].create(bind)
+    with bind.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ix_questions_asked_created_at")
+        conn.exec_driver_sql("DROP INDEX ix_questions_asked_timestamp")
+        conn.exec_driver_sql("INSERT INTO questions_asked (event_id, created_at) VALUES ('e1', '2026-10-18 09:00:00')")
+
+    def indexes():
+        return {i["name"] for i in sa.inspect(bind).get_indexes("questions_asked")}
+
+    run_revision(bind, lambda: [
+        create_index_online("ix_questions_asked_created_at", "questions_asked", ["created_at"]),
+        create_index_online("ix_questions_asked_timestamp", "questions_asked", ["timestamp"]),
+    ])
+    assert not indexes() & {"ix_questions_asked_created_at", "ix_questions_asked_timestamp"}
+    # Downgraded before the app got to it
+    run_revision(bind, lambda: drop_index_online("ix_questions_asked_timestamp", "questions_asked"))
+
+    service = BackfillService(bind=bind, session_factory=sa.orm.sessionmaker(bind=bind))
+    service.register(Backfill("events_upper", "events", lambda conn, lo, hi: 0))
+    run_revision(bind, lambda: schedule_backfill("events_upper"))
+    # Data backfills go first
+    assert service.pending() == ["events_upper", "index:ix_questions_asked_created_at"]
+    service.run_pending()
+    assert service.pending() == []
+    assert "ix_questions_asked_created_at" in indexes() and "ix_questions_asked_timestamp" not in indexes()
@@ -0,0 +1,81 @@
+from datetime import date, datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.database import Base
+from src.models import QuestionsAsked, QuestionsWeeklyAggr
+from src.services.ingest_service import ingest_service
+from src.services.timeline_service import TimelineService
+import pytest
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def test_timeline_merges_rollups_and_recent_delta(db):
+    db.add(QuestionsWeeklyAggr(profile_id="p1", subject="Math", count=4, date=date(2026, 9, 28)))
+    db.add(QuestionsWeeklyAggr(profile_id="p1", subject="Math", count=2, date=date(2026, 10, 5)))
+    # Already covered by the 2026-10-05 rollup, must not be counted twice
+    db.add(QuestionsAsked(event_id="e0", profile_id="p1", subject="Math", timestamp=datetime(2026, 10, 6, 9)))
+    db.add(QuestionsAsked(event_id="e1", profile_id="p1", subject="Math", timestamp=datetime(2026, 10, 13, 9)))
+    db.add(QuestionsAsked(event_id="e2", profile_id="p2", subject="Math", timestamp=datetime(2026, 10, 13, 9)))
+    db.commit()
+
+    service = TimelineService()
+    weekly = service.get_timeline(db, "p1", "week")
+    assert weekly == [
+        {"period_start": date(2026, 9, 28), "subject": "Math", "count": 4, "estimated": False},
+        {"period_start": date(2026, 10, 5), "subject": "Math", "count": 2, "estimated": False},
+        {"period_start": date(2026, 10, 12), "subject": "Math", "count": 1, "estimated": False},
+    ]
+
+    # The week of 2026-09-28 runs into October and has no raw rows left: it is not split
+    monthly = service.get_timeline(db, "p1", "month")
+    assert monthly == [
+        {"period_start": date(2026, 9, 1), "subject": "Math", "count": 4, "estimated": True},
+        {"period_start": date(2026, 10, 1), "subject": "Math", "count": 3, "estimated": False},
+    ]
+
+
+def test_month_boundary_week_split_by_raw_days(db):
+    db.add(QuestionsWeeklyAggr(profile_id="p1", subject="Math", count=3, date=date(2026, 9, 28)))
+    for i, day in enumerate((date(2026, 9, 30), date(2026, 10, 1), date(2026, 10, 4))):
+        db.add(QuestionsAsked(event_id=f"e{i}", profile_id="p1", subject="Math",
+                              timestamp=datetime.combine(day, datetime.min.time())))
+    # Not rolled up yet: raw rows on both sides of the next boundary (2026-11-01 is a Sunday)
+    db.add(QuestionsAsked(event_id="e3", profile_id="p1", subject="Math", timestamp=datetime(2026, 10, 27, 9)))
+    db.add(QuestionsAsked(event_id="e4", profile_id="p1", subject="Math", timestamp=datetime(2026, 11, 1, 9)))
+    db.commit()
+
+    service = TimelineService()
+    assert service.get_timeline(db, "p1", "month") == [
+        {"period_start": date(2026, 9, 1), "subject": "Math", "count": 1, "estimated": False},
+        {"period_start": date(2026, 10, 1), "subject": "Math", "count": 3, "estimated": False},
+        {"period_start": date(2026, 11, 1), "subject": "Math", "count": 1, "estimated": False},
+    ]
+    assert service.get_timeline(db, "p1", "week") == [
+        {"period_start": date(2026, 9, 28), "subject": "Math", "count": 3, "estimated": False},
+        {"period_start": date(2026, 10, 26), "subject": "Math", "count": 2, "estimated": False},
+    ]
+
+
+def test_timeline_cache_invalidated_on_ingest(db):
+    service = TimelineService()
+    assert service.get_timeline(db, "p1") == []
+
+    ingest_service.save_event(db, {
+        "event_id": "e1",
+        "event_type": "QUESTION_ASKED",
+        "profile_id": "p1",
+        "subject": "Science",
+        "timestamp": "2026-10-14T08:00:00",
+    })
+
+    assert service.get_timeline(db, "p1") == [
+        {"period_start": date(2026, 10, 12), "subject": "Science", "count": 1, "estimated": False},
+    ]
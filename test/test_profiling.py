@@ -0,0 +1,68 @@
+import pstats
+import time
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException
+from fastapi.testclient import TestClient
+from src.profiling import ProfiledRoute, profile_store
+
+
+def slow_query():
+    time.sleep(0.05)
+    return [{"n": i} for i in range(10)]
+
+
+def require_admin(authorization: str = Header(default="")):
+    if authorization != "Bearer admin":
+        raise HTTPException(status_code=401, detail="Invalid session token")
+
+
+def make_client(tmp_path, monkeypatch):
+    monkeypatch.setattr(profile_store, "directory", str(tmp_path / "profiles"))
+    monkeypatch.setattr(profile_store, "max_profiles", 2)
+    router = APIRouter(prefix="/api/insights", dependencies=[Depends(require_admin)], route_class=ProfiledRoute)
+
+    @router.get("/questions")
+    def questions():
+        return slow_query()
+
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+
+def test_sampled_profile_is_stored_and_returned_by_id(tmp_path, monkeypatch):
+    client = make_client(tmp_path, monkeypatch)
+    plain = client.get("/api/insights/questions", headers={"Authorization": "Bearer admin"})
+    assert plain.status_code == 200
+    assert "x-profile-id" not in plain.headers
+
+    response = client.get("/api/insights/questions",
+                          headers={"Authorization": "Bearer admin", "X-Profile": "sample"})
+    assert response.status_code == 200
+    assert len(response.json()) == 10
+    meta = profile_store.get(response.headers["x-profile-id"])
+    assert meta["path"].endswith(".collapsed") and meta["samples"] > 0
+    with open(meta["path"]) as f:
+        stacks = f.read()
+    assert stacks.startswith("GET /api/insights/questions;")
+    assert "slow_query" in stacks
+
+
+def test_cprofile_mode_and_ring_buffer(tmp_path, monkeypatch):
+    client = make_client(tmp_path, monkeypatch)
+    ids = []
+    for _ in range(3):
+        response = client.get("/api/insights/questions",
+                              headers={"Authorization": "Bearer admin", "X-Profile": "cprofile"})
+        ids.append(response.headers["x-profile-id"])
+    # Only the newest two are kept
+    assert [m["id"] for m in profile_store.list()] == sorted(ids[1:], reverse=True)
+    stats = pstats.Stats(profile_store.get(ids[-1])["path"])
+    assert any(func[2] == "slow_query" for func in stats.stats)
+
+
+def test_no_profile_without_auth(tmp_path, monkeypatch):
+    client = make_client(tmp_path, monkeypatch)
+    response = client.get("/api/insights/questions", headers={"X-Profile": "sample"})
+    assert response.status_code == 401
+    assert "x-profile-id" not in response.headers
+    assert profile_store.list() == []
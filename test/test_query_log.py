@@ -0,0 +1,80 @@
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+import pytest
+from src.dependencies import track_route
+from src.query_log import QueryTracker, normalize_sql, param_shape
+
+
+def make_engine(tmp_path, slow_ms):
+    engine = create_engine(f"sqlite:///{tmp_path}/queries.db")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE events (id INTEGER PRIMARY KEY, subject TEXT, score INTEGER)"))
+        conn.execute(text("CREATE INDEX ix_events_subject ON events (subject)"))
+    tracker = QueryTracker(slow_ms=slow_ms, max_statements=50)
+    tracker.attach(engine)
+    return engine, tracker
+
+
+def test_normalize_sql_and_param_shape():
+    assert normalize_sql("SELECT *  FROM t\n WHERE a = 'x''y' AND b IN (1, 2, 3) AND c = 4.5") == \
+        "SELECT * FROM t WHERE a = ? AND b IN (?...) AND c = ?"
+    assert normalize_sql("SELECT * FROM t2 WHERE id IN (?, ?)") == "SELECT * FROM t2 WHERE id IN (?...)"
+    assert normalize_sql("SELECT * FROM t WHERE a = %(a_1)s") == "SELECT * FROM t WHERE a = ?"
+    assert param_shape(("maths", 3)) == "(str, int)"
+    assert param_shape({"a": None}) == "{a: NoneType}"
+    assert param_shape([("x",), ("y",)], executemany=True) == "2 x (str)"
+
+
+def test_digest_groups_statements_and_slow_queries_get_a_plan(tmp_path):
+    engine, tracker = make_engine(tmp_path, slow_ms=0)
+    with engine.begin() as conn:
+        for subject in ("maths", "physics", "maths"):
+            conn.execute(text("SELECT count(*) FROM events WHERE subject = :s"), {"s": subject})
+        conn.execute(text("SELECT * FROM events WHERE score > 5"))
+
+    digest = tracker.digest()
+    by_sql = {entry["sql"]: entry for entry in digest}
+    indexed = by_sql["SELECT count(*) FROM events WHERE subject = ?"]
+    assert indexed["calls"] == 3 and indexed["slow_calls"] == 3
+    assert indexed["routes"] == {"background": 3}
+    assert "ix_events_subject" in indexed["plan"]
+    assert "SCAN" in by_sql["SELECT * FROM events WHERE score > ?"]["plan"]
+    assert [entry["total_ms"] for entry in digest] == sorted((entry["total_ms"] for entry in digest), reverse=True)
+    assert tracker.stats()["calls"] >= 4
+
+
+def test_fast_statements_are_counted_but_not_explained(tmp_path):
+    engine, tracker = make_engine(tmp_path, slow_ms=60_000)
+    with engine.begin() as conn:
+        conn.execute(text("SELECT * FROM events WHERE id = 1"))
+    entry = next(e for e in tracker.digest() if e["sql"] == "SELECT * FROM events WHERE id = ?")
+    assert entry["calls"] == 1 and entry["slow_calls"] == 0 and entry["plan"] is None
+
+
+def test_failing_statements_leave_nothing_on_the_connection(tmp_path):
+    engine, tracker = make_engine(tmp_path, slow_ms=60_000)
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+            conn.rollback()
+        conn.execute(text("SELECT * FROM events WHERE id = 1"))
+        assert not conn.info.get("query_started")
+    entry = next(e for e in tracker.digest() if e["sql"] == "SELECT * FROM events WHERE id = ?")
+    assert entry["calls"] == 1
+
+
+def test_statements_are_attributed_to_the_route(tmp_path):
+    engine, tracker = make_engine(tmp_path, slow_ms=0)
+    app = FastAPI(dependencies=[Depends(track_route)])
+
+    @app.get("/api/insights/subjects/{subject}")
+    def count_subject(subject: str):
+        with engine.connect() as conn:
+            return {"count": conn.execute(text("SELECT count(*) FROM events WHERE subject = :s"), {"s": subject}).scalar()}
+
+    assert TestClient(app).get("/api/insights/subjects/maths").json() == {"count": 0}
+    entry = next(e for e in tracker.digest() if e["sql"] == "SELECT count(*) FROM events WHERE subject = ?")
+    assert entry["routes"] == {"GET /api/insights/subjects/{subject}": 1}
@@ -0,0 +1,107 @@
+import asyncio
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from src.services.quota_service import QuotaService, AccountsClient, AccountsServiceError
+
+
+class FakeAccounts:
+    def __init__(self):
+        self.calls = 0
+        self.enabled = True
+        self.fail = False
+
+    async def has_feature(self, feature, token):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise ConnectionError("accounts down")
+        return self.enabled
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_concurrent_lookups_share_one_upstream_call():
+    accounts = FakeAccounts()
+    service = QuotaService(client=accounts, clock=Clock())
+
+    async def run():
+        results = await asyncio.gather(*[service.check_feature("u1", "F", "t") for _ in range(20)])
+        assert results == [True] * 20
+        assert accounts.calls == 1
+        assert await service.check_feature("u1", "F") is True
+        assert accounts.calls == 1
+        assert await service.check_feature("u2", "F") is True
+        assert accounts.calls == 2
+
+    asyncio.run(run())
+    assert service.stats()["coalesced"] == 19
+
+
+def test_stale_while_revalidate_and_negative_ttl(monkeypatch):
+    from src.config import settings
+    monkeypatch.setattr(settings, "QUOTA_CACHE_TTL_SECONDS", 100)
+    monkeypatch.setattr(settings, "QUOTA_NEGATIVE_TTL_SECONDS", 10)
+    monkeypatch.setattr(settings, "QUOTA_STALE_SECONDS", 1000)
+    accounts, clock = FakeAccounts(), Clock()
+    service = QuotaService(client=accounts, clock=clock)
+
+    async def run():
+        assert await service.check_feature("u1", "F") is True
+        # Expired: the cached answer is returned at once and refreshed behind it
+        clock.now = 150
+        accounts.enabled = False
+        assert await service.check_feature("u1", "F") is True
+        await asyncio.sleep(0.05)
+        assert accounts.calls == 2
+        assert await service.check_feature("u1", "F") is False
+
+        # A "no" is only trusted for the negative TTL
+        clock.now = 165
+        accounts.enabled = True
+        assert await service.check_feature("u1", "F") is False
+        await asyncio.sleep(0.05)
+        assert await service.check_feature("u1", "F") is True
+
+        # Upstream outage: stale answers keep being served, unknown keys fail loudly
+        clock.now = 400
+        accounts.fail = True
+        assert await service.check_feature("u1", "F") is True
+        await asyncio.sleep(0.05)
+        with pytest.raises(AccountsServiceError):
+            await service.check_feature("u3", "F")
+
+    asyncio.run(run())
+
+
+def test_accounts_client_reuses_one_keep_alive_session():
+    async def feature(request):
+        assert request.headers["Authorization"] == "Bearer tok"
+        return web.json_response({"enabled": request.match_info["feature"] == "BASIC_FEEDBACK_REPORT"})
+
+    async def profiles(request):
+        return web.json_response(["p1", "p2"])
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/features/profiles/{feature}", profiles)
+        app.router.add_get("/features/{feature}", feature)
+        server = TestServer(app)
+        await server.start_server()
+        client = AccountsClient(str(server.make_url("")))
+        try:
+            assert await client.has_feature("BASIC_FEEDBACK_REPORT", "tok") is True
+            assert await client.has_feature("OTHER", "tok") is False
+            assert await client.profiles_with_feature("BASIC_FEEDBACK_REPORT") == ["p1", "p2"]
+            assert len(client._sessions) == 1
+        finally:
+            await client.close()
+            await server.close()
+
+    asyncio.run(run())
@@ -0,0 +1,122 @@
+import json
+from datetime import date, datetime
+from src.models import QuestionsAsked, TestPapers, EventRollup, EventRollupWatermark
+from src.migration_helpers import get_checkpoint, save_checkpoint
+from src.services.replay_service import ReplayService, iter_chunks
+from src.services.topics_service import TopTopicsService
+
+
+def write_dump(path, count):
+    with open(path, "w") as f:
+        for i in range(count):
+            f.write(json.dumps({
+                "event_id": f"e{i}", "user_id": "u1", "profile_id": f"p{i % 7}",
+                "class_name": "Class 10", "subject": "Math",
+                "event_type": "QUESTION_ASKED" if i % 4 else "TEST_PAPER_GENERATED",
+                "data": {"q": "why"}, "timestamp": f"2026-10-{1 + i % 5:02d}T09:00:00Z"
+            }) + "\n")
+        f.write("not json\n")
+        f.write(json.dumps({"event_type": "ACTIVITY_HEARTBEAT", "event_id": "hb"}) + "\n")
+
+
+def test_chunks_end_on_line_boundaries(tmp_path):
+    path = tmp_path / "events.ndjson"
+    write_dump(path, 50)
+    chunks = list(iter_chunks(str(path), chunk_bytes=300))
+    assert b"".join(data for _, _, data in chunks) == path.read_bytes()
+    assert all(data.endswith(b"\n") for _, _, data in chunks)
+    assert [start for start, _, _ in chunks[1:]] == [end for _, end, _ in chunks[:-1]]
+
+
+def test_replay_skips_duplicates_resumes_and_rebuilds_touched_rollups(bind, session_factory, tmp_path):
+    db = session_factory()
+    # Already ingested, and rollups covered up to Oct 10
+    db.add(QuestionsAsked(event_id="e1", profile_id="p1", class_name="Class 10", subject="Math",
+                          timestamp=datetime(2026, 10, 2, 9)))
+    db.add(EventRollupWatermark(metric="questions", granularity="day", covered_until=date(2026, 10, 10)))
+    db.commit()
+
+    path = tmp_path / "events.ndjson"
+    write_dump(path, 200)
+    service = ReplayService(bind=bind, session_factory=session_factory)
+    totals = service.replay(str(path), workers=2, chunk_bytes=4096)
+    assert totals == {"inserted": 199, "duplicates": 1, "skipped": 1, "bad": 1}
+    assert db.query(QuestionsAsked).count() == 150
+    assert db.query(TestPapers).count() == 50
+
+    rollup_total = sum(r.count for r in db.query(EventRollup).filter(
+        EventRollup.metric == "questions", EventRollup.granularity == "day"))
+    assert rollup_total == 150
+
+    # A finished dump is not replayed twice; restart re-reads it and finds only duplicates
+    assert service.replay(str(path), workers=1)["inserted"] == 0
+    assert service.replay(str(path), workers=1, restart=True)["duplicates"] == 200
+    with bind.connect() as conn:
+        assert get_checkpoint(conn, service.checkpoint_name(str(path))).status == "done"
+    db.close()
+
+
+def test_interrupted_replay_resumes_from_byte_offset(bind, session_factory, tmp_path):
+    path = tmp_path / "events.ndjson"
+    write_dump(path, 100)
+    service = ReplayService(bind=bind, session_factory=session_factory)
+    middle = path.read_bytes().index(b'"e50"')
+    middle = path.read_bytes().rfind(b"\n", 0, middle) + 1
+
+    # Simulate a crash after the chunk ending at `middle` was committed
+    with bind.connect() as conn:
+        save_checkpoint(conn, service.checkpoint_name(str(path)), status="running", cursor=str(middle),
+                        rows_done=50, message=json.dumps({"questions": ["2026-10-01"]}))
+        conn.commit()
+
+    totals = service.replay(str(path), workers=1, chunk_bytes=1024)
+    assert totals["inserted"] == 100  # 50 carried over from the checkpoint
+    assert totals["duplicates"] == 0
+    db = session_factory()
+    assert db.query(QuestionsAsked).filter(QuestionsAsked.event_id == "e1").count() == 0
+    assert db.query(QuestionsAsked).filter(QuestionsAsked.event_id == "e51").count() == 1
+    db.close()
+
+
+def test_replay_of_test_papers_only_keeps_rebuilt_rollups(bind, session_factory, tmp_path):
+    db = session_factory()
+    db.add(EventRollupWatermark(metric="test_papers", granularity="day", covered_until=date(2026, 10, 10)))
+    db.commit()
+
+    path = tmp_path / "papers.ndjson"
+    with open(path, "w") as f:
+        for i in range(12):
+            f.write(json.dumps({
+                "event_id": f"t{i}", "event_type": "TEST_PAPER_GENERATED", "class_name": "Class 10",
+                "subject": "Math", "timestamp": f"2026-10-{1 + i % 3:02d}T09:00:00Z"
+            }) + "\n")
+    ReplayService(bind=bind, session_factory=session_factory).replay(str(path), workers=1)
+
+    rows = db.query(EventRollup).filter(EventRollup.metric == "test_papers", EventRollup.granularity == "day").all()
+    assert {row.bucket_start: row.count for row in rows} == {date(2026, 10, d): 4 for d in (1, 2, 3)}
+    db.close()
+
+
+def test_replayed_questions_reach_the_running_apps_top_topics(bind, session_factory, tmp_path):
+    topics = TopTopicsService(capacity=20, session_factory=session_factory)
+    # The app ingested one question before the replay and one it has not persisted yet
+    topics.add("Class 10", "Math", datetime(2026, 10, 1, 9), ["why"])
+    topics.persist()
+    topics.add("Class 10", "Math", datetime(2026, 10, 2, 9), ["limits"])
+
+    path = tmp_path / "events.ndjson"
+    write_dump(path, 20)
+    ReplayService(bind=bind, session_factory=session_factory).replay(str(path), workers=1)
+
+    db = session_factory()
+    expected = [{"topic": "why", "count": 13, "error": 0}, {"topic": "limits", "count": 1, "error": 0}]
+    assert topics.top_topics(db, date(2026, 9, 28), "Class 10", "Math") == expected
+    # Oct 5 starts the next week
+    assert topics.top_topics(db, date(2026, 10, 5)) == [{"topic": "why", "count": 3, "error": 0}]
+
+    topics.persist()
+    topics.add("Class 10", "Math", datetime(2026, 10, 2, 9), ["limits"])
+    fresh = TopTopicsService(capacity=20, session_factory=session_factory)
+    assert fresh.top_topics(db, date(2026, 9, 28)) == expected
+    assert topics.top_topics(db, date(2026, 9, 28))[1] == {"topic": "limits", "count": 2, "error": 0}
+    db.close()
@@ -0,0 +1,134 @@
+from datetime import date, datetime, timedelta
+import pytest
+from sqlalchemy import func
+from src.config import settings
+from src.models import QuestionsAsked, TestPapers, TestPapersMonthly, QuestionsWeeklyAggr, EventRollup, EventRollupWatermark
+from src.migration_helpers import get_checkpoint, save_checkpoint
+from src.services.ingest_service import ingest_service
+from src.services.retention_service import RetentionService
+from src.services.rollup_service import RollupService
+
+
+@pytest.fixture
+def service(bind, session_factory, monkeypatch):
+    # Switching auto_vacuum on a database that already has tables takes a VACUUM
+    with bind.connect() as conn:
+        conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
+    monkeypatch.setattr(settings, "QUESTIONS_RETENTION_DAYS", 30)
+    monkeypatch.setattr(settings, "TEST_PAPERS_RETENTION_DAYS", 30)
+    monkeypatch.setattr(settings, "RETENTION_BATCH_SIZE", 25)
+    monkeypatch.setattr(settings, "RETENTION_DUTY_CYCLE", 1.0)
+    return RetentionService(bind=bind, session_factory=session_factory)
+
+
+def add_questions(db, start: date, days: int):
+    for i in range(days * 4):
+        db.add(QuestionsAsked(event_id=f"q{start}-{i}", profile_id="p1", class_name="Class 10", subject="Math",
+                              data={"text": "x" * 500}, timestamp=datetime.combine(start, datetime.min.time())
+                              + timedelta(hours=6 * i)))
+    db.commit()
+
+
+def cover(db, until: date):
+    db.add(EventRollupWatermark(metric="questions", granularity="day", covered_until=until))
+    db.add(QuestionsWeeklyAggr(user_id="u1", profile_id="p1", class_name="Class 10", subject="Math",
+                               count=1, date=until - timedelta(days=7)))
+    db.commit()
+
+
+def test_purge_deletes_only_expired_and_aggregated_rows(service):
+    today = date(2026, 10, 18)
+    db = service.session_factory()
+    add_questions(db, date(2026, 7, 1), 100)
+
+    # Nothing is aggregated yet
+    assert service.purge("questions_asked", today) == 0
+    assert db.query(QuestionsAsked).count() == 400
+
+    # Aggregates cover until Aug 3: that, not the 30 day window, is the limit
+    cover(db, date(2026, 8, 3))
+    deleted = service.purge("questions_asked", today)
+    assert deleted == 33 * 4
+    assert db.query(QuestionsAsked).filter(QuestionsAsked.timestamp < datetime(2026, 8, 3)).count() == 0
+    assert db.query(QuestionsAsked).count() == 400 - 33 * 4
+    # test_papers has no monthly aggregates, so it is left alone
+    assert service.purge_all(today)["test_papers"] == 0
+
+    with service.bind.connect() as conn:
+        assert get_checkpoint(conn, "retention:questions_asked").status == "done"
+        assert conn.exec_driver_sql("PRAGMA freelist_count").scalar() == 0
+    db.close()
+
+
+def test_interrupted_purge_resumes_and_next_run_starts_over(service):
+    today = date(2026, 10, 18)
+    db = service.session_factory()
+    add_questions(db, date(2026, 7, 1), 20)
+    cover(db, date(2026, 10, 1))
+    # A late row with an old timestamp gets a high id
+    db.add(QuestionsAsked(event_id="late", timestamp=datetime(2026, 7, 2)))
+    db.commit()
+
+    with service.bind.connect() as conn:
+        save_checkpoint(conn, "retention:questions_asked", status="running", cursor="40", rows_done=40, rows_total=81)
+        conn.commit()
+    assert service.purge("questions_asked", today) == 41
+    # Rows below the resumed cursor are picked up by the next full pass
+    assert db.query(QuestionsAsked).count() == 40
+    assert service.purge("questions_asked", today) == 40
+    assert db.query(QuestionsAsked).count() == 0
+    db.close()
+
+
+
+def test_test_papers_are_purged_up_to_the_last_monthly_aggregate(service):
+    today = date(2026, 10, 18)
+    db = service.session_factory()
+    for i in range(60 * 4):
+        db.add(TestPapers(event_id=f"t{i}", profile_id="p1", class_name="Class 10", subject="Math",
+                          timestamp=datetime(2026, 7, 1) + timedelta(hours=6 * i)))
+    db.add(EventRollupWatermark(metric="test_papers", granularity="day", covered_until=date(2026, 8, 20)))
+    db.add(TestPapersMonthly(class_name="Class 10", subject="Math", no_of_tests=124, month_start=datetime(2026, 7, 1)))
+    db.commit()
+
+    # July is in test_papers_monthly; August is not yet, though its days are rolled up
+    assert service.purge("test_papers", today) == 31 * 4
+    assert db.query(func.min(TestPapers.timestamp)).scalar() == datetime(2026, 8, 1)
+    assert db.query(TestPapers).count() == 60 * 4 - 31 * 4
+    # Questions have no weekly aggregates, so they are left alone
+    assert service.purge_all(today)["questions_asked"] == 0
+    db.close()
+
+def test_late_event_for_a_purged_day_keeps_its_rollup(service):
+    rollups = RollupService(session_factory=service.session_factory)
+    db = service.session_factory()
+    try:
+        add_questions(db, date(2026, 7, 1), 40)
+        rollups.refresh(today=date(2026, 8, 10))
+        db.add(QuestionsWeeklyAggr(user_id="u1", profile_id="p1", class_name="Class 10", subject="Math",
+                                   count=1, date=date(2026, 8, 3)))
+        db.commit()
+
+        def counts(granularity):
+            return {row.bucket_start: row.count for row in db.query(EventRollup).filter(
+                EventRollup.granularity == granularity)}
+        before = {granularity: counts(granularity) for granularity in ("day", "week", "month")}
+        assert before["day"][date(2026, 7, 5)] == 4
+
+        assert service.purge("questions_asked", date(2026, 10, 18)) > 0
+        assert db.query(QuestionsAsked).count() == 0
+
+        for event_id, day in (("late-purged", "2026-07-05"), ("late-kept", "2026-08-10")):
+            ingest_service.save_event(db, {"event_id": event_id, "event_type": "QUESTION_ASKED",
+                                           "class_name": "Class 10", "subject": "Math",
+                                           "timestamp": f"{day}T09:00:00"})
+        rollups.refresh(today=date(2026, 8, 12))
+        db.expire_all()
+        assert {granularity: counts(granularity) for granularity in ("week", "month")} == \
+            {granularity: before[granularity] for granularity in ("week", "month")}
+        after = counts("day")
+        assert {d: c for d, c in after.items() if d < date(2026, 8, 10)} == before["day"]
+        assert after[date(2026, 8, 10)] == 1
+    finally:
+        db.close()
@@ -0,0 +1,203 @@
+import json
+from datetime import datetime
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.database import get_db
+from src.dependencies import validate_admin_access
+from src.models import QuestionsAsked
+from src.routers import insights
+from src.config import settings
+from src.services import dedupe_service as dedupe_module, event_consumer, ingest_service as ingest_module
+from src.services import live_service as live_module, stats_service as stats_module
+from src.services.dedupe_service import EventIdFilter
+from src.services.event_consumer import QueueConsumer
+from src.services.ingest_service import ingest_service
+from src.services.live_service import LiveFeed
+from src.services.shard_service import ShardService
+from src.services.stats_service import StatsService
+
+
+class ColumnarOff:
+    ready = False
+
+
+@pytest.fixture
+def sharded(session_factory, tmp_path, monkeypatch):
+    shards = ShardService([f"sqlite:///{tmp_path / f'shard{i}.db'}" for i in range(3)], session_factory=session_factory)
+    shards.ensure_schema()
+    monkeypatch.setattr(event_consumer, "shard_service", shards)
+    monkeypatch.setattr(stats_module, "shard_service", shards)
+    return session_factory, shards
+
+
+def ingest(main, shards, count=30):
+    """Store `count` questions through the consumer, plus two pre-sharding rows in the main database."""
+    class Client:
+        def delete_message_batch(self, QueueUrl, Entries):
+            pass
+
+    consumer = QueueConsumer("tutor_queue", Client(), "local", session_factory=main)
+    consumer.process([
+        {"ReceiptHandle": str(i), "Body": json.dumps({
+            "event_type": "QUESTION_ASKED", "event_id": f"e{i}", "user_id": f"u{i % 7}", "profile_id": f"u{i % 7}-p",
+            "class_name": "Class 10", "subject": "Math" if i % 2 else None,
+            "timestamp": datetime(2026, 10, 1 + i % 10, i % 24).isoformat()
+        })}
+        for i in range(count)
+    ])
+    db = main()
+    for i in range(2):
+        db.add(QuestionsAsked(event_id=f"old{i}", user_id="u0", class_name="Class 10", subject="Math",
+                              timestamp=datetime(2026, 9, 1 + i)))
+    db.commit()
+    db.close()
+
+
+def test_events_are_spread_by_user_and_stats_combine_partials(sharded):
+    main, shards = sharded
+    ingest(main, shards)
+    per_shard = []
+    for factory in shards._shards:
+        db = factory()
+        per_shard.append({row.user_id for row in db.query(QuestionsAsked)})
+        db.close()
+    # Every user lands on exactly one shard, and more than one shard is used
+    assert sum(len(users) for users in per_shard) == 7 and sum(1 for users in per_shard if users) > 1
+    assert sum(shards.writes) == 30
+
+    db = main()
+    try:
+        counts = StatsService(engine=ColumnarOff()).db_class_subject_counts(db, "questions")
+        assert counts == {("Class 10", "Math"): 17, ("Class 10", None): 15}
+        dashboard = StatsService(engine=ColumnarOff()).dashboard(db, today=datetime(2026, 10, 6).date())
+        assert dashboard["total_questions"] == 32
+        # 2026-10-05 in IST: the three UTC rows of that day plus 2026-10-04 23:00 UTC
+        assert dashboard["questions_yesterday"] == 4
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("sort_field,descending", [("timestamp", True), ("subject", False), ("subject", True)])
+def test_cursor_pages_merge_every_shard_in_order(sharded, sort_field, descending):
+    main, shards = sharded
+    ingest(main, shards)
+    field = getattr(QuestionsAsked, sort_field)
+    db = main()
+    try:
+        everything, _ = shards.page(db, QuestionsAsked, field, descending, limit=100)
+        assert len(everything) == 32
+
+        seen, cursor = [], None
+        while True:
+            rows, cursor = shards.page(db, QuestionsAsked, field, descending, limit=7, cursor=cursor)
+            seen += [row.event_id for row in rows]
+            if cursor is None:
+                break
+        assert seen == [row.event_id for row in everything]
+
+        # Offset pages agree with the cursor walk
+        second, _ = shards.page(db, QuestionsAsked, field, descending, limit=7, offset=7)
+        assert [row.event_id for row in second] == seen[7:14]
+    finally:
+        db.close()
+
+    values = [getattr(row, sort_field) for row in everything]
+    present = [value for value in values if value is not None]
+    assert present == sorted(present, reverse=descending)
+    if sort_field == "subject":
+        # NULLs first ascending, last descending
+        assert (values[-1] is None) if descending else (values[0] is None)
+
+
+def test_list_endpoint_returns_next_cursor(session_factory):
+    db = session_factory()
+    for i in range(5):
+        db.add(QuestionsAsked(event_id=f"q{i}", user_id="u1", timestamp=datetime(2026, 10, 1 + i)))
+    db.commit()
+    db.close()
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(insights.router)
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[validate_admin_access] = lambda: {"user_id": "admin"}
+    client = TestClient(app)
+
+    first = client.get("/api/insights/questions", params={"limit": 3})
+    assert [q["event_id"] for q in first.json()] == ["q4", "q3", "q2"]
+    rest = client.get("/api/insights/questions", params={"limit": 3, "cursor": first.headers["x-next-cursor"]})
+    assert [q["event_id"] for q in rest.json()] == ["q1", "q0"]
+    assert "x-next-cursor" not in rest.headers
+    assert client.get("/api/insights/questions", params={"cursor": "garbage"}).status_code == 400
+
+
+def test_export_stream_merges_shards_and_main_only_jobs_refuse(sharded, tmp_path, monkeypatch):
+    main, shards = sharded
+    ingest(main, shards)
+    db = main()
+    try:
+        rows = list(shards.iter_sorted(db, QuestionsAsked, QuestionsAsked.timestamp, filters=(
+            QuestionsAsked.timestamp >= datetime(2026, 9, 2),
+        ), batch_size=4))
+    finally:
+        db.close()
+    assert len(rows) == 31
+    assert [row.timestamp for row in rows] == sorted(row.timestamp for row in rows)
+
+    from src.services import archive_service, replay_service, retention_service
+    for module in (archive_service, replay_service, retention_service):
+        monkeypatch.setattr(module, "shard_service", shards)
+    with pytest.raises(RuntimeError, match="SHARD_URLS"):
+        archive_service.ArchiveService(session_factory=main).archive_closed_months()
+    with pytest.raises(RuntimeError, match="SHARD_URLS"):
+        retention_service.RetentionService(session_factory=main).purge("questions_asked")
+    with pytest.raises(RuntimeError, match="SHARD_URLS"):
+        replay_service.ReplayService(session_factory=main).replay(str(tmp_path / "events.ndjson"))
+
+
+def test_live_snapshot_lists_recent_events_from_the_shards(sharded, monkeypatch):
+    main, shards = sharded
+    ingest(main, shards)
+    monkeypatch.setattr(live_module, "shard_service", shards)
+    feed = LiveFeed(session_factory=main)
+    feed.seed(today=datetime(2026, 10, 20).date())
+    recent = feed.snapshot()["recent"]["questions"]
+    assert len(recent) == min(settings.LIVE_MAX_EVENTS, 32)
+    # Newest first, and the main database's pre-sharding rows are the oldest
+    assert [row["timestamp"] for row in recent] == sorted((row["timestamp"] for row in recent), reverse=True)
+    assert recent[0]["event_id"] == "e19"
+
+
+def test_event_id_filter_warms_from_every_shard(sharded, tmp_path, monkeypatch):
+    main, shards = sharded
+    monkeypatch.setattr(ingest_module, "shard_service", shards)
+    ingest(main, shards)
+    monkeypatch.setattr(dedupe_module, "shard_service", shards)
+    monkeypatch.setattr(settings, "EVENT_ID_FILTER_WARM_DAYS", 365)
+    path = str(tmp_path / "filter.bin")
+    event_filter = EventIdFilter(path=path, session_factory=main)
+    event_filter.warm()
+    event_filter.persist()
+
+    # Every read-set member keeps its own id sequence
+    assert event_filter._max_ids["questions_asked"] == 2
+    assert sum(event_filter._max_ids.get(f"questions_asked@shard{member}", 0) for member in (1, 2, 3)) == 30
+
+    # A restart only scans rows newer than the snapshot, shard by shard
+    consumer_db = shards.writer("u3")()
+    ingest_service.save_event(consumer_db, {"event_type": "QUESTION_ASKED", "event_id": "late", "user_id": "u3",
+                                            "timestamp": datetime(2026, 10, 12).isoformat()})
+    restarted = EventIdFilter(path=path, session_factory=main)
+    restarted.warm()
+    assert all(event_id in restarted._bloom for event_id in ("e5", "e29", "old1", "late"))
+    assert restarted.is_duplicate(consumer_db, "questions_asked", "late")
+    assert not restarted.is_duplicate(consumer_db, "questions_asked", "never-sent")
+    assert restarted.counters["definitely_new"] == 1
+    consumer_db.close()
@@ -0,0 +1,99 @@
+from src.sketches import HyperLogLog, SpaceSaving, TDigest, ScalableBloomFilter
+
+
+def test_hyperloglog_estimate_within_error():
+    sketch = HyperLogLog()
+    for i in range(50000):
+        sketch.add(f"profile-{i}")
+        sketch.add(f"profile-{i}")  # duplicates do not count
+    assert abs(sketch.count() - 50000) / 50000 < 0.03
+
+
+def test_hyperloglog_small_cardinality_is_exact_enough():
+    sketch = HyperLogLog()
+    for i in range(25):
+        sketch.add(f"p{i}")
+    assert sketch.count() == 25
+
+
+def test_hyperloglog_merge_and_roundtrip():
+    a, b = HyperLogLog(), HyperLogLog()
+    for i in range(3000):
+        a.add(f"p{i}")
+    for i in range(2000, 5000):
+        b.add(f"p{i}")
+
+    restored = HyperLogLog.from_bytes(a.to_bytes())
+    assert restored.count() == a.count()
+    assert len(a.to_bytes()) < 16384
+
+    merged = restored.merge(b)
+    assert abs(merged.count() - 5000) / 5000 < 0.03
+
+
+def test_space_saving_finds_heavy_hitters():
+    summary = SpaceSaving(capacity=10)
+    for i in range(1000):
+        summary.add("photosynthesis")
+        if i % 2 == 0:
+            summary.add("gravity")
+        summary.add(f"rare-{i}")
+
+    top = summary.top(2)
+    assert [item for item, _, _ in top] == ["photosynthesis", "gravity"]
+    for item, count, err in top:
+        true = 1000 if item == "photosynthesis" else 500
+        assert count - err <= true <= count
+    assert len(summary.counters) == 10
+
+
+def test_space_saving_merge_and_roundtrip():
+    a, b = SpaceSaving(capacity=5), SpaceSaving(capacity=5)
+    for _ in range(30):
+        a.add("fractions")
+    for _ in range(20):
+        b.add("fractions")
+        b.add("decimals")
+
+    merged = SpaceSaving.from_dict(a.to_dict()).merge(b)
+    assert merged.top(2) == [("fractions", 50, 0), ("decimals", 20, 0)]
+
+
+def test_tdigest_quantiles_and_merge():
+    values = [(i * 7919) % 1000 for i in range(20000)]  # uniform over 0..999
+    a, b = TDigest(), TDigest()
+    for i, v in enumerate(values):
+        (a if i % 2 else b).add(v)
+
+    merged = TDigest.from_dict(a.to_dict()).merge(b)
+    assert merged.total == 20000
+    assert len(merged.centroids) <= 200
+    for q in (0.1, 0.5, 0.9, 0.99):
+        assert abs(merged.quantile(q) - q * 1000) < 15
+    assert abs(merged.cdf(250) - 0.25) < 0.02
+    assert merged.quantile(0) == 0
+    assert merged.quantile(1) == 999
+
+
+def test_scalable_bloom_grows_without_false_negatives():
+    bloom = ScalableBloomFilter(initial_capacity=1000, error_rate=0.01)
+    for i in range(5000):
+        bloom.add(f"event-{i}")
+    assert len(bloom.layers) > 1
+    assert all(f"event-{i}" in bloom for i in range(5000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives / 10000 < 0.02
+
+    restored = ScalableBloomFilter.from_bytes(bloom.to_bytes())
+    assert len(restored) == 5000
+    assert "event-4999" in restored and "event-0" in restored
+
+
+def test_scalable_bloom_memory_bounded_by_max_layers():
+    bloom = ScalableBloomFilter(initial_capacity=100, error_rate=0.01, max_layers=2)
+    for i in range(5000):
+        bloom.add(f"event-{i}")
+    assert len(bloom.layers) == 2
+    # New layers are sized by their position in the window, not by how many layers came before
+    assert [layer.capacity for layer in bloom.layers] == [200, 200]
+    assert "event-4999" in bloom
@@ -0,0 +1,44 @@
+import sqlite3
+import subprocess
+import sys
+from src.startup import head_revisions, current_revision, schema_is_current, StartupTimer, VERSIONS_DIR
+
+
+def test_revision_check_reads_heads_and_stamp(tmp_path):
+    heads = head_revisions()
+    assert len(heads) == 1
+
+    path = tmp_path / "insights.db"
+    url = f"sqlite:///{path}"
+    assert current_revision(url) is None
+    assert not schema_is_current(url)
+
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)")
+        conn.execute("INSERT INTO alembic_version VALUES ('5f26519e865e')")
+    assert current_revision(url) == "5f26519e865e"
+    assert not schema_is_current(url)
+
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE alembic_version SET version_num = ?", (next(iter(heads)),))
+    assert schema_is_current(url)
+    # Other databases always go through Alembic
+    assert current_revision("postgresql://insights@db/insights") is None
+
+
+def test_app_import_does_not_load_heavy_dependencies():
+    code = (
+        "import sys, src.main; "
+        "print(sorted(m for m in ('numpy._core', 'numpy.core', 'boto3', 'pyarrow') if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=VERSIONS_DIR.parent.parent)
+    assert out.stdout.strip().splitlines()[-1] == "[]"
+
+
+def test_startup_timer_reports_phases():
+    timer = StartupTimer()
+    timer.mark("imports")
+    with timer.phase("scheduler"):
+        pass
+    assert timer.ready().startswith("Ready in ")
+    assert set(timer.report()["phases"]) == {"imports", "scheduler"}
@@ -0,0 +1,64 @@
+from datetime import date, datetime
+from src.models import EventRollup, EventRollupWatermark, QuestionsWeeklyAggr
+from src.services.suggest_service import PrefixIndex, SuggestService
+import pytest
+
+
+def test_prefix_index_ranks_matches_by_count():
+    index = PrefixIndex({"Class 10": 50, "Class 9": 80, "Chemistry": 5, "class 11": 20})
+    assert index.top("cla", 2) == [("Class 9", 80), ("Class 10", 50)]
+    assert index.top("CLASS 1", 5) == [("Class 10", 50), ("class 11", 20)]
+    index.add("Class 12", 100)
+    assert index.top("class", 1) == [("Class 12", 100)]
+    assert index.top("", 10)[-1] == ("Chemistry", 5)
+    assert index.top("physics", 10) == []
+
+
+@pytest.fixture
+def session_factory(session_factory):
+    db = session_factory()
+    for class_name, subject, count in (("Class 10", "Math", 40), ("Class 10", "Science", 10), ("Class 9", "Math", 5)):
+        db.add(EventRollup(metric="questions", granularity="day", bucket_start=date(2026, 10, 5),
+                           class_name=class_name, subject=subject, count=count))
+    db.add(EventRollupWatermark(metric="questions", granularity="day", covered_until=date(2026, 10, 10)))
+    db.add(QuestionsWeeklyAggr(user_id="user-a", profile_id="user-a-1", class_name="Class 10", subject="Math",
+                               count=7, date=date(2026, 9, 28)))
+    db.commit()
+    db.close()
+    return session_factory
+
+
+class Row:
+    def __init__(self, timestamp, class_name="Class 10", subject="Math", user_id="user-a"):
+        self.timestamp, self.class_name, self.subject, self.user_id = timestamp, class_name, subject, user_id
+
+
+def test_suggestions_come_from_rollups_plus_newer_ingest(session_factory):
+    service = SuggestService(session_factory=session_factory)
+    service.load()
+    assert service.suggest("class", "class") == [{"value": "Class 10", "count": 50}, {"value": "Class 9", "count": 5}]
+    assert service.suggest("user", "us") == [{"value": "user-a", "count": 7}]
+
+    # Already in the rollups: not counted again. After the watermark: added straight away
+    service._on_event("QUESTION_ASKED", Row(datetime(2026, 10, 9, 12)))
+    service._on_event("QUESTION_ASKED", Row(datetime(2026, 10, 17, 9), "Class 12", "Physics", "user-b"))
+    service._on_event("TEST_PAPER_GENERATED", Row(datetime(2026, 10, 17, 9), "Class 12", "Physics", "user-c"))
+    assert service.suggest("class", "Class 1") == [{"value": "Class 10", "count": 50}, {"value": "Class 12", "count": 2}]
+    assert service.suggest("subject", "p") == [{"value": "Physics", "count": 2}]
+    assert [s["value"] for s in service.suggest("user", "user-")] == ["user-a", "user-b", "user-c"]
+
+    # A reload re-applies what the rollups do not cover yet
+    service.load()
+    assert service.suggest("subject", "ph") == [{"value": "Physics", "count": 2}]
+    assert {s["value"] for s in service.suggest("user", "")} == {"user-a", "user-b", "user-c"}
+
+    # Once the rollups cover the day, its ingest-time counts are dropped
+    db = session_factory()
+    db.add(EventRollup(metric="questions", granularity="day", bucket_start=date(2026, 10, 17),
+                       class_name="Class 12", subject="Physics", count=2))
+    db.query(EventRollupWatermark).update({"covered_until": date(2026, 10, 18)})
+    db.commit()
+    db.close()
+    service.load()
+    assert service.suggest("subject", "ph") == [{"value": "Physics", "count": 2}]
+    assert service.stats()["ready"] is True
@@ -0,0 +1,85 @@
+from datetime import date, datetime
+from src.models import QuestionsAsked, EventRollup
+from src.services.ingest_service import ingest_service
+from src.services.rollup_service import RollupService
+from src.services.timeseries_service import plan, Segment, timeseries_service
+import src.services.timeseries_service as timeseries_module
+
+
+def test_plan_prefers_coarsest_complete_buckets():
+    watermarks = {"month": date(2026, 10, 1), "week": date(2026, 10, 12), "day": date(2026, 10, 15)}
+    segments = plan(date(2026, 8, 20), date(2026, 10, 17), "month", watermarks)
+
+    assert segments == [
+        # August: partial month -> weeks inside it, day edges
+        Segment(date(2026, 8, 1), "day", date(2026, 8, 20), date(2026, 8, 24)),
+        Segment(date(2026, 8, 1), "week", date(2026, 8, 24), date(2026, 8, 31)),
+        Segment(date(2026, 8, 1), "day", date(2026, 8, 31), date(2026, 9, 1)),
+        # September: complete month rollup
+        Segment(date(2026, 9, 1), "month", date(2026, 9, 1), date(2026, 10, 1)),
+        # October: days before the first week, closed weeks, closed days, raw tail
+        Segment(date(2026, 10, 1), "day", date(2026, 10, 1), date(2026, 10, 5)),
+        Segment(date(2026, 10, 1), "week", date(2026, 10, 5), date(2026, 10, 12)),
+        Segment(date(2026, 10, 1), "day", date(2026, 10, 12), date(2026, 10, 15)),
+        Segment(date(2026, 10, 1), "raw", date(2026, 10, 15), date(2026, 10, 17)),
+    ]
+
+
+def test_plan_without_rollups_reads_raw():
+    assert plan(date(2026, 10, 5), date(2026, 10, 7), "day", {}) == [
+        Segment(date(2026, 10, 5), "raw", date(2026, 10, 5), date(2026, 10, 6)),
+        Segment(date(2026, 10, 6), "raw", date(2026, 10, 6), date(2026, 10, 7)),
+    ]
+
+
+def test_timeseries_matches_raw_counts(session_factory, monkeypatch):
+    db = session_factory()
+    timestamps = [datetime(2026, 9, d, 10) for d in (3, 14, 14, 29)] + [datetime(2026, 10, d, 9) for d in (2, 6, 13, 16)]
+    for i, ts in enumerate(timestamps):
+        db.add(QuestionsAsked(event_id=f"e{i}", class_name="Class 10", subject="Math", timestamp=ts))
+    db.add(QuestionsAsked(event_id="other", class_name="Class 9", subject="Math", timestamp=datetime(2026, 9, 14)))
+    db.commit()
+
+    rollups = RollupService(session_factory=session_factory)
+    monkeypatch.setattr(timeseries_module, "rollup_service", rollups)
+    rollups.refresh(today=date(2026, 10, 16))
+    assert db.query(EventRollup).filter(EventRollup.granularity == "month").count() == 2
+
+    # A late event for an already rolled-up day is picked up on the next refresh
+    ingest_service.add_listener(rollups._on_event)
+    ingest_service.save_event(db, {
+        "event_id": "late", "event_type": "QUESTION_ASKED",
+        "class_name": "Class 10", "subject": "Math", "timestamp": "2026-09-14T12:00:00"
+    })
+    rollups.refresh(today=date(2026, 10, 16))
+
+    points = timeseries_service.query(db, "questions", "month", date(2026, 9, 1), date(2026, 10, 17), "Class 10", "Math")
+    assert points == [
+        {"bucket_start": date(2026, 9, 1), "count": 5},
+        {"bucket_start": date(2026, 10, 1), "count": 4},
+    ]
+
+    weekly = timeseries_service.query(db, "questions", "week", date(2026, 10, 5), date(2026, 10, 17), subject="Math")
+    assert weekly == [
+        {"bucket_start": date(2026, 10, 5), "count": 1},
+        {"bucket_start": date(2026, 10, 12), "count": 2},
+    ]
+
+
+def test_late_days_are_recovered_after_a_restart(session_factory, monkeypatch):
+    db = session_factory()
+    for i, day in enumerate((3, 4, 5)):
+        db.add(QuestionsAsked(event_id=f"e{i}", class_name="Class 10", subject="Math", timestamp=datetime(2026, 10, day, 9)))
+    db.commit()
+    rollups = RollupService(session_factory=session_factory)
+    rollups.refresh(today=date(2026, 10, 8))
+
+    # A late row stored, then the process exits before the next refresh
+    db.add(QuestionsAsked(event_id="late", class_name="Class 10", subject="Math", timestamp=datetime(2026, 10, 4, 12)))
+    db.commit()
+
+    restarted = RollupService(session_factory=session_factory)
+    restarted.refresh(today=date(2026, 10, 8))
+    counts = {row.bucket_start: row.count for row in db.query(EventRollup).filter(EventRollup.granularity == "day")}
+    assert counts == {date(2026, 10, 3): 1, date(2026, 10, 4): 2, date(2026, 10, 5): 1}
+    db.close()
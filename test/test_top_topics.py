@@ -0,0 +1,33 @@
+from datetime import date, datetime
+from src.services.topics_service import TopTopicsService, extract_topics, normalize_topic
+
+
+def test_extract_topics_prefers_tags_over_text():
+    assert normalize_topic("  Why is the SKY blue?? ") == "why is the sky blue"
+    assert extract_topics({"q": "Why is the sky blue?", "topics": ["Optics", "Light"]}) == ["optics", "light"]
+    assert extract_topics({"q": "Why is the sky blue?"}) == ["why is the sky blue"]
+    assert extract_topics(None) == []
+
+
+def test_top_topics_survive_persist_and_eviction(session_factory):
+    service = TopTopicsService(capacity=20, max_sketches=1, session_factory=session_factory)
+
+    ts = datetime(2026, 10, 14, 10)
+    for _ in range(3):
+        service.add("Class 10", "Science", ts, ["optics"])
+    service.add("Class 10", "Science", ts, ["gravity"])
+    service.add("Class 9", "Science", ts, ["gravity"])
+    assert service.persist() == 2
+    assert len(service._sketches) == 1
+
+    # Reloaded from the database when touched again
+    service.add("Class 10", "Science", ts, ["gravity"])
+    service.persist()
+
+    db = session_factory()
+    assert service.top_topics(db, date(2026, 10, 12), "Class 10", "Science", k=2) == [
+        {"topic": "optics", "count": 3, "error": 0},
+        {"topic": "gravity", "count": 2, "error": 0},
+    ]
+    merged = service.top_topics(db, date(2026, 10, 15), subject="Science", k=1)
+    assert merged == [{"topic": "gravity", "count": 3, "error": 0}]
@@ -0,0 +1,63 @@
+from datetime import date, datetime
+from src.models import QuestionStudentSketch
+from src.services.ingest_service import ingest_service
+from src.services.unique_students_service import UniqueStudentsService
+
+
+def test_unique_students_merge_across_days_and_groups(session_factory):
+    service = UniqueStudentsService(session_factory=session_factory)
+
+    for day in (date(2026, 9, 30), date(2026, 10, 1), date(2026, 10, 2)):
+        for i in range(10):
+            service.add(f"p{i}", "Class 10", "Math", day)
+    service.add("p99", "Class 9", "Math", date(2026, 10, 1))
+    assert service.flush() > 0
+    # Not yet flushed updates are visible to reads too
+    service.add("p42", "Class 10", "Math", date(2026, 10, 2))
+
+    db = session_factory()
+    rows = service.unique_students(db, date(2026, 10, 1), date(2026, 10, 3))
+    assert rows == [
+        {"class_name": "Class 10", "subject": "Math", "unique_students": 11},
+        {"class_name": "Class 9", "subject": "Math", "unique_students": 1},
+    ]
+
+    by_subject = service.unique_students(db, date(2026, 9, 1), date(2026, 11, 1), group_by="subject")
+    assert by_subject == [{"class_name": "", "subject": "Math", "unique_students": 12}]
+
+    assert service.unique_students(db, date(2026, 10, 3), date(2026, 10, 5)) == []
+
+
+def test_rebuild_month_from_raw(session_factory):
+    service = UniqueStudentsService(session_factory=session_factory)
+    # Only the rebuild sees these rows
+    ingest_service.remove_listener(service._on_event)
+    db = session_factory()
+    for i in range(5):
+        ingest_service.save_event(db, {
+            "event_id": f"e{i}", "event_type": "QUESTION_ASKED", "profile_id": f"p{i % 3}",
+            "class_name": "Class 10", "subject": "Science", "timestamp": datetime(2026, 8, 10 + i).isoformat()
+        })
+
+    service.rebuild_month(db, date(2026, 8, 1))
+    assert service.unique_students(db) == [{"class_name": "Class 10", "subject": "Science", "unique_students": 3}]
+
+
+def test_sketches_use_business_days(session_factory):
+    service = UniqueStudentsService(session_factory=session_factory)
+    db = session_factory()
+    # 01:30 on Nov 1 in Asia/Kolkata
+    ingest_service.save_event(db, {
+        "event_id": "late", "event_type": "QUESTION_ASKED", "profile_id": "p1",
+        "class_name": "Class 10", "subject": "Science", "timestamp": "2026-10-31T20:00:00"
+    })
+    assert service.unique_students(db, date(2026, 10, 31), date(2026, 11, 1)) == []
+    assert service.unique_students(db, date(2026, 11, 1), date(2026, 11, 2))[0]["unique_students"] == 1
+
+    service.flush()
+    db.query(QuestionStudentSketch).delete()
+    service.rebuild_month(db, date(2026, 10, 1))
+    service.rebuild_month(db, date(2026, 11, 1))
+    assert {(row.granularity, row.bucket_start) for row in db.query(QuestionStudentSketch)} == \
+        {("day", date(2026, 11, 1)), ("month", date(2026, 11, 1))}
+    db.close()